@@ -0,0 +1,97 @@
+# Pocketsmith API HTTP client
+#  All Pocketsmith API calls go through one ApiClient object. It owns a requests.Session, so TCP+TLS connections to the API server
+#  are kept alive and reused from a connection pool instead of opening a new connection for every call.
+#  If a Telemetry object is given (see MyTelemetry.py), time, status, size and retries of every call are recorded to it.
+#  Repository link: https://github.com/gandos21/PocketSmith
+import os
+import time
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+#### Configs ####
+API_BASE_URL        = os.environ.get('POCKETSMITH_API_URL', 'https://api.pocketsmith.com/v2')     # Environment variable can point the script to another server, eg. for testing
+POOL_SIZE           = 10            # Max number of keep-alive connections kept open to the API server
+CONNECT_TIMEOUT     = 5             # Timeout in s to establish a connection
+READ_TIMEOUT        = 30            # Timeout in s to wait for response data
+MAX_RETRIES         = 3             # Number of retries on connection errors and transient server errors
+RETRY_BACKOFF       = 0.5           # Retry wait time is RETRY_BACKOFF * 2^(retry number - 1) s
+RETRY_STATUS_CODES  = (429, 500, 502, 503, 504)
+# POST is not idempotent (a retried POST could create a duplicate transaction), so POSTs are only retried when the connection could not be made
+RETRY_METHODS       = frozenset(['GET', 'PUT', 'DELETE', 'HEAD', 'OPTIONS'])
+#### End Configs ####
+
+
+# API client class. Holds the default headers, timeouts and retry policy used for all API calls
+class ApiClient:
+    def __init__(self, baseUrl=API_BASE_URL, poolSize=POOL_SIZE, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), retries=MAX_RETRIES, telemetry=None):
+        self.baseUrl = baseUrl.rstrip('/')
+        self.timeout = timeout
+        self.telemetry = telemetry
+        self.session = requests.Session()
+        self.session.headers.update({
+            "Accept": "application/json",
+            "X-Developer-Key": ""
+        })
+        # Retry policy. Connection errors are retried for all methods, read errors and retry status codes only for RETRY_METHODS.
+        #  Retry-After header is respected for 429 (rate limited) responses. Ref: https://urllib3.readthedocs.io/en/stable/reference/urllib3.util.html
+        retry = Retry(total=retries, connect=retries, read=retries, status=retries,
+                      backoff_factor=RETRY_BACKOFF, status_forcelist=RETRY_STATUS_CODES,
+                      allowed_methods=RETRY_METHODS, raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=poolSize, pool_maxsize=poolSize, max_retries=retry)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    # Set developer API key sent with every request
+    def setApiKey(self, apiKey):
+        self.session.headers['X-Developer-Key'] = apiKey
+
+    # API paths (eg. '/me') are appended to base URL. Full URLs (eg. pagination links) are used as they are
+    def url(self, path):
+        return path if path.startswith('http') else self.baseUrl + path
+
+    # Make an API call. Takes the same keyword arguments as requests (params, json, etc.). When json payload is given, requests sets Content-Type header
+    def request(self, method, path, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        if self.telemetry is None:
+            return self.session.request(method, self.url(path), **kwargs)
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, self.url(path), **kwargs)
+        except requests.RequestException as ex:
+            request = ex.request
+            self.telemetry.record(method, path, None, time.perf_counter() - start, len(request.body or b'') if request is not None else 0)
+            raise
+        # Retries done by urllib3 are kept in the retry history of the raw response
+        retries = getattr(response.raw, 'retries', None)
+        self.telemetry.record(method, path, response.status_code, time.perf_counter() - start, len(response.request.body or b''), len(response.content),
+                              len(retries.history) if retries is not None else 0)
+        return response
+
+    def close(self):
+        self.session.close()
+
+
+# Rate limiter shared by worker threads. wait() blocks until the next call is allowed, so calls are spaced at least 1/ratePerSecond s apart.
+#  Coroutines use delay() instead, and await asyncio.sleep() of it. Rate of 0 or None means no limit
+class RateLimiter:
+    def __init__(self, ratePerSecond):
+        self.interval = 1.0 / ratePerSecond if ratePerSecond else 0.0
+        self.lock = threading.Lock()
+        self.nextCall = 0.0
+
+    # Reserve the next call time. Returns time in s to wait until then
+    def delay(self):
+        if not self.interval:
+            return 0.0
+        with self.lock:
+            now = time.monotonic()
+            callTime = max(now, self.nextCall)
+            self.nextCall = callTime + self.interval
+        return callTime - now
+
+    def wait(self):
+        delay = self.delay()
+        if delay > 0:
+            time.sleep(delay)
@@ -0,0 +1,405 @@
+# Pocketsmith automation, asyncio version
+#  Coroutine versions of the main API functions of MyPocketSmith.py, so many API calls can run at the same time on one thread without a thread per call.
+#  All downloads share one aiohttp connection pool, and a semaphore caps the number of requests in flight (MAX_CONCURRENT_REQUESTS).
+#  Lists, lookups, caches and local transaction store are shared with MyPocketSmith.py, so both versions can be used in the same program.
+#  Changes (create, update, confirm) are sent by the async client too, under the same semaphore, and are saved to the same outbox as the sync version (see MyOutbox.py).
+#  Only the short outbox database steps before and after each request run on the default executor, so the event loop isn't blocked. Re-approved transactions are
+#  auto cleared with the same rate limit and concurrency cap as the sync version.
+#  Synchronous wrappers (names ending with Sync) run the coroutines on a background event loop, for callers that are not async.
+#  Requires package aiohttp. Repository link: https://github.com/gandos21/PocketSmith
+import asyncio
+import json
+import time
+import threading
+import uuid
+import aiohttp
+from datetime import datetime, date, timedelta, timezone
+from MyApiClient import API_BASE_URL, POOL_SIZE, CONNECT_TIMEOUT, READ_TIMEOUT, MAX_RETRIES, RETRY_BACKOFF, RETRY_STATUS_CODES, RETRY_METHODS, RateLimiter
+import MyPocketSmith as ps
+import MyOutbox
+from MyTaskGraph import TaskFailed
+from WindowFields import WindowFields as wf
+
+#### Configs & Globals ####
+MAX_CONCURRENT_REQUESTS = 20        # Max number of API requests in flight at the same time
+#### End Configs & Globals ####
+
+
+# Response of an API call. Body is read before the connection is returned to the pool. Attributes match the requests.Response attributes used by MyPocketSmith.py
+class ApiResponse:
+    def __init__(self, status_code, headers, links, text):
+        self.status_code = status_code
+        self.headers = headers
+        self.links = links          # rel -> {'url': url}, like requests.Response.links
+        self.text = text
+
+    def __str__(self):
+        return f'<Response [{self.status_code}]>'
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise aiohttp.ClientResponseError(None, (), status=self.status_code, message=self.text[:200])
+
+
+# Async API client class. Same default headers, timeouts and retry policy as MyApiClient.ApiClient.
+#  aiohttp sessions belong to one event loop, so session and semaphore are created on first use in the running loop
+class AsyncApiClient:
+    def __init__(self, baseUrl=API_BASE_URL, poolSize=POOL_SIZE, maxConcurrent=MAX_CONCURRENT_REQUESTS, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), retries=MAX_RETRIES, telemetry=None):
+        self.baseUrl = baseUrl.rstrip('/')
+        self.telemetry = telemetry      # Calls are recorded to the same telemetry as the sync client, see MyTelemetry.py
+        self.poolSize = max(poolSize, maxConcurrent)
+        self.maxConcurrent = maxConcurrent
+        self.timeout = aiohttp.ClientTimeout(sock_connect=timeout[0], sock_read=timeout[1])
+        self.retries = retries
+        self.headers = {
+            "Accept": "application/json",
+            "X-Developer-Key": ""
+        }
+        self.session = None
+        self.semaphore = None
+        self.loop = None
+
+    def setApiKey(self, apiKey):
+        self.headers['X-Developer-Key'] = apiKey
+
+    def url(self, path):
+        return path if path.startswith('http') else self.baseUrl + path
+
+    def __getSession(self):
+        loop = asyncio.get_running_loop()
+        if self.session is None or self.session.closed or self.loop is not loop:
+            self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.poolSize), timeout=self.timeout)
+            self.semaphore = asyncio.Semaphore(self.maxConcurrent)
+            self.loop = loop
+        return self.session
+
+    # Make an API call. Connection errors are retried for all methods, timeouts and retry status codes only for RETRY_METHODS (POST is not idempotent).
+    #  Retry-After header is respected for 429 (rate limited) responses
+    async def request(self, method, path, **kwargs):
+        session = self.__getSession()
+        headers = dict(self.headers, **kwargs.pop('headers', {}))
+        retryable = method.upper() in RETRY_METHODS
+        bytesSent = len(json.dumps(kwargs['json']).encode()) if kwargs.get('json') is not None else 0
+        start = time.perf_counter()
+        for attempt in range(self.retries + 1):
+            wait = RETRY_BACKOFF * 2 ** attempt
+            try:
+                async with self.semaphore:
+                    async with session.request(method, self.url(path), headers=headers, **kwargs) as resp:
+                        text = await resp.text()
+                        links = {rel: {'url': str(link.get('url'))} for rel, link in resp.links.items()}
+                        response = ApiResponse(resp.status, resp.headers, links, text)
+                        bytesReceived = len(await resp.read())
+            except aiohttp.ClientConnectorError:
+                if attempt == self.retries:
+                    self.__record(method, path, None, start, bytesSent, 0, attempt)
+                    raise
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if not retryable or attempt == self.retries:
+                    self.__record(method, path, None, start, bytesSent, 0, attempt)
+                    raise
+            else:
+                if not (retryable and response.status_code in RETRY_STATUS_CODES) or attempt == self.retries:
+                    self.__record(method, path, response.status_code, start, bytesSent, bytesReceived, attempt)
+                    return response
+                if response.status_code == 429 and response.headers.get('Retry-After', '').isdigit():
+                    wait = int(response.headers['Retry-After'])
+            await asyncio.sleep(wait)
+
+    def __record(self, method, path, status, start, bytesSent, bytesReceived, retries):
+        if self.telemetry is not None:
+            self.telemetry.record(method, path, status, time.perf_counter() - start, bytesSent, bytesReceived, retries)
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+
+client = AsyncApiClient()       # Shared async client. API key and telemetry are copied from the sync client when first used
+loop = None                     # Background event loop used by the Sync wrappers
+loopLock = threading.Lock()
+
+
+# Function to copy API key and telemetry from the sync client, so ps.ReadDevKey() sets up both clients
+def SyncApiKey():
+    client.telemetry = ps.GetTelemetry()
+    client.setApiKey(ps.client.session.headers['X-Developer-Key'])
+
+# Function to get user ID of the API key owner. User data is shared with MyPocketSmith.py, so /me is requested at most once
+async def GetUserId():
+    if ps.KeyFileChanged():
+        ps.InvalidateUserContext()
+        ps.ReadDevKey()
+    SyncApiKey()
+    with ps.userContextLock:
+        if ps.userContext or ps.ReadUserContextCache():
+            return ps.userContext['id']
+    response = await client.request("GET", "/me")
+    response.raise_for_status()
+    with ps.userContextLock:
+        return ps.SaveUserContext(json.loads(response.text))['id']
+
+
+## Loaders ##
+# Function to download metadata (categories or accounts). See ps.FetchMetadata()
+async def FetchMetadata(Name, CachedEntry=None):
+    url = f'/users/{await GetUserId()}/{ps.METADATA_ENDPOINTS[Name]}'
+    response = await client.request("GET", url, headers=ps.MetadataRequestHeaders(CachedEntry))
+    if response.status_code == 304:
+        return None
+    response.raise_for_status()
+    return ps.MetadataEntry(Name, json.loads(response.text), response.headers, CachedEntry)
+
+async def LoadMetadata(Name, UseCache=True):
+    cachedEntry = ps.ReadMetadataCache().get(Name) if UseCache else None
+    if cachedEntry is not None:
+        ps.ApplyMetadata(Name, cachedEntry['Data'])
+        return
+    entry = await FetchMetadata(Name)
+    ps.ApplyMetadata(Name, entry['Data'])
+    ps.WriteMetadataCache(Name, entry)
+
+async def LoadCategories(UseCache=True):
+    await LoadMetadata('categories', UseCache)
+
+async def LoadAccounts(UseCache=True):
+    await LoadMetadata('accounts', UseCache)
+
+# Function to check cached categories and accounts are still up to date. Both are checked at the same time. Returns list of names of changed metadata
+async def RevalidateMetadata():
+    cache = ps.ReadMetadataCache()
+    names = list(ps.METADATA_ENDPOINTS)
+    entries = await asyncio.gather(*(FetchMetadata(name, cache.get(name)) for name in names))
+    changed = []
+    for name, entry in zip(names, entries):
+        if entry is not None:
+            ps.ApplyMetadata(name, entry['Data'])
+            ps.WriteMetadataCache(name, entry)
+            changed.append(name)
+    return changed
+
+
+## Transactions ##
+async def GetTransactionsPage(Url, QueryString, Page):
+    response = await client.request("GET", Url, params=dict(QueryString, page=str(Page)))
+    response.raise_for_status()
+    return json.loads(response.text), response
+
+# Function to get all user transactions between StartDate and EndDate, following the API pagination. See ps.FetchUserTransactions().
+#  After the first page, all remaining pages are requested at once. Concurrency is limited by the client semaphore
+async def FetchUserTransactions(StartDate=None, EndDate=None, **Filters):
+    url = f"/users/{await GetUserId()}/transactions"
+    querystring = {'per_page': str(ps.TRANSACTIONS_PER_PAGE)}
+    if StartDate is not None:
+        querystring['start_date'] = str(StartDate)
+    if EndDate is not None:
+        querystring['end_date'] = str(EndDate)
+    querystring.update({k: str(v) for k, v in Filters.items() if v is not None})
+
+    firstPage, response = await GetTransactionsPage(url, querystring, 1)
+    pageCount = ps.GetPageCount(response)
+    if pageCount is None:
+        # No pagination headers. Follow rel="next" links one page at a time
+        pages = [firstPage]
+        page = 1
+        while 'next' in response.links and len(pages[-1]):
+            page += 1
+            transactions, response = await GetTransactionsPage(url, querystring, page)
+            pages.append(transactions)
+        return [t for p in pages for t in p]
+
+    pages = await asyncio.gather(*(GetTransactionsPage(url, querystring, page) for page in range(2, pageCount + 1)))
+    return firstPage + [t for transactions, response in pages for t in transactions]
+
+# Function to bring local transaction store up to date with Pocketsmith. See ps.SyncTransactions()
+async def SyncTransactions(FullSync=False):
+    store = ps.GetTransactionStore()
+    syncStart = datetime.now(timezone.utc) - timedelta(seconds=ps.SYNC_OVERLAP)
+    lastSync = None if FullSync or ps.IsFullSyncDue(store) else store.getState('LastSync')
+
+    if lastSync is None:
+        endDate = date.today()
+        window = (endDate - timedelta(days=ps.TRANSACTION_FETCH_DAYS), endDate)
+        return ps.ApplySyncResult(store, await FetchUserTransactions(*window), syncStart, window)
+    return ps.ApplySyncResult(store, await FetchUserTransactions(updated_since=lastSync), syncStart)
+
+# Get all transactions for user between StartDate and EndDate, after auto clearing re-approved transactions. See ps.GetUserTransactions()
+async def GetUserTransactions(StartDate=None, EndDate=None):
+    if EndDate is None:
+        EndDate = date.today()
+    if StartDate is None:
+        StartDate = EndDate - timedelta(days=ps.TRANSACTION_FETCH_DAYS)
+    print(f'Synced transactions: {await SyncTransactions()} downloaded')
+    store = ps.GetTransactionStore()
+    transactions = store.getTransactions(StartDate, EndDate)
+    unconfirmedTrans = ps.GetPendingReviewList(store)
+    ps.PrintTransactions(transactions, StartDate, EndDate)
+
+    # Auto clear transactions that were approved before and did not change
+    cleared, pending = await CheckNewTransactionsForReapproval(unconfirmedTrans)
+    return pending, transactions
+
+# Function to check new transactions come up for approval were previously approved or not, and auto clear them. See ps.CheckNewTransactionsForReapproval()
+async def CheckNewTransactionsForReapproval(UnconfirmedTrans):
+    candidates = await asyncio.get_running_loop().run_in_executor(None, ps.MatchReapprovalCandidates, UnconfirmedTrans)     # May read the history file
+    return ps.SplitCleared(UnconfirmedTrans, await AutoClearTransactions(candidates) if candidates else [])
+
+# Function to auto clear re-approval candidates. See ps.AutoClearTransactions(). Same concurrency cap and rate limit: at most MaxConcurrent confirmations
+#  in flight and AUTO_CLEAR_RATE_LIMIT calls per second. Returns list of cleared transaction ids
+async def AutoClearTransactions(Candidates, MaxConcurrent=ps.MAX_CONCURRENT_AUTO_CLEARS):
+    limiter = RateLimiter(ps.AUTO_CLEAR_RATE_LIMIT)
+    semaphore = asyncio.Semaphore(max(1, MaxConcurrent))
+
+    async def AutoClear(Candidate):
+        val, approved = Candidate
+        async with semaphore:
+            await asyncio.sleep(limiter.delay())
+            try:
+                return await ConfirmTransactionWithPayee(val['id'], approved[wf.PAYEE_NAME], approved.get(wf.CATEGORY_NAME), approved.get(wf.NOTE_TEXT))
+            except Exception as ex:     # eg. connection error. Transaction stays in review list
+                return '', f'Transaction confirmation failed! {ex}'
+
+    clearedIds = []
+    clearedTrans = []
+    for candidate, (res, status) in zip(Candidates, await asyncio.gather(*(AutoClear(c) for c in Candidates))):
+        ps.ReportAutoClear(candidate, res, status, clearedIds, clearedTrans)
+    if clearedTrans:
+        await asyncio.get_running_loop().run_in_executor(None, ps.GetTransactionStore().upsert, clearedTrans)
+    return clearedIds
+
+# Function to send one outbox operation with the async client. Operation is taken for this process before, and its outcome saved after, on the default executor
+#  (see Outbox.take() and Outbox.finish()). Returns (response or None, new operation status). If Replay is False, the operation was saved with Outbox.begin()
+#  and the caller reports the result: an error with no response is raised after it is saved
+async def SendOperation(Outbox, Op, Replay=True):
+    loop = asyncio.get_running_loop()
+    path = await loop.run_in_executor(None, Outbox.take, Op)
+    if path is None:
+        return None, MyOutbox.SKIPPED
+    response = None
+    error = None
+    interrupted = False
+    try:
+        response = await client.request(Op['method'], path, json=Op['payload'], headers={'Idempotency-Key': Op['key']})
+    except aiohttp.ClientConnectorError as ex:      # Request was not sent
+        error = ex
+    except (aiohttp.ClientError, asyncio.TimeoutError) as ex:
+        error = ex
+        interrupted = True
+    message = None if error is None else f'{type(error).__name__} {error}'
+    status = await loop.run_in_executor(None, lambda: Outbox.finish(Op, path, response, message, interrupted, Replay))
+    if response is None and not Replay:
+        raise error
+    return response, status
+
+# Function to save a change to the outbox and send it with the async client. Returns the response, see Outbox.call()
+async def OutboxCall(Method, Path, Payload=None):
+    loop = asyncio.get_running_loop()
+    outbox = await loop.run_in_executor(None, ps.GetOutbox)
+    op = await loop.run_in_executor(None, outbox.begin, Method, Path, Payload)
+    response, status = await SendOperation(outbox, op, Replay=False)
+    return response
+
+# Function to save planned operations (see ps.OperationPlanner) to the outbox and send them with the async client. Each operation is sent as soon as the operations
+#  it depends on are done, so independent ones are sent at the same time. Operations failing with temporary errors are left to outbox background replay, as are operations
+#  waiting for them. Returns dictionary of operation key -> outbox operation after sending
+async def SendOperations(Operations, Group):
+    loop = asyncio.get_running_loop()
+    outbox = await loop.run_in_executor(None, ps.GetOutbox)
+    await loop.run_in_executor(None, lambda: outbox.enqueue(Operations, Group, claim=True))
+    finished = {op['key']: loop.create_future() for op in Operations}      # Operation key -> status after sending
+
+    async def Send(Op):
+        status = None
+        try:
+            deps = [await finished[dep] for dep in Op.get('deps', []) if dep in finished]
+            if all(dep in (MyOutbox.DONE, MyOutbox.SKIPPED) for dep in deps):
+                op = await loop.run_in_executor(None, outbox.get, Op['key'])       # Saved operation, with its attempts and state
+                response, status = await SendOperation(outbox, op)
+        except TaskFailed:
+            pass        # Taken by another process using the same outbox
+        finally:
+            finished[Op['key']].set_result(status)
+
+    try:
+        await asyncio.gather(*(Send(op) for op in Operations))
+    finally:
+        outbox.release(Group)
+    return {op['key']: op for op in await loop.run_in_executor(None, lambda: outbox.list(group=Group))}
+
+# Function to plan, save and send a posting from the review panel. See ps.PlanPosting(). Returns response data of the transaction and of its TransferTo transaction, and status message
+async def SendPosting(GuiPanelValues, TransactionId=None, Need_Review=True, ChangePayeeName=True):
+    planner = ps.OperationPlanner()
+    keys = ps.PlanPosting(planner, GuiPanelValues, TransactionId, Need_Review, ChangePayeeName)
+    group = 'post-' + uuid.uuid4().hex
+    return ps.PostingResult(planner, keys, await SendOperations(planner.operations(group), group))
+
+# Function to create new transaction. See ps.PostTransaction()
+async def PostTransaction(GuiPanelValues, Need_Review=True, ChangePayeeName=True):
+    res1, res2, msg = await SendPosting(GuiPanelValues, Need_Review=Need_Review, ChangePayeeName=ChangePayeeName)
+    print(msg)
+    return res1, res2, msg
+
+# Function to update main transaction and to create TransferTo transaction if required. See ps.PlanPosting()
+async def UpdateTransaction(TransactionId, GuiPanelValues, Need_Review=True):
+    return await SendPosting(GuiPanelValues, TransactionId, Need_Review)
+
+# Function to check response of a confirmation. Returns response data ('' if failed) and status message, like ps.ConfirmTransaction()
+def ConfirmationResult(Response):
+    if Response.status_code == 200:
+        return json.loads(Response.text), 'Transaction posting success'
+    print(Response)
+    return '', f'Transaction confirmation failed! Res: {str(Response)}'
+
+# Function to confirm a transaction after it has been updated or created. See ps.ConfirmTransaction()
+async def ConfirmTransaction(TransactionId):
+    return ConfirmationResult(await OutboxCall("PUT", f'/transactions/{TransactionId}', {'needs_review': False}))
+
+# Function to confirm a transaction with payee, category and note update. See ps.ConfirmTransactionWithPayee()
+async def ConfirmTransactionWithPayee(TransactionId, PayeeName, CategoryName=None, Note=None):
+    payload = {'payee': PayeeName, 'needs_review': False}
+    if CategoryName in ps.categoryIdLookup:
+        payload['category_id'] = ps.categoryIdLookup[CategoryName]
+    if Note is not None:
+        payload['note'] = Note
+    res, msg = ConfirmationResult(await OutboxCall("PUT", f'/transactions/{TransactionId}', payload))
+    if isinstance(res, dict) and res.get('needs_review'):
+        res, msg = await ConfirmTransaction(TransactionId)     # Payee change flagged it for review again
+    return res, msg
+
+
+## Synchronous wrappers ##
+# Function to run a coroutine on the background event loop and wait for its result. Can be called from any thread.
+#  Loop is kept running between calls, so the connection pool is re-used
+def RunSync(Coroutine):
+    global loop
+    with loopLock:
+        if loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name='AsyncPocketSmith', daemon=True).start()
+    return asyncio.run_coroutine_threadsafe(Coroutine, loop).result()
+
+def LoadCategoriesSync(UseCache=True):
+    return RunSync(LoadCategories(UseCache))
+
+def LoadAccountsSync(UseCache=True):
+    return RunSync(LoadAccounts(UseCache))
+
+def RevalidateMetadataSync():
+    return RunSync(RevalidateMetadata())
+
+def GetUserTransactionsSync(StartDate=None, EndDate=None):
+    return RunSync(GetUserTransactions(StartDate, EndDate))
+
+def PostTransactionSync(GuiPanelValues, Need_Review=True, ChangePayeeName=True):
+    return RunSync(PostTransaction(GuiPanelValues, Need_Review, ChangePayeeName))
+
+def UpdateTransactionSync(TransactionId, GuiPanelValues, Need_Review=True):
+    return RunSync(UpdateTransaction(TransactionId, GuiPanelValues, Need_Review))
+
+def ConfirmTransactionSync(TransactionId):
+    return RunSync(ConfirmTransaction(TransactionId))
+
+def CloseSync():
+    if loop is not None:
+        RunSync(client.close())
@@ -0,0 +1,171 @@
+# Category tree
+#  Pocketsmith categories are a tree: each category may have child categories, to any depth. The tree is kept in memory with lookups of each category by id,
+#  by full path (eg. 'Transport > Fuel') and by its own title (leaf name). A category is shown by its leaf name, unless another category has the same leaf name,
+#  in which case its full path is shown, so the two can be told apart. Categories under a top level category titled HIDDEN_CATEGORY are left out of pick lists,
+#  but can still be looked up, eg. for transactions already in them.
+#  When categories change, only changed categories and their sub-categories get new paths, and only leaf names they had or have are checked again for duplicates
+#  Repository link: https://github.com/gandos21/PocketSmith
+import threading
+
+#### Configs ####
+PATH_SEPARATOR  = ' > '         # Separator between parent and child titles in category paths
+HIDDEN_CATEGORY = 'Hidden'      # Sub-categories of a top level category with this title are not shown in category lists
+#### End Configs ####
+
+
+# A category of the tree
+class CategoryNode:
+    def __init__(self, id, title, parentId):
+        self.id = id
+        self.title = title
+        self.parentId = parentId        # None for top level categories
+        self.childIds = []
+        self.path = title               # Titles from top level category down to this one, joined with PATH_SEPARATOR
+        self.name = title               # Name shown in category lists. Leaf title, or full path if leaf title isn't unique
+        self.hidden = False
+
+
+# Category tree class. Safe to look up from GUI thread while it's updated by a background thread
+class CategoryTree:
+    def __init__(self, categories=()):
+        self.lock = threading.Lock()
+        self.version = 0            # Incremented whenever categories change, so names looked up from the tree can be cached until then
+        self.nodes = {}             # Category id -> CategoryNode
+        self.order = []             # Category ids in tree order (parent before its children), as returned by the API
+        self.byPath = {}            # Case folded path -> category id
+        self.byLeaf = {}            # Case folded title -> list of category ids having it
+        self.lookup = {}            # Name, path or unique leaf title -> category id. Used to find the id of a category entered in the GUI
+        self.names = []             # Names of categories to pick from, in tree order. Parent categories are left out, as transactions go into sub-categories
+        self.searchWords = {}       # Name -> case folded words of its path, for type-ahead filtering
+        self.filterCache = ('', None)   # Last type-ahead filter text and its results, to narrow down on next key press
+        self.update(categories)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    # Function to flatten category tree data returned by the API into (id, title, parent id) in tree order
+    @staticmethod
+    def __flatten(categories, parentId=None):
+        for c in categories:
+            yield c['id'], c['title'], parentId
+            yield from CategoryTree.__flatten(c.get('children') or [], c['id'])
+
+    # Update tree with category tree data returned by the API. Returns set of ids of added, changed or removed categories, empty if nothing changed
+    def update(self, categories):
+        flat = list(self.__flatten(categories))
+        with self.lock:
+            newIds = {id for id, title, parentId in flat}
+            removed = set(self.nodes) - newIds
+            changed = {id for id, title, parentId in flat if id not in self.nodes or (self.nodes[id].title, self.nodes[id].parentId) != (title, parentId)}
+            order = [id for id, title, parentId in flat]
+            if not changed and not removed and order == self.order:
+                return set()
+
+            nodes = dict(self.nodes)
+            byPath = dict(self.byPath)
+            byLeaf = {k: list(v) for k, v in self.byLeaf.items()}
+            # Remove changed and removed categories from path and leaf lookups. Changed ones are added back with new data below
+            leafNames = set()       # Leaf names to check again for duplicates
+            for id in removed | (changed & set(nodes)):
+                node = nodes.pop(id)
+                byPath.pop(node.path.casefold(), None)
+                leafNames.add(node.title.casefold())
+                byLeaf[node.title.casefold()].remove(id)
+            for id, title, parentId in flat:
+                if id in changed:
+                    nodes[id] = CategoryNode(id, title, parentId)
+                nodes[id].childIds = []
+            for id in order:
+                parentId = nodes[id].parentId
+                if parentId in nodes:
+                    nodes[parentId].childIds.append(id)
+            # New paths for changed categories and everything under them
+            pending = [id for id in order if id in changed and (nodes[id].parentId is None or nodes[id].parentId not in changed)]
+            while pending:
+                node = nodes[pending.pop()]
+                parent = nodes.get(node.parentId)
+                if node.id not in changed:
+                    byPath.pop(node.path.casefold(), None)
+                node.path = node.title if parent is None else parent.path + PATH_SEPARATOR + node.title
+                node.hidden = (parent is None and node.title == HIDDEN_CATEGORY) or (parent is not None and parent.hidden)
+                byPath[node.path.casefold()] = node.id
+                leafNames.add(node.title.casefold())       # Name may be the path, so check it again
+                pending.extend(node.childIds)
+            for id in changed:
+                leafNames.add(nodes[id].title.casefold())
+                byLeaf.setdefault(nodes[id].title.casefold(), []).append(id)
+            # Shown names of categories having a checked leaf name
+            for leaf in leafNames:
+                ids = byLeaf.get(leaf)
+                if not ids:
+                    byLeaf.pop(leaf, None)
+                    continue
+                for id in ids:
+                    nodes[id].name = nodes[id].title if len(ids) == 1 else nodes[id].path
+
+            lookup = {}
+            for id in order:
+                node = nodes[id]
+                lookup[node.path] = id
+                lookup[node.name] = id      # Names are added last, so a name always finds its own category
+            self.nodes, self.order, self.byPath, self.byLeaf = nodes, order, byPath, byLeaf
+            self.lookup = lookup
+            self.names = [nodes[id].name for id in order if not nodes[id].childIds and not nodes[id].hidden]
+            self.searchWords = {nodes[id].name: nodes[id].path.casefold().replace(PATH_SEPARATOR, ' ').split() for id in order}
+            self.filterCache = ('', None)
+            self.version += 1
+            return changed | removed
+
+    # Category id of a name entered in the GUI or rules file: shown name, full path or leaf title (case insensitive), or id. Returns None if not found or
+    #  if a leaf title is shared by more than one category (see matches() to list them)
+    def find(self, name):
+        with self.lock:
+            return self.__find(name)
+
+    def __find(self, name):
+        if isinstance(name, int):
+            return name if name in self.nodes else None
+        if name in self.lookup:
+            return self.lookup[name]
+        key = name.strip().casefold()
+        if key in self.byPath:
+            return self.byPath[key]
+        ids = self.byLeaf.get(key, [])
+        return ids[0] if len(ids) == 1 else None
+
+    # Ids of a category and all categories under it, eg. to filter transactions of a parent category. Returns empty list if id is not found
+    def subtreeIds(self, id):
+        with self.lock:
+            if id not in self.nodes:
+                return []
+            ids = []
+            pending = [id]
+            while pending:
+                ids.append(pending.pop())
+                pending.extend(self.nodes[ids[-1]].childIds)
+            return ids
+
+    # Categories having a leaf title, eg. to tell the user which paths to choose from when a title is shared
+    def matches(self, title):
+        with self.lock:
+            return [self.nodes[id] for id in self.byLeaf.get(title.strip().casefold(), [])]
+
+    # Name shown in category lists of a category id or any name find() accepts. Returns None if not found
+    def displayName(self, nameOrId):
+        with self.lock:
+            id = self.__find(nameOrId)
+            return self.nodes[id].name if id is not None else None
+
+    # Category names matching typed text, for type-ahead filtering of category lists. Each word typed must start a word of the category path, eg. 'tr fu' finds
+    #  'Transport > Fuel'. Categories whose name starts with the text come first. When more is typed, only the previous results are searched again
+    def filter(self, text):
+        words = text.casefold().split()
+        if not words:
+            return list(self.names)
+        with self.lock:
+            lastText, lastResults = self.filterCache
+            pool = lastResults if lastResults is not None and lastText and text.casefold().startswith(lastText) else self.names
+            results = [name for name in pool if all(any(w.startswith(word) for w in self.searchWords[name]) for word in words)]
+            self.filterCache = (text.casefold(), results)
+        key = text.strip().casefold()
+        return sorted(results, key=lambda name: not name.casefold().startswith(key))     # Stable sort keeps tree order within each group
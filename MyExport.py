@@ -0,0 +1,63 @@
+# Transaction export
+#  Transactions are written to a csv, JSON Lines (one json object per line) or json file as they are read, one at a time, from a generator of transactions
+#  (see MyPocketSmith.IterUserTransactions() and TransactionStore.iterTransactions()). So memory use stays the same however many transactions are exported,
+#  and writing starts with the first page downloaded instead of after the last one.
+#  Repository link: https://github.com/gandos21/PocketSmith
+import csv
+import json
+
+#### Configs ####
+EXPORT_FIELDS       = ['id', 'date', 'account', 'payee', 'amount', 'category', 'note', 'needs_review', 'status', 'upload_source']
+EXPORT_BUFFER_SIZE  = 1024 * 1024       # Size in bytes of export file write buffer, so rows are written to disk in big blocks
+#### End Configs ####
+
+EXPORT_FORMATS = ('csv', 'jsonl', 'json')
+
+
+# Function to convert a transaction from the API or local store to a flat row of EXPORT_FIELDS.
+#  CategoryName is a function giving the name to show for a category id (eg. CategoryTree.displayName), or None to use category titles
+def FlatTransaction(Transaction, CategoryName=None):
+    row = {k: Transaction.get(k) for k in EXPORT_FIELDS}
+    row['account'] = (Transaction.get('transaction_account') or {}).get('name')
+    category = Transaction.get('category') or {}
+    row['category'] = (CategoryName(category['id']) if CategoryName is not None and 'id' in category else None) or category.get('title')
+    return row
+
+# Function to get export format of a file from its extension. Default is csv
+def ExportFormat(FileName):
+    extension = FileName.rsplit('.', 1)[-1].lower()
+    return extension if extension in EXPORT_FORMATS else 'csv'
+
+# Generator of transactions of an account name and of a set of category ids, if given. Used where the API doesn't filter them, see IterUserTransactions()
+def FilterTransactions(Transactions, Account=None, CategoryIds=None):
+    for t in Transactions:
+        if Account is not None and (t.get('transaction_account') or {}).get('name') != Account:
+            continue
+        if CategoryIds is not None and (t.get('category') or {}).get('id') not in CategoryIds:
+            continue
+        yield t
+
+# Function to write transactions to an open text file, one at a time. Format is one of EXPORT_FORMATS. A json file is written as a list, one transaction per line.
+#  Returns number of transactions written
+def ExportTransactions(Transactions, Fp, Format='csv', CategoryName=None):
+    if Format not in EXPORT_FORMATS:
+        raise ValueError(f'Unknown export format {Format}')
+    count = 0
+    if Format == 'csv':
+        writer = csv.writer(Fp)
+        writer.writerow(EXPORT_FIELDS)
+        for t in Transactions:
+            row = FlatTransaction(t, CategoryName)
+            writer.writerow([row[k] for k in EXPORT_FIELDS])
+            count += 1
+    elif Format == 'jsonl':
+        for t in Transactions:
+            Fp.write(json.dumps(FlatTransaction(t, CategoryName)) + '\n')
+            count += 1
+    else:
+        Fp.write('[')
+        for t in Transactions:
+            Fp.write((',\n ' if count else '\n ') + json.dumps(FlatTransaction(t, CategoryName)))
+            count += 1
+        Fp.write('\n]\n')
+    return count
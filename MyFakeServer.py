@@ -0,0 +1,380 @@
+# Local stand-in for the Pocketsmith API, for testing and benchmarking without a real account
+#  Serves /me, categories, transaction accounts and transactions (list with filters and pagination, create, read, update, delete) from memory.
+#  Latency, server errors and rate limiting (429 responses) can be injected. Every request is counted per route and response status.
+#  Pocketsmith quirk is emulated: when payee or amount of a transaction is changed, it may be flagged for review again even if needs_review is set to False (see ReflagRate).
+#  To point the script to the fake server, set environment variable POCKETSMITH_API_URL to the server url (see MyApiClient.py). Uses standard library only.
+#  Repository link: https://github.com/gandos21/PocketSmith
+import json
+import re
+import time
+import random
+import hashlib
+import threading
+from collections import Counter
+from datetime import datetime, date, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, urlencode
+
+#### Configs ####
+FAKE_USER_ID    = 42
+DEFAULT_PER_PAGE = 30       # Pocketsmith default page size
+MAX_PER_PAGE    = 1000
+#### End Configs ####
+
+# API routes served: (method, path pattern, route name). Pattern group 1 is the user, account or transaction id
+ROUTES = [
+    ('GET',    re.compile(r'/me'),                                          'me'),
+    ('GET',    re.compile(r'/users/(\d+)/categories'),                      'categories'),
+    ('GET',    re.compile(r'/users/(\d+)/transaction_accounts'),            'transaction_accounts'),
+    ('GET',    re.compile(r'/users/(\d+)/transactions'),                    'list_transactions'),
+    ('POST',   re.compile(r'/transaction_accounts/(\d+)/transactions'),     'create_transaction'),
+    ('GET',    re.compile(r'/transactions/(\d+)'),                          'get_transaction'),
+    ('PUT',    re.compile(r'/transactions/(\d+)'),                          'update_transaction'),
+    ('DELETE', re.compile(r'/transactions/(\d+)'),                          'delete_transaction'),
+]
+
+
+# Fake Pocketsmith account data
+class FakeAccount:
+    def __init__(self, categories=None, accounts=None):
+        self.lock = threading.Lock()
+        self.user = {'id': FAKE_USER_ID, 'login': 'fake', 'name': 'Fake User', 'time_zone': 'UTC', 'base_currency_code': 'aud'}
+        self.categories = categories if categories is not None else DefaultCategories()
+        self.accounts = accounts if accounts is not None else DefaultAccounts()
+        self.transactions = {}      # id -> transaction data
+        self.nextId = 1000
+
+    def categoryById(self, categoryId):
+        for parent in self.categories:
+            for c in [parent] + parent['children']:
+                if c['id'] == categoryId:
+                    return {'id': c['id'], 'title': c['title']}
+        return None
+
+    def accountById(self, accountId):
+        for a in self.accounts:
+            if a['id'] == accountId:
+                return {'id': a['id'], 'name': a['name']}
+        return None
+
+    # Add a transaction, eg. a bank feed transaction to review. Returns transaction data
+    def addTransaction(self, accountId, amount, payee, transDate, categoryId=None, note=None, needsReview=True, uploadSource='feed'):
+        with self.lock:
+            self.nextId += 1
+            t = {
+                'id'                    : self.nextId,
+                'payee'                 : payee,
+                'original_payee'        : payee,
+                'date'                  : str(transDate),
+                'upload_source'         : uploadSource,
+                'category'              : self.categoryById(categoryId),
+                'closing_balance'       : 0.0,
+                'note'                  : note,
+                'amount'                : float(amount),
+                'status'                : 'posted',
+                'needs_review'          : needsReview,
+                'transaction_account'   : self.accountById(accountId),
+                'created_at'            : UtcNow(),
+                'updated_at'            : UtcNow(),
+            }
+            self.transactions[t['id']] = t
+            return dict(t)
+
+    # Apply update fields from a PUT or POST payload. Returns True if payee or amount changed
+    def applyFields(self, t, payload):
+        changed = False
+        if 'payee' in payload and payload['payee'] != t['payee']:
+            t['payee'] = payload['payee']
+            changed = True
+        if 'amount' in payload and float(payload['amount']) != t['amount']:
+            t['amount'] = float(payload['amount'])
+            changed = True
+        if 'date' in payload:
+            t['date'] = payload['date']
+        if 'category_id' in payload:
+            t['category'] = self.categoryById(payload['category_id'])
+        if 'note' in payload:
+            t['note'] = payload['note']
+        if 'needs_review' in payload:
+            t['needs_review'] = bool(payload['needs_review'])
+        t['updated_at'] = UtcNow()
+        return changed
+
+
+# Fake server class. Runs on a background thread. Port 0 picks a free port, see url
+class FakeServer:
+    def __init__(self, account=None, port=0, latency=0.0, latencyJitter=0.0, errorRate=0.0, rateLimit=0, reflagRate=0.5, seed=1):
+        self.account = account if account is not None else FakeAccount()
+        self.latency = latency              # Added delay in s for each request
+        self.latencyJitter = latencyJitter  # Random extra delay in s, up to this value
+        self.errorRate = errorRate          # Fraction of requests answered with 500 error, before doing anything
+        self.rateLimit = rateLimit          # Max number of requests per second. More requests get 429 with Retry-After: 1. 0 for no limit
+        self.reflagRate = reflagRate        # Fraction of payee/amount changes that leave the transaction flagged for review
+        self.random = random.Random(seed)
+        self.randomLock = threading.Lock()
+        self.statsLock = threading.Lock()
+        self.requestCounts = Counter()      # (method, route) -> number of requests
+        self.statusCounts = Counter()       # (method, route, status) -> number of responses
+        self.rateWindow = [0, 0]            # [second, requests in that second]
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', port), MakeHandler(self))
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.httpd.server_address[1]}'
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name='FakePocketSmith', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def resetStats(self):
+        with self.statsLock:
+            self.requestCounts.clear()
+            self.statusCounts.clear()
+
+    def chance(self, rate):
+        with self.randomLock:
+            return rate > 0 and self.random.random() < rate
+
+    def delay(self):
+        with self.randomLock:
+            jitter = self.random.random() * self.latencyJitter
+        if self.latency or jitter:
+            time.sleep(self.latency + jitter)
+
+    # Check rate limit. Returns True if request is over the limit
+    def rateLimited(self):
+        if not self.rateLimit:
+            return False
+        with self.statsLock:
+            second = int(time.monotonic())
+            if self.rateWindow[0] != second:
+                self.rateWindow[:] = [second, 0]
+            self.rateWindow[1] += 1
+            return self.rateWindow[1] > self.rateLimit
+
+    def record(self, method, route, status):
+        with self.statsLock:
+            self.requestCounts[(method, route)] += 1
+            self.statusCounts[(method, route, status)] += 1
+
+
+# Function to make request handler class for a fake server
+def MakeHandler(server):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'       # Keep-alive, like the real API
+        disable_nagle_algorithm = True      # Headers and body are written separately. Without this, delayed ACKs add ~40 ms to each response
+
+        def log_message(self, format, *args):
+            pass        # No request logging to console
+
+        def do_GET(self):
+            self.handle_request('GET')
+
+        def do_POST(self):
+            self.handle_request('POST')
+
+        def do_PUT(self):
+            self.handle_request('PUT')
+
+        def do_DELETE(self):
+            self.handle_request('DELETE')
+
+        def send_json(self, route, status, data=None, headers=None):
+            body = b'' if data is None else json.dumps(data).encode()
+            server.record(self.command, route, status)     # Before the response is sent, so counts are complete once the client has it
+            self.send_response(status)
+            if data is not None:
+                self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def handle_request(self, method):
+            length = int(self.headers.get('Content-Length') or 0)
+            body = self.rfile.read(length) if length else b''
+            parsed = urlparse(self.path)
+            query = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+            route, match = MatchRoute(method, parsed.path)
+            if match is None:
+                return self.send_json(route, 404, {'error': 'Not found'})
+
+            server.delay()
+            if not self.headers.get('X-Developer-Key'):
+                return self.send_json(route, 401, {'error': 'Missing developer key'})
+            if server.rateLimited():
+                return self.send_json(route, 429, {'error': 'Rate limited'}, {'Retry-After': '1'})
+            if server.chance(server.errorRate):
+                return self.send_json(route, 500, {'error': 'Injected server error'})
+            try:
+                payload = json.loads(body) if body else {}
+            except ValueError:
+                return self.send_json(route, 400, {'error': 'Invalid json'})
+            getattr(self, 'route_' + route)(route, match, query, payload)
+
+        def route_me(self, route, match, query, payload):
+            self.send_json(route, 200, server.account.user)
+
+        def check_user(self, route, match):
+            if int(match.group(1)) != FAKE_USER_ID:
+                self.send_json(route, 404, {'error': 'User not found'})
+                return False
+            return True
+
+        def send_metadata(self, route, data):
+            # ETag support, so conditional requests can be answered with 304
+            etag = '"' + hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()[:16] + '"'
+            if self.headers.get('If-None-Match') == etag:
+                return self.send_json(route, 304, None, {'ETag': etag})
+            self.send_json(route, 200, data, {'ETag': etag})
+
+        def route_categories(self, route, match, query, payload):
+            if self.check_user(route, match):
+                self.send_metadata(route, server.account.categories)
+
+        def route_transaction_accounts(self, route, match, query, payload):
+            if self.check_user(route, match):
+                self.send_metadata(route, server.account.accounts)
+
+        def route_list_transactions(self, route, match, query, payload):
+            if not self.check_user(route, match):
+                return
+            with server.account.lock:
+                items = [dict(t) for t in server.account.transactions.values()]
+            if 'start_date' in query:
+                items = [t for t in items if t['date'] >= query['start_date']]
+            if 'end_date' in query:
+                items = [t for t in items if t['date'] <= query['end_date']]
+            if 'updated_since' in query:
+                items = [t for t in items if t['updated_at'] >= query['updated_since']]
+            if 'needs_review' in query:
+                wanted = query['needs_review'].lower() in ('true', '1')
+                items = [t for t in items if t['needs_review'] == wanted]
+            items.sort(key=lambda t: (t['date'], t['id']), reverse=True)
+            perPage = min(MAX_PER_PAGE, int(query.get('per_page', DEFAULT_PER_PAGE)))
+            page = int(query.get('page', 1))
+            lastPage = max(1, -(-len(items) // perPage))
+            links = []
+            base = f'{server.url}/users/{FAKE_USER_ID}/transactions?'
+            if page < lastPage:
+                links.append(f'<{base}{urlencode(dict(query, page=page + 1))}>; rel="next"')
+            links.append(f'<{base}{urlencode(dict(query, page=lastPage))}>; rel="last"')
+            self.send_json(route, 200, items[(page - 1) * perPage:page * perPage],
+                           {'Total': str(len(items)), 'Per-Page': str(perPage), 'Link': ', '.join(links)})
+
+        def route_create_transaction(self, route, match, query, payload):
+            accountId = int(match.group(1))
+            if server.account.accountById(accountId) is None:
+                return self.send_json(route, 404, {'error': 'Account not found'})
+            try:
+                t = server.account.addTransaction(accountId, payload['amount'], payload['payee'], payload['date'], payload.get('category_id'), payload.get('note'))
+            except (KeyError, ValueError) as ex:
+                return self.send_json(route, 422, {'error': f'Invalid transaction: {ex}'})
+            self.send_json(route, 201, t)       # Created transactions always need review, whatever needs_review says
+
+        def route_get_transaction(self, route, match, query, payload):
+            with server.account.lock:
+                t = server.account.transactions.get(int(match.group(1)))
+                t = dict(t) if t is not None else None
+            if t is None:
+                return self.send_json(route, 404, {'error': 'Transaction not found'})
+            self.send_json(route, 200, t)
+
+        def route_update_transaction(self, route, match, query, payload):
+            with server.account.lock:
+                t = server.account.transactions.get(int(match.group(1)))
+                if t is None:
+                    return self.send_json(route, 404, {'error': 'Transaction not found'})
+                try:
+                    changed = server.account.applyFields(t, payload)
+                except ValueError as ex:
+                    return self.send_json(route, 422, {'error': f'Invalid transaction: {ex}'})
+                if changed and server.chance(server.reflagRate):
+                    t['needs_review'] = True        # Pocketsmith quirk
+                t = dict(t)
+            self.send_json(route, 200, t)
+
+        def route_delete_transaction(self, route, match, query, payload):
+            with server.account.lock:
+                t = server.account.transactions.pop(int(match.group(1)), None)
+            if t is None:
+                return self.send_json(route, 404, {'error': 'Transaction not found'})
+            self.send_json(route, 204)
+
+    return Handler
+
+
+# Function to find the API route of a request. Path may have the /v2 prefix of the real API. Returns route name and match object, or ('unknown', None)
+def MatchRoute(Method, Path):
+    if Path.startswith('/v2/'):
+        Path = Path[3:]
+    for routeMethod, pattern, route in ROUTES:
+        match = pattern.fullmatch(Path)
+        if routeMethod == Method and match:
+            return route, match
+    return 'unknown', None
+
+# Function to get current UTC time in the format used for updated_since
+def UtcNow():
+    return datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+# Default category tree. 'Hidden' parent is last, as in the script's expected setup
+def DefaultCategories():
+    return [
+        {'id': 1, 'title': 'Food', 'children': [{'id': 11, 'title': 'Groceries', 'children': []}, {'id': 12, 'title': 'Eating Out', 'children': []}]},
+        {'id': 2, 'title': 'Transport', 'children': [{'id': 21, 'title': 'Fuel', 'children': []}, {'id': 22, 'title': 'Public Transport', 'children': []}]},
+        {'id': 3, 'title': 'Bills', 'children': [{'id': 31, 'title': 'Electricity', 'children': []}, {'id': 32, 'title': 'Internet', 'children': []}]},
+        {'id': 4, 'title': 'Transfer', 'children': []},
+        {'id': 9, 'title': 'Hidden', 'children': [{'id': 91, 'title': 'Old Category', 'children': []}]},
+    ]
+
+def DefaultAccounts():
+    return [
+        {'id': 101, 'account_id': 201, 'name': 'Everyday'},
+        {'id': 102, 'account_id': 202, 'name': 'Credit Card'},
+        {'id': 103, 'account_id': 203, 'name': 'Wallet'},
+        {'id': 104, 'account_id': 204, 'name': 'Savings'},
+    ]
+
+# Function to fill a fake account with transactions waiting for review, dated over the last Days days. Returns list of added transactions
+def AddPendingTransactions(Account, Count, Days=20, Seed=1):
+    rnd = random.Random(Seed)
+    payees = ['Coles', 'Woolworths', 'Shell', 'Opal', 'AGL', 'Telstra', 'Cafe', 'ATM Withdrawal', 'Amazon', 'Pharmacy']
+    added = []
+    for i in range(Count):
+        account = rnd.choice(Account.accounts[:2])      # Bank feed accounts
+        added.append(Account.addTransaction(account['id'], round(-rnd.uniform(5, 300), 2), rnd.choice(payees), date.today() - timedelta(days=rnd.randrange(Days))))
+    return added
+
+
+if __name__ == "__main__":
+    # Run fake server on its own, eg. to run the GUI against it: set POCKETSMITH_API_URL=http://127.0.0.1:8700
+    import argparse
+    parser = argparse.ArgumentParser(description='Run a local fake Pocketsmith API server')
+    parser.add_argument('port', type=int, nargs='?', default=8700, help='Port to listen on. Default 8700')
+    parser.add_argument('--transactions', type=int, default=20, help='Number of transactions waiting for review')
+    parser.add_argument('--latency', type=float, default=50, help='Server latency in ms added to each request')
+    parser.add_argument('--jitter', type=float, default=0, help='Random extra server latency in ms, up to this value')
+    parser.add_argument('--error-rate', type=float, default=0, help='Percent of requests answered with a 500 error')
+    parser.add_argument('--rate-limit', type=int, default=0, help='Max requests per second before 429 responses. 0 for no limit')
+    parser.add_argument('--reflag', type=float, default=50, help='Percent of payee/amount changes flagged for review again')
+    args = parser.parse_args()
+
+    fake = FakeServer(port=args.port, latency=args.latency / 1000, latencyJitter=args.jitter / 1000, errorRate=args.error_rate / 100, rateLimit=args.rate_limit,
+                      reflagRate=args.reflag / 100)
+    AddPendingTransactions(fake.account, args.transactions)
+    fake.start()
+    print(f'Fake Pocketsmith API running at {fake.url}. Press Ctrl+C to stop')
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        fake.stop()
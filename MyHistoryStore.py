@@ -0,0 +1,160 @@
+# Approved transaction history
+#  Approved main transactions are saved with their IDs, so they can be auto cleared if they come up for approval again (see CheckNewTransactionsForReapproval()).
+#  History is an append-only JSON Lines file: each approval appends one line, instead of re-writing the whole file. Later lines replace earlier ones with the same id.
+#  Entries older than the history duration are dropped by a background compaction, which re-writes the file with live entries only.
+#  Repository link: https://github.com/gandos21/PocketSmith
+import os
+import json
+import threading
+from datetime import datetime
+import MyUtils as ut
+
+#### Configs ####
+COMPACT_INTERVAL    = 3600      # Time interval in s between background compaction checks
+COMPACT_MIN_LINES   = 1000      # File is compacted when it has more than this many lines and at least half of them are replaced or expired entries
+#### End Configs ####
+
+
+# History class. Entries are cached in memory and re-loaded only if the file was changed by someone else (eg. another instance of the script)
+class ApprovalHistory:
+    def __init__(self, fileName, durationDays, transactionDateKey):
+        self.fileName = fileName
+        self.durationDays = durationDays
+        self.transactionDateKey = transactionDateKey        # Key of transaction date in saved entries, used to expire old entries
+        self.lock = threading.RLock()
+        self.entries = {}           # Transaction id (as string) -> saved transaction data
+        self.lineCount = 0          # Number of lines in file. Larger than number of entries when entries were replaced
+        self.fileSignature = None   # File modified time, size and inode when it was last read or written by us
+        self.partialLastLine = False    # True if last line of file is not complete. Next append starts on a new line
+        self.lastCompaction = datetime.now()
+        self.closed = threading.Event()     # Set by close(). Stops the compactor
+        self.compactor = None
+
+    def __signature(self):
+        try:
+            st = os.stat(self.fileName)
+            return st.st_mtime_ns, st.st_size, st.st_ino
+        except OSError:
+            return None
+
+    # Re-load entries if file changed since we last read or wrote it
+    def __refresh(self):
+        signature = self.__signature()
+        if signature == self.fileSignature:
+            return
+        entries = {}
+        lineCount = 0
+        self.partialLastLine = False
+        try:
+            with open(self.fileName, 'r') as fp:
+                for line in fp:
+                    self.partialLastLine = not line.endswith('\n')
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue        # Partly written last line, eg. if script was stopped while saving. Ignore it
+                    entries[str(record['id'])] = record['data']
+                    lineCount += 1
+        except OSError:
+            pass        # No history file yet
+        self.entries = entries
+        self.lineCount = lineCount
+        self.fileSignature = signature
+
+    # Get saved data of a transaction, or None if not in history
+    def get(self, transId):
+        with self.lock:
+            self.__refresh()
+            return self.entries.get(str(transId))
+
+    # Get all entries as a dictionary of transaction id (as string) -> saved data
+    def all(self):
+        with self.lock:
+            self.__refresh()
+            return dict(self.entries)
+
+    # Read file into memory if not read yet or changed, eg. at startup so first lookups don't wait for it. Returns number of entries
+    def load(self):
+        with self.lock:
+            self.__refresh()
+            return len(self.entries)
+
+    # Get one field of all entries as a dictionary of transaction id (as string) -> field value, eg. payees for the payee index. Saved data is not copied
+    def fieldValues(self, key):
+        with self.lock:
+            self.__refresh()
+            return {transId: data.get(key) for transId, data in self.entries.items() if isinstance(data, dict)}
+
+    # Save data of an approved transaction. Line is flushed to disk before returning, so it's not lost if script or PC crashes
+    def append(self, transId, data):
+        line = json.dumps({'id': str(transId), 'data': data}) + '\n'
+        with self.lock:
+            self.__refresh()
+            with open(self.fileName, 'a') as fp:
+                fp.write('\n' + line if self.partialLastLine else line)
+                fp.flush()
+                os.fsync(fp.fileno())
+            self.entries[str(transId)] = data
+            self.lineCount += 1
+            self.partialLastLine = False
+            self.fileSignature = self.__signature()
+
+    # Re-write file with live entries only. New file is written next to the old one and then replaces it in one step, so history is never partly written
+    def compact(self):
+        with self.lock:
+            self.__refresh()
+            now = datetime.now()
+            # Entry dates are parsed in bulk. Entries without a valid date are kept
+            dates = ut.ParseDates((data.get(self.transactionDateKey) if isinstance(data, dict) else None for data in self.entries.values()), Errors='none')
+            self.entries = {k: v for (k, v), dt in zip(self.entries.items(), dates) if dt is None or (now - dt).days <= self.durationDays}
+            tmpFile = self.fileName + '.tmp'
+            with open(tmpFile, 'w') as fp:
+                for transId, data in self.entries.items():
+                    fp.write(json.dumps({'id': transId, 'data': data}) + '\n')
+                fp.flush()
+                os.fsync(fp.fileno())
+            os.replace(tmpFile, self.fileName)
+            self.lineCount = len(self.entries)
+            self.partialLastLine = False
+            self.fileSignature = self.__signature()
+            self.lastCompaction = now
+
+    # Compaction is done when file has many replaced entries, or at least once a day to expire old entries
+    def needsCompaction(self):
+        with self.lock:
+            self.__refresh()
+            tooManyLines = self.lineCount > COMPACT_MIN_LINES and self.lineCount > 2 * len(self.entries)
+            return tooManyLines or (datetime.now() - self.lastCompaction).days >= 1
+
+    # Run compaction checks on a background thread every COMPACT_INTERVAL seconds, until closed
+    def startCompactor(self, interval=COMPACT_INTERVAL):
+        def Compactor():
+            while not self.closed.wait(interval):
+                try:
+                    if self.needsCompaction():
+                        self.compact()
+                except OSError as ex:
+                    print(f'Error compacting history file {self.fileName}: {ex}')
+        self.compactor = threading.Thread(target=Compactor, name='HistoryCompactor', daemon=True)
+        self.compactor.start()
+        return self.compactor
+
+    # Stop the compactor. Waits for a running compaction to finish, so the file is not being re-written when the script exits
+    def close(self):
+        self.closed.set()
+        if self.compactor is not None and self.compactor is not threading.current_thread():
+            self.compactor.join()
+
+    # Import entries from the old history file format (a single json dictionary of transaction id -> data), if the new file doesn't exist yet
+    def importLegacyFile(self, legacyFileName):
+        with self.lock:
+            if os.path.exists(self.fileName) or not os.path.exists(legacyFileName):
+                return 0
+            try:
+                with open(legacyFileName, 'r') as fp:
+                    legacyEntries = json.load(fp)
+            except (OSError, ValueError):
+                return 0
+            self.entries = {str(k): v for k, v in legacyEntries.items()}
+            self.compact()
+            return len(self.entries)
@@ -0,0 +1,198 @@
+# Statement file import
+#  Bank statement files (csv or OFX/QFX) are read one row at a time into StatementRow objects. Csv columns are mapped to transaction fields by their headings
+#  (see COLUMN_NAMES), or by a mapping given by the user, eg. {'payee': 'Narrative'}. Account, category and transfer account can be given for rows that don't have them.
+#  Rows already in Pocketsmith are skipped by matching account, date and amount. Each existing transaction matches one row only, so a statement with the same
+#  purchase twice on a day still gets the second one imported. Posting is done by MyPocketSmith.ImportTransactions().
+#  Csv files written by export (see MyExport.py) can be imported back.
+#  Repository link: https://github.com/gandos21/PocketSmith
+import re
+import csv
+import html
+from collections import Counter
+import MyUtils as ut
+
+#### Configs ####
+# Transaction field -> csv column headings it's found under (case insensitive). Debit and credit are for statements with money out and money in in separate columns
+COLUMN_NAMES = {
+    'date'      : ('date', 'transaction date', 'posted date', 'posting date', 'value date'),
+    'amount'    : ('amount', 'transaction amount', 'value'),
+    'debit'     : ('debit', 'debit amount', 'withdrawal', 'withdrawals', 'money out', 'paid out'),
+    'credit'    : ('credit', 'credit amount', 'deposit', 'deposits', 'money in', 'paid in'),
+    'payee'     : ('payee', 'description', 'narrative', 'details', 'merchant', 'name'),
+    'account'   : ('account', 'account name'),
+    'category'  : ('category',),
+    'transferTo': ('transfer to', 'transfer_to'),
+    'note'      : ('note', 'notes', 'memo', 'reference'),
+}
+OFX_READ_SIZE = 64 * 1024       # Size in characters of each block read from OFX files
+#### End Configs ####
+
+IMPORT_FORMATS = ('csv', 'ofx')
+OFX_TAG = re.compile(r'<(/?)([A-Za-z0-9.]+)>([^<]*)')         # Tag and the text after it. OFX 1.x (SGML) leaves out closing tags of fields
+
+
+# Error in a statement file or column mapping, eg. a missing column
+class StatementError(ValueError):
+    pass
+
+
+# A transaction read from a statement file. Line is the line (csv) or transaction number (OFX) in the file, to tell the user which row had a problem.
+#  Error is set instead of raised for rows that can't be read, so all bad rows of a file can be listed at once
+class StatementRow:
+    def __init__(self, line, date=None, amount=None, payee=None, account=None, category=None, transferTo=None, note=None, error=None):
+        self.line = line
+        self.date = date                # yyyy-mm-dd string
+        self.amount = amount            # Float, negative for money out
+        self.payee = payee
+        self.account = account          # Account name
+        self.category = category        # Category name or path, None for uncategorised
+        self.transferTo = transferTo    # Account name of the other side of a transfer, if any
+        self.note = note
+        self.error = error
+
+
+# Function to convert amount text of a statement to float. Currency signs and thousand separators are removed, and amounts in brackets are negative, eg. '($1,234.50)'
+def ParseAmount(Text):
+    text = (Text or '').strip()
+    if not text:
+        return None
+    negative = text.startswith('(') and text.endswith(')')
+    text = re.sub(r'[^\d.+-]', '', text)
+    try:
+        amount = float(text)
+    except ValueError:
+        raise StatementError(f'Invalid amount: {Text!r}')
+    return -abs(amount) if negative else amount
+
+# Function to get import format of a file from its extension. QFX is the same as OFX. Default is csv
+def ImportFormat(FileName):
+    extension = FileName.rsplit('.', 1)[-1].lower()
+    return 'ofx' if extension in ('ofx', 'qfx') else 'csv'
+
+# Function to find the column of each transaction field in csv headings. Mapping is field -> column heading (or column number from 1), and is used before COLUMN_NAMES.
+#  Returns dictionary of field -> column index. Raises StatementError if a mapped column isn't found or date, payee or amount columns are missing
+def ColumnMapping(Headings, Mapping=None):
+    columns = {h.strip().casefold(): i for i, h in reversed(list(enumerate(Headings)))}      # First column wins if headings repeat
+    result = {}
+    for field, column in (Mapping or {}).items():
+        if field not in COLUMN_NAMES:
+            raise StatementError(f'Unknown field {field}. Fields are: {", ".join(COLUMN_NAMES)}')
+        if str(column).isdigit() and 0 < int(column) <= len(Headings):
+            result[field] = int(column) - 1
+        elif str(column).strip().casefold() in columns:
+            result[field] = columns[str(column).strip().casefold()]
+        else:
+            raise StatementError(f'Column {column} of {field} not found in headings: {", ".join(Headings)}')
+    for field, names in COLUMN_NAMES.items():
+        if field not in result:
+            index = next((columns[n] for n in names if n in columns), None)
+            if index is not None and index not in result.values():
+                result[field] = index
+    if 'amount' in result:
+        result.pop('debit', None)       # Single amount column is used when both are found
+        result.pop('credit', None)
+    missing = [f for f in ('date', 'payee') if f not in result] + ([] if {'amount', 'debit', 'credit'} & set(result) else ['amount'])
+    if missing:
+        raise StatementError(f'No column found for {", ".join(missing)}. Map them with the column headings: {", ".join(Headings)}')
+    return result
+
+# Generator of rows of a csv statement file with a heading row. Defaults has the account, category and transferTo of rows that don't have them in the file
+def ReadCsv(Fp, Mapping=None, Defaults=None):
+    defaults = Defaults or {}
+    reader = csv.reader(Fp)
+    headings = next(reader, None)
+    if headings is None:
+        return
+    columns = ColumnMapping(headings, Mapping)
+
+    def Field(Values, Name):
+        i = columns.get(Name)
+        value = Values[i].strip() if i is not None and i < len(Values) else ''
+        return value or defaults.get(Name)
+
+    for values in reader:
+        line = reader.line_num
+        if not any(v.strip() for v in values):
+            continue        # Blank line, eg. at end of file
+        row = StatementRow(line, payee=Field(values, 'payee'), account=Field(values, 'account'), category=Field(values, 'category'),
+                           transferTo=Field(values, 'transferTo'), note=Field(values, 'note'))
+        try:
+            row.date = ut.ParseDate(Field(values, 'date'), ut.DATE_SOURCE_STATEMENT).strftime('%Y-%m-%d')
+            if 'amount' in columns:
+                row.amount = ParseAmount(Field(values, 'amount'))
+            else:
+                debit, credit = ParseAmount(Field(values, 'debit')), ParseAmount(Field(values, 'credit'))
+                row.amount = None if debit is None and credit is None else (credit or 0.0) - abs(debit or 0.0)
+            if row.amount is None:
+                raise StatementError('No amount')
+        except (ut.DateFormatError, StatementError) as ex:
+            row.error = str(ex)
+        yield row
+
+# Generator of transactions of an OFX or QFX file, OFX 1.x (SGML) or 2.x (XML). File is read in blocks, so it doesn't need to fit in memory.
+#  Account is the ACCTID of the statement unless Defaults gives one
+def ReadOfx(Fp, Defaults=None):
+    defaults = Defaults or {}
+    accountId = None
+    current = None          # Fields of the transaction being read
+    count = 0
+    buffer = ''
+    while True:
+        block = Fp.read(OFX_READ_SIZE)
+        buffer += block
+        end = max(buffer.rfind('<'), 0) if block else len(buffer)       # Last tag may be cut off at end of block. Kept for next block
+        for match in OFX_TAG.finditer(buffer, 0, end):
+            closing, tag, text = match[1], match[2].upper(), html.unescape(match[3].strip())
+            if tag == 'STMTTRN':
+                if closing and current is not None:
+                    count += 1
+                    yield OfxRow(count, current, defaults, accountId)
+                current = None if closing else {}
+            elif not closing and text:
+                if tag == 'ACCTID':
+                    accountId = text
+                elif current is not None:
+                    current.setdefault(tag, text)
+        buffer = buffer[end:]
+        if not block:
+            return
+
+# Function to convert fields of an OFX transaction to a StatementRow
+def OfxRow(Number, Fields, Defaults, AccountId):
+    row = StatementRow(Number, payee=Fields.get('NAME') or Fields.get('MEMO'), account=Defaults.get('account') or AccountId, category=Defaults.get('category'),
+                       transferTo=Defaults.get('transferTo'), note=Fields.get('MEMO') if Fields.get('NAME') else None)
+    try:
+        posted = Fields.get('DTPOSTED', '')[:8]        # yyyymmdd, followed by optional time and time zone
+        row.date = ut.ParseDate(f'{posted[:4]}-{posted[4:6]}-{posted[6:8]}', ut.DATE_SOURCE_STATEMENT).strftime('%Y-%m-%d')
+        row.amount = ParseAmount(Fields.get('TRNAMT'))
+        if row.amount is None:
+            raise StatementError('No amount')
+    except (ut.DateFormatError, StatementError) as ex:
+        row.error = str(ex)
+    return row
+
+# Generator of rows of a statement file. Format is one of IMPORT_FORMATS. Mapping is only used for csv files
+def ReadStatement(Fp, Format='csv', Mapping=None, Defaults=None):
+    if Format == 'ofx':
+        return ReadOfx(Fp, Defaults)
+    if Format == 'csv':
+        return ReadCsv(Fp, Mapping, Defaults)
+    raise StatementError(f'Unknown import format {Format}')
+
+# Key used to find a statement row in Pocketsmith: account name, date and amount in cents
+def DuplicateKey(Account, Date, Amount):
+    return Account, str(Date)[:10], round(float(Amount) * 100)
+
+# Function to split statement rows into new rows and rows already in Pocketsmith. Existing is an iterable of DuplicateKey() of transactions in Pocketsmith.
+#  Each existing transaction matches one row only. Returns (new rows, skipped rows)
+def SkipExisting(Rows, Existing):
+    counts = Counter(Existing)
+    new, skipped = [], []
+    for row in Rows:
+        key = DuplicateKey(row.account, row.date, row.amount)
+        if counts[key] > 0:
+            counts[key] -= 1
+            skipped.append(row)
+        else:
+            new.append(row)
+    return new, skipped
@@ -0,0 +1,355 @@
+# Outbox of API changes (write-ahead log)
+#  Every change sent to Pocketsmith (create, update, delete) is first saved to a local SQLite database, then sent. If sending a queued change fails with a temporary error
+#  (connection error, rate limit, server error), the change stays in the outbox and is replayed later in background with increasing wait times, also after a restart.
+#  Changes sent with call() are reported to the caller straight away instead, and are not replayed.
+#  Callers sending changes with their own client (eg. the async client of MyAsyncPocketSmith.py) save them with begin() or enqueue(), and use take() and finish() around each request.
+#  So a half done approval (eg. split created, but its review flag not cleared) is completed later instead of needing to be redone by hand.
+#  Operations can depend on other operations, eg. clearing review flag of a transaction that is created by an earlier operation. An operation is only sent once
+#  all operations it depends on are done, and can take its transaction id from the result of one of them.
+#  Each operation has a unique key, sent as Idempotency-Key header. Adding an operation with a key already in the outbox does nothing.
+#  More than one process (eg. GUI and CLI daemon) can use the same outbox. Each process is an owner with a heartbeat, and an operation is marked with the owner sending it.
+#  Operations left 'sending' are only recovered once their owner stopped (no heartbeat for OUTBOX_OWNER_TIMEOUT s), so a running process' sends are not touched.
+#  Outbox can be inspected with list() and summary(), or with any SQLite browser.
+#  Repository link: https://github.com/gandos21/PocketSmith
+import sqlite3
+import json
+import time
+import uuid
+import threading
+import requests
+from MyApiClient import RETRY_STATUS_CODES
+from MyTaskGraph import TaskGraph, TaskFailed
+
+#### Configs ####
+outboxDbFile            = 'Outbox.db'
+OUTBOX_REPLAY_INTERVAL  = 30        # Max time in s between background replay checks
+OUTBOX_BACKOFF          = 5         # Wait time in s before first retry. Doubled on each retry
+OUTBOX_MAX_BACKOFF      = 3600      # Max wait time in s between retries
+OUTBOX_MAX_WORKERS      = 8         # Max number of operations sent at the same time
+OUTBOX_HEARTBEAT        = 10        # Time in s between heartbeats of a process using the outbox
+OUTBOX_OWNER_TIMEOUT    = 60        # A process without a heartbeat for this long is taken as stopped, and operations it was sending are recovered
+#### End Configs ####
+
+# Operation states
+PENDING     = 'pending'     # Waiting to be sent, or waiting for retry
+SENDING     = 'sending'     # Being sent
+DONE        = 'done'
+SKIPPED     = 'skipped'     # Not needed, condition was not met. Counts as done for dependent operations
+FAILED      = 'failed'      # Rejected by server or an operation it depends on failed. Not retried unless retry() is called
+UNCERTAIN   = 'uncertain'   # Create call was interrupted after it was sent. It may or may not have been created, so it is not replayed automatically
+
+COLUMNS = ('key', 'grp', 'method', 'path', 'payload', 'expected', 'deps', 'idFrom', 'condition', 'status', 'attempts', 'nextAttempt', 'lastError', 'result', 'created', 'updated', 'owner')
+
+
+# Outbox class. Client is the ApiClient used to send operations
+class Outbox:
+    def __init__(self, client, dbFile=outboxDbFile):
+        self.client = client
+        self.lock = threading.RLock()
+        self.dispatchLock = threading.Lock()        # Only one dispatch runs at a time, so an operation is never sent twice at once
+        self.wakeUp = threading.Event()
+        self.claimedGroups = set()                  # Groups the caller sends itself with dispatch(). Background replay leaves them alone until then
+        self.closed = threading.Event()             # Set by close(). Stops the replayer
+        self.replayer = None
+        self.owner = uuid.uuid4().hex               # Owner id of this process, saved with operations it sends
+        self.conn = sqlite3.connect(dbFile, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        with self.lock, self.conn:
+            self.conn.executescript('''
+                CREATE TABLE IF NOT EXISTS outbox (
+                    key         TEXT PRIMARY KEY,
+                    grp         TEXT,
+                    method      TEXT,
+                    path        TEXT,
+                    payload     TEXT,
+                    expected    TEXT,
+                    deps        TEXT,
+                    idFrom      TEXT,
+                    condition   TEXT,
+                    status      TEXT,
+                    attempts    INTEGER DEFAULT 0,
+                    nextAttempt REAL DEFAULT 0,
+                    lastError   TEXT,
+                    result      TEXT,
+                    created     REAL,
+                    updated     REAL,
+                    owner       TEXT
+                );
+                CREATE INDEX IF NOT EXISTS idx_outbox_status ON outbox (status);
+                CREATE INDEX IF NOT EXISTS idx_outbox_grp    ON outbox (grp);
+                CREATE TABLE IF NOT EXISTS owners (
+                    owner       TEXT PRIMARY KEY,
+                    heartbeat   REAL
+                );
+            ''')
+            if 'owner' not in [row[1] for row in self.conn.execute('PRAGMA table_info(outbox)')]:
+                self.conn.execute('ALTER TABLE outbox ADD COLUMN owner TEXT')      # Outbox of older script versions
+            self.conn.execute('INSERT OR REPLACE INTO owners (owner, heartbeat) VALUES (?, ?)', (self.owner, time.time()))
+        self.recoverStale()
+        self.heartbeat = threading.Thread(target=self.__heartbeat, name='OutboxHeartbeat', daemon=True)
+        self.heartbeat.start()
+
+    # Update heartbeat of this process, and recover operations of stopped processes, until closed
+    def __heartbeat(self):
+        while not self.closed.wait(OUTBOX_HEARTBEAT):
+            try:
+                with self.lock, self.conn:
+                    self.conn.execute('UPDATE owners SET heartbeat = ? WHERE owner = ?', (time.time(), self.owner))
+                self.recoverStale()
+            except sqlite3.Error as ex:
+                if self.closed.is_set():
+                    break
+                print(f'Outbox heartbeat failed: {type(ex).__name__} {ex}')
+
+    # Operations that were being sent by a process that stopped, eg. killed or crashed. Updates and deletes are safe to send again. Creates may have been done already.
+    #  Operations of processes still running are left alone. Returns number of recovered operations
+    def recoverStale(self):
+        staleTime = time.time() - OUTBOX_OWNER_TIMEOUT
+        with self.lock, self.conn:
+            self.conn.execute('DELETE FROM owners WHERE heartbeat < ?', (staleTime,))
+            recovered = self.conn.execute("UPDATE outbox SET status = CASE WHEN method = 'POST' THEN ? ELSE ? END, lastError = 'Interrupted while sending', owner = NULL "
+                                          'WHERE status = ? AND (owner IS NULL OR owner NOT IN (SELECT owner FROM owners))', (UNCERTAIN, PENDING, SENDING)).rowcount
+        if recovered:
+            self.wakeUp.set()
+        return recovered
+
+    # Add operations. Each operation is a dict with keys: method, path, payload, and optional key, expected (list of success status codes), deps (keys of operations to be done first),
+    #  idFrom (key of operation whose result id replaces {id} in path) and condition ('needs_review': only send if result of idFrom operation still needs review).
+    #  Operations must be given after the operations they depend on. All operations are saved in one database transaction. Returns list of keys.
+    #  If claim is True, caller sends the group with dispatch() straight after, with its own concurrency and progress, so background replay doesn't pick it up first
+    def enqueue(self, operations, group=None, status=PENDING, claim=False):
+        now = time.time()
+        rows = []
+        for op in operations:
+            key = op.get('key') or uuid.uuid4().hex
+            rows.append((key, group, op['method'], op['path'], json.dumps(op.get('payload')), json.dumps(op.get('expected', [200, 201, 204])),
+                         json.dumps(op.get('deps', [])), op.get('idFrom'), op.get('condition'), status, now, now, self.owner if status == SENDING else None))
+        with self.lock, self.conn:
+            if claim and group is not None:
+                self.claimedGroups.add(group)
+            self.conn.executemany('INSERT OR IGNORE INTO outbox (key, grp, method, path, payload, expected, deps, idFrom, condition, status, created, updated, owner) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+        if not claim:
+            self.wakeUp.set()
+        return [row[0] for row in rows]
+
+    # Save an operation and send it straight away. Returns the response, or raises requests ConnectionError. Caller reports the result, so an operation that failed
+    #  is marked failed, also for temporary errors, and is not replayed in background. Use enqueue() and dispatch() for changes to be retried until done
+    def call(self, method, path, payload=None, expected=(200, 201, 204), key=None, group=None):
+        return self.__send(self.begin(method, path, payload, expected, key, group), raiseOnError=False)
+
+    # Save an operation as being sent by this process, for a caller that sends it itself (eg. with the async client), then takes it with take() and saves the outcome with finish().
+    #  Background replay doesn't pick it up. Returns the saved operation
+    def begin(self, method, path, payload=None, expected=(200, 201, 204), key=None, group=None):
+        key = self.enqueue([{'key': key, 'method': method, 'path': path, 'payload': payload, 'expected': list(expected)}], group, status=SENDING)[0]
+        return self.get(key)
+
+    def get(self, key):
+        with self.lock:
+            row = self.conn.execute('SELECT * FROM outbox WHERE key = ?', (key,)).fetchone()
+        return self.__toDict(row)
+
+    # List operations, oldest first. Filter by status and/or group if given
+    def list(self, status=None, group=None):
+        query = 'SELECT * FROM outbox WHERE (? IS NULL OR status = ?) AND (? IS NULL OR grp = ?) ORDER BY rowid'
+        with self.lock:
+            rows = self.conn.execute(query, (status, status, group, group)).fetchall()
+        return [self.__toDict(row) for row in rows]
+
+    # Number of operations in each state, eg. {'done': 12, 'pending': 1}
+    def summary(self):
+        with self.lock:
+            return dict(self.conn.execute('SELECT status, COUNT(*) FROM outbox GROUP BY status').fetchall())
+
+    # Send a failed or uncertain operation again, eg. after checking in Pocketsmith that an uncertain create was not done. Operations blocked by it are retried too
+    def retry(self, key):
+        with self.lock, self.conn:
+            self.conn.execute('UPDATE outbox SET status = ?, attempts = 0, nextAttempt = 0 WHERE key = ? AND status IN (?, ?)', (PENDING, key, FAILED, UNCERTAIN))
+            for op in self.list(status=FAILED):
+                if key in op['deps']:
+                    self.retry(op['key'])
+        self.wakeUp.set()
+
+    # Remove an operation that is not needed any more, eg. an uncertain create that was done
+    def discard(self, key):
+        with self.lock, self.conn:
+            self.conn.execute('DELETE FROM outbox WHERE key = ?', (key,))
+
+    # Remove done operations older than given number of days. Failed and waiting operations are kept
+    def purge(self, olderThanDays=7):
+        with self.lock, self.conn:
+            return self.conn.execute('DELETE FROM outbox WHERE status IN (?, ?) AND updated < ?', (DONE, SKIPPED, time.time() - olderThanDays * 86400)).rowcount
+
+    # Send all operations that are due (of one group only if given). Operations are run as a task graph, so independent operations are sent in parallel and dependent ones in order.
+    #  Operations that fail with a temporary error are re-scheduled, and operations depending on them wait for the next dispatch.
+    #  Progress is called with the key of each operation when sending it is finished (done or not), from the sending thread. Returns number of operations sent.
+    #  Dispatching a claimed group (see enqueue()) hands what's left of it, eg. operations waiting for a retry, to background replay
+    def dispatch(self, group=None, maxWorkers=OUTBOX_MAX_WORKERS, progress=None):
+        def Send(op):
+            try:
+                return self.__send(op)
+            finally:
+                if progress is not None:
+                    progress(op['key'])
+
+        with self.dispatchLock:
+            now = time.time()
+            graph = TaskGraph()
+            with self.lock:
+                claimed = set(self.claimedGroups) - {group}
+            for op in self.list(status=PENDING, group=group):
+                if op['grp'] in claimed:
+                    continue        # Caller is about to send it
+                deps = [self.__depStatus(dep, graph) for dep in op['deps']]
+                if op['nextAttempt'] > now or any(d not in (DONE, SKIPPED, 'queued') for d in deps):
+                    continue        # Not due yet, or waiting for an operation that is not due or not done
+                graph.add(op['key'], lambda *r, o=op: Send(o), deps=[dep for dep in op['deps'] if dep in graph.tasks])
+            try:
+                graph.run(maxWorkers)
+            finally:
+                if group is not None and group in self.claimedGroups:
+                    self.release(group)
+            return len(graph.tasks)
+
+    # Hand a claimed group (see enqueue()) to background replay, eg. what's left of it after the caller sent it: operations waiting for a retry, or for them
+    def release(self, group):
+        with self.lock:
+            self.claimedGroups.discard(group)
+        self.wakeUp.set()
+
+    # Status of an operation as seen by a dependent operation. 'queued' if it is in this dispatch's task graph
+    def __depStatus(self, key, graph):
+        if key in graph.tasks:
+            return 'queued'
+        op = self.get(key)
+        return op['status'] if op is not None else None
+
+    # Time in s until the next pending operation is due, or None if nothing is pending
+    def secondsUntilDue(self):
+        with self.lock:
+            row = self.conn.execute('SELECT MIN(nextAttempt) FROM outbox WHERE status = ?', (PENDING,)).fetchone()
+        return None if row[0] is None else max(0.0, row[0] - time.time())
+
+    # Replay pending operations on a background thread. Thread wakes up when operations are added, or when a retry is due
+    def startReplayer(self, interval=OUTBOX_REPLAY_INTERVAL):
+        def Replayer():
+            while not self.closed.is_set():
+                try:
+                    self.dispatch()
+                    due = self.secondsUntilDue()
+                except Exception as ex:
+                    if self.closed.is_set():
+                        break
+                    print(f'Outbox replay failed: {type(ex).__name__} {ex}')
+                    due = None
+                self.wakeUp.wait(interval if due is None else min(interval, max(due, 0.1)))
+                self.wakeUp.clear()
+        self.replayer = threading.Thread(target=Replayer, name='OutboxReplayer', daemon=True)
+        self.replayer.start()
+        return self.replayer
+
+    # Stop the replayer and close the database. Waits for a running dispatch to finish
+    def close(self):
+        self.closed.set()
+        self.wakeUp.set()
+        with self.dispatchLock, self.lock:
+            with self.conn:
+                self.conn.execute('DELETE FROM owners WHERE owner = ?', (self.owner,))      # Anything still being sent by this process can be recovered straight away
+            self.conn.close()
+
+    def __toDict(self, row):
+        if row is None:
+            return None
+        op = dict(zip(COLUMNS, tuple(row)))
+        for col in ('payload', 'expected', 'deps', 'result'):
+            op[col] = json.loads(op[col]) if op[col] is not None else None
+        return op
+
+    def __update(self, key, **values):
+        values['updated'] = time.time()
+        with self.lock, self.conn:
+            self.conn.execute(f"UPDATE outbox SET {', '.join(f'{k} = ?' for k in values)} WHERE key = ?", (*values.values(), key))
+
+    # Mark operation failed, and all operations depending on it
+    def __fail(self, key, error):
+        self.__update(key, status=FAILED, lastError=error)
+        for op in self.list(status=PENDING):
+            if key in op['deps']:
+                self.__fail(op['key'], f'Blocked by failed operation {key}')
+
+    # Get an operation ready to be sent by this process: fill in the transaction id from the result of its idFrom operation, and mark it as being sent by this process.
+    #  Returns path to send it to, or None if it is not needed (condition not met, marked skipped). Raises TaskFailed if another process using the same outbox took it since it was listed
+    def take(self, op):
+        key = op['key']
+        path = op['path']
+        if op['idFrom']:
+            source = self.get(op['idFrom'])
+            if op['condition'] == 'needs_review' and not source['result'].get('needs_review'):
+                self.__update(key, status=SKIPPED, result=json.dumps(source['result']))
+                return None
+            path = path.format(id=source['result']['id'])
+        with self.lock, self.conn:
+            taken = self.conn.execute('UPDATE outbox SET status = ?, owner = ?, attempts = attempts + 1, updated = ? WHERE key = ? AND (status = ? OR status = ? AND owner = ?)',
+                                      (SENDING, self.owner, time.time(), key, PENDING, SENDING, self.owner)).rowcount      # Operations of begin() are already sending by this process
+        if not taken:
+            raise TaskFailed(f'Operation {key} is being sent by another process')
+        return path
+
+    # Save the outcome of sending an operation taken with take(): the response, or the error if there was none. Interrupted is True if the request may have reached
+    #  the server (eg. read timeout), False if it was not sent (eg. connection error). Returns new status of the operation.
+    #  If replay is False (operations of call() and begin()), the caller reports the result, so an operation that failed with a temporary error is marked failed and not replayed:
+    #  replay would make a second copy if the user makes the change again by hand (Pocketsmith ignores the Idempotency-Key header). Otherwise it is re-scheduled with a backoff
+    def finish(self, op, path, response=None, error=None, interrupted=False, replay=True):
+        key = op['key']
+        if response is None and interrupted and op['method'] == 'POST':
+            self.__update(key, status=UNCERTAIN, lastError=error)
+            print(f'Outbox: {op["method"]} {path} was interrupted. Check in Pocketsmith if it was done, then retry or discard operation {key}')
+            return UNCERTAIN
+
+        if response is not None:
+            if response.status_code in op['expected'] or (op['method'] == 'DELETE' and response.status_code == 404):     # Already deleted, eg. on replay
+                self.__update(key, status=DONE, result=response.text if response.text else None, lastError=None)
+                return DONE
+            if response.status_code not in RETRY_STATUS_CODES:
+                self.__fail(key, f'Response {response.status_code}: {response.text[:200]}')
+                print(f'Outbox: {op["method"]} {path} failed! {response}')
+                return FAILED
+            error = f'Response {response.status_code}'
+
+        if not replay:
+            self.__update(key, status=FAILED, lastError=f'{error}. Reported to caller, not replayed')
+            print(f'Outbox: {op["method"]} {path} failed ({error})')
+            return FAILED
+
+        # Temporary error. Retry later
+        wait = min(OUTBOX_MAX_BACKOFF, OUTBOX_BACKOFF * 2 ** op['attempts'])
+        self.__update(key, status=PENDING, nextAttempt=time.time() + wait, lastError=error)
+        print(f'Outbox: {op["method"]} {path} failed ({error}). Will retry in {wait}s')
+        return PENDING
+
+    # Send one operation. Returns the response. If raiseOnError is True, TaskFailed is raised when the operation did not succeed, so dependent tasks in the graph are skipped.
+    #  RaiseOnError is False for call(), whose failed operations are not replayed
+    def __send(self, op, raiseOnError=True):
+        path = self.take(op)
+        if path is None:
+            return None
+        response = None
+        error = None
+        interrupted = False
+        try:
+            response = self.client.request(op['method'], path, json=op['payload'], headers={'Idempotency-Key': op['key']})
+        except requests.exceptions.ConnectionError as ex:     # Includes connect timeout. Request was not sent
+            error = f'{type(ex).__name__} {ex}'
+        except requests.exceptions.RequestException as ex:
+            error = f'{type(ex).__name__} {ex}'
+            interrupted = True
+
+        status = self.finish(op, path, response, error, interrupted, replay=raiseOnError)
+        if status == DONE or (not raiseOnError and response is not None):
+            return response
+        if not raiseOnError:
+            raise requests.exceptions.ConnectionError(error)
+        if status == UNCERTAIN:
+            raise TaskFailed(f'Transaction posting uncertain! {error}')
+        if status == FAILED:
+            raise TaskFailed(f'Transaction posting failed! Res: {str(response)}')
+        raise TaskFailed(f'Transaction posting delayed! {error}')
@@ -0,0 +1,125 @@
+# Payee index for payee autocomplete
+#  Payees of downloaded transactions and approval history are kept in a sorted list, so payees starting with the typed text are found with a binary search (bisect),
+#  and are ranked by how many transactions have that payee. If there are not enough of them, payees with similar spelling are found with a trigram index:
+#  each payee is split into 3 character pieces (eg. 'uber' -> ' ub', 'ube', 'ber', 'er '), and payees sharing most pieces with the typed text are suggested, so typos still find the payee.
+#  Index is updated as transactions are added, and each transaction is counted once, however many times it's downloaded again
+#  Repository link: https://github.com/gandos21/PocketSmith
+import bisect
+import heapq
+import threading
+from collections import Counter
+
+#### Configs ####
+SUGGESTION_COUNT    = 8         # Max number of suggestions returned
+FUZZY_MIN_SCORE     = 0.5       # Min similarity (0 to 1, Dice coefficient of trigrams) of a payee to be suggested for a typo
+FUZZY_MIN_LENGTH    = 3         # Typed text shorter than this only gets prefix suggestions
+PREFIX_CACHE_LENGTH = 2         # Suggestions for typed text up to this length are cached, as they match the most payees. Cache is cleared when payees are added
+#### End Configs ####
+
+
+# Function to get trigrams of a case folded text. Text is padded with a space at both ends, so the first and last letters count too
+def Trigrams(Text):
+    padded = f' {Text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+# Payee index class. Safe to update from background threads while GUI thread looks up suggestions
+class PayeeIndex:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.keys = []              # Sorted case folded payees
+        self.names = {}             # Case folded payee -> payee as shown, from the most recent transaction that had it
+        self.counts = Counter()     # Case folded payee -> number of transactions
+        self.grams = {}             # Case folded payee -> set of its trigrams
+        self.postings = {}          # Trigram -> set of case folded payees having it
+        self.seenIds = set()        # Ids (as str) of transactions already counted
+        self.cache = {}             # Short typed text -> prefix matches
+
+    def __len__(self):
+        return len(self.keys)
+
+    # Count a payee. New payees are added to newKeys, to be merged into sorted list by __merge()
+    def __add(self, payee, transId, newKeys):
+        if not payee or not payee.strip():
+            return
+        if transId is not None:
+            if str(transId) in self.seenIds:
+                return
+            self.seenIds.add(str(transId))
+        payee = payee.strip()
+        key = payee.casefold()
+        if key not in self.counts:
+            newKeys.append(key)
+            self.grams[key] = Trigrams(key)
+            for gram in self.grams[key]:
+                self.postings.setdefault(gram, set()).add(key)
+        self.counts[key] += 1
+        self.names[key] = payee
+        self.cache.clear()
+
+    def __merge(self, newKeys):
+        if len(newKeys) == 1:
+            bisect.insort(self.keys, newKeys[0])
+        elif newKeys:
+            self.keys.extend(newKeys)
+            self.keys.sort()        # Sorting a sorted list with a run of new keys appended is close to linear
+
+    # Add one payee. TransId is the transaction it's from, so it's counted once. Without TransId, each call counts
+    def add(self, payee, transId=None):
+        with self.lock:
+            newKeys = []
+            self.__add(payee, transId, newKeys)
+            self.__merge(newKeys)
+
+    # Add payees of transactions from API or local store
+    def addTransactions(self, transactions):
+        with self.lock:
+            newKeys = []
+            for t in transactions:
+                self.__add(t.get('payee'), t.get('id'), newKeys)
+            self.__merge(newKeys)
+
+    # Add payees of approval history, dictionary of transaction id -> approved payee name (see MyPocketSmith.SaveApprovedTransaction())
+    def addHistory(self, payees):
+        with self.lock:
+            newKeys = []
+            for transId, payee in payees.items():
+                self.__add(payee, f'approved {transId}', newKeys)      # Payee may have been changed when approved, so it's counted apart from the downloaded one
+            self.__merge(newKeys)
+
+    # Payees starting with text, most used first
+    def __prefixMatches(self, key, limit):
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached[:limit]
+        start = bisect.bisect_left(self.keys, key)
+        end = bisect.bisect_left(self.keys, key + '\U0010ffff', start)      # Highest character, so every key starting with text is before it
+        matches = heapq.nlargest(limit, self.keys[start:end], key=self.counts.__getitem__)
+        if len(key) <= PREFIX_CACHE_LENGTH:
+            self.cache[key] = matches
+        return matches
+
+    # Payees similar to text, most similar first. A payee sharing enough trigrams to pass FUZZY_MIN_SCORE must have one of the rarest trigrams of the text,
+    #  so only payees in the postings of those are scored, instead of all payees having any of the trigrams
+    def __fuzzyMatches(self, key, limit, exclude):
+        grams = Trigrams(key)
+        minShared = -(-FUZZY_MIN_SCORE * len(grams) // (2 - FUZZY_MIN_SCORE))        # Dice = 2*shared / (len(grams) + payee grams) and payee grams >= shared
+        rarest = sorted(grams, key=lambda g: len(self.postings.get(g, ())))[:len(grams) - int(minShared) + 1]
+        candidates = set().union(*(self.postings.get(g, ()) for g in rarest)) - exclude
+        scored = []
+        for candidate in candidates:
+            score = 2 * len(grams & self.grams[candidate]) / (len(grams) + len(self.grams[candidate]))
+            if score >= FUZZY_MIN_SCORE:
+                scored.append((score, self.counts[candidate], candidate))
+        return [candidate for score, count, candidate in heapq.nlargest(limit, scored)]
+
+    # Suggested payees for typed text: payees starting with the text, then payees with similar spelling. Returns payees as shown
+    def suggest(self, text, limit=SUGGESTION_COUNT):
+        key = text.strip().casefold()
+        if not key:
+            return []
+        with self.lock:
+            matches = self.__prefixMatches(key, limit)
+            if len(matches) < limit and len(key) >= FUZZY_MIN_LENGTH:
+                matches = matches + self.__fuzzyMatches(key, limit - len(matches), set(matches))
+            return [self.names[k] for k in matches if k != key]         # Payee already typed in full is not suggested
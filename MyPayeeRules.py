@@ -0,0 +1,280 @@
+# Payee rules for auto categorisation of transactions waiting for review
+#  Rules are defined in PayeeRules.json, a list of rules in priority order. Each rule has conditions and actions. All conditions of a rule must match:
+#   payee, note             Text found anywhere in payee/note (not case sensitive)
+#   payee_exact             Payee is exactly this text (not case sensitive)
+#   payee_regex, note_regex Regular expression found in payee/note (not case sensitive)
+#   amount_min, amount_max  Amount range, inclusive. Debits are negative
+#   account                 Account name
+#  Actions: category, set_note, transfer_to. If auto_approve is true, transactions matching the rule's payee_exact are approved without review.
+#  Example: [{"payee": "woolworths", "category": "Groceries"}, {"payee_exact": "ATM Withdrawal", "transfer_to": "Wallet", "category": "Transfer", "auto_approve": true}]
+#  Rules are compiled into one matcher: substrings into an Aho-Corasick automaton and exact payees into a dictionary. Regular expressions are indexed in the same automaton
+#  by a text they can't match without (eg. 'opal' of '^opal\b'), and only run on transactions having that text. Regular expressions without such text are combined into one regex.
+#  So each transaction is looked up in one pass, however many rules there are. First matching rule wins.
+#  Repository link: https://github.com/gandos21/PocketSmith
+import re
+import json
+from collections import deque
+
+#### Configs ####
+payeeRulesFile = 'PayeeRules.json'
+#### End Configs ####
+
+CONDITIONS  = ('payee', 'note', 'payee_exact', 'payee_regex', 'note_regex', 'amount_min', 'amount_max', 'account')
+ACTIONS     = ('category', 'set_note', 'transfer_to')
+BACK_REFERENCE = re.compile(r'\\\d|\(\?P=')       # Numbered or named back reference in a regex
+REPEAT      = re.compile(r'\{\d*,?\d*\}')         # Counted repeat in a regex, eg. {2,4}
+VERBOSE_FLAG = re.compile(r'\(\?[aiLmsux]*x')     # Inline verbose flag in a regex. Spaces are not literals then
+TEXT_FIELDS = {'payee': 'payee', 'note': 'note', 'payee_regex': 'payee', 'note_regex': 'note'}     # Text condition -> transaction field it is checked on
+
+
+# Error in a rule definition
+class RuleError(ValueError):
+    pass
+
+
+# Aho-Corasick automaton. Finds all added keywords in a text in one pass over the text. Ref: https://en.wikipedia.org/wiki/Aho%E2%80%93Corasick_algorithm
+class AhoCorasick:
+    def __init__(self):
+        self.goto = [{}]        # State -> {character -> next state}. State 0 is the root
+        self.fail = [0]         # State -> state of longest proper suffix that is also in the trie
+        self.output = [[]]      # State -> values of keywords ending at this state, including ones reached by fail links
+
+    def add(self, keyword, value):
+        state = 0
+        for ch in keyword:
+            nextState = self.goto[state].get(ch)
+            if nextState is None:
+                nextState = len(self.goto)
+                self.goto[state][ch] = nextState
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+            state = nextState
+        self.output[state].append(value)
+
+    # Build fail links, breadth first. Must be called after all keywords are added
+    def build(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nextState in self.goto[state].items():
+                queue.append(nextState)
+                f = self.fail[state]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nextState] = self.goto[f].get(ch, 0)
+                self.output[nextState] = self.output[nextState] + self.output[self.fail[nextState]]
+        return self
+
+    # Set of values of all keywords found in text
+    def search(self, text):
+        found = set()
+        state = 0
+        for ch in text:
+            while state and ch not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(ch, 0)
+            if self.output[state]:
+                found.update(self.output[state])
+        return found
+
+
+# Result of a rule match: actions to apply to a transaction
+class RuleMatch:
+    def __init__(self, rule, index, exact):
+        self.index = index                              # Position of the rule in rules file
+        self.name = rule.get('name', f'Rule {index + 1}')
+        self.category = rule.get('category')
+        self.note = rule.get('set_note')
+        self.transferTo = rule.get('transfer_to')
+        self.autoApprove = bool(rule.get('auto_approve')) and exact     # Only exact payee matches are approved without review
+
+
+# Compiled payee rules
+class PayeeRules:
+    def __init__(self, rules):
+        self.rules = []
+        for i, rule in enumerate(rules):
+            self.rules.append(self.__checkRule(i, rule))
+        self.__compile()
+
+    @staticmethod
+    def __checkRule(index, rule):
+        if not isinstance(rule, dict):
+            raise RuleError(f'Rule {index + 1} is not an object')
+        unknown = set(rule) - set(CONDITIONS) - set(ACTIONS) - {'name', 'auto_approve'}
+        if unknown:
+            raise RuleError(f'Rule {index + 1} has unknown keys {sorted(unknown)}')
+        if not any(k in rule for k in ACTIONS):
+            raise RuleError(f'Rule {index + 1} has no actions')
+        for key in ('payee_regex', 'note_regex'):
+            if key in rule:
+                try:
+                    re.compile(rule[key], re.IGNORECASE)
+                except re.error as ex:
+                    raise RuleError(f'Rule {index + 1} has invalid {key}: {ex}')
+        for key in ('amount_min', 'amount_max'):
+            if key in rule and not isinstance(rule[key], (int, float)):
+                raise RuleError(f'Rule {index + 1} has invalid {key}')
+        return rule
+
+    # Each rule is indexed under one of its conditions (the most selective one it has). Other conditions are checked only for rules found by the index
+    def __compile(self):
+        self.exact = {}                 # Case folded payee -> rule indexes
+        self.substrings = {}            # Field -> AhoCorasick of case folded substrings
+        self.regexes = {}               # Field -> (combined regex, group name -> rule index, rule index -> separate regex)
+        self.unindexed = []             # Rules without text conditions, eg. only account or amount
+        regexParts = {'payee': [], 'note': []}
+        for i, rule in enumerate(self.rules):
+            if 'payee_exact' in rule:
+                self.exact.setdefault(rule['payee_exact'].casefold(), []).append(i)
+            elif 'payee' in rule or 'note' in rule:
+                field = 'payee' if 'payee' in rule else 'note'
+                self.substrings.setdefault(field, AhoCorasick()).add(rule[field].casefold(), i)
+            elif 'payee_regex' in rule or 'note_regex' in rule:
+                field = 'payee' if 'payee_regex' in rule else 'note'
+                literal = RequiredLiteral(rule[field + '_regex'])
+                if literal:
+                    self.substrings.setdefault(field, AhoCorasick()).add(literal, i)     # Regex is checked by __ruleMatches() on transactions having the literal
+                else:
+                    regexParts[field].append((i, rule[field + '_regex']))
+            else:
+                self.unindexed.append(i)
+        for automaton in self.substrings.values():
+            automaton.build()
+        for field, parts in regexParts.items():
+            if parts:
+                self.regexes[field] = self.__combineRegexes(parts)
+
+    # Combine regular expressions into one regex of optional lookaheads, one per rule, each with its own group. One match() call sets the group of every rule
+    #  whose regex is found in the text. Regexes with back references (their group numbers change when combined) are kept separate, as are all of them if they can't be combined
+    #  (eg. same group name used in two rules). Returns (combined regex or None, group name -> rule index, rule index -> separate regex)
+    @staticmethod
+    def __combineRegexes(parts):
+        separate = {i: re.compile(pattern, re.IGNORECASE) for i, pattern in parts if BACK_REFERENCE.search(pattern)}
+        parts = [(i, pattern) for i, pattern in parts if i not in separate]
+        try:
+            combined = re.compile(''.join(f'(?=(?P<r{i}>.*?(?:{pattern})))?' for i, pattern in parts), re.IGNORECASE | re.DOTALL) if parts else None
+            return combined, {f'r{i}': i for i, pattern in parts}, separate
+        except re.error:
+            separate.update((i, re.compile(pattern, re.IGNORECASE)) for i, pattern in parts)
+            return None, {}, separate
+
+    # Check all conditions of a rule. Text conditions are checked again, as the index only checked one of them.
+    #  Regexes are run on the text as it is, with IGNORECASE, as case folding changes what a regex sees (eg. 'ß' becomes 'ss'). Other text conditions use case folded text
+    def __ruleMatches(self, rule, transaction):
+        original = {'payee': transaction.get('payee') or '', 'note': transaction.get('note') or ''}
+        text = {k: v.casefold() for k, v in original.items()}
+        if 'payee_exact' in rule and text['payee'] != rule['payee_exact'].casefold():
+            return False
+        for key in ('payee', 'note'):
+            if key in rule and rule[key].casefold() not in text[key]:
+                return False
+        for key in ('payee_regex', 'note_regex'):
+            if key in rule and not re.search(rule[key], original[TEXT_FIELDS[key]], re.IGNORECASE):
+                return False
+        amount = transaction.get('amount')
+        if 'amount_min' in rule and (amount is None or amount < rule['amount_min']):
+            return False
+        if 'amount_max' in rule and (amount is None or amount > rule['amount_max']):
+            return False
+        if 'account' in rule and transaction.get('account') != rule['account']:
+            return False
+        return True
+
+    # Indexes of rules that may match a transaction, from one lookup in each index. Exact and substring lookups use case folded text, regexes the text as it is
+    def __candidates(self, transaction):
+        original = {'payee': transaction.get('payee') or '', 'note': transaction.get('note') or ''}
+        text = {k: v.casefold() for k, v in original.items()}
+        candidates = set(self.exact.get(text['payee'], ()))
+        for field, automaton in self.substrings.items():
+            candidates |= automaton.search(text[field])
+        for field, (combined, groups, separate) in self.regexes.items():
+            if combined is not None:
+                found = combined.match(original[field]).groupdict()
+                candidates.update(i for name, i in groups.items() if found[name] is not None)
+            candidates.update(i for i, regex in separate.items() if regex.search(original[field]))
+        candidates.update(self.unindexed)
+        return candidates
+
+    # Find first matching rule of a transaction (with payee, note, amount and account keys, as in review list). Returns RuleMatch or None
+    def match(self, transaction):
+        for i in sorted(self.__candidates(transaction)):
+            rule = self.rules[i]
+            if self.__ruleMatches(rule, transaction):
+                return RuleMatch(rule, i, exact='payee_exact' in rule)
+        return None
+
+    # Classify a batch of transactions. Returns dictionary of transaction id -> RuleMatch, for matched transactions only
+    def classify(self, transactions):
+        matches = {}
+        for t in transactions:
+            match = self.match(t)
+            if match is not None:
+                matches[t['id']] = match
+        return matches
+
+    def __len__(self):
+        return len(self.rules)
+
+
+# Function to find the longest text a regular expression can't match without, eg. 'woolworths' of '^woolworths\s+\d+'. Only literals outside groups and repeats are used.
+#  Pattern is scanned one token at a time: plain and escaped punctuation characters are literals, anything else (classes, groups, escapes like \d or \b, anchors) ends a run of literals,
+#  and a repeat drops the character before it. Returns case folded text, or None if there's no such text of at least 2 characters
+def RequiredLiteral(Pattern):
+    if VERBOSE_FLAG.search(Pattern):
+        return None
+    best = run = ''
+    depth = 0       # Group nesting. Only literals at top level are required
+    i = 0
+    while i < len(Pattern):
+        c = Pattern[i]
+        literal = None
+        if c == '\\':
+            if i + 1 >= len(Pattern):
+                return None
+            if not Pattern[i + 1].isalnum():
+                literal = Pattern[i + 1]        # Escaped punctuation, eg. '\.'
+            i += 2
+        elif c == '[':
+            i += 2 if Pattern[i + 1:i + 2] == '^' else 1
+            if Pattern[i:i + 1] == ']':
+                i += 1      # First character of a class is part of it, even if it's ']'
+            while i < len(Pattern) and Pattern[i] != ']':
+                i += 2 if Pattern[i] == '\\' else 1
+            i += 1
+        elif c in '*+?{':
+            repeat = REPEAT.match(Pattern, i) if c == '{' else None
+            if c != '{' or repeat:
+                run = run[:-1]      # Character before a repeat may be left out, or repeated
+            i = repeat.end() if repeat else i + 1
+        else:
+            if c == '(':
+                depth += 1
+            elif c == ')':
+                depth -= 1
+            elif c == '|' and depth == 0:
+                return None         # Top level alternation, eg. 'a|b'. Text before it may not be required
+            elif c not in '.^$':
+                literal = c
+            i += 1
+        if literal is not None and depth == 0:
+            run += literal
+        else:
+            best = max(best, run, key=len)
+            run = ''
+    best = max(best, run, key=len)
+    return best.casefold() if len(best) >= 2 else None
+
+# Function to load payee rules from a json file. Returns empty rules if file doesn't exist. Raises RuleError if a rule is invalid
+def LoadPayeeRules(FileName=payeeRulesFile):
+    try:
+        with open(FileName, 'r') as fp:
+            rules = json.load(fp)
+    except FileNotFoundError:
+        return PayeeRules([])
+    except ValueError as ex:
+        raise RuleError(f'Invalid json in {FileName}: {ex}')
+    if not isinstance(rules, list):
+        raise RuleError(f'{FileName} must have a list of rules')
+    return PayeeRules(rules)
@@ -1,47 +1,96 @@
 # Pocketsmith automation
 # Created based using REST APIs provided by Pocketsmith. Link to API documentation: https://developers.pocketsmith.com/
 #  Repository link: https://github.com/gandos21/PocketSmith
-import requests
 import json
-from WindowLayout import WindowFields as wf
-from datetime import datetime
+import os
+import hashlib
+import threading
+import uuid
+from collections import deque
+from MyApiClient import ApiClient, RateLimiter
+from WindowFields import WindowFields as wf
+from datetime import datetime, date, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse, parse_qs
 import MyUtils as ut
+from MyTransactionStore import TransactionStore
+from MyHistoryStore import ApprovalHistory
 
 #### Configs & Globals ####
-approvedTransFile = 'ApprovedTransactions.json'
+approvedTransFile = 'ApprovedTransactions.jsonl'          # Append-only history file, one approved transaction per line
+legacyApprovedTransFile = 'ApprovedTransactions.json'     # History file of older script versions. Imported once into approvedTransFile
 keyFile = 'keyFile.json'
-APPROVED_TRANS_HISTORY_DURATION = 15       # Number of days to keep approved transaction data in history file
+userContextFile = 'UserContext.json'      # On-disk cache of user data returned by /me, so it is not requested again on next start
+USER_CONTEXT_DISK_CACHE = True             # Set to False to only cache user data in memory
+metadataCacheFile = 'MetadataCache.json'   # On-disk cache of categories and accounts. Used at startup and revalidated in background
+outboxFile = 'Outbox.db'                   # Outbox of changes to send to Pocketsmith. Changes that failed to send are replayed from here
+APPROVED_TRANS_HISTORY_DURATION = 365      # Number of days to keep approved transaction data in history file
+TRANSACTION_FETCH_DAYS = 30                # Default date window (in days, up to today) for fetching user transactions
+TRANSACTIONS_PER_PAGE = 100                # Page size requested from the transactions API (Pocketsmith default is 30)
+MAX_CONCURRENT_PAGE_FETCHES = 4            # Max number of transaction pages downloaded in parallel
+MAX_CONCURRENT_APPROVALS = 8               # Max number of API calls run in parallel when approving transactions
+MAX_CONCURRENT_AUTO_CLEARS = 4             # Max number of re-approved transactions auto cleared in parallel
+MAX_CONCURRENT_IMPORTS = 8                 # Max number of API calls run in parallel when importing a statement file
+AUTO_CLEAR_RATE_LIMIT = 5                  # Max number of auto clear API calls started per second. 0 for no limit
+SYNC_OVERLAP = 60                          # Seconds subtracted from last sync time when asking for updated transactions
+FULL_SYNC_INTERVAL = 24 * 3600             # Seconds between full syncs, which find transactions deleted in Pocketsmith. Other syncs only download changes
 
-headers = {
-    "Accept": "application/json",
-    "X-Developer-Key": ""
-}
-post_headers = {
-    "Accept": "application/json",
-    "Content-Type": "application/json",
-    "X-Developer-Key": ""
-}
+telemetry = None                # Per-endpoint stats of all API calls. Created with the API key by GetTelemetry(), as no call is made before the key is read
+telemetryLock = threading.Lock()
+client = ApiClient(poolSize=max(MAX_CONCURRENT_PAGE_FETCHES, MAX_CONCURRENT_APPROVALS, 10))     # Shared HTTP client. All API calls use its keep-alive connection pool
 
-categoryList = []
-categoryIdLookup = {}
+categoryTree = None             # Category tree with lookups by id, path and name. See MyCategoryTree.py. Created on first use by GetCategoryTree()
+categoryTreeLock = threading.Lock()
+categoryList = []               # Names of categories to pick from. Same list as categoryTree.names
+categoryIdLookup = {}           # Category name or path -> id. Same dictionary as categoryTree.lookup
 
 accountList = []
 accountIdLookup = {}
+metadataLock = threading.Lock()             # Held while swapping in rebuilt category/account lists and lookups
+metadataCacheLock = threading.Lock()
+METADATA_ENDPOINTS = {'categories': 'categories', 'accounts': 'transaction_accounts'}   # Metadata name -> user API endpoint
+
+transactionStore = None     # Local transaction store. Opened on first use by GetTransactionStore()
+transactionStoreLock = threading.Lock()
+approvalHistory = None      # Approved transaction history. Opened on first use by GetApprovalHistory()
+approvalHistoryLock = threading.Lock()
+outbox = None               # Outbox of API changes. Opened on first use by GetOutbox()
+outboxLock = threading.Lock()
+queuedApprovals = {}        # Transaction id -> (planner, entries, planned keys, outbox group) of approvals sent by the outbox in background. See CheckQueuedApprovals()
+queuedApprovalsLock = threading.Lock()
+payeeRules = None           # Compiled payee rules. Loaded and reloaded when rules file changes by GetPayeeRules()
+payeeRulesMtime = None
+payeeRulesLock = threading.Lock()
+payeeIndex = None           # Payee autocomplete index. Built on first use by GetPayeeIndex(), then updated as transactions are synced and approved
+payeeIndexLock = threading.Lock()
+
+userContext = {}            # User data (id, login, etc.) of the current API key, resolved once from /me
+userContextLock = threading.Lock()
+apiKeyHash = ''             # Hash of current API key. Used to key the disk cache, so the key itself is not saved to another file
+keyFileMtime = None         # Modified time of key file when it was last read. Used to detect key changes
 
 #### End Configs & globals ####
 
 # Read developer key from an external file. Returns True if a key is read, False otherwise
 def ReadDevKey():
+    global apiKeyHash
+    global keyFileMtime
+
     # Load developer key from key file
     try:  # If file exist, load data from file, otherwise start with a new history file
+        keyFileMtime = os.path.getmtime(keyFile)
         with open(keyFile, 'r') as fp:
             apiKey = json.load(fp)['ApiKey']
         if len(apiKey) != 128:      # Length of developer ksy is 128 bytes
             print('Invalid key length!')
             raise Exception
 
-        headers['X-Developer-Key'] = apiKey
-        post_headers['X-Developer-Key'] = apiKey
+        GetTelemetry()      # Calls are recorded from the first one made with the key
+        client.setApiKey(apiKey)
+        newKeyHash = hashlib.sha256(apiKey.encode()).hexdigest()
+        if newKeyHash != apiKeyHash:
+            InvalidateUserContext(RemoveDiskCache=False)   # Different key, so user data in memory belongs to another key. Disk cache is keyed by key hash, so it can stay
+        apiKeyHash = newKeyHash
         return True
     except:
         keyDict = {}
@@ -57,203 +106,220 @@ def ReadDevKey():
         return False
 
 
-# Function to get get user data from Pocketsmith account
+# Function to check if key file was modified since it was last read
+def KeyFileChanged():
+    try:
+        return os.path.getmtime(keyFile) != keyFileMtime
+    except OSError:
+        return keyFileMtime is not None
+
+# Function to drop cached user data. Called when API key changes. Disk cache is removed too, unless RemoveDiskCache is False
+def InvalidateUserContext(RemoveDiskCache=True):
+    global userContext
+    with userContextLock:
+        userContext = {}
+        if RemoveDiskCache:
+            try:
+                os.remove(userContextFile)
+            except OSError:
+                pass        # No disk cache
+
+# Function to get get user data from Pocketsmith account. /me is only requested once per API key, then user data is served from memory (or disk cache on next start)
+def GetUserContext():
+    if KeyFileChanged():        # Key file was edited since it was read. Re-read key and drop user data cached for the old key
+        InvalidateUserContext()
+        ReadDevKey()
+
+    with userContextLock:
+        if userContext or ReadUserContextCache():
+            return userContext
+
+        response = client.request("GET", "/me")
+        response.raise_for_status()
+        return SaveUserContext(json.loads(response.text))
+
+# Function to load user data from disk cache, if it was saved for the current API key. Returns True if loaded
+def ReadUserContextCache():
+    global userContext
+    if USER_CONTEXT_DISK_CACHE:
+        try:
+            with open(userContextFile, 'r') as fp:
+                cache = json.load(fp)
+            if cache['KeyHash'] == apiKeyHash:
+                userContext = cache['User']
+                return True
+        except (OSError, ValueError, KeyError):
+            pass        # No usable disk cache. Get user data from Pocketsmith
+    return False
+
+# Function to keep user data returned by /me in memory and disk cache. Returns the kept user data
+def SaveUserContext(UserData):
+    global userContext
+    userContext = {k: UserData.get(k) for k in ('id', 'login', 'name', 'time_zone', 'base_currency_code')}
+    if USER_CONTEXT_DISK_CACHE:
+        try:
+            with open(userContextFile, 'w') as fp:
+                json.dump({'KeyHash': apiKeyHash, 'User': userContext}, fp, indent=4)
+        except OSError:
+            print(f'Error creating user data cache file {userContextFile}')
+    return userContext
+
+# Function to get user ID of the API key owner
 def GetUserId():
-    url = "https://api.pocketsmith.com/v2/me"
-    response = requests.request("GET", url, headers=headers)
-    userData = json.loads(response.text)
-    return userData['id']
-
-# Function to load categories and their IDs from Pocketsmith account
-def LoadCategories():
-    global categoryList
-    global categoryIdLookup
-
-    url = f'https://api.pocketsmith.com/v2/users/{GetUserId()}/categories'
-    categories = json.loads(requests.request("GET", url, headers=headers).text)
-    for i in categories:
-        if 'Hidden' in i['title']:
-            break       # Skip anything after this Hidden categories
-        # Collect category names into a list and also make a dictionary to lookup category IDs
-        if len(i['children']) == 0:     # If no children sub-categories, then save parent category name
-            categoryList.append(i['title'])
-        categoryIdLookup[i['title']] = i['id']
-        for j in i['children']:
-            #x = i['title'] + '->' + j['title']  # When saving child category, prefix with parent
-            x = j['title']                       # Saving only child category
-            categoryList.append(x)
-            categoryIdLookup[x] = j['id']
-    return
-
-# Function to load all account and their IDs from Pocketsmith account
-def LoadAccounts():
-    global accountList
-    global accountIdLookup
-
-    # Get transaction accounts and their IDs. Note, there are 2 IDs associated with accounts: id and account_id. We need to use id to create or update transactions in them
-    url = f'https://api.pocketsmith.com/v2/users/{GetUserId()}/transaction_accounts'
-    accounts = json.loads(requests.request("GET", url, headers=headers).text)
-    for i in accounts:
+    return GetUserContext()['id']
+
+# Function to build account name list and name->ID lookup from transaction account data returned by the API
+#  Note, there are 2 IDs associated with accounts: id and account_id. We need to use id to create or update transactions in them
+def BuildAccountLookups(Accounts):
+    newAccountList = []
+    newAccountIdLookup = {}
+    for i in Accounts:
         #print('id: ', i['id'], ' --- ', 'account_id: ', i['account_id'], ' --- ', i['name'])
-        accountList.append(i['name'])
-        accountIdLookup[i['name']] = i['id']
-    return
+        newAccountList.append(i['name'])
+        newAccountIdLookup[i['name']] = i['id']
+    return newAccountList, newAccountIdLookup
 
-# Function to create new transaction. Used for both manual entry and to create initial split transactions
-def PostTransaction(GuiPanelValues, Need_Review=True, ChangePayeeName=True):
-    transAccountId = accountIdLookup[GuiPanelValues[wf.AC_FROM]]  # Account to post to
-    url = f'https://api.pocketsmith.com/v2/transaction_accounts/{transAccountId}/transactions'
-    payload = {
-        'payee'       : GuiPanelValues[wf.PAYEE_NAME],
-        'amount'      : '%.2f' % float(GuiPanelValues[wf.AMOUNT].replace(',','')),         # float() doesn't take comma separators, so removing them before converting to float. We added , separator to show on the GUI
-        'date'        : GuiPanelValues[wf.TRANSACTION_DATE],
-        'category_id' : categoryIdLookup[GuiPanelValues[wf.CATEGORY_NAME]],
-        'note'        : GuiPanelValues[wf.NOTE_TEXT],
-        'needs_review': Need_Review
-        # Note: when transactions are created, they are always set for review by Pocketsmith.
-        #   So even if we call this function with Need_Review=False, transaction will still come up for review
-    }
-    # If an account given for TransferTo, then make double entry: debit transaction on one account, credit on other
-    if len(GuiPanelValues[wf.AC_TO]) and GuiPanelValues[wf.AC_TO] != GuiPanelValues[wf.AC_FROM]:
-        # Double account entry
-        # Update Payee name to 'Transfer : xxxx'
-        # Check applicable for primary transaction only. For the other double entry, we will use 'Transfer : xxx' payee name.
-        #   When ChangePayeeName is False, Payee is not changed when split trans are created for the first time as we want to clone the payee name of the original trans.
-        #   We then change it with UpdateSplitTranferTransactions()
-        if ChangePayeeName:
-            payload['payee'] = 'Transfer : ' + GuiPanelValues[wf.AC_TO]
-        response1 = requests.request("POST", url, json=payload, headers=post_headers)
-
-        transAccountId = accountIdLookup[GuiPanelValues[wf.AC_TO]]        # Account to post to
-        payload['payee'] = 'Transfer : ' + GuiPanelValues[wf.AC_FROM]
-        payload['amount'] = '%.2f' % (float(GuiPanelValues[wf.AMOUNT].replace(',','')) * -1)   # Negate the amount for Transfer To account
-        url = f'https://api.pocketsmith.com/v2/transaction_accounts/{transAccountId}/transactions'
-        response2 = requests.request("POST", url, json=payload, headers=post_headers)
-    else:
-        # Single account entry
-        response1 = requests.request("POST", url, json=payload, headers=post_headers)
-        response2 = ''
+# Function to replace category/account lists and lookups. New objects are built first and then swapped in together,
+#  so other threads never see a partly built list. Category tree only rebuilds categories that changed
+def ApplyMetadata(Name, Data):
+    global categoryList, categoryIdLookup
+    global accountList, accountIdLookup
 
-    if str(response1) == '<Response [201]>' and str(response2) in ['', '<Response [201]>']:
-        msg = 'Transaction posting success'
-        res1 = json.loads(response1.text)
-        if response2 != '':
-            res2 = json.loads(response2.text)
-        else:
-            res2 = ''
+    if Name == 'categories':
+        tree = GetCategoryTree()
+        tree.update(Data)
+        with metadataLock:
+            categoryList, categoryIdLookup = tree.names, tree.lookup
     else:
-        msg = f'Transaction posting failed! Res1: {str(response1)}, Res2: {str(response2)}'
-        res1 = res2 = ''
-        if str(response1) != '<Response [201]>':
-            print(response1)
-        if str(response2) not in ['', '<Response [201]>']:
-            print(response2)
-    print(msg)
-    return res1, res2, msg
+        newList, newLookup = BuildAccountLookups(Data)
+        with metadataLock:
+            accountList, accountIdLookup = newList, newLookup
 
+# Function to read metadata cache file. Cache is only used if it was saved for the current API key
+def ReadMetadataCache():
+    try:
+        with open(metadataCacheFile, 'r') as fp:
+            cache = json.load(fp)
+        if cache.get('KeyHash') == apiKeyHash:
+            return cache
+    except (OSError, ValueError):
+        pass        # No cache file or it is corrupt. It will be re-created
+    return {'KeyHash': apiKeyHash}
 
-# Function to update main transaction and to create TransferTo transaction if required
-def UpdateTransaction(TransactionId, GuiPanelValues, Need_Review=True):
-    url = f'https://api.pocketsmith.com/v2/transactions/{TransactionId}'
-    payload = {
-        # Note: If amount and Payee Name are changed from original entry of the trans, then the updated trans will again come up for review, even if needs_review is updated with False
-        #  We need to once again update it with only needs_review set to False. To confirm again, we use ConfirmTransaction()
-        'payee'         : GuiPanelValues[wf.PAYEE_NAME],
-        'amount'        : '%.2f' % float(GuiPanelValues[wf.AMOUNT].replace(',','')),           # float() doesn't take comma separators, so removing them before converting to float. We added , separator to show on the GUI
-        'category_id'   : categoryIdLookup[GuiPanelValues[wf.CATEGORY_NAME]],
-        'note'          : GuiPanelValues[wf.NOTE_TEXT],
-        'needs_review'  : Need_Review
-    }
+# Function to save one metadata entry (categories or accounts) to cache file. File is replaced in one step, so an interrupted write doesn't corrupt the cache
+def WriteMetadataCache(Name, Entry):
+    with metadataCacheLock:
+        cache = ReadMetadataCache()
+        cache[Name] = Entry
+        tmpFile = metadataCacheFile + '.tmp'
+        try:
+            with open(tmpFile, 'w') as fp:
+                json.dump(cache, fp)
+            os.replace(tmpFile, metadataCacheFile)
+        except OSError:
+            print(f'Error saving metadata cache file {metadataCacheFile}')
 
-    # If an account given for TransferTo, then make double entry: debit transaction on one account, credit on other
-    if len(GuiPanelValues[wf.AC_TO]) and GuiPanelValues[wf.AC_TO] != GuiPanelValues[wf.AC_FROM]:
-        # Double account entry
-        # Update Payee name to 'Transfer : xxxx'
-        payload['payee'] = 'Transfer : ' + GuiPanelValues[wf.AC_TO]
-        response1 = requests.request("PUT", url, json=payload, headers=post_headers)           # Update existing transaction
-
-        # Create a new transaction in TransferTo account
-        transAccountId = accountIdLookup[GuiPanelValues[wf.AC_TO]]        # Account to post to
-        url = f'https://api.pocketsmith.com/v2/transaction_accounts/{transAccountId}/transactions'
-        payload['date'] = GuiPanelValues[wf.TRANSACTION_DATE]
-        payload['payee'] = 'Transfer : ' + GuiPanelValues[wf.AC_FROM]
-        payload['amount'] = '%.2f' % (float(GuiPanelValues[wf.AMOUNT].replace(',','')) * -1)   # Negate the amount for Transfer To account
-        response2 = requests.request("POST", url, json=payload, headers=post_headers)
-        if str(response2) == '<Response [201]>':
-            # We need to re-run Update transaction API on the newly created transaction on TransferTo account to prevent that from appearing for confirmation
-            payload2 = {'needs_review': False}
-            transId = json.loads(response2.text)['id']
-            url = f'https://api.pocketsmith.com/v2/transactions/{transId}'
-            response2 = requests.request("PUT", url, json=payload2, headers=post_headers)  # Update existing transaction
-    else:
-        # Single account entry
-        response1 = requests.request("PUT", url, json=payload, headers=post_headers)            # Update existing transaction
-        response2 = ''
+# Function to download metadata (categories or accounts). Cache validators (ETag/Last-Modified) of the cached copy are sent,
+#  so server can answer with 304 Not Modified. Returns new cache entry, or None if data did not change
+def FetchMetadata(Name, CachedEntry=None):
+    url = f'/users/{GetUserId()}/{METADATA_ENDPOINTS[Name]}'
+    response = client.request("GET", url, headers=MetadataRequestHeaders(CachedEntry))
+    if response.status_code == 304:
+        return None
+    response.raise_for_status()
+    return MetadataEntry(Name, json.loads(response.text), response.headers, CachedEntry)
 
-    if str(response1) == '<Response [200]>' and str(response2) in ['', '<Response [200]>']:     # Positive responses: 200 received for Update Transaction API, 201 for Create Transaction
-        msg = 'Transaction posting success'
-        res1 = json.loads(response1.text)
-        if response2 != '':
-            res2 = json.loads(response2.text)
-        else:
-            res2 = ''
-    else:
-        msg = f'Transaction posting failed! Res1: {str(response1)}, Res2: {str(response2)}'
-        res1 = res2 = ''
-        if str(response1) != '<Response [200]>':
-            print(response1)
-        if str(response2) not in ['', '<Response [200]>']:
-            print(response2)
-    return res1, res2, msg
+# Function to get conditional request headers for a cached metadata entry
+def MetadataRequestHeaders(CachedEntry):
+    conditionalHeaders = {}
+    if CachedEntry is not None:
+        if CachedEntry.get('ETag'):
+            conditionalHeaders['If-None-Match'] = CachedEntry['ETag']
+        if CachedEntry.get('LastModified'):
+            conditionalHeaders['If-Modified-Since'] = CachedEntry['LastModified']
+    return conditionalHeaders
 
+# Function to make a metadata cache entry from downloaded data and response headers. Returns None if data is same as cached entry
+def MetadataEntry(Name, Data, Headers, CachedEntry=None):
+    entry = {
+        'ETag'          : Headers.get('ETag'),
+        'LastModified'  : Headers.get('Last-Modified'),
+        'Hash'          : hashlib.sha256(json.dumps(Data, sort_keys=True).encode()).hexdigest(),   # Content hash in case server doesn't support conditional requests
+        'Data'          : Data
+    }
+    if CachedEntry is not None and entry['Hash'] == CachedEntry.get('Hash'):
+        WriteMetadataCache(Name, entry)        # Same data. Only save new validators
+        return None
+    return entry
 
-# Function to split transactions
-def UpdateSplitTranferTransactions(TransactionId1, TransactionId2, GuiPanelValues):
-    url = f'https://api.pocketsmith.com/v2/transactions/{TransactionId1}'
-    payload = {'needs_review' : False}
+# Function to load categories or accounts. Cached copy is used if available, so no network call is needed. Otherwise data is downloaded and cached
+def LoadMetadata(Name, UseCache=True):
+    cachedEntry = ReadMetadataCache().get(Name) if UseCache else None
+    if cachedEntry is not None:
+        ApplyMetadata(Name, cachedEntry['Data'])
+        return
+    entry = FetchMetadata(Name)
+    ApplyMetadata(Name, entry['Data'])
+    WriteMetadataCache(Name, entry)
 
-    # If an account given for TransferTo, then make double entry: debit transaction on one account, credit on other
-    if len(GuiPanelValues[wf.AC_TO]) and GuiPanelValues[wf.AC_TO] != GuiPanelValues[wf.AC_FROM]:
-        # Double account entry
-        # Clear the first entry
-        payload['payee'] = 'Transfer : ' + GuiPanelValues[wf.AC_TO]
-        response1 = requests.request("PUT", url, json=payload, headers=post_headers)           # Update existing transaction
+# Function to load categories and their IDs from Pocketsmith account (or metadata cache)
+def LoadCategories(UseCache=True):
+    LoadMetadata('categories', UseCache)
 
-        # Clear the second entry
-        url = f'https://api.pocketsmith.com/v2/transactions/{TransactionId2}'
-        payload2 = {'needs_review' : False}     # Just clearing the review flag for the second transaction
-        response2 = requests.request("PUT", url, json=payload2, headers=post_headers)  # Update existing transaction
-    else:
-        # Single account entry
-        response1 = requests.request("PUT", url, json=payload, headers=post_headers)            # Update existing transaction
-        response2 = ''
+# Function to load all account and their IDs from Pocketsmith account (or metadata cache)
+def LoadAccounts(UseCache=True):
+    LoadMetadata('accounts', UseCache)
 
-    if str(response1) == '<Response [200]>' and str(response2) in ['', '<Response [200]>']:     # Positive responses: 200 received for Update Transaction API, 201 for Create Transaction
-        msg = 'Transaction posting success'
-        res1 = json.loads(response1.text)
-        if response2 != '':
-            res2 = json.loads(response2.text)
-        else:
-            res2 = ''
-    else:
-        msg = f'Transaction posting failed! Res1: {str(response1)}, Res2: {str(response2)}'
-        res1 = res2 = ''
-        if str(response1) != '<Response [200]>':
-            print(response1)
-        if str(response2) not in ['', '<Response [200]>']:
-            print(response2)
+# Function to check cached categories and accounts are still up to date. Lists and lookups are rebuilt only if data changed.
+#  Returns list of names of changed metadata, eg. ['categories']
+def RevalidateMetadata():
+    changed = []
+    cache = ReadMetadataCache()
+    for name in METADATA_ENDPOINTS:
+        entry = FetchMetadata(name, cache.get(name))
+        if entry is not None:
+            ApplyMetadata(name, entry['Data'])
+            WriteMetadataCache(name, entry)
+            changed.append(name)
+    return changed
+
+# Function to run RevalidateMetadata() on a background thread. Callback is called with list of changed metadata names, only if something changed
+def RevalidateMetadataInBackground(Callback=None):
+    def Revalidate():
+        try:
+            changed = RevalidateMetadata()
+        except Exception as ex:
+            print(f'Metadata revalidation failed: {type(ex).__name__} {ex.args}')
+            return
+        if changed and Callback is not None:
+            Callback(changed)
+    thread = threading.Thread(target=Revalidate, daemon=True)
+    thread.start()
+    return thread
+
+# Function to create new transaction from the review panel, eg. manual entry. If an account given for TransferTo, a double entry is made (see PlanPosting()).
+#  Calls are planned, saved to the outbox and sent straight away. Returns response data of the transaction and of its TransferTo transaction ('' if none or not done), and status message
+def PostTransaction(GuiPanelValues, Need_Review=True, ChangePayeeName=True):
+    planner = OperationPlanner()
+    keys = PlanPosting(planner, GuiPanelValues, Need_Review=Need_Review, ChangePayeeName=ChangePayeeName)
+    group = 'post-' + uuid.uuid4().hex
+    outbox = GetOutbox()
+    outbox.enqueue(planner.operations(group), group, claim=True)
+    outbox.dispatch(group)
+    res1, res2, msg = PostingResult(planner, keys, {op['key']: op for op in outbox.list(group=group)})
+    print(msg)
     return res1, res2, msg
 
 
 # Function to confirm a transaction after it has been updated or created
 def ConfirmTransaction(TransactionId):
-    url = f'https://api.pocketsmith.com/v2/transactions/{TransactionId}'
+    url = f'/transactions/{TransactionId}'
     payload = {
         # Note: If amount and Payee Name are changed from original entry of the trans, then the updated trans will again come up for review, even if needs_review is updated with False
         #  We update transaction once again with this function only to set needs_review to False
         'needs_review' : False
     }
-    response = requests.request("PUT", url, json=payload, headers=post_headers)            # Update existing transaction
+    response = GetOutbox().call("PUT", url, payload)            # Update existing transaction
 
     if str(response) == '<Response [200]>':     # Positive responses: 200 received for Update Transaction API, 201 for Create Transaction
         msg = 'Transaction posting success'
@@ -266,19 +332,26 @@ def ConfirmTransaction(TransactionId):
     return res, msg
 
 # Function to confirm a transaction with payee update. Used to auto clear transactions that come back for re-approval. Payee is updated in case we previously update payee name to something else eg. 'Transfer : xxx'
-def ConfirmTransactionWithPayee(TransactionId, PayeeName):
-    url = f'https://api.pocketsmith.com/v2/transactions/{TransactionId}'
+#  Category and note are also restored if given, as bank re-syncs may reset them
+def ConfirmTransactionWithPayee(TransactionId, PayeeName, CategoryName=None, Note=None):
+    url = f'/transactions/{TransactionId}'
     payload = {
         # Note: If amount and Payee Name are changed from original entry of the trans, then the updated trans will again come up for review, even if needs_review is updated with False
-        #  We update transaction once again with this function only to set needs_review to False
+        #  So if the response shows the transaction still needs review, we confirm it once more with ConfirmTransaction()
         'payee': PayeeName,
         'needs_review' : False
     }
-    response = requests.request("PUT", url, json=payload, headers=post_headers)            # Update existing transaction
+    if CategoryName in categoryIdLookup:
+        payload['category_id'] = categoryIdLookup[CategoryName]
+    if Note is not None:
+        payload['note'] = Note
+    response = GetOutbox().call("PUT", url, payload)            # Update existing transaction
 
     if str(response) == '<Response [200]>':     # Positive responses: 200 received for Update Transaction API, 201 for Create Transaction
         msg = 'Transaction posting success'
         res = json.loads(response.text)
+        if res.get('needs_review'):
+            res, msg = ConfirmTransaction(TransactionId)
     else:
         msg = f'Transaction confirmation failed! Res: {str(response)}'
         res = ''
@@ -287,69 +360,628 @@ def ConfirmTransactionWithPayee(TransactionId, PayeeName):
     return res, msg
 
 
-# Get all transactions for user. Each query retrieves a page of 30 transactions
-def GetUserTransactions():
+# Planned final state of one transaction. Transactions to be created have no id until they are posted
+class PlannedTransaction:
+    def __init__(self, key, transId=None, accountId=None, createFields=None, after=()):
+        self.key = key
+        self.transId = transId
+        self.accountId = accountId              # Account to create the transaction in
+        self.createFields = createFields        # Fields sent when the transaction is created
+        self.fields = {}                        # Fields to update. Later updates of the same field replace earlier ones
+        self.confirm = False                    # True to clear the review flag
+        self.after = list(after)                # Keys of planned transactions that must be done first
+        self.naiveCalls = 0                     # Number of calls the same changes took without planning
+
+
+# Operation planner. Collects intended changes to each transaction, then works out the least number of API calls to get there:
+#  all field updates and review flag clearing of a transaction are merged into one PUT, and a created transaction only gets a PUT for fields that differ from the POST.
+#  Created transactions to be confirmed are posted with needs_review False.
+#  Note: If amount or Payee Name are changed, Pocketsmith may flag the transaction for review again even if needs_review is set to False in the same call, and it may set
+#   created transactions for review whatever needs_review says. So a conditional PUT is planned to clear the review flag, which is only sent if the response still shows needs_review.
+#   Otherwise that call is saved.
+#  Planned calls are saved to the outbox (see MyOutbox.py) and sent from there
+class OperationPlanner:
+    def __init__(self):
+        self.targets = {}           # key -> PlannedTransaction, in the order added
+        self.targetOps = {}         # key -> outbox operation keys of the planned transaction, set by operations()
+        self.naiveCalls = 0         # Number of calls the sent transactions took without planning, one call per change
+        self.calls = 0              # Number of calls made, including retries
+
+    def update(self, key, transId, after=(), **fields):
+        if key not in self.targets:
+            self.targets[key] = PlannedTransaction(key, transId=transId, after=after)
+        self.targets[key].fields.update(fields)
+        return key
+
+    def create(self, key, accountId, after=(), **fields):
+        self.targets[key] = PlannedTransaction(key, accountId=accountId, createFields=fields, after=after)
+        return key
+
+    # Merge more field updates into a planned transaction
+    def set(self, key, **fields):
+        self.targets[key].fields.update(fields)
+
+    def confirm(self, key):
+        self.targets[key].confirm = True
+
+    # Set number of API calls the changes of a planned transaction took without planning. Used to report calls saved
+    def countNaive(self, key, calls):
+        self.targets[key].naiveCalls = calls
+
+    def callsSaved(self):
+        return self.naiveCalls - self.calls
+
+    # Convert planned transactions to outbox operations. Operation keys start with Group, so they are unique to this plan. Returns list of operations
+    def operations(self, group):
+        ops = []
+        for key, target in self.targets.items():
+            prefix = group + '/' + '/'.join(str(k) for k in key)
+            deps = [self.targetOps[k][-1] for k in target.after]
+            fields = dict(target.fields)
+            path = f'/transactions/{target.transId}'
+            idFrom = None
+            opKeys = []
+            if target.transId is None:
+                opKeys.append(prefix + '/create')
+                createFields = dict(target.createFields, needs_review=False) if target.confirm else target.createFields
+                ops.append({'key': opKeys[-1], 'method': 'POST', 'path': f'/transaction_accounts/{target.accountId}/transactions', 'payload': createFields, 'expected': [201], 'deps': deps})
+                fields = {k: v for k, v in fields.items() if createFields.get(k) != v}       # Only fields changed since creation
+                idFrom = opKeys[-1]
+                deps = [idFrom]
+                path = '/transactions/{id}'     # Id of created transaction is filled in by the outbox
+            if target.confirm and (fields or target.transId is not None):
+                fields['needs_review'] = False
+            if fields:
+                opKeys.append(prefix + '/update')
+                ops.append({'key': opKeys[-1], 'method': 'PUT', 'path': path, 'payload': fields, 'expected': [200], 'deps': deps, 'idFrom': idFrom})
+            if target.confirm:
+                # Only sent if the response of the previous call still shows needs_review
+                ops.append({'key': prefix + '/confirm', 'method': 'PUT', 'path': '/transactions/{id}', 'payload': {'needs_review': False}, 'expected': [200],
+                            'deps': [opKeys[-1]], 'idFrom': opKeys[-1], 'condition': 'needs_review'})
+                opKeys.append(prefix + '/confirm')
+            self.targetOps[key] = opKeys
+        return ops
+
+    # Count calls made and calls the same changes took without planning, from outbox operation states
+    def countCalls(self, Ops):
+        self.calls = sum(Ops[k]['attempts'] for opKeys in self.targetOps.values() for k in opKeys)
+        self.naiveCalls = sum(target.naiveCalls for key, target in self.targets.items() if Ops[self.targetOps[key][0]]['attempts'])
+
+    # Status of a planned transaction: outbox state of its first not done operation, or done. Also returns error message of that operation and result of last operation
+    def targetState(self, key, Ops):
+        import MyOutbox
+        for k in self.targetOps[key]:
+            if Ops[k]['status'] not in (MyOutbox.DONE, MyOutbox.SKIPPED):
+                return Ops[k]['status'], Ops[k]['lastError'], None
+        return MyOutbox.DONE, None, Ops[self.targetOps[key][-1]]['result']
+
+
+# Function to convert GUI panel values to transaction fields for the API
+def TransactionFields(GuiPanelValues):
+    return {
+        'payee'         : GuiPanelValues[wf.PAYEE_NAME],
+        'amount'        : '%.2f' % float(GuiPanelValues[wf.AMOUNT].replace(',','')),           # float() doesn't take comma separators, so removing them before converting to float. We added , separator to show on the GUI
+        'category_id'   : categoryIdLookup[GuiPanelValues[wf.CATEGORY_NAME]],
+        'note'          : GuiPanelValues[wf.NOTE_TEXT]
+    }
+
+# Function to plan API calls needed to approve a transaction from the review panel, including any split transactions.
+#  Entries is a list of (EntryType, GuiPanelValues) tuples: main transaction first, then splits. EntryType is 'No transfer' or 'Transfer'.
+#  Main transaction is updated first. Split transactions are created as new transactions, first with the payee of the main transaction and then updated.
+#  If an account given for TransferTo, a double entry is made: debit transaction on one account, credit on other, with payee 'Transfer : xxx' on both.
+#  Splits and transfer legs only depend on the main transaction update, so they are created in parallel once it succeeded. Returns list of planned transaction keys of each entry
+def PlanApproval(Planner, Transaction, Entries):
+    transId = Transaction['id']
+    entryKeys = []
+    mainKey = None
+    for i, (entryType, transDict) in enumerate(Entries):
+        fields = TransactionFields(transDict)
+        after = [mainKey] if mainKey is not None else []
+        if i == 0:
+            # Main transaction
+            if entryType == 'Transfer':
+                fields['payee'] = 'Transfer : ' + transDict[wf.AC_TO]
+            mainKey = Planner.update((transId, i, 'main'), transId, **fields)
+            Planner.confirm(mainKey)
+            keys = [mainKey]
+            Planner.countNaive(mainKey, 2 if entryType == 'Transfer' else 1)     # Transfer: update, and confirm main again
+        else:
+            # We create new split transaction with 'original_payee' of main trans. This may help with correct clearing of pending transaction. Pocketsmith may use 'original_payee' to group sum to match bank amount. Not sure about this as we haven't verified otherwise
+            key = Planner.create((transId, i, 'split'), accountIdLookup[transDict[wf.AC_FROM]], after=after, date=transDict[wf.TRANSACTION_DATE], **dict(fields, payee=Transaction['payee']))
+            Planner.set(key, payee='Transfer : ' + transDict[wf.AC_TO] if entryType == 'Transfer' else fields['payee'])
+            Planner.confirm(key)
+            keys = [key]
+            Planner.countNaive(key, 2)       # Create, then update
+        if entryType == 'Transfer':
+            # Opposing transaction in TransferTo account, with negated amount
+            legFields = dict(fields, payee='Transfer : ' + transDict[wf.AC_FROM], amount='%.2f' % (float(transDict[wf.AMOUNT].replace(',','')) * -1))
+            key = Planner.create((transId, i, 'transferTo'), accountIdLookup[transDict[wf.AC_TO]], after=[mainKey], date=transDict[wf.TRANSACTION_DATE], **legFields)
+            Planner.confirm(key)
+            keys.append(key)
+            Planner.countNaive(key, 2)       # Create, then clear review
+        entryKeys.append(keys)
+    return entryKeys
+
+# Function to work out status of an approved row from outbox operation states. Returns status message and values of the approved main transaction to save to history
+#  (None if main transaction update failed). Rows with operations waiting to be sent or retried have a 'queued' status
+def ApprovalResult(Planner, Entries, EntryKeys, Ops):
+    import MyOutbox
+    status = 'Transaction posting success'
+    approvedMain = None
+    for i, ((entryType, transDict), keys) in enumerate(zip(Entries, EntryKeys)):
+        states = [Planner.targetState(key, Ops) for key in keys]
+        failed = [error for state, error, res in states if state in (MyOutbox.FAILED, MyOutbox.UNCERTAIN)]
+        if failed:
+            status = f'Transaction posting failed! {failed[0]}'
+            break
+        queued = [error for state, error, res in states if state != MyOutbox.DONE]
+        if queued and 'SUCCESS' in status.upper():
+            status = 'Transaction posting queued' + (f'. Will retry after error: {queued[0]}' if queued[0] else '')
+        if i == 0:
+            # It was noted that sometimes the main transaction repeatedly appear for confirmation even after it was confirmed before.
+            #  To prevent such confirmation repetitions, approved main transactions are saved with their IDs, so they can be auto cleared when they come up again
+            res = states[0][2]
+            approvedMain = dict(transDict)
+            # res is a response data from API call. We get the payee from res in case the payee name was changed to 'Transfer : xxx'. If not sent yet, planned payee is used
+            approvedMain[wf.PAYEE_NAME] = res['payee'] if isinstance(res, dict) else Planner.targets[keys[0]].fields['payee']
+            approvedMain.pop(wf.AC_TO, None)       # We won't need AccountTo info to reconfirm re-appearing transactions for repeated confirmation
+    return status, approvedMain
+
+# Function to plan API calls to post a transaction from the review panel: created, or updated if TransactionId is given. If Need_Review is False, its review flag is cleared.
+#  If an account given for TransferTo, a double entry is made: debit transaction on one account, credit on other. Payee is changed to 'Transfer : xxx' on both, unless
+#  ChangePayeeName is False (payee of a new transaction is kept). The opposing transaction in TransferTo account is created once the first one succeeded, and its review flag is cleared
+#  (always for an update, as for approvals, and if Need_Review is False for a new transaction). Returns list of planned transaction keys: transaction and any TransferTo transaction
+def PlanPosting(Planner, GuiPanelValues, TransactionId=None, Need_Review=True, ChangePayeeName=True):
+    fields = dict(TransactionFields(GuiPanelValues), needs_review=Need_Review)
+    transfer = len(GuiPanelValues[wf.AC_TO]) and GuiPanelValues[wf.AC_TO] != GuiPanelValues[wf.AC_FROM]
+    if transfer and (ChangePayeeName or TransactionId is not None):
+        fields['payee'] = 'Transfer : ' + GuiPanelValues[wf.AC_TO]
+    if TransactionId is not None:
+        key = Planner.update(('post', 'main'), TransactionId, **fields)
+    else:
+        key = Planner.create(('post', 'main'), accountIdLookup[GuiPanelValues[wf.AC_FROM]], date=GuiPanelValues[wf.TRANSACTION_DATE], **fields)
+    if not Need_Review:
+        Planner.confirm(key)
+    keys = [key]
+    if transfer:
+        legFields = dict(fields, payee='Transfer : ' + GuiPanelValues[wf.AC_FROM], amount='%.2f' % (float(GuiPanelValues[wf.AMOUNT].replace(',','')) * -1))     # Negate the amount for Transfer To account
+        keys.append(Planner.create(('post', 'transferTo'), accountIdLookup[GuiPanelValues[wf.AC_TO]], after=[key], date=GuiPanelValues[wf.TRANSACTION_DATE], **legFields))
+        if TransactionId is not None or not Need_Review:
+            Planner.confirm(keys[-1])
+    return keys
+
+# Function to work out result of a posting planned by PlanPosting() from outbox operation states. Returns response data of each planned transaction
+#  ('' if none or not done) and status message
+def PostingResult(Planner, Keys, Ops):
+    import MyOutbox
+    states = [Planner.targetState(key, Ops) for key in Keys]
+    failed = [error for state, error, res in states if state in (MyOutbox.FAILED, MyOutbox.UNCERTAIN)]
+    queued = [error for state, error, res in states if state != MyOutbox.DONE]
+    if failed:
+        msg = f'Transaction posting failed! {failed[0]}'
+    elif queued:
+        msg = 'Transaction posting queued' + (f'. Will retry after error: {queued[0]}' if queued[0] else '')
+    else:
+        msg = 'Transaction posting success'
+    res1, res2 = [res if isinstance(res, dict) else '' for state, error, res in states] + [''] * (2 - len(states))
+    return res1, res2, msg
+
+# Function to approve a batch of transactions from the review panel. Batch is a list of (Transaction, Entries) tuples, see PlanApproval().
+#  Changes of all rows are planned together and all planned calls are saved to the outbox before any is sent. If Wait is True, calls are sent straight away,
+#  independent rows and splits in parallel, at most MaxConcurrent calls at a time. Otherwise they are sent by the outbox in background and rows show as queued.
+#  Calls failing with temporary errors are retried by the outbox in background. Final result of queued rows is given by CheckQueuedApprovals(). Returns dictionary of transaction id -> (status message, approved main transaction values)
+def ApproveTransactions(Batch, MaxConcurrent=MAX_CONCURRENT_APPROVALS, Wait=True):
+    planner = OperationPlanner()
+    rowKeys = [PlanApproval(planner, transaction, entries) for transaction, entries in Batch]
+    group = 'approve-' + uuid.uuid4().hex
+    outbox = GetOutbox()
+    outbox.enqueue(planner.operations(group), group, claim=Wait)
+    if Wait:
+        outbox.dispatch(group, MaxConcurrent)
+    ops = {op['key']: op for op in outbox.list(group=group)}
+    if Wait:
+        planner.countCalls(ops)
+        print(f'Approval API calls: {planner.calls} made, {planner.callsSaved()} saved by merging updates')
+    results = {transaction['id']: ApprovalResult(planner, entries, keys, ops) for (transaction, entries), keys in zip(Batch, rowKeys)}
+    with queuedApprovalsLock:
+        for (transaction, entries), keys in zip(Batch, rowKeys):
+            if 'QUEUED' in results[transaction['id']][0].upper():
+                queuedApprovals[transaction['id']] = (planner, entries, keys, group)
+    return results
+
+# Function to check approvals that were queued in the outbox by ApproveTransactions(), eg. with Wait=False or after a temporary error. Returns dictionary of
+#  transaction id -> (status message, approved main transaction values) of approvals that finished since the last check: all calls done, or failed or uncertain.
+#  Approvals still waiting to be sent or retried are left for the next check
+def CheckQueuedApprovals():
+    with queuedApprovalsLock:
+        queued = dict(queuedApprovals)
+    finished = {}
+    groupOps = {}       # Outbox group -> operations, so a batch is listed once
+    for transId, (planner, entries, keys, group) in queued.items():
+        if group not in groupOps:
+            groupOps[group] = {op['key']: op for op in GetOutbox().list(group=group)}
+        status, approvedMain = ApprovalResult(planner, entries, keys, groupOps[group])
+        if 'QUEUED' not in status.upper():
+            finished[transId] = (status, approvedMain)
+    with queuedApprovalsLock:
+        for transId in finished:
+            queuedApprovals.pop(transId, None)
+    return finished
+
+# Function to get ids of transactions whose approval calls are still in the outbox, eg. approved with Wait=False and not sent yet or waiting for a retry.
+#  Pocketsmith lists them as needing review until all calls of their approval are done
+def ApprovalsInFlight():
+    import MyOutbox
+    outbox = GetOutbox()
+    groups = {op['grp'] for status in (MyOutbox.PENDING, MyOutbox.SENDING) for op in outbox.list(status=status) if (op['grp'] or '').startswith('approve-')}
+    ids = set()
+    for group in groups:
+        for op in outbox.list(group=group):
+            transId = op['path'].rsplit('/', 1)[-1]
+            if op['path'].startswith('/transactions/') and transId.isdigit():     # Updates of approved transactions. Created splits have no id in path
+                ids.add(int(transId))
+    return ids
+
+# Function to approve a transaction from the review panel, including any split transactions. See ApproveTransactions()
+#  Returns status message and values of the approved main transaction to save to history (None if main transaction update failed)
+def ApproveTransaction(Transaction, Entries, Wait=True):
+    return ApproveTransactions([(Transaction, Entries)], Wait=Wait)[Transaction['id']]
+
+
+# Function to check statement rows can be posted: account and any transfer account must exist, and category must be found. Error of a row that can't be posted
+#  is set on the row. Returns rows without errors
+def CheckImportRows(Rows):
+    for row in Rows:
+        if row.error is not None:
+            continue
+        if row.account not in accountIdLookup:
+            row.error = f'Unknown account {row.account}' if row.account else 'No account'
+        elif row.transferTo and row.transferTo not in accountIdLookup:
+            row.error = f'Unknown transfer account {row.transferTo}'
+        elif row.category and GetCategoryTree().find(row.category) is None:
+            matches = GetCategoryTree().matches(row.category)
+            row.error = f'Category {row.category} ' + (f'is ambiguous, use one of: {", ".join(n.path for n in matches)}' if matches else 'not found')
+        elif not row.payee:
+            row.error = 'No payee'
+    return [row for row in Rows if row.error is None]
+
+# Generator of duplicate keys (see MyImport.DuplicateKey()) of transactions in Pocketsmith, in the accounts and date range of statement rows.
+#  Transactions created by an earlier import that are still waiting in the outbox are included, so importing a file again doesn't post them twice
+def ExistingImportKeys(Rows):
+    import MyImport
+    import MyOutbox
+    if not Rows:
+        return
+    accounts = {row.account for row in Rows} | {row.transferTo for row in Rows if row.transferTo}
+    for t in IterUserTransactions(min(row.date for row in Rows), max(row.date for row in Rows)):
+        if t['transaction_account']['name'] in accounts:
+            yield MyImport.DuplicateKey(t['transaction_account']['name'], t['date'], t['amount'])
+    accountNames = {accountId: name for name, accountId in accountIdLookup.items()}
+    for status in (MyOutbox.PENDING, MyOutbox.SENDING, MyOutbox.UNCERTAIN):
+        for op in GetOutbox().list(status=status):
+            if (op['grp'] or '').startswith('import-') and op['method'] == 'POST':
+                yield MyImport.DuplicateKey(accountNames.get(int(op['path'].split('/')[2])), op['payload']['date'], op['payload']['amount'])
+
+# Function to post statement rows (see MyImport.py) checked by CheckImportRows(). Rows with a transfer account get a double entry, same as PlanPosting():
+#  payee 'Transfer : xxx' on both sides and negated amount on the transfer account. All calls are saved to the outbox before any is sent, then sent in parallel,
+#  at most MaxConcurrent at a time. Transactions come up for review unless NeedsReview is False, in which case their review flag is cleared after creation.
+#  Progress is called with (finished calls, all calls) as calls finish, from sending threads. Calls failing with temporary errors are retried by the outbox in background.
+#  Returns dictionary of row line -> status message
+def ImportTransactions(Rows, NeedsReview=True, MaxConcurrent=MAX_CONCURRENT_IMPORTS, Progress=None):
+    import MyOutbox
+    planner = OperationPlanner()
+    rowKeys = []
+    for row in Rows:
+        fields = {'payee': row.payee, 'amount': '%.2f' % row.amount, 'date': row.date, 'note': row.note or '', 'needs_review': NeedsReview}
+        categoryId = GetCategoryTree().find(row.category) if row.category else None
+        if categoryId is not None:
+            fields['category_id'] = categoryId
+        keys = []
+        if row.transferTo and row.transferTo != row.account:
+            keys.append(planner.create((row.line, 'main'), accountIdLookup[row.account], **dict(fields, payee='Transfer : ' + row.transferTo)))
+            keys.append(planner.create((row.line, 'transferTo'), accountIdLookup[row.transferTo], **dict(fields, payee='Transfer : ' + row.account, amount='%.2f' % -row.amount)))
+        else:
+            keys.append(planner.create((row.line, 'main'), accountIdLookup[row.account], **fields))
+        if not NeedsReview:
+            for key in keys:
+                planner.confirm(key)
+        rowKeys.append(keys)
+
+    group = 'import-' + uuid.uuid4().hex
+    outbox = GetOutbox()
+    operations = planner.operations(group)
+    outbox.enqueue(operations, group, claim=True)
+    finished = [0]
+    finishedLock = threading.Lock()
+
+    def OnSent(Key):
+        with finishedLock:
+            finished[0] += 1
+            count = finished[0]
+        if Progress is not None:
+            Progress(count, len(operations))
+
+    outbox.dispatch(group, MaxConcurrent, OnSent)
+    ops = {op['key']: op for op in outbox.list(group=group)}
+    results = {}
+    created = []
+    for row, keys in zip(Rows, rowKeys):
+        states = [planner.targetState(key, ops) for key in keys]
+        failed = [error for state, error, res in states if state in (MyOutbox.FAILED, MyOutbox.UNCERTAIN)]
+        queued = [error for state, error, res in states if state not in (MyOutbox.DONE, MyOutbox.FAILED, MyOutbox.UNCERTAIN)]
+        if failed:
+            results[row.line] = f'Transaction posting failed! {failed[0]}'
+        elif queued:
+            results[row.line] = 'Transaction posting queued' + (f'. Will retry after error: {queued[0]}' if queued[0] else '')
+        else:
+            results[row.line] = 'Transaction posting success'
+        created.extend(res for state, error, res in states if state == MyOutbox.DONE and isinstance(res, dict) and 'transaction_account' in res)
+    if created:
+        GetTransactionStore().upsert(created)       # Keep local store and payee suggestions in step without waiting for next sync
+        if payeeIndex is not None:
+            payeeIndex.addTransactions(created)
+    return results
+
+
+# Function to work out number of pages of a paginated API response, using the Total and Per-Page headers Pocketsmith sends.
+#  Falls back to the page number in the rel="last" Link header. Returns None if page count can't be found
+def GetPageCount(Response):
+    try:
+        total = int(Response.headers['Total'])
+        perPage = int(Response.headers['Per-Page'])
+        return max(1, -(-total // perPage))         # Ceiling division
+    except (KeyError, ValueError, ZeroDivisionError):
+        pass
+    lastUrl = Response.links.get('last', {}).get('url')
+    if lastUrl is not None:
+        lastPage = parse_qs(urlparse(lastUrl).query).get('page')
+        if lastPage:
+            return int(lastPage[0])
+    return None
+
+# Function to download one page of user transactions. Returns the page's transactions and the response object
+def GetTransactionsPage(Url, QueryString, Page):
+    params = dict(QueryString, page=str(Page))
+    response = client.request("GET", Url, params=params)
+    response.raise_for_status()
+    return json.loads(response.text), response
+
+# Function to get all user transactions between StartDate and EndDate (date objects or 'yyyy-mm-dd' strings), following the API pagination.
+#  Result is same as fetching pages one after another, newest transactions first. See IterUserTransactions()
+def FetchUserTransactions(StartDate=None, EndDate=None, **Filters):
+    return list(IterUserTransactions(StartDate, EndDate, **Filters))
+
+# Generator of user transactions between StartDate and EndDate, page by page. First page is fetched to find out page count, then the next pages are fetched
+#  concurrently, at most MAX_CONCURRENT_PAGE_FETCHES pages ahead of the page being read. Transactions are given in page order, and only pages in flight are held
+#  in memory, so any number of transactions can be streamed, eg. to an export file
+def IterUserTransactions(StartDate=None, EndDate=None, **Filters):
+    url = f"/users/{GetUserId()}/transactions"
+    querystring = {'per_page': str(TRANSACTIONS_PER_PAGE)}
+    if StartDate is not None:
+        querystring['start_date'] = str(StartDate)     # str() of date object gives yyyy-mm-dd format expected by the API
+    if EndDate is not None:
+        querystring['end_date'] = str(EndDate)
+    querystring.update({k: str(v) for k, v in Filters.items() if v is not None})   # Any other filters supported by the API, eg. needs_review, updated_since
+
+    transactions, response = GetTransactionsPage(url, querystring, 1)
+    yield from transactions
+    pageCount = GetPageCount(response)
+    if pageCount is None:
+        # No pagination headers. Follow rel="next" links one page at a time
+        page = 1
+        while 'next' in response.links and len(transactions):
+            page += 1
+            transactions, response = GetTransactionsPage(url, querystring, page)
+            yield from transactions
+        return
+
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_PAGE_FETCHES) as executor:
+        inFlight = deque()
+        nextPage = 2
+        try:
+            while nextPage <= pageCount or inFlight:
+                while nextPage <= pageCount and len(inFlight) < MAX_CONCURRENT_PAGE_FETCHES:
+                    inFlight.append(executor.submit(GetTransactionsPage, url, querystring, nextPage))
+                    nextPage += 1
+                yield from inFlight.popleft().result()[0]
+        finally:
+            for future in inFlight:     # Reader stopped early or a page failed. Don't download the rest
+                future.cancel()
+
+# Function to open local transaction store on first use. Store is cleared if it was filled using another API key
+def GetTransactionStore():
+    global transactionStore
+    with transactionStoreLock:
+        if transactionStore is None:
+            transactionStore = TransactionStore()
+            if transactionStore.getState('KeyHash') != apiKeyHash:
+                transactionStore.clear()
+                transactionStore.setState('KeyHash', apiKeyHash)
+    return transactionStore
+
+# Function to bring local transaction store up to date with Pocketsmith. Returns number of transactions downloaded.
+#  A full sync downloads transactions of the last TRANSACTION_FETCH_DAYS days, and drops transactions of those days from the store that are no longer in
+#  Pocketsmith. It's done on first sync, when FullSync is set, and every FULL_SYNC_INTERVAL seconds. Other syncs only download transactions updated since
+#  the last sync, whose needs_review flags also bring the review list up to date. Updated_since doesn't report deleted transactions, so they stay until next full sync
+def SyncTransactions(FullSync=False):
+    store = GetTransactionStore()
+    syncStart = datetime.now(timezone.utc) - timedelta(seconds=SYNC_OVERLAP)      # Small overlap so changes made during the sync or clock differences are not missed
+    lastSync = None if FullSync or IsFullSyncDue(store) else store.getState('LastSync')
+
+    if lastSync is None:
+        endDate = date.today()
+        window = (endDate - timedelta(days=TRANSACTION_FETCH_DAYS), endDate)
+        return ApplySyncResult(store, FetchUserTransactions(*window), syncStart, window)
+    return ApplySyncResult(store, FetchUserTransactions(updated_since=lastSync), syncStart)
+
+# Function to check if a full sync is due, see SyncTransactions()
+def IsFullSyncDue(Store):
+    lastFullSync = Store.getState('LastFullSync')
+    if lastFullSync is None:
+        return True
+    return (datetime.now(timezone.utc) - datetime.strptime(lastFullSync, '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=timezone.utc)).total_seconds() >= FULL_SYNC_INTERVAL
+
+# Function to save downloaded transactions to local store. Window is the (start date, end date) of a full sync, whose transactions are all downloaded:
+#  transactions of the window in store that were not downloaded were deleted in Pocketsmith, and are dropped. Transactions updated after the download
+#  started (eg. just posted and saved to the store) are kept. Returns number of transactions downloaded
+def ApplySyncResult(Store, Transactions, SyncStart, Window=None):
+    syncTime = SyncStart.strftime('%Y-%m-%dT%H:%M:%SZ')
+    if Window is not None:
+        downloadStart = (SyncStart + timedelta(seconds=SYNC_OVERLAP)).strftime('%Y-%m-%dT%H:%M:%SZ')
+        removedIds = Store.getIds(str(Window[0]), str(Window[1]), updatedBefore=downloadStart) - {t['id'] for t in Transactions}
+        if removedIds:
+            Store.delete(removedIds)
+    Store.upsert(Transactions)
+    if payeeIndex is not None:
+        payeeIndex.addTransactions(Transactions)
+    Store.setState('LastSync', syncTime)
+    if Window is not None:
+        Store.setState('LastFullSync', syncTime)
+    return len(Transactions)
+
+# Function to download transactions of a date range into local store, eg. older transactions for reports. Sync only keeps the last TRANSACTION_FETCH_DAYS days
+#  and later changes. Returns number of transactions downloaded
+def DownloadTransactions(StartDate, EndDate):
+    transactions = FetchUserTransactions(StartDate, EndDate)
+    GetTransactionStore().upsert(transactions)
+    if payeeIndex is not None:
+        payeeIndex.addTransactions(transactions)
+    return len(transactions)
+
+# Function to get report rows of transactions in local store. Store is loaded into a columnar table once and reused until it changes (see MyReports.py).
+#  Returns column headings, rows and number of transactions in the store. Requires numpy, which is only imported here, so it's not needed for anything else
+def GetReport(Name, StartDate=None, EndDate=None, Account=None):
+    import MyReports
+    categoryTree = GetCategoryTree()
+    table = MyReports.LoadTable(GetTransactionStore(), categoryTree.displayName, categoryTree.version)
+    headings, rows = MyReports.RunReport(table, Name, StartDate, EndDate, Account)
+    return headings, rows, table.count
+
+# Get all transactions for user between StartDate and EndDate. By default, transactions of the last TRANSACTION_FETCH_DAYS days are listed.
+#  Local store is synced first, so only changed transactions are downloaded. Transactions are then read from the local store
+def GetUserTransactions(StartDate=None, EndDate=None):
     # Get latest transactions
-    url = f"https://api.pocketsmith.com/v2/users/{GetUserId()}/transactions"
-    querystring = {"page": "1"}                                                         # FIXME - update code to get last 1month transactions, not just 1 page
-    transactions = json.loads(requests.request("GET", url, headers=headers, params=querystring).text)
+    print(f'Synced transactions: {SyncTransactions()} downloaded')
+    return ListUserTransactions(StartDate, EndDate)
+
+# Function to get transactions between StartDate and EndDate from local store without syncing, and auto clear re-appearing approved transactions. See GetUserTransactions()
+def ListUserTransactions(StartDate=None, EndDate=None):
+    if EndDate is None:
+        EndDate = date.today()
+    if StartDate is None:
+        StartDate = EndDate - timedelta(days=TRANSACTION_FETCH_DAYS)
+    store = GetTransactionStore()
+    transactions = store.getTransactions(StartDate, EndDate)
+    unconfirmedTrans = GetPendingReviewList(store)
+    PrintTransactions(transactions, StartDate, EndDate)
+
+    cleared, pending = CheckNewTransactionsForReapproval(unconfirmedTrans)
+    return pending, transactions
+
+
+# Function to get unconfirmed transactions from local store, with the fields shown on review grid
+def GetPendingReviewList(Store):
+    categoryTree = GetCategoryTree()
     unconfirmedTrans = []
-    for i in transactions:
-        if i['needs_review'] == True:       # Only collect unconfirmed transactions
-            t = {}
-            t['id'] = i['id']
-            t['date'] = i['date']
-            t['amount'] = i['amount']
-            t['payee'] = i['payee']
-            t['note'] = i['note']
-            if i['category'] == None:       # Uncategorised transaction
-                t['category'] = '<< Uncategorised >>'
-            else:
-                t['category'] = i['category']['title']
-            t['account'] = i['transaction_account']['name']
-            unconfirmedTrans.append(t)
-    # if len(unconfirmedTrans) == 0:
-    #     print('There are no new transactions to review')
-    print('Recent 30 transactions:')
-    for i in transactions:
-        # Pad spaces information to vertically align them
-        upSource = i['upload_source'] + ' ' * (9 - len(i['upload_source']))
-        status = i['status'] + ' ' * (7 - len(i['status']))
-        amt = '${:>11}'.format('{:,.2f}'.format(i['amount']))          # Currency formatting with right justification. Ref: https://stackoverflow.com/a/42658877
-        PAYEE_LEN_MAX = 40
-        payee = (i['payee'] + ' ' * (PAYEE_LEN_MAX - len(i['payee']))) if len(i['payee']) < PAYEE_LEN_MAX else i['payee'][:PAYEE_LEN_MAX]
-        NOTE_LEN_MAX = 40
-        note = (' ' * NOTE_LEN_MAX) if i['note'] is None else (i['note'] + ' ' * (NOTE_LEN_MAX - len(i['note']))) if len(i['note']) < NOTE_LEN_MAX else i['note'][:NOTE_LEN_MAX]
-        print(f" {i['id']} | {'  New   ' if i['needs_review'] else 'Approved'} | {i['date']} | {upSource} | {status} | {amt} | {payee} | {note} |")
-
-    return CheckNewTransactionsForReapproval(unconfirmedTrans), transactions
-
-
-# Function to check new transactions come up for approval were previously approved or not. If approved, and data did not change, auto clear them
+    for i in Store.getPending():        # Only collect unconfirmed transactions
+        t = {}
+        t['id'] = i['id']
+        t['date'] = i['date']
+        t['amount'] = i['amount']
+        t['payee'] = i['payee']
+        t['note'] = i['note']
+        if i['category'] == None:       # Uncategorised transaction
+            t['category'] = '<< Uncategorised >>'
+        else:
+            t['category'] = categoryTree.displayName(i['category']['id']) or i['category']['title']     # Path is shown if another category has the same title
+        t['account'] = i['transaction_account']['name']
+        unconfirmedTrans.append(t)
+    return unconfirmedTrans
+
+# Function to print list of transactions to console. Fields are padded and cut with format specs to vertically align them, and all lines are printed
+#  with one print() call, as each print from GUI goes through a window event
+def PrintTransactions(Transactions, StartDate, EndDate):
+    lines = [f'Transactions from {StartDate} to {EndDate}: {len(Transactions)}']
+    for i in Transactions:
+        amt = f"{i['amount']:,.2f}"
+        lines.append(f" {i['id']} | {'  New   ' if i['needs_review'] else 'Approved'} | {i['date']} | {i['upload_source']:<9} | {i['status']:<7} | ${amt:>11} | {i['payee']:<40.40} | {i['note'] or '':<40.40} |")
+    print('\n'.join(lines))
+
+
+# Function to find unconfirmed transactions that were approved before and did not change since. Each transaction is looked up by id in approval history,
+#  so history is not copied. Returns list of (transaction, approved history data) tuples
+def MatchReapprovalCandidates(UnconfirmedTrans):
+    history = GetApprovalHistory()      # Approved transaction history. Keys are transaction ids of string type
+    candidates = []
+    for val in UnconfirmedTrans:
+        approved = history.get(str(val['id']))
+        if approved is None:
+            continue
+        # If transaction ID match, compare account, category and amount too. If they match the transaction can be auto cleared
+        try:
+            amountMatch = ut.IsFloatValueZero(val['amount'] - float(approved[wf.AMOUNT].replace(',','')))      # float() doesn't take comma separators, so removing them before converting to float
+        except (KeyError, AttributeError, ValueError):
+            continue        # Damaged history entry
+        if amountMatch and val['category'] == approved.get(wf.CATEGORY_NAME) and val['account'] == approved.get(wf.AC_FROM):
+            candidates.append((val, approved))
+    return candidates
+
+# Function to auto clear re-approval candidates. Confirmations are sent in parallel, at most MaxConcurrent at a time and AUTO_CLEAR_RATE_LIMIT calls per second.
+#  Payee, category and note of the approved transaction are restored. Returns list of cleared transaction ids
+def AutoClearTransactions(Candidates, MaxConcurrent=MAX_CONCURRENT_AUTO_CLEARS):
+    limiter = RateLimiter(AUTO_CLEAR_RATE_LIMIT)
+
+    def AutoClear(Candidate):
+        val, approved = Candidate
+        limiter.wait()
+        return ConfirmTransactionWithPayee(val['id'], approved[wf.PAYEE_NAME], approved.get(wf.CATEGORY_NAME), approved.get(wf.NOTE_TEXT))
+
+    clearedIds = []
+    clearedTrans = []
+    with ThreadPoolExecutor(max_workers=max(1, MaxConcurrent)) as executor:
+        futures = {executor.submit(AutoClear, c): c for c in Candidates}
+        for future in as_completed(futures):
+            try:
+                res, status = future.result()
+            except Exception as ex:     # eg. connection error. Transaction stays in review list
+                res, status = '', f'Transaction confirmation failed! {ex}'
+            ReportAutoClear(futures[future], res, status, clearedIds, clearedTrans)
+    if clearedTrans:
+        GetTransactionStore().upsert(clearedTrans)      # Keep local store in step, so cleared transactions don't show as pending until next sync
+    return clearedIds
+
+# Function to print result of auto clearing a re-approval candidate. Ids and response data of cleared transactions are added to ClearedIds and ClearedTrans
+def ReportAutoClear(Candidate, Res, Status, ClearedIds, ClearedTrans):
+    val, approved = Candidate
+    print('\nTransaction:')
+    print(f"  --> {approved.get(wf.TRANSACTION_DATE)} | {approved.get(wf.AC_FROM)} | {approved.get(wf.AMOUNT)} | {approved.get(wf.CATEGORY_NAME)} | {val['payee']}")
+    if 'SUCCESS' in Status.upper():
+        print(' had come up for re-approval and successfully auto cleared.\n')
+        ClearedIds.append(val['id'])
+        if isinstance(Res, dict) and 'id' in Res:
+            ClearedTrans.append(Res)
+    else:
+        print(f' auto clearing failed! {Status}\n')
+
+# Function to sync local store and auto clear pending transactions that were approved before, without listing all transactions. Returns (cleared, pending) lists
+def SyncAndAutoClear(FullSync=False):
+    print(f'Synced transactions: {SyncTransactions(FullSync)} downloaded')
+    return CheckNewTransactionsForReapproval(GetPendingReviewList(GetTransactionStore()))
+
+# Function to check new transactions come up for approval were previously approved or not. If approved, and data did not change, auto clear them.
+#  Returns (cleared, pending) lists of transactions. Order of the input list is kept in both
 def CheckNewTransactionsForReapproval(UnconfirmedTrans):
-    reapprovalCheck = False
-    ApprovedTransDict = LoadApprovedTransactions()      # Load approved transactions from json history. Note, when data is read back from json, keys will be of string type. So we use str() to convert int keys when looking up data in ApprovedTransDict
-
-    for idx, val in enumerate(UnconfirmedTrans):
-        if str(val['id']) in ApprovedTransDict:
-            # If transaction ID match, compare account, category and amount too. If they match auto clear the transaction
-            if val['category'] == ApprovedTransDict[str(val['id'])][wf.CATEGORY_NAME] and \
-                    val['account'] == ApprovedTransDict[str(val['id'])][wf.AC_FROM] and \
-                    ut.IsFloatValueZero(val['amount'] - float(ApprovedTransDict[str(val['id'])][wf.AMOUNT].replace(',',''))):      # float() doesn't take comma separators, so removing them before converting to float
-
-                res, status = ConfirmTransactionWithPayee(val['id'], ApprovedTransDict[str(val['id'])][wf.PAYEE_NAME])       #FIXME also recopy Category and Note
-                reapprovalCheck = True
-                print('\nTransaction:')
-                print(f"  --> {ApprovedTransDict[str(val['id'])][wf.TRANSACTION_DATE]} | {ApprovedTransDict[str(val['id'])][wf.AC_FROM]} | {ApprovedTransDict[str(val['id'])][wf.AMOUNT]} | {ApprovedTransDict[str(val['id'])][wf.CATEGORY_NAME]} | {val['payee']}")
-                if 'SUCCESS' in status.upper():
-                    print(' had come up for re-approval and successfully auto cleared.\n')
-                    UnconfirmedTrans.pop(idx)       # Remove it from unconfirmed transaction list
-                else:
-                    print(' auto clearing failed!\n')
+    candidates = MatchReapprovalCandidates(UnconfirmedTrans)
+    return SplitCleared(UnconfirmedTrans, AutoClearTransactions(candidates) if candidates else [])
 
-    if not reapprovalCheck:
+# Function to split transactions into (cleared, pending) lists by ids of auto cleared transactions. Order of the input list is kept in both
+def SplitCleared(UnconfirmedTrans, ClearedIds):
+    clearedIds = set(ClearedIds)
+    cleared = [t for t in UnconfirmedTrans if t['id'] in clearedIds]
+    pending = [t for t in UnconfirmedTrans if t['id'] not in clearedIds]
+    if not cleared:
         print('\n - No transactions were auto cleared.\n')
-    return UnconfirmedTrans
+    return cleared, pending
 
 
 # Function to delete a transaction using ID. Or any test transactions
@@ -360,47 +992,136 @@ def DeleteAccountTransaction(GuiPanelValues):
         if 'TEST TRANS' in transactionId.upper():
             x, transactions = GetUserTransactions()
             print('---------------------------------------------')
-            n = 0
-            for i in transactions:
-                if i['note'] is not None:
-                    if 'TEST TRANS' in i['note'].upper():
-                        url = f"https://api.pocketsmith.com/v2/transactions/{i['id']}"
-                        response = requests.request("DELETE", url, headers=post_headers)
-                        if str(response) == '<Response [204]>':
-                            print('Deleted transaction:')
-                            print(f"  {i['id']} | {i['date']} | {i['amount']} | {i['transaction_account']['name']} | {i['payee']} | {i['note']}")
-                            n += 1
-                        else:
-                            print(f"Transaction {i['id']} deletion failed!  -> {response}")
-            print(f'--- # of deleted transactions: {n} ---')
+            testTrans = FindTestTransactions(transactions)
+            results = DeleteTransactions([i['id'] for i in testTrans])
+            for i in testTrans:
+                if results[i['id']] is None:
+                    print('Deleted transaction:')
+                    print(f"  {i['id']} | {i['date']} | {i['amount']} | {i['transaction_account']['name']} | {i['payee']} | {i['note']}")
+                else:
+                    print(f"Transaction {i['id']} deletion failed!  -> {results[i['id']]}")
+            print(f'--- # of deleted transactions: {sum(error is None for error in results.values())} ---')
     else:
         # Individual transaction delete using transaction ID number
-        url =f'https://api.pocketsmith.com/v2/transactions/{transactionId}'
-        response =  requests.request("DELETE", url, headers=post_headers)
+        url =f'/transactions/{transactionId}'
+        response = GetOutbox().call("DELETE", url)
         if str(response) == '<Response [204]>':
+            GetTransactionStore().delete([transactionId])
             print(f'Transaction {transactionId} successfully deleted')
         else:
             print(f'Transaction {transactionId} deletion failed!  -> {response}')
 
+# Function to find test transactions created for script testing, ie. transactions with "Test Trans" keyword in their Note field
+def FindTestTransactions(Transactions):
+    return [i for i in Transactions if i['note'] is not None and 'TEST TRANS' in i['note'].upper()]
 
-# Function to get approved transaction from history file
-def LoadApprovedTransactions():
-    try:  # If file exist, load data from file, otherwise start with a new history file
-        with open(approvedTransFile, 'r') as fp:
-            approvedTrans = json.load(fp)
-    except:
-        approvedTrans = {}      # If json does not exist, start with an empty dictionary
-    return approvedTrans
+# Function to delete a list of transactions. Deletes are saved to the outbox as one batch and sent in parallel, at most MaxConcurrent at a time.
+#  Transactions already deleted in Pocketsmith count as deleted. Returns dictionary of transaction id -> None if deleted, or error message
+def DeleteTransactions(TransIds, MaxConcurrent=MAX_CONCURRENT_APPROVALS):
+    import MyOutbox
+    group = 'delete-' + uuid.uuid4().hex
+    outbox = GetOutbox()
+    outbox.enqueue([{'key': f'{group}/{transId}', 'method': 'DELETE', 'path': f'/transactions/{transId}', 'expected': [204]} for transId in TransIds], group, claim=True)
+    outbox.dispatch(group, MaxConcurrent)
+    ops = {op['key']: op for op in outbox.list(group=group)}
+    results = {}
+    for transId in TransIds:
+        op = ops[f'{group}/{transId}']
+        results[transId] = None if op['status'] == MyOutbox.DONE else (f"Queued. Will retry after error: {op['lastError']}" if op['status'] == MyOutbox.PENDING else op['lastError'])
+    GetTransactionStore().delete([transId for transId, error in results.items() if error is None])
+    return results
+
+
+# Function to create category tree on first use. Categories are added by LoadCategories()
+def GetCategoryTree():
+    global categoryTree
+    from MyCategoryTree import CategoryTree
+    with categoryTreeLock:
+        if categoryTree is None:
+            categoryTree = CategoryTree()
+    return categoryTree
 
-# Function to save approved transaction data to JSON file
-def SaveApprovedTransaction(ApprovedTransDict):
-    # Parse through the transaction dictionary and delete data that are older than APPROVED_TRANS_HISTORY_DURATION days
-    removeKeyList = [k for k,v in ApprovedTransDict.items() if (datetime.now() - ut.StrToDate(v[wf.TRANSACTION_DATE])).days > APPROVED_TRANS_HISTORY_DURATION]
-    for k in removeKeyList: del ApprovedTransDict[k]
+# Function to create API call telemetry on first use and record calls of the shared client to it. See MyTelemetry.py
+def GetTelemetry():
+    global telemetry
+    import MyTelemetry
+    with telemetryLock:
+        if telemetry is None:
+            telemetry = MyTelemetry.Telemetry()
+            client.telemetry = telemetry
+    return telemetry
 
-    # Save to file
+# Function to open approved transaction history on first use. Older json history file is imported if found, and background compaction is started
+def GetApprovalHistory():
+    global approvalHistory
+    with approvalHistoryLock:
+        if approvalHistory is None:
+            approvalHistory = ApprovalHistory(approvedTransFile, APPROVED_TRANS_HISTORY_DURATION, wf.TRANSACTION_DATE)
+            approvalHistory.importLegacyFile(legacyApprovedTransFile)
+            approvalHistory.startCompactor()
+    return approvalHistory
+
+# Function to open outbox on first use and start replaying changes that were not sent yet, eg. from before a restart
+def GetOutbox():
+    global outbox
+    import MyOutbox
+    with outboxLock:
+        if outbox is None:
+            outbox = MyOutbox.Outbox(client, outboxFile)
+            waiting = {k: v for k, v in outbox.summary().items() if k in (MyOutbox.PENDING, MyOutbox.UNCERTAIN, MyOutbox.FAILED)}
+            if waiting:
+                print(f'Outbox: changes not sent yet {waiting}')
+            outbox.purge()
+            outbox.startReplayer()
+    return outbox
+
+# Function to get compiled payee rules. Rules file is re-read when it's changed, so rules can be edited while the script is running.
+#  If the file has an invalid rule, the error is printed and previously loaded rules are kept
+def GetPayeeRules():
+    global payeeRules
+    global payeeRulesMtime
+    import MyPayeeRules
+    with payeeRulesLock:
+        try:
+            mtime = os.path.getmtime(MyPayeeRules.payeeRulesFile)
+        except OSError:
+            mtime = None
+        if payeeRules is None or mtime != payeeRulesMtime:
+            payeeRulesMtime = mtime
+            try:
+                payeeRules = MyPayeeRules.LoadPayeeRules()
+            except MyPayeeRules.RuleError as ex:
+                print(f'Payee rules not loaded! {ex}')
+                if payeeRules is None:
+                    payeeRules = MyPayeeRules.PayeeRules([])        # No rules until the file is fixed
+    return payeeRules
+
+# Function to build payee autocomplete index on first use, from payees of local transaction store and approval history
+def GetPayeeIndex():
+    global payeeIndex
+    from MyPayeeIndex import PayeeIndex
+    with payeeIndexLock:
+        if payeeIndex is None:
+            index = PayeeIndex()
+            index.addTransactions(GetTransactionStore().getTransactions())
+            index.addHistory(GetApprovalHistory().fieldValues(wf.PAYEE_NAME))
+            payeeIndex = index
+    return payeeIndex
+
+# Function to get payee suggestions for typed text. Returns no suggestions until the index is built, so typing never waits for it
+def PayeeSuggestions(Text):
+    return payeeIndex.suggest(Text) if payeeIndex is not None else []
+
+# Function to load approved transaction history file into memory, eg. at startup. History is cached in memory and only re-read if the file was changed by
+#  another program. Look up entries with GetApprovalHistory().get(). Returns number of approved transactions in history
+def LoadApprovedTransactions():
+    return GetApprovalHistory().load()
+
+# Function to save an approved transaction to history file. Only the new entry is appended to the file. Old entries are removed by background compaction
+def SaveApprovedTransaction(TransactionId, TransDict):
     try:
-        with open(approvedTransFile, 'w') as fp:
-            json.dump(ApprovedTransDict, fp, indent=4)  # Creating json with indentation. Ref: https://stackoverflow.com/a/12309296
-    except:
+        GetApprovalHistory().append(TransactionId, TransDict)
+        if payeeIndex is not None:
+            payeeIndex.addHistory({TransactionId: TransDict.get(wf.PAYEE_NAME)})
+    except OSError:
         print(f'Error opening file {approvedTransFile} for update. Approved transaction not saved to history file!')
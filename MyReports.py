@@ -0,0 +1,178 @@
+# Reporting engine
+#  Transactions in local store are loaded into a columnar table, one numpy array per field. Text fields (account, category, payee) are stored as integer codes
+#  into a list of names, so totals of every group are worked out with one np.bincount() call over the amounts instead of a Python loop over transactions.
+#  Table is loaded once and reused until the store changes. Reports are worked out on the rows of a date range (and account) picked with a boolean mask.
+#  Account balances use Pocketsmith closing balances where transactions have them, otherwise they are net amounts since the first transaction in local store.
+#  Requires package numpy. Repository link: https://github.com/gandos21/PocketSmith
+import threading
+import numpy as np
+
+#### Configs ####
+TOP_PAYEE_COUNT = 20                        # Number of payees in Top payees report
+UNCATEGORISED   = '<< Uncategorised >>'     # Category name of transactions without a category. Same as shown on review grid
+#### End Configs ####
+
+REPORTS = ('Category totals', 'Account totals', 'Monthly totals', 'Account balances by month', 'Top payees')
+
+tableCache = None           # Last loaded TransactionTable. Reused while store and category tree versions are the same
+tableCacheLock = threading.Lock()
+
+
+# Function to encode values as integer codes. Returns array of codes and list of distinct values, where code is the index into the list
+def Encode(Values):
+    codes = {}
+    return np.fromiter((codes.setdefault(v, len(codes)) for v in Values), dtype=np.int32, count=len(Values)), list(codes)
+
+
+# Columnar table of transactions
+class TransactionTable:
+    # Rows are (id, date, account, amount, category id, category title, payee, closing balance) tuples, in date order (see TransactionStore.getReportColumns()).
+    #  CategoryName is a function giving the name to show for a category id, or None to use category titles. Version is the cache key, see LoadTable()
+    def __init__(self, rows, categoryName=None, version=None):
+        self.version = version
+        self.count = len(rows)
+        ids, dates, accounts, amounts, categoryIds, categoryTitles, payees, closingBalances = zip(*rows) if rows else ((),) * 8
+        self.ids = np.array(ids, dtype=np.int64)
+        self.dates = np.array(dates, dtype='datetime64[D]')
+        self.months = self.dates.astype('datetime64[M]')
+        self.amounts = np.array([a or 0.0 for a in amounts], dtype=np.float64)
+        self.closingBalances = np.array([np.nan if b is None else b for b in closingBalances], dtype=np.float64)
+        self.accountCodes, self.accounts = Encode(accounts)
+        self.payeeCodes, self.payees = Encode([p or '' for p in payees])
+
+        # Categories are coded by id, then named once per id. Ids with the same name (eg. unknown ids falling back to title) are merged into one code
+        idCodes, distinctIds = Encode([(i, t) for i, t in zip(categoryIds, categoryTitles)])
+        names = [UNCATEGORISED if i is None else (categoryName(i) if categoryName is not None else None) or t for i, t in distinctIds]
+        nameCodes, self.categories = Encode(names)
+        self.categoryCodes = nameCodes[idCodes] if self.count else idCodes
+
+    # Boolean mask of transactions between StartDate and EndDate (date objects or 'yyyy-mm-dd', inclusive), and of Account if given
+    def mask(self, startDate=None, endDate=None, account=None):
+        selected = np.ones(self.count, dtype=bool)
+        if startDate is not None:
+            selected &= self.dates >= np.datetime64(str(startDate), 'D')
+        if endDate is not None:
+            selected &= self.dates <= np.datetime64(str(endDate), 'D')
+        if account is not None:
+            code = self.accounts.index(account) if account in self.accounts else -1
+            selected &= self.accountCodes == code
+        return selected
+
+    # Running balance of each account after each transaction, in table order. Net amounts are summed per account, and moved to match the latest closing balance
+    #  reported by Pocketsmith for that account, if any
+    def runningBalances(self):
+        order = np.argsort(self.accountCodes, kind='stable')       # Stable sort keeps date order within each account
+        amounts = self.amounts[order]
+        sums = np.cumsum(amounts)
+        isStart = np.r_[True, self.accountCodes[order][1:] != self.accountCodes[order][:-1]] if self.count else np.zeros(0, dtype=bool)
+        starts = np.flatnonzero(isStart)
+        group = np.cumsum(isStart) - 1
+        running = np.empty(self.count)
+        running[order] = sums - (sums[starts] - amounts[starts])[group]       # Take off sum of earlier accounts' amounts
+
+        offsets = np.zeros(len(self.accounts))
+        known = np.flatnonzero(~np.isnan(self.closingBalances))
+        if len(known):
+            lastKnown = np.full(len(self.accounts), -1)
+            np.maximum.at(lastKnown, self.accountCodes[known], known)      # Latest transaction with a closing balance in each account
+            hasKnown = lastKnown >= 0
+            offsets[hasKnown] = self.closingBalances[lastKnown[hasKnown]] - running[lastKnown[hasKnown]]
+        return running + offsets[self.accountCodes]
+
+
+# Function to sum amounts per group code. Returns money out (as negative), money in, net and transaction count arrays indexed by code
+def GroupTotals(Codes, Amounts, GroupCount):
+    moneyOut = np.bincount(Codes, weights=np.minimum(Amounts, 0.0), minlength=GroupCount)
+    moneyIn = np.bincount(Codes, weights=np.maximum(Amounts, 0.0), minlength=GroupCount)
+    return moneyOut, moneyIn, moneyOut + moneyIn, np.bincount(Codes, minlength=GroupCount)
+
+# Function to get month index of each month (0 for first month) and list of month names from StartMonth to EndMonth
+def MonthRange(StartMonth, EndMonth):
+    months = np.arange(StartMonth, EndMonth + np.timedelta64(1, 'M'), dtype='datetime64[M]')
+    return months, [str(m) for m in months]
+
+def CategoryTotals(Table, Selected):
+    return NamedTotals(Table.categoryCodes[Selected], Table.amounts[Selected], Table.categories, 'Category')
+
+def AccountTotals(Table, Selected):
+    return NamedTotals(Table.accountCodes[Selected], Table.amounts[Selected], Table.accounts, 'Account')
+
+# Function to get totals per name, biggest spend first, with a total row
+def NamedTotals(Codes, Amounts, Names, Heading):
+    moneyOut, moneyIn, net, count = GroupTotals(Codes, Amounts, len(Names))
+    used = np.flatnonzero(count)
+    used = used[np.argsort(net[used], kind='stable')]
+    rows = [[Names[i], moneyOut[i], moneyIn[i], net[i], int(count[i])] for i in used]
+    rows.append(['Total', moneyOut.sum(), moneyIn.sum(), net.sum(), int(count.sum())])
+    return [Heading, 'Out', 'In', 'Net', 'Count'], rows
+
+# Function to get totals per month, with running net amount from first month shown
+def MonthlyTotals(Table, Selected):
+    if not Selected.any():
+        return ['Month', 'Out', 'In', 'Net', 'Running net', 'Count'], []
+    months = Table.months[Selected]
+    monthList, names = MonthRange(months.min(), months.max())
+    moneyOut, moneyIn, net, count = GroupTotals((months - monthList[0]).astype(np.int64), Table.amounts[Selected], len(monthList))
+    running = np.cumsum(net)
+    return ['Month', 'Out', 'In', 'Net', 'Running net', 'Count'], [[names[i], moneyOut[i], moneyIn[i], net[i], running[i], int(count[i])] for i in range(len(names))]
+
+# Function to get balance of each account at the end of each month. Balances include transactions before the date range, so they are real balances,
+#  not just changes within the range. Months without transactions carry the balance over
+def AccountBalancesByMonth(Table, Selected):
+    if not Selected.any():
+        return ['Month'], []
+    accounts = np.unique(Table.accountCodes[Selected])
+    monthList, names = MonthRange(Table.months[Selected].min(), Table.months[Selected].max())
+    upToEnd = Table.dates <= Table.dates[Selected].max()
+    balances = Table.runningBalances()
+    # Last transaction of each account and month, up to end of range. Transactions before the range count towards the first month
+    monthIndex = np.clip((Table.months - monthList[0]).astype(np.int64), 0, None)
+    keys = Table.accountCodes.astype(np.int64) * len(monthList) + monthIndex
+    lastIndex = np.full(len(Table.accounts) * len(monthList), -1)
+    rowsUsed = np.flatnonzero(upToEnd)
+    np.maximum.at(lastIndex, keys[rowsUsed], rowsUsed)
+    lastIndex = lastIndex.reshape(len(Table.accounts), len(monthList))[accounts]
+    carried = np.maximum.accumulate(lastIndex, axis=1)         # Table is in date order, so the latest index so far is the latest transaction so far
+    matrix = np.where(carried >= 0, balances[np.maximum(carried, 0)], 0.0)
+    return ['Month'] + [Table.accounts[a] for a in accounts], [[names[i]] + list(matrix[:, i]) for i in range(len(names))]
+
+# Function to get payees with the most money spent
+def TopPayees(Table, Selected, Count=TOP_PAYEE_COUNT):
+    codes = Table.payeeCodes[Selected]
+    amounts = Table.amounts[Selected]
+    spent = -np.bincount(codes, weights=np.minimum(amounts, 0.0), minlength=len(Table.payees))
+    count = np.bincount(codes, weights=amounts < 0, minlength=len(Table.payees)).astype(np.int64)
+    top = np.flatnonzero(spent > 0)
+    if len(top) > Count:
+        top = top[np.argpartition(-spent[top], Count)[:Count]]
+    top = top[np.argsort(-spent[top], kind='stable')]
+    return ['Payee', 'Spent', 'Count', 'Average'], [[Table.payees[i], spent[i], int(count[i]), spent[i] / count[i]] for i in top]
+
+REPORT_FUNCTIONS = dict(zip(REPORTS, (CategoryTotals, AccountTotals, MonthlyTotals, AccountBalancesByMonth, TopPayees)))
+
+
+# Function to load transactions of a TransactionStore into a table. CategoryVersion is the version of the categories CategoryName gives names of
+#  (see CategoryTree.version), so category names are looked up again when categories change. Last loaded table is reused if neither changed since
+def LoadTable(Store, CategoryName=None, CategoryVersion=None):
+    global tableCache
+    with tableCacheLock:
+        if tableCache is None or tableCache.version != (Store.version, CategoryVersion):
+            version, rows = Store.getReportColumns()
+            tableCache = TransactionTable(rows, CategoryName, (version, CategoryVersion))
+        return tableCache
+
+# Function to run a report on transactions of a date range, and of an account if given. Returns list of column headings and list of rows
+def RunReport(Table, Name, StartDate=None, EndDate=None, Account=None):
+    if Name not in REPORT_FUNCTIONS:
+        raise ValueError(f'Unknown report {Name}')
+    return REPORT_FUNCTIONS[Name](Table, Table.mask(StartDate, EndDate, Account))
+
+# Function to format report as lines of text with aligned columns. Amounts have 2 decimals and , separators
+def FormatReport(Headings, Rows):
+    cells = [[c if isinstance(c, str) else f'{c:,}' if isinstance(c, int) else f'{c:,.2f}' for c in row] for row in Rows]
+    widths = [max([len(h)] + [len(row[i]) for row in cells]) for i, h in enumerate(Headings)]
+    lines = ['  '.join(h.ljust(w) if i == 0 else h.rjust(w) for i, (h, w) in enumerate(zip(Headings, widths)))]
+    lines.append('  '.join('-' * w for w in widths))
+    for row in cells:
+        lines.append('  '.join(c.ljust(w) if i == 0 else c.rjust(w) for i, (c, w) in enumerate(zip(row, widths))))
+    return lines
@@ -0,0 +1,100 @@
+# Parallel startup loader
+#  Startup loads run as a task graph on background threads (see MyTaskGraph.py), while the GUI thread imports PySimpleGUI and builds the window:
+#   API modules are imported, then developer key is read. Categories, accounts, approval history and transaction sync then run at the same time.
+#   Review list is made from local store once sync and metadata are done, as auto clearing needs category ids. Payee autocomplete index is built from the store and history.
+#  GUI waits only for categories and accounts (needed for drop down lists), and gets transactions later with STARTUP_DONE_EVENT. Each load is timed as a startup phase.
+#  Repository link: https://github.com/gandos21/PocketSmith
+import importlib
+import threading
+from MyTaskGraph import TaskGraph, TaskFailed
+
+#### Configs ####
+STARTUP_DONE_EVENT  = '-StartupDone-'   # Window event sent when all startup loads are finished. Event value is the StartupLoader
+STARTUP_THREADS     = 4                 # Max number of startup loads run at the same time
+#### End Configs ####
+
+
+# Startup loader class. Timer is a MyTelemetry.StartupTimer
+class StartupLoader:
+    def __init__(self, timer):
+        self.timer = timer
+        self.ps = None                          # MyPocketSmith module, once imported
+        self.results = {}                       # Task key -> TaskResult, once all loads are finished
+        self.metadataReady = threading.Event()  # Set when categories and accounts are loaded, or startup failed
+        self.done = threading.Event()
+        self.lock = threading.Lock()
+        self.window = None
+        self.thread = None
+
+    def __timed(self, name, function):
+        def Run(*depResults):
+            with self.timer.phase(name):
+                return function()
+        return Run
+
+    def __importApi(self):
+        self.ps = importlib.import_module('MyPocketSmith')      # Imports requests, sqlite3, etc. Done here, so it overlaps with PySimpleGUI import on GUI thread
+
+    def __readKey(self):
+        if not self.ps.ReadDevKey():
+            raise TaskFailed('Developer API key not found')
+
+    def __metadataLoaded(self):
+        self.metadataReady.set()
+
+    def start(self):
+        graph = TaskGraph()
+        graph.add('import api', self.__timed('import api modules', self.__importApi))
+        graph.add('key', self.__timed('read key', self.__readKey), deps=['import api'])
+        graph.add('categories', self.__timed('load categories', lambda: self.ps.LoadCategories()), deps=['key'])
+        graph.add('accounts', self.__timed('load accounts', lambda: self.ps.LoadAccounts()), deps=['key'])
+        graph.add('metadata', lambda *r: self.__metadataLoaded(), deps=['categories', 'accounts'])
+        graph.add('history', self.__timed('load approval history', lambda: self.ps.LoadApprovedTransactions()), deps=['import api'])
+        graph.add('sync', self.__timed('sync transactions', lambda: self.ps.SyncTransactions()), deps=['key'])
+        graph.add('payees', self.__timed('payee index', lambda: self.ps.GetPayeeIndex()), deps=['sync', 'history'])
+        graph.add('transactions', self.__timed('review list', lambda: self.ps.ListUserTransactions()), deps=['sync', 'metadata', 'history'])
+
+        def Run():
+            try:
+                self.results = graph.run(STARTUP_THREADS)
+            finally:
+                self.metadataReady.set()
+                self.done.set()
+                self.__post()
+        self.thread = threading.Thread(target=Run, name='StartupLoader', daemon=True)
+        self.thread.start()
+        return self
+
+    # Error of a startup load, or None if it succeeded. Only valid once the loads are finished, or for metadata once metadataReady is set
+    def error(self, key):
+        result = self.results.get(key)
+        return result.error if result is not None else None
+
+    # Wait for categories and accounts. Returns None if they are loaded, otherwise the error that stopped them
+    def waitForMetadata(self):
+        self.metadataReady.wait()
+        if self.done.is_set():
+            for key in ('import api', 'key', 'categories', 'accounts'):
+                if self.error(key) is not None:
+                    return self.error(key)
+        return None
+
+    # Pending review list and all transactions, as returned by MyPocketSmith.GetUserTransactions(). Raises the error if loading failed
+    def transactions(self):
+        result = self.results['transactions']
+        if not result.ok():
+            raise result.error
+        return result.result
+
+    # Set window to send STARTUP_DONE_EVENT to. Event is sent straight away if loads are already finished
+    def setWindow(self, window):
+        with self.lock:
+            self.window = window
+        if self.done.is_set():
+            self.__post()
+
+    def __post(self):
+        with self.lock:
+            window, self.window = self.window, None     # Event is sent once
+        if window is not None:
+            window.write_event_value(STARTUP_DONE_EVENT, self)
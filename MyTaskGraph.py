@@ -0,0 +1,84 @@
+# Dependency graph of API calls
+#  Used to run a batch of API calls concurrently while keeping dependent calls in order, eg. a split transaction must be created before its review flag can be cleared.
+#  Each task is run as soon as all tasks it depends on have finished, on a thread pool. If a task fails, tasks depending on it (directly or not) are skipped.
+#  Repository link: https://github.com/gandos21/PocketSmith
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+#### Configs ####
+MAX_CONCURRENT_TASKS = 8        # Default max number of tasks run at the same time
+#### End Configs ####
+
+
+# Error raised by a task function to mark the task failed, eg. when an API call returns an error status
+class TaskFailed(Exception):
+    pass
+
+
+# Result of a task. Error is the exception raised by the task, or by the failed task it depends on if the task was skipped
+class TaskResult:
+    def __init__(self, result=None, error=None, skipped=False):
+        self.result = result
+        self.error = error
+        self.skipped = skipped      # True if task was not run because a task it depends on failed
+
+    def ok(self):
+        return self.error is None
+
+
+# Task graph class. Tasks are added with a key, a function and keys of the tasks they depend on.
+#  Task function is called with results of the tasks it depends on, in the order given
+class TaskGraph:
+    def __init__(self):
+        self.tasks = {}         # key -> (function, dependency keys)
+        self.dependents = {}    # key -> keys of tasks depending on it
+
+    def add(self, key, function, deps=()):
+        deps = tuple(deps)
+        for dep in deps:
+            if dep not in self.tasks:
+                raise KeyError(f'Task {key} depends on unknown task {dep}')     # Tasks must be added after their dependencies, so the graph can't have cycles
+        self.tasks[key] = (function, deps)
+        self.dependents[key] = []
+        for dep in deps:
+            self.dependents[dep].append(key)
+        return key
+
+    # Run all tasks. Returns dictionary of key -> TaskResult
+    def run(self, maxWorkers=MAX_CONCURRENT_TASKS):
+        results = {}
+        waitingFor = {key: len(deps) for key, (function, deps) in self.tasks.items()}
+        with ThreadPoolExecutor(max_workers=max(1, maxWorkers), thread_name_prefix='TaskGraph') as executor:
+            running = {}
+
+            def Start(key):
+                function, deps = self.tasks[key]
+                running[executor.submit(function, *(results[dep].result for dep in deps))] = key
+
+            def Skip(key, error):
+                # Skip a task and all tasks depending on it
+                stack = [key]
+                while stack:
+                    k = stack.pop()
+                    if k not in results:
+                        results[k] = TaskResult(error=error, skipped=True)
+                        stack.extend(self.dependents[k])
+
+            for key, count in waitingFor.items():
+                if count == 0:
+                    Start(key)
+            while running:
+                done, notDone = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    key = running.pop(future)
+                    try:
+                        results[key] = TaskResult(result=future.result())
+                    except Exception as ex:
+                        results[key] = TaskResult(error=ex)
+                        for dependent in self.dependents[key]:
+                            Skip(dependent, ex)
+                        continue
+                    for dependent in self.dependents[key]:
+                        waitingFor[dependent] -= 1
+                        if waitingFor[dependent] == 0 and dependent not in results:
+                            Start(dependent)
+        return results
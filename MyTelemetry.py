@@ -0,0 +1,232 @@
+# API call telemetry and structured logging
+#  Every API call made through an ApiClient is recorded per endpoint: call count, response status codes, bytes sent and received, retries and a latency histogram.
+#  Endpoints are grouped by method and path with ids replaced by {id}, eg. 'PUT /transactions/{id}'. Stats can be shown live (see API Stats tab) and saved to json and csv files.
+#  Log records are written as one json object per line, so they can be filtered and parsed. Extra fields are given as keyword arguments of LogEvent()
+#  Repository link: https://github.com/gandos21/PocketSmith
+import re
+import csv
+import json
+import time
+import logging
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+#### Configs ####
+LATENCY_BUCKETS_MS  = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)    # Upper bounds of latency histogram buckets in ms. Last bucket takes everything slower
+telemetryJsonFile   = 'ApiTelemetry.json'
+telemetryCsvFile    = 'ApiTelemetry.csv'
+logFile             = 'PsControl.log'
+LOG_LEVEL           = logging.INFO      # Set to logging.DEBUG to log every API call
+#### End Configs ####
+
+ID_SEGMENT = re.compile(r'/\d+(?=/|$)')
+
+
+# Function to get endpoint name of an API call, eg. 'GET /users/{id}/transactions'. Base url, api version and query string are dropped
+def EndpointName(Method, Url):
+    path = urlparse(Url).path
+    if path.startswith('/v2/'):
+        path = path[3:]
+    return f'{Method.upper()} {ID_SEGMENT.sub("/{id}", path)}'
+
+
+# Stats of one endpoint
+class EndpointStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0                 # Calls without a response (connection errors, timeouts)
+        self.retries = 0                # Retries made by the client, not counted in calls
+        self.bytesSent = 0
+        self.bytesReceived = 0
+        self.totalTime = 0.0            # Sum of call times in s, including retries
+        self.maxTime = 0.0
+        self.statuses = Counter()       # Status code -> count
+        self.histogram = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def record(self, status, elapsed, bytesSent, bytesReceived, retries):
+        self.calls += 1
+        self.retries += retries
+        self.bytesSent += bytesSent
+        self.bytesReceived += bytesReceived
+        self.totalTime += elapsed
+        self.maxTime = max(self.maxTime, elapsed)
+        if status is None:
+            self.errors += 1
+        else:
+            self.statuses[status] += 1
+        ms = elapsed * 1000
+        self.histogram[next((i for i, bound in enumerate(LATENCY_BUCKETS_MS) if ms <= bound), len(LATENCY_BUCKETS_MS))] += 1
+
+    # Latency percentile in ms, estimated from histogram as the upper bound of the bucket it falls in. Slowest bucket is capped at max call time
+    def percentile(self, pct):
+        if not self.calls:
+            return None
+        rank = max(1, -(-self.calls * pct // 100))
+        seen = 0
+        for i, count in enumerate(self.histogram):
+            seen += count
+            if seen >= rank:
+                return min(LATENCY_BUCKETS_MS[i], self.maxTime * 1000) if i < len(LATENCY_BUCKETS_MS) else self.maxTime * 1000
+        return self.maxTime * 1000
+
+    def toDict(self):
+        bucketNames = [f'<={b}ms' for b in LATENCY_BUCKETS_MS] + [f'>{LATENCY_BUCKETS_MS[-1]}ms']
+        return {
+            'calls'             : self.calls,
+            'errors'            : self.errors,
+            'retries'           : self.retries,
+            'bytes_sent'        : self.bytesSent,
+            'bytes_received'    : self.bytesReceived,
+            'avg_ms'            : round(self.totalTime * 1000 / self.calls, 1) if self.calls else None,
+            'p50_ms'            : round(self.percentile(50), 1) if self.calls else None,
+            'p95_ms'            : round(self.percentile(95), 1) if self.calls else None,
+            'max_ms'            : round(self.maxTime * 1000, 1),
+            'statuses'          : {str(k): v for k, v in sorted(self.statuses.items())},
+            'histogram'         : dict(zip(bucketNames, self.histogram)),
+        }
+
+
+# Telemetry class. Shared by all threads making API calls
+class Telemetry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.endpoints = {}     # Endpoint name -> EndpointStats
+        self.started = time.time()
+
+    def record(self, method, url, status, elapsed, bytesSent=0, bytesReceived=0, retries=0):
+        endpoint = EndpointName(method, url)
+        with self.lock:
+            if endpoint not in self.endpoints:
+                self.endpoints[endpoint] = EndpointStats()
+            self.endpoints[endpoint].record(status, elapsed, bytesSent, bytesReceived, retries)
+        LogEvent(apiLog, 'api_call', logging.DEBUG, endpoint=endpoint, status=status, ms=round(elapsed * 1000, 1), sent=bytesSent, received=bytesReceived, retries=retries)
+
+    def reset(self):
+        with self.lock:
+            self.endpoints = {}
+            self.started = time.time()
+
+    # Stats of all endpoints as a dictionary of endpoint name -> stats dictionary, sorted by endpoint name
+    def snapshot(self):
+        with self.lock:
+            return {endpoint: self.endpoints[endpoint].toDict() for endpoint in sorted(self.endpoints)}
+
+    # Stats as table rows, for the API Stats tab and csv file. Each row matches TABLE_HEADINGS
+    def rows(self):
+        rows = []
+        for endpoint, s in self.snapshot().items():
+            rows.append([endpoint, s['calls'], s['errors'], s['retries'], round(s['bytes_sent'] / 1024, 1), round(s['bytes_received'] / 1024, 1),
+                         s['avg_ms'], s['p50_ms'], s['p95_ms'], s['max_ms'], ' '.join(f'{k}:{v}' for k, v in s['statuses'].items())])
+        return rows
+
+    def saveJson(self, fileName=telemetryJsonFile):
+        with open(fileName, 'w') as fp:
+            json.dump({'started': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.started)),
+                       'saved': time.strftime('%Y-%m-%d %H:%M:%S'), 'endpoints': self.snapshot()}, fp, indent=4)
+
+    def saveCsv(self, fileName=telemetryCsvFile):
+        with open(fileName, 'w', newline='') as fp:
+            writer = csv.writer(fp)
+            writer.writerow(TABLE_HEADINGS)
+            writer.writerows(self.rows())
+
+    # Text histogram of an endpoint, one line per bucket with a bar of #s
+    def histogramText(self, endpoint, width=40):
+        with self.lock:
+            stats = self.endpoints.get(endpoint)
+            histogram = list(stats.histogram) if stats is not None else []
+        if not histogram:
+            return ''
+        most = max(histogram) or 1
+        names = [f'<= {b} ms' for b in LATENCY_BUCKETS_MS] + [f'>  {LATENCY_BUCKETS_MS[-1]} ms']
+        return '\n'.join(f'{name:>12} | {"#" * round(width * count / most):<{width}} {count}' for name, count in zip(names, histogram))
+
+
+TABLE_HEADINGS = ['Endpoint', 'Calls', 'Errors', 'Retries', 'Sent KB', 'Recv KB', 'Avg ms', 'p50 ms', 'p95 ms', 'Max ms', 'Statuses']
+
+
+# Startup timer. Records start and end time of startup phases (which may run in parallel on different threads) and milestones, eg. window shown.
+#  Times are relative to Start, which should be taken before any heavy imports
+class StartupTimer:
+    def __init__(self, start=None):
+        self.start = time.perf_counter() if start is None else start
+        self.lock = threading.Lock()
+        self.phases = []        # (name, start s, end s, thread name, error)
+        self.milestones = []    # (name, time s)
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter() - self.start
+        error = None
+        try:
+            yield
+        except Exception as ex:
+            error = f'{type(ex).__name__} {ex}'
+            raise
+        finally:
+            with self.lock:
+                self.phases.append((name, start, time.perf_counter() - self.start, threading.current_thread().name, error))
+
+    def mark(self, name):
+        with self.lock:
+            self.milestones.append((name, time.perf_counter() - self.start))
+
+    # Report as text lines: phases in start order, with a bar showing when each ran, then milestones
+    def report(self, width=40):
+        with self.lock:
+            phases = sorted(self.phases, key=lambda p: p[1])
+            milestones = list(self.milestones)
+        end = max([p[2] for p in phases] + [m[1] for m in milestones] + [1e-9])
+        lines = [f"{'Startup phase':<24}{'Start ms':>9}{'End ms':>9}{'Took ms':>9}  {'Timeline':<{width}}  Thread"]
+        for name, start, stop, thread, error in phases:
+            bar = ' ' * int(width * start / end) + '#' * max(1, round(width * (stop - start) / end))
+            lines.append(f'{name:<24}{start * 1000:>9.1f}{stop * 1000:>9.1f}{(stop - start) * 1000:>9.1f}  {bar[:width]:<{width}}  {thread}' + (f'  FAILED: {error}' if error else ''))
+        for name, at in milestones:
+            lines.append(f'{name:<24}{at * 1000:>9.1f}')
+        return lines
+
+    # Log phases and milestones as events
+    def log(self, logger):
+        with self.lock:
+            phases = list(self.phases)
+            milestones = list(self.milestones)
+        for name, start, stop, thread, error in phases:
+            LogEvent(logger, 'startup_phase', phase=name, start_ms=round(start * 1000, 1), ms=round((stop - start) * 1000, 1), thread=thread, error=error)
+        for name, at in milestones:
+            LogEvent(logger, 'startup_milestone', milestone=name, ms=round(at * 1000, 1))
+
+
+# Log formatter writing each record as one json object. Extra fields given to LogEvent() are added as keys
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        data = {'time': self.formatTime(record, '%Y-%m-%d %H:%M:%S'), 'level': record.levelname, 'logger': record.name, 'event': record.getMessage()}
+        data.update(getattr(record, 'fields', {}))
+        if record.exc_info:
+            data['exception'] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str)
+
+# Function to log an event with extra fields, eg. LogEvent(log, 'grid_updated', added=2, removed=1)
+def LogEvent(Logger, Event, Level=logging.INFO, **Fields):
+    if Logger.isEnabledFor(Level):
+        Logger.log(Level, Event, extra={'fields': Fields})
+
+# Function to set up logging to log file, and to Stream (eg. console) if given. Safe to call more than once
+def SetupLogging(Stream=None, FileName=logFile, Level=LOG_LEVEL):
+    root = logging.getLogger('PocketSmith')
+    root.setLevel(Level)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+    handlers = [logging.FileHandler(FileName)] if FileName else []
+    if Stream is not None:
+        handlers.append(logging.StreamHandler(Stream))
+    for handler in handlers:
+        handler.setFormatter(JsonFormatter())
+        root.addHandler(handler)
+    root.propagate = False
+    return root
+
+
+apiLog = logging.getLogger('PocketSmith.api')
@@ -0,0 +1,161 @@
+# Local transaction store
+#  Transactions downloaded from Pocketsmith are kept in a local SQLite database, so each refresh only needs to download transactions
+#  that changed since last sync (delta sync). Review grid, re-approval check and console listing read transactions from here.
+#  Repository link: https://github.com/gandos21/PocketSmith
+import sqlite3
+import json
+import threading
+
+#### Configs ####
+transactionDbFile = 'Transactions.db'
+#### End Configs ####
+
+
+# Transaction store class. Full transaction data returned by the API is saved as json text, with frequently queried fields
+#  (account, date, needs_review) in their own indexed columns
+class TransactionStore:
+    def __init__(self, dbFile=transactionDbFile):
+        self.lock = threading.Lock()        # Connection is shared by GUI and background threads
+        self.version = 0                    # Incremented whenever transactions change, so data read from the store can be cached until then
+        self.conn = sqlite3.connect(dbFile, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.executescript('''
+                CREATE TABLE IF NOT EXISTS transactions (
+                    id              INTEGER PRIMARY KEY,
+                    account         TEXT,
+                    date            TEXT,
+                    needs_review    INTEGER,
+                    updated_at      TEXT,
+                    data            TEXT
+                );
+                CREATE INDEX IF NOT EXISTS idx_transactions_account      ON transactions (account);
+                CREATE INDEX IF NOT EXISTS idx_transactions_date         ON transactions (date);
+                CREATE INDEX IF NOT EXISTS idx_transactions_needs_review ON transactions (needs_review);
+                CREATE TABLE IF NOT EXISTS sync_state (
+                    key     TEXT PRIMARY KEY,
+                    value   TEXT
+                );
+            ''')
+
+    # Insert new transactions or replace existing ones with same id
+    def upsert(self, transactions):
+        rows = [(t['id'], t['transaction_account']['name'], t['date'], int(bool(t['needs_review'])), t.get('updated_at'), json.dumps(t))
+                for t in transactions]
+        with self.lock, self.conn:
+            self.conn.executemany('INSERT OR REPLACE INTO transactions (id, account, date, needs_review, updated_at, data) VALUES (?, ?, ?, ?, ?, ?)', rows)
+            self.version += 1
+        return len(rows)
+
+    def delete(self, transactionIds):
+        with self.lock, self.conn:
+            self.conn.executemany('DELETE FROM transactions WHERE id = ?', [(i,) for i in transactionIds])
+            self.version += 1
+
+    # Where conditions and their parameters of transaction filters. See getTransactions()
+    @staticmethod
+    def __filters(startDate, endDate, account, needsReview, categoryIds):
+        where = []
+        params = []
+        if startDate is not None:
+            where.append('date >= ?')
+            params.append(str(startDate))
+        if endDate is not None:
+            where.append('date <= ?')
+            params.append(str(endDate))
+        if account is not None:
+            where.append('account = ?')
+            params.append(account)
+        if needsReview is not None:
+            where.append('needs_review = ?')
+            params.append(int(bool(needsReview)))
+        if categoryIds is not None:
+            categoryIds = list(categoryIds)
+            where.append(f"json_extract(data, '$.category.id') IN ({', '.join('?' * len(categoryIds))})")
+            params.extend(categoryIds)
+        return where, params
+
+    # Get transactions, newest first. Optional filters: date range (yyyy-mm-dd strings), account name, review flag and category ids
+    def getTransactions(self, startDate=None, endDate=None, account=None, needsReview=None, categoryIds=None):
+        where, params = self.__filters(startDate, endDate, account, needsReview, categoryIds)
+        query = 'SELECT data FROM transactions'
+        if where:
+            query += ' WHERE ' + ' AND '.join(where)
+        query += ' ORDER BY date DESC, id DESC'
+        with self.lock:
+            rows = self.conn.execute(query, params).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    # Generator of transactions with same filters and order as getTransactions(), read batchSize at a time, eg. to export any number of transactions.
+    #  Each batch starts after the (date, id) of the last transaction read, so the store is only locked while a batch is read and no offset is re-scanned
+    def iterTransactions(self, startDate=None, endDate=None, account=None, needsReview=None, categoryIds=None, batchSize=1000):
+        where, params = self.__filters(startDate, endDate, account, needsReview, categoryIds)
+        last = None
+        while True:
+            batchWhere, batchParams = list(where), list(params)
+            if last is not None:
+                batchWhere.append('(date < ? OR (date = ? AND id < ?))')
+                batchParams.extend((last[0], last[0], last[1]))
+            query = 'SELECT date, id, data FROM transactions'
+            if batchWhere:
+                query += ' WHERE ' + ' AND '.join(batchWhere)
+            query += ' ORDER BY date DESC, id DESC LIMIT ?'
+            with self.lock:
+                rows = self.conn.execute(query, batchParams + [batchSize]).fetchall()
+            for row in rows:
+                yield json.loads(row[2])
+            if len(rows) < batchSize:
+                return
+            last = rows[-1][:2]
+
+    # Get fields used by reports of all transactions, as (id, date, account, amount, category id, category title, payee, closing balance) tuples in date order.
+    #  Fields are read from json text by SQLite, which is much faster than loading each transaction's json in Python. Returns (store version, rows)
+    def getReportColumns(self):
+        with self.lock:
+            rows = self.conn.execute('''SELECT id, date, account, json_extract(data, '$.amount'), json_extract(data, '$.category.id'),
+                                               json_extract(data, '$.category.title'), json_extract(data, '$.payee'), json_extract(data, '$.closing_balance')
+                                        FROM transactions ORDER BY date, id''').fetchall()
+            return self.version, rows
+
+    # Get transactions that need review
+    def getPending(self):
+        return self.getTransactions(needsReview=True)
+
+    # Get ids of transactions of a date range (yyyy-mm-dd strings). UpdatedBefore leaves out transactions updated at or after a time (API format, eg.
+    #  '2024-01-31T09:00:00Z'), eg. ones saved while a sync was running
+    def getIds(self, startDate=None, endDate=None, updatedBefore=None):
+        where, params = self.__filters(startDate, endDate, None, None, None)
+        if updatedBefore is not None:
+            where.append('(updated_at IS NULL OR updated_at < ?)')
+            params.append(updatedBefore)
+        query = 'SELECT id FROM transactions' + (' WHERE ' + ' AND '.join(where) if where else '')
+        with self.lock:
+            return {r[0] for r in self.conn.execute(query, params)}
+
+    def getPendingIds(self):
+        with self.lock:
+            return {r[0] for r in self.conn.execute('SELECT id FROM transactions WHERE needs_review = 1')}
+
+    def count(self):
+        with self.lock:
+            return self.conn.execute('SELECT COUNT(*) FROM transactions').fetchone()[0]
+
+    # Sync state values, eg. time of last sync
+    def getState(self, key, default=None):
+        with self.lock:
+            row = self.conn.execute('SELECT value FROM sync_state WHERE key = ?', (key,)).fetchone()
+        return default if row is None else row[0]
+
+    def setState(self, key, value):
+        with self.lock, self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)', (key, value))
+
+    # Remove all transactions and sync state, eg. when API key changes to another user
+    def clear(self):
+        with self.lock, self.conn:
+            self.conn.execute('DELETE FROM transactions')
+            self.conn.execute('DELETE FROM sync_state')
+            self.version += 1
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
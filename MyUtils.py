@@ -1,26 +1,99 @@
 from datetime import datetime
 import re
 
-# Function to convert string formatted date to date type
-def StrToDate(DateStr):
-    return IsDateFormatValid(DateStr)[1]    # Function IsDateFormatValid() returns tuple of 2 values. We need the second element in the tuple
+#### Configs ####
+# Date formats accepted by Pocketsmith. Each format is matched with a regex giving year, month and day groups, so a date is parsed in a single pass
+DATE_FORMATS = {
+    '%Y-%m-%d' : re.compile(r'(?P<y>\d{4})-(?P<m>\d{1,2})-(?P<d>\d{1,2})'),
+    '%d-%m-%Y' : re.compile(r'(?P<d>\d{1,2})-(?P<m>\d{1,2})-(?P<y>\d{4})'),
+    '%d/%m/%Y' : re.compile(r'(?P<d>\d{1,2})/(?P<m>\d{1,2})/(?P<y>\d{4})'),
+    '%Y/%m/%d' : re.compile(r'(?P<y>\d{4})/(?P<m>\d{1,2})/(?P<d>\d{1,2})'),
+}
+# Single regex matching any of the formats above, used to detect the format of a date string in one pass. Outer group names are f + index of the format
+DATE_FORMAT_DETECT = re.compile('|'.join(f'(?P<f{i}>{regex.pattern.replace("?P<", f"?P<g{i}")})' for i, regex in enumerate(DATE_FORMATS.values())))
+DATE_SOURCE_API = 'api'     # Dates from Pocketsmith API and files saved by this script
+DATE_SOURCE_GUI = 'gui'     # Dates typed by the user
+DATE_SOURCE_STATEMENT = 'statement'     # Dates of imported bank statement files
+#### End Configs ####
 
-# Function to check validity of input date string. Input date string may be of four different types checked below
-def IsDateFormatValid(DateStr):
+dateFormatCache = {}        # Source -> last date format seen from that source. Tried first, as all dates from one source usually have the same format
+
+
+# Error raised for date strings not in any of the accepted formats, or not a valid calendar date (eg. 31/02/2024)
+class DateFormatError(ValueError):
+    pass
+
+
+# Parse date string with a given format. Returns None if string doesn't match the format
+def _ParseDateWithFormat(DateStr, Format):
+    if Format == '%Y-%m-%d' and len(DateStr) == 10 and DateStr[4] == '-' and DateStr[7] == '-':
+        try:
+            return datetime.fromisoformat(DateStr)      # Fast path for the most common format, eg. dates from Pocketsmith API
+        except ValueError:
+            pass
+    match = DATE_FORMATS[Format].fullmatch(DateStr)
+    if match is None:
+        return None
     try:
-        dt = datetime.strptime(DateStr, '%Y-%m-%d')
-    except:
+        return datetime(int(match['y']), int(match['m']), int(match['d']))
+    except ValueError:
+        raise DateFormatError(f'Invalid date: {DateStr!r}')
+
+
+# Function to convert string formatted date to datetime. Source is where the date string came from, see DATE_SOURCE_API and DATE_SOURCE_GUI.
+#  Raises DateFormatError if date string is not valid
+def ParseDate(DateStr, Source=DATE_SOURCE_API):
+    if not isinstance(DateStr, str):
+        raise DateFormatError(f'Invalid date: {DateStr!r}')
+    DateStr = DateStr.strip()
+    cachedFormat = dateFormatCache.get(Source)
+    if cachedFormat is not None:
+        dt = _ParseDateWithFormat(DateStr, cachedFormat)
+        if dt is not None:
+            return dt
+    match = DATE_FORMAT_DETECT.fullmatch(DateStr)       # Format changed or not known yet for this source. Detect it
+    if match is None:
+        raise DateFormatError(f'Invalid date format: {DateStr!r}')
+    fmt = list(DATE_FORMATS)[int(match.lastgroup[1:])]
+    dateFormatCache[Source] = fmt
+    return _ParseDateWithFormat(DateStr, fmt)
+
+
+# Function to parse a list of date strings at once, eg. all transaction dates in approval history. Returns list of datetimes in the same order.
+#  Dates repeat a lot in transaction lists, so each distinct string is parsed only once.
+#  If Errors is 'raise', DateFormatError is raised for the first invalid date. If 'none', invalid dates are returned as None
+def ParseDates(DateStrs, Source=DATE_SOURCE_API, Errors='raise'):
+    parsed = {}
+    result = []
+    for dateStr in DateStrs:
         try:
-            dt = datetime.strptime(DateStr, '%d-%m-%Y')
-        except:
+            dt = parsed[dateStr]
+        except (KeyError, TypeError):       # TypeError if dateStr is not hashable, eg. a list read from a corrupted file
             try:
-                dt = datetime.strptime(DateStr, '%d/%m/%Y')
-            except:
-                try:
-                    dt = datetime.strptime(DateStr, '%Y/%m/%d')
-                except:
-                    return False, datetime.today()      # Invalid date format
-    return True, dt
+                dt = ParseDate(dateStr, Source)
+            except DateFormatError:
+                if Errors == 'raise':
+                    raise
+                dt = None
+            try:
+                parsed[dateStr] = dt
+            except TypeError:
+                pass
+        result.append(dt)
+    return result
+
+
+# Function to convert string formatted date to date type. Raises DateFormatError if date string is not valid
+def StrToDate(DateStr, Source=DATE_SOURCE_API):
+    return ParseDate(DateStr, Source)
+
+# Function to check validity of input date string. Input date string may be of four different types, see DATE_FORMATS.
+#  Returns tuple of validity and parsed date (None if not valid)
+def IsDateFormatValid(DateStr, Source=DATE_SOURCE_GUI):
+    try:
+        return True, ParseDate(DateStr, Source)
+    except DateFormatError:
+        return False, None      # Invalid date format
 
 # Function to check if a given value of type float is near zero
 def IsFloatValueZero(floatValue):
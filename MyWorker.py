@@ -0,0 +1,130 @@
+# Background worker for API calls
+#  Pocketsmith API calls (transaction download, approvals, etc.) are run on worker threads, so the GUI event loop is never blocked on the network.
+#  When a job finishes, its result is sent back to the GUI thread as a window event, using PySimpleGUI's write_event_value().
+#  Periodic jobs (eg. refresh every NEW_DATA_CHECK_INTERVAL seconds) are run by a scheduler thread.
+#  Repository link: https://github.com/gandos21/PocketSmith
+import threading
+import time
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+
+#### Configs ####
+WORKER_THREADS      = 4                 # Max number of jobs run at the same time
+WORKER_DONE_EVENT   = '-WorkerDone-'    # Window event sent when a job is finished. Event value is a WorkerResult
+WORKER_PRINT_EVENT  = '-WorkerPrint-'   # Window event sent when a job prints a message. Event value is the printed text
+#### End Configs ####
+
+
+# Result of a finished job, sent to the GUI with WORKER_DONE_EVENT
+class WorkerResult:
+    def __init__(self, jobId, name, tag, result=None, error=None):
+        self.jobId = jobId
+        self.name = name            # Job name given when job was submitted, eg. 'refresh', 'approve'
+        self.tag = tag              # Any data the GUI needs to handle the result, eg. review grid row number
+        self.result = result        # Return value of job function
+        self.error = error          # Exception raised by job function, if any
+        self.elapsed = 0.0          # Job run time in s
+
+
+# Worker class. Window object can be changed with setWindow() when the GUI window is re-created
+class ApiWorker:
+    def __init__(self, window=None, threads=WORKER_THREADS):
+        self.window = window
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='ApiWorker')
+        self.jobIds = itertools.count(1)
+        self.lock = threading.Lock()
+        self.wakeUp = threading.Event()
+        self.stopped = False
+        self.scheduledJobs = {}     # name -> [function, interval in s, next run time, running flag]
+        self.inFlight = {}          # jobId -> (name, tag) of submitted jobs not yet finished
+        self.scheduler = threading.Thread(target=self.__schedulerLoop, daemon=True)
+        self.scheduler.start()
+
+    def setWindow(self, window):
+        self.window = window
+
+    # Run function on a worker thread. Returns job id. When done, WORKER_DONE_EVENT is sent to the window
+    def submit(self, name, function, *args, tag=None, **kwargs):
+        jobId = next(self.jobIds)
+        with self.lock:
+            self.inFlight[jobId] = (name, tag)
+        self.executor.submit(self.__runJob, jobId, name, tag, function, args, kwargs)
+        return jobId
+
+    # Check if any jobs with given name (or any job, if name is None) are still running
+    def busy(self, name=None):
+        with self.lock:
+            return any(name is None or n == name for n, t in self.inFlight.values())
+
+    # Run function every interval seconds. First run is after interval seconds, unless runNow() is called
+    def schedule(self, name, function, interval):
+        with self.lock:
+            self.scheduledJobs[name] = [function, interval, time.monotonic() + interval, False]
+        self.wakeUp.set()
+
+    # Run scheduled job straight away, eg. when Refresh button is clicked. Next run is re-scheduled interval seconds after this run
+    def runNow(self, name):
+        with self.lock:
+            self.scheduledJobs[name][2] = time.monotonic()
+        self.wakeUp.set()
+
+    # Number of seconds until scheduled job is run next
+    def secondsUntil(self, name):
+        with self.lock:
+            return max(0, int(self.scheduledJobs[name][2] - time.monotonic()))
+
+    def stop(self):
+        self.stopped = True
+        self.wakeUp.set()
+        self.executor.shutdown(wait=False)
+
+    def __runJob(self, jobId, name, tag, function, args, kwargs):
+        start = time.perf_counter()
+        try:
+            result = WorkerResult(jobId, name, tag, result=function(*args, **kwargs))
+        except Exception as ex:
+            result = WorkerResult(jobId, name, tag, error=ex)
+        result.elapsed = time.perf_counter() - start
+        with self.lock:
+            self.inFlight.pop(jobId, None)
+            if name in self.scheduledJobs:
+                self.scheduledJobs[name][3] = False
+        if self.window is not None and not self.stopped:
+            self.window.write_event_value(WORKER_DONE_EVENT, result)
+
+    # Scheduler thread. Submits scheduled jobs when they are due. A scheduled job is not started again while its previous run is still going
+    def __schedulerLoop(self):
+        while not self.stopped:
+            now = time.monotonic()
+            nextDue = now + 60
+            with self.lock:
+                dueJobs = []
+                for name, job in self.scheduledJobs.items():
+                    if job[2] <= now and not job[3]:
+                        job[2] = now + job[1]
+                        job[3] = True
+                        dueJobs.append((name, job[0]))
+                    nextDue = min(nextDue, job[2])
+            for name, function in dueJobs:
+                self.submit(name, function)
+            self.wakeUp.wait(max(0.05, nextDue - time.monotonic()))
+            self.wakeUp.clear()
+
+
+# Stdout wrapper. sg.Output element is a Tk widget, which must only be updated from the GUI thread.
+#  Text printed by the GUI thread goes to the wrapped stream as usual. Text printed by worker threads is sent to the GUI thread with WORKER_PRINT_EVENT.
+class WorkerStdout:
+    def __init__(self, stream, window):
+        self.stream = stream
+        self.window = window
+        self.guiThread = threading.current_thread()
+
+    def write(self, text):
+        if threading.current_thread() is self.guiThread:
+            self.stream.write(text)
+        elif text:
+            self.window.write_event_value(WORKER_PRINT_EVENT, text)
+
+    def flush(self):
+        if threading.current_thread() is self.guiThread:
+            self.stream.flush()
@@ -0,0 +1,216 @@
+# End-to-end benchmark of MyPocketSmith against the local fake Pocketsmith server (see MyFakeServer.py)
+#  Runs the script's workflow without the GUI: startup, first sync, approving all pending transactions (some split, some transfers),
+#  delta sync, and auto clearing of approved transactions that come up for review again. Files are written to a temporary folder, not the script folder.
+#  Reports wall time and API calls of each phase, and call count and p50/p95 latency of each API operation.
+#  Example: python PsBenchmark.py --transactions 200 --splits 20 --transfers 10 --latency 50
+#  Repository link: https://github.com/gandos21/PocketSmith
+import io
+import os
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+import contextlib
+from collections import Counter, defaultdict
+from urllib.parse import urlparse
+import MyFakeServer
+import MyPocketSmith as ps
+from MyPocketSmith import wf
+
+#### Configs ####
+TRANSFER_ACCOUNT = 'Savings'        # Fake account used as TransferTo account of transfers
+#### End Configs ####
+
+
+# Recorder of API calls made by the script. Wraps ApiClient.request() of a client to time every call, grouped by operation (fake server route name)
+class CallRecorder:
+    def __init__(self, client):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)      # operation -> list of call times in s
+        self.statuses = defaultdict(Counter)    # operation -> status code -> count
+        self.phaseCalls = Counter()             # phase -> number of calls
+        self.phase = None
+        self.request = client.request
+        client.request = self.__timedRequest
+
+    def __timedRequest(self, method, path, **kwargs):
+        operation = MyFakeServer.MatchRoute(method, urlparse(path).path)[0]
+        start = time.perf_counter()
+        status = 'error'
+        try:
+            response = self.request(method, path, **kwargs)
+            status = response.status_code
+            return response
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                self.latencies[operation].append(elapsed)
+                self.statuses[operation][status] += 1
+                self.phaseCalls[self.phase] += 1
+
+
+# Function to get the Pct percentile of a list of values (nearest rank). Returns None for an empty list
+def Percentile(Values, Pct):
+    if not Values:
+        return None
+    values = sorted(Values)
+    return values[max(0, min(len(values) - 1, -(-len(values) * Pct // 100) - 1))]
+
+# Function to build review panel values of a transaction, the same way the review grid fills them
+def PanelValues(Transaction, Category, Amount=None, AccountTo=''):
+    return {
+        wf.TRANSACTION_DATE : Transaction['date'],
+        wf.PAYEE_NAME       : Transaction['payee'],
+        wf.CATEGORY_NAME    : Category,
+        wf.NOTE_TEXT        : 'Benchmark',
+        wf.AMOUNT           : '{:,.2f}'.format(Transaction['amount'] if Amount is None else Amount),
+        wf.AC_FROM          : Transaction['account'],
+        wf.AC_TO            : AccountTo,
+        wf.AC_TRANSFER      : not AccountTo,
+    }
+
+# Function to build an approval batch from pending transactions. SplitPct % of rows are split in two, TransferPct % are transfers to TRANSFER_ACCOUNT
+def BuildApprovalBatch(Pending, SplitPct, TransferPct, Rnd):
+    categories = [c for c in ps.categoryList if c]
+    batch = []
+    for t in Pending:
+        entryType = 'Transfer' if Rnd.random() * 100 < TransferPct else 'No transfer'
+        accountTo = TRANSFER_ACCOUNT if entryType == 'Transfer' else ''
+        if Rnd.random() * 100 < SplitPct:
+            half = round(t['amount'] / 2, 2)
+            entries = [(entryType, PanelValues(t, Rnd.choice(categories), half, accountTo)),
+                       ('No transfer', PanelValues(t, Rnd.choice(categories), round(t['amount'] - half, 2)))]
+        else:
+            entries = [(entryType, PanelValues(t, Rnd.choice(categories), AccountTo=accountTo))]
+        batch.append((t, entries))
+    return batch
+
+# Function to flag approved transactions for review again on the fake server, as Pocketsmith sometimes does. Returns number of flagged transactions
+def ReflagApproved(Server, TransIds, Pct, Rnd):
+    flagged = 0
+    with Server.account.lock:
+        for transId in TransIds:
+            t = Server.account.transactions.get(transId)
+            if t is not None and Rnd.random() * 100 < Pct:
+                t['needs_review'] = True
+                t['updated_at'] = MyFakeServer.UtcNow()
+                flagged += 1
+    return flagged
+
+# Function to send outbox operations queued for retry, waiting for their retry time. Operations that can't be sent in Timeout s are left in the outbox
+def DrainOutbox(Outbox, MaxConcurrent, Timeout=120):
+    deadline = time.monotonic() + Timeout
+    while time.monotonic() < deadline:
+        due = Outbox.secondsUntilDue()
+        if due is None:
+            return
+        time.sleep(due)
+        Outbox.dispatch(maxWorkers=MaxConcurrent)
+
+# Function to run the benchmark workload. Returns report dictionary
+def RunBenchmark(Args):
+    rnd = random.Random(Args.seed)
+    server = MyFakeServer.FakeServer(latency=Args.latency / 1000, latencyJitter=Args.jitter / 1000, errorRate=Args.error_rate / 100,
+                                     rateLimit=Args.rate_limit, reflagRate=Args.reflag / 100, seed=Args.seed).start()
+    MyFakeServer.AddPendingTransactions(server.account, Args.transactions, Seed=Args.seed)
+    ps.client.baseUrl = server.url
+    recorder = CallRecorder(ps.client)
+    phases = []
+    info = {}
+    output = io.StringIO()
+
+    def Phase(Name, Function):
+        recorder.phase = Name
+        serverRequests = sum(server.requestCounts.values())
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(output) if not Args.verbose else contextlib.nullcontext():
+            result = Function()
+        phases.append({'phase': Name, 'wall_s': time.perf_counter() - start, 'api_calls': recorder.phaseCalls[Name],
+                       'server_requests': sum(server.requestCounts.values()) - serverRequests})
+        return result
+
+    workDir = tempfile.mkdtemp(prefix='PsBenchmark_')
+    cwd = os.getcwd()
+    os.chdir(workDir)       # Script files (key, caches, stores, outbox) are relative to current folder
+    try:
+        with open(ps.keyFile, 'w') as fp:
+            json.dump({'ApiKey': 'b' * 128}, fp)
+        Phase('startup', lambda: (ps.ReadDevKey(), ps.LoadCategories(UseCache=False), ps.LoadAccounts(UseCache=False), ps.GetUserId()))
+        pending, transactions = Phase('first sync', ps.GetUserTransactions)
+        batch = BuildApprovalBatch(pending, Args.splits, Args.transfers, rnd)
+        info['pending'] = len(pending)
+        info['split_rows'] = sum(len(entries) > 1 for t, entries in batch)
+        info['transfer_rows'] = sum(entries[0][0] == 'Transfer' for t, entries in batch)
+
+        def Approve():
+            results = ps.ApproveTransactions(batch, MaxConcurrent=Args.concurrency, Wait=True)
+            for transId, (status, approvedMain) in results.items():
+                if 'FAILED' not in status.upper() and approvedMain is not None:
+                    ps.SaveApprovedTransaction(transId, approvedMain)
+            return results
+        results = Phase('approve all', Approve)
+        info['approve_failed'] = sum('FAILED' in status.upper() for status, approvedMain in results.values())
+        info['approve_queued'] = sum('QUEUED' in status.upper() for status, approvedMain in results.values())
+
+        if info['approve_queued']:
+            Phase('outbox retries', lambda: DrainOutbox(ps.GetOutbox(), Args.concurrency))
+
+        pending, transactions = Phase('delta sync', ps.GetUserTransactions)
+        info['pending_after_approval'] = len(pending)
+        info['reflagged'] = ReflagApproved(server, list(results), Args.reappear, rnd)
+        pending, transactions = Phase('resync + auto clear', ps.GetUserTransactions)
+        info['pending_after_auto_clear'] = len(pending)
+    finally:
+        os.chdir(cwd)
+        if ps.outbox is not None:
+            ps.outbox.close()
+        server.stop()
+
+    operations = []
+    for operation in sorted(recorder.latencies):
+        latencies = recorder.latencies[operation]
+        operations.append({'operation': operation, 'calls': len(latencies),
+                           'server_requests': sum(n for (method, route), n in server.requestCounts.items() if route == operation),
+                           'p50_ms': Percentile(latencies, 50) * 1000, 'p95_ms': Percentile(latencies, 95) * 1000,
+                           'statuses': {str(k): v for k, v in sorted(recorder.statuses[operation].items(), key=str)}})
+    return {'config': vars(Args), 'workload': info, 'phases': phases, 'operations': operations,
+            'total_wall_s': sum(p['wall_s'] for p in phases), 'total_api_calls': sum(p['api_calls'] for p in phases),
+            'total_server_requests': sum(server.requestCounts.values()), 'work_dir': workDir}
+
+# Function to print benchmark report
+def PrintReport(Report):
+    print('Workload: ' + ', '.join(f'{k}={v}' for k, v in Report['workload'].items()))
+    print(f"\n{'Phase':<22}{'Wall (s)':>10}{'API calls':>11}{'Requests':>10}")
+    for p in Report['phases']:
+        print(f"{p['phase']:<22}{p['wall_s']:>10.3f}{p['api_calls']:>11}{p['server_requests']:>10}")
+    print(f"{'Total':<22}{Report['total_wall_s']:>10.3f}{Report['total_api_calls']:>11}{Report['total_server_requests']:>10}")
+    print(f"\n{'Operation':<22}{'Calls':>7}{'Requests':>10}{'p50 (ms)':>10}{'p95 (ms)':>10}  Statuses")
+    for o in Report['operations']:
+        print(f"{o['operation']:<22}{o['calls']:>7}{o['server_requests']:>10}{o['p50_ms']:>10.1f}{o['p95_ms']:>10.1f}  {o['statuses']}")
+    print('\nRequests include retries of failed calls. Files written to ' + Report['work_dir'])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark MyPocketSmith against a local fake Pocketsmith server')
+    parser.add_argument('--transactions', type=int, default=100, help='Number of transactions waiting for review')
+    parser.add_argument('--splits', type=float, default=20, help='Percent of approved rows split in two')
+    parser.add_argument('--transfers', type=float, default=10, help='Percent of approved rows that are transfers')
+    parser.add_argument('--reappear', type=float, default=20, help='Percent of approved transactions flagged for review again, to be auto cleared')
+    parser.add_argument('--latency', type=float, default=20, help='Server latency in ms added to each request')
+    parser.add_argument('--jitter', type=float, default=10, help='Random extra server latency in ms, up to this value')
+    parser.add_argument('--error-rate', type=float, default=0, help='Percent of requests answered with a 500 error')
+    parser.add_argument('--rate-limit', type=int, default=0, help='Max requests per second before 429 responses. 0 for no limit')
+    parser.add_argument('--reflag', type=float, default=50, help='Percent of payee/amount changes flagged for review again by the server')
+    parser.add_argument('--concurrency', type=int, default=ps.MAX_CONCURRENT_APPROVALS, help='Max concurrent approval calls')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed of the workload')
+    parser.add_argument('--json', help='Also save report to this json file')
+    parser.add_argument('--verbose', action='store_true', help='Show script console output')
+    args = parser.parse_args()
+
+    report = RunBenchmark(args)
+    PrintReport(report)
+    if args.json:
+        with open(args.json, 'w') as fp:
+            json.dump(report, fp, indent=4)
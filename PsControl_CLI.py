@@ -0,0 +1,281 @@
+# Pocketsmith py automation, command line version
+#  Runs the API side of the script without the GUI, eg. from cron or Task Scheduler on a machine without a desktop. PySimpleGUI is not loaded.
+#  Subcommands:
+#   sync        Bring local transaction store up to date with Pocketsmith
+#   auto-clear  Sync, then auto clear pending transactions that were approved before and came up for review again
+#   pending     List transactions waiting for review
+#   delete      Delete transactions by id, or all test transactions (transactions with "Test Trans" in their Note)
+#   export      Stream transactions of a date range to a csv, JSON Lines or json file, from local store or straight from the API
+#   import      Post transactions of a csv or OFX statement file, skipping ones already in Pocketsmith
+#   daemon      Run sync and auto clear on a schedule until stopped. Changes that failed to send are replayed from the outbox in background
+#  Example: python PsControl_CLI.py pending --no-sync
+#  Repository link: https://github.com/gandos21/PocketSmith
+import os
+import sys
+import json
+import time
+import signal
+import logging
+import argparse
+import threading
+from datetime import date, timedelta
+import MyPocketSmith as ps
+import MyTelemetry
+import MyExport
+import MyImport
+import MyUtils as ut
+from MyTelemetry import LogEvent
+
+#### Configs ####
+DAEMON_INTERVAL     = 600       # Default time interval in s between syncs in daemon mode. Same as NEW_DATA_CHECK_INTERVAL of the GUI
+#### End Configs ####
+
+log = logging.getLogger('PocketSmith.cli')
+
+
+# Function to parse a date argument. Any of the date formats accepted by Pocketsmith can be used
+def DateArg(DateStr):
+    try:
+        return ut.StrToDate(DateStr, ut.DATE_SOURCE_GUI).date()
+    except ut.DateFormatError as ex:
+        raise argparse.ArgumentTypeError(str(ex))
+
+def CmdSync(Args):
+    print(f'Synced transactions: {ps.SyncTransactions(FullSync=Args.full)} downloaded. Transactions in local store: {ps.GetTransactionStore().count()}')
+    return 0
+
+def CmdAutoClear(Args):
+    cleared, pending = ps.SyncAndAutoClear(FullSync=Args.full)
+    print(f'Auto cleared: {len(cleared)}. Waiting for review: {len(pending)}')
+    return 0
+
+def CmdPending(Args):
+    if not Args.no_sync:
+        ps.SyncTransactions()
+    pending = ps.GetPendingReviewList(ps.GetTransactionStore())
+    if Args.json:
+        print(json.dumps(pending, indent=4))
+        return 0
+    for t in pending:
+        print(f" {t['id']} | {t['date']} | {t['account'][:20]:<20} | {'${:>11}'.format('{:,.2f}'.format(t['amount']))} | {t['payee'][:40]:<40} | {t['category']}")
+    print(f'Transactions waiting for review: {len(pending)}')
+    return 0
+
+def CmdDelete(Args):
+    if Args.test == bool(Args.ids):
+        print('Give transaction ids or --test, not both')
+        return 2
+    if Args.test:
+        ps.SyncTransactions()
+        transactions = ps.FindTestTransactions(ps.GetTransactionStore().getTransactions())
+        for t in transactions:
+            print(f" {t['id']} | {t['date']} | {t['amount']} | {t['transaction_account']['name']} | {t['payee']} | {t['note']}")
+        transIds = [t['id'] for t in transactions]
+    else:
+        transIds = Args.ids
+    if not transIds:
+        print('No transactions to delete')
+        return 0
+    if Args.dry_run:
+        print(f'{len(transIds)} transactions would be deleted')
+        return 0
+    results = ps.DeleteTransactions(transIds)
+    for transId, error in results.items():
+        if error is not None:
+            print(f'Transaction {transId} deletion failed!  -> {error}')
+    failed = sum(error is not None for error in results.values())
+    print(f'--- # of deleted transactions: {len(results) - failed} ---')
+    return 1 if failed else 0
+
+# Export transactions as they are read, so memory use doesn't grow with the date range. Source 'api' pages through Pocketsmith without touching the local store,
+#  with account and category filtered as pages come in. Source 'store' reads local store in batches, after syncing it unless --no-sync
+def CmdExport(Args):
+    endDate = Args.end or date.today()
+    startDate = Args.start or endDate - timedelta(days=ps.TRANSACTION_FETCH_DAYS)
+    categoryIds = None
+    categoryTree = ps.GetCategoryTree()
+    if Args.category is not None:
+        ps.LoadCategories()
+        categoryId = categoryTree.find(Args.category)
+        if categoryId is None:
+            matches = categoryTree.matches(Args.category)
+            print(f'Category {Args.category} ' + (f'is ambiguous, use one of: {", ".join(n.path for n in matches)}' if matches else 'not found'), file=sys.stderr)
+            return 2
+        categoryIds = set(categoryTree.subtreeIds(categoryId))       # Sub-categories are exported too
+    if Args.source == 'api':
+        transactions = MyExport.FilterTransactions(ps.IterUserTransactions(startDate, endDate), Args.account, categoryIds)
+    else:
+        if not Args.no_sync:
+            ps.SyncTransactions()
+        transactions = ps.GetTransactionStore().iterTransactions(startDate, endDate, Args.account, categoryIds=categoryIds)
+
+    fileFormat = Args.format or MyExport.ExportFormat(Args.file)
+    categoryName = categoryTree.displayName if len(categoryTree) else None
+    start = time.perf_counter()
+    if Args.file == '-':
+        count = MyExport.ExportTransactions(transactions, Args.dataOut, fileFormat, categoryName)
+    else:
+        with open(Args.file, 'w', newline='', encoding='utf-8', buffering=MyExport.EXPORT_BUFFER_SIZE) as fp:
+            count = MyExport.ExportTransactions(transactions, fp, fileFormat, categoryName)
+    elapsed = time.perf_counter() - start
+    LogEvent(log, 'export', source=Args.source, format=fileFormat, count=count, ms=round(elapsed * 1000, 1))
+    print(f'Exported {count} transactions from {startDate} to {endDate} to {Args.file} in {elapsed:.2f}s ({count / max(elapsed, 1e-6):,.0f}/s)')
+    return 0
+
+# Import a statement file. Whole file is read and checked first, so nothing is posted if the column mapping is wrong. Rows with errors are listed and left out
+def CmdImport(Args):
+    mapping = {}
+    for item in Args.map or []:
+        field, sep, column = item.partition('=')
+        if not sep:
+            print(f'Invalid --map {item}. Use FIELD=COLUMN, eg. payee=Description', file=sys.stderr)
+            return 2
+        mapping[field.strip()] = column.strip()
+    defaults = {'account': Args.account, 'category': Args.category, 'transferTo': Args.transfer_to}
+    ps.LoadAccounts()
+    ps.LoadCategories()
+    try:
+        with open(Args.file, newline='', encoding='utf-8-sig') as fp:        # utf-8-sig drops the byte order mark some banks put at the start of csv files
+            rows = list(MyImport.ReadStatement(fp, Args.format or MyImport.ImportFormat(Args.file), mapping, defaults))
+    except MyImport.StatementError as ex:
+        print(f'Import failed! {ex}', file=sys.stderr)
+        return 2
+    valid = ps.CheckImportRows(rows)
+    for row in rows:
+        if row.error is not None:
+            print(f'Line {row.line} left out: {row.error}')
+    new, skipped = MyImport.SkipExisting(valid, ps.ExistingImportKeys(valid))
+    print(f'{len(rows)} rows read: {len(new)} to import, {len(skipped)} already in Pocketsmith, {len(rows) - len(valid)} with errors')
+    if Args.dry_run:
+        for row in new:
+            print(f'  {row.line:>5} | {row.date} | {row.account} | {row.amount:>11,.2f} | {row.payee} | {row.category or ""} | {row.transferTo or ""}')
+        return 0
+    if not new:
+        return 0
+
+    start = time.perf_counter()
+    lastShown = [0.0]
+
+    def Progress(Done, Total):
+        now = time.perf_counter()
+        if Done == Total or now - lastShown[0] >= 1:       # Show progress once a second
+            lastShown[0] = now
+            print(f'  {Done} of {Total} API calls done ({Done / (now - start):.1f}/s)', flush=True)
+
+    results = ps.ImportTransactions(new, NeedsReview=not Args.approve, Progress=Progress)
+    failed = {line: status for line, status in results.items() if 'SUCCESS' not in status.upper()}
+    for line, status in failed.items():
+        print(f'Line {line}: {status}')
+    elapsed = time.perf_counter() - start
+    LogEvent(log, 'import', rows=len(rows), imported=len(results) - len(failed), skipped=len(skipped), failed=len(failed), ms=round(elapsed * 1000, 1))
+    print(f'--- # of imported transactions: {len(results) - len(failed)} of {len(new)} in {elapsed:.1f}s ---')
+    return 1 if failed else 0
+
+# Daemon mode. Sync and auto clear every Interval s. Stops on Ctrl+C or SIGTERM, after the running cycle is finished
+def CmdDaemon(Args):
+    stop = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda signum, frame: stop.set())
+    ps.GetOutbox()      # Start replaying changes that were not sent yet
+    LogEvent(log, 'daemon_started', interval=Args.interval)
+    failures = 0
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            if ps.KeyFileChanged():
+                ps.ReadDevKey()
+            if Args.no_auto_clear:
+                cleared, pending = [], None
+                ps.SyncTransactions()
+            else:
+                cleared, pending = ps.SyncAndAutoClear()
+            failures = 0
+            LogEvent(log, 'daemon_cycle', cleared=len(cleared), pending=len(pending) if pending is not None else None, ms=round((time.perf_counter() - start) * 1000, 1))
+        except Exception as ex:      # eg. Pocketsmith can't be reached. Try again next cycle, waiting longer after repeated failures
+            failures += 1
+            LogEvent(log, 'daemon_cycle_failed', logging.ERROR, error=f'{type(ex).__name__} {ex}', failures=failures)
+        stop.wait(Args.interval * min(2 ** max(failures - 1, 0), 8))
+    LogEvent(log, 'daemon_stopped')
+    return 0
+
+
+# Function to build command line parser
+def ArgParser():
+    parser = argparse.ArgumentParser(description='Pocketsmith transaction sync and auto clear, without the GUI')
+    parser.add_argument('--quiet', action='store_true', help='Only show errors. Log events are still written to the log file')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    p = subparsers.add_parser('sync', help='Bring local transaction store up to date')
+    p.add_argument('--full', action='store_true', help='Download all transactions of the fetch window again, not only changed ones')
+    p.set_defaults(function=CmdSync)
+
+    p = subparsers.add_parser('auto-clear', help='Sync and auto clear re-appearing approved transactions')
+    p.add_argument('--full', action='store_true', help='Full sync first')
+    p.set_defaults(function=CmdAutoClear)
+
+    p = subparsers.add_parser('pending', help='List transactions waiting for review')
+    p.add_argument('--no-sync', action='store_true', help='List from local store without syncing first')
+    p.add_argument('--json', action='store_true', help='Print as json')
+    p.set_defaults(function=CmdPending)
+
+    p = subparsers.add_parser('delete', help='Delete transactions')
+    p.add_argument('ids', nargs='*', type=int, help='Transaction ids to delete')
+    p.add_argument('--test', action='store_true', help='Delete all transactions with "Test Trans" in their Note')
+    p.add_argument('--dry-run', action='store_true', help='Only list transactions to delete')
+    p.set_defaults(function=CmdDelete)
+
+    p = subparsers.add_parser('export', help='Save transactions to a csv, JSON Lines or json file')
+    p.add_argument('file', help='Output file, or - for stdout. Format is taken from file extension unless --format is given')
+    p.add_argument('--start', type=DateArg, help=f'Start date. Default is {ps.TRANSACTION_FETCH_DAYS} days before end date')
+    p.add_argument('--end', type=DateArg, help='End date. Default is today')
+    p.add_argument('--format', choices=MyExport.EXPORT_FORMATS)
+    p.add_argument('--source', choices=['store', 'api'], default='store', help='Read from local store (default) or download straight from Pocketsmith')
+    p.add_argument('--account', help='Only transactions of this account name')
+    p.add_argument('--category', help='Only transactions of this category (name or path) and its sub-categories')
+    p.add_argument('--no-sync', action='store_true', help='Export from local store without syncing first')
+    p.set_defaults(function=CmdExport)
+
+    p = subparsers.add_parser('import', help='Post transactions of a csv or OFX statement file')
+    p.add_argument('file', help='Statement file. Format is taken from file extension (.ofx, .qfx or csv) unless --format is given')
+    p.add_argument('--format', choices=MyImport.IMPORT_FORMATS)
+    p.add_argument('--map', action='append', metavar='FIELD=COLUMN', help=f'Csv column of a field, by heading or number from 1, eg. --map payee=Narrative. Can be repeated. Fields: {", ".join(MyImport.COLUMN_NAMES)}')
+    p.add_argument('--account', help='Account of rows without an account column, eg. Wallet')
+    p.add_argument('--category', help='Category of rows without a category')
+    p.add_argument('--transfer-to', help='Account of the other side of rows without a transfer column. Makes a double entry, same as posting a transfer from the GUI')
+    p.add_argument('--approve', action='store_true', help='Clear review flag of imported transactions')
+    p.add_argument('--dry-run', action='store_true', help='Only list transactions to import')
+    p.set_defaults(function=CmdImport)
+
+    p = subparsers.add_parser('daemon', help='Sync and auto clear on a schedule until stopped')
+    p.add_argument('--interval', type=float, default=DAEMON_INTERVAL, help=f'Time in s between syncs. Default {DAEMON_INTERVAL}')
+    p.add_argument('--no-auto-clear', action='store_true', help='Only sync')
+    p.set_defaults(function=CmdDaemon)
+    return parser
+
+def main(Argv=None):
+    args = ArgParser().parse_args(Argv)
+    stdout = sys.stdout
+    args.dataOut = stdout       # Export to '-' writes transactions here, so script messages and log events go to stderr instead
+    messages = sys.stderr if args.function is CmdExport and args.file == '-' else stdout
+    MyTelemetry.SetupLogging(None if args.quiet else messages)
+    if args.quiet:
+        sys.stdout = open(os.devnull, 'w')      # Script messages are printed by the API functions. Errors still go to stderr
+    else:
+        sys.stdout = messages
+    try:
+        if not ps.ReadDevKey():
+            return 2
+        return args.function(args)
+    finally:
+        if ps.outbox is not None:
+            ps.outbox.close()
+        if ps.approvalHistory is not None:
+            ps.approvalHistory.close()
+        if sys.stdout is not stdout:
+            if args.quiet:
+                sys.stdout.close()
+            sys.stdout = stdout
+
+
+if __name__ == "__main__":
+    sys.exit(main())
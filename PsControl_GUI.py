@@ -8,33 +8,55 @@
 # This file is the main entry point for the script.
 #  Created using PySimepleGUI package. Template from window panel was taken from https://pysimplegui.readthedocs.io/en/latest/cookbook/
 #  Repository link: https://github.com/gandos21/PocketSmith
-import PySimpleGUI as sg
+import time
+STARTUP_START = time.perf_counter()     # Startup time is measured from here, before any heavy imports
 import sys
-import WindowLayout as wl
-import MyPocketSmith as ps
+import logging
 import MyUtils as ut
+import MyWorker
+import MyTelemetry
+import MyStartup
+from MyTelemetry import LogEvent
+# PySimpleGUI, MyPocketSmith (requests) and window modules are imported in main(), in parallel with each other. See MyStartup.py
+ps = None
 
 #### Constants, configs & globals ####
 WIN_READ_TIMEOUT        = 1000      # Window read timeout duration in ms
 NEW_DATA_CHECK_INTERVAL = 600       # Time interval in s to get new data from Pocketsmith
+APPROVAL_CHECK_INTERVAL = 2         # Time interval in s to check approvals queued in the outbox are done (see ps.CheckQueuedApprovals())
+TELEMETRY_SAVE_ON_EXIT  = True      # Save API call stats to json and csv files (see MyTelemetry.py) when window is closed
+STARTUP_REPORT          = True      # Print startup timing report to console once transactions are loaded
+AUTO_APPROVE_RULES      = True      # Approve new transactions matched by a payee rule with auto_approve set (see MyPayeeRules.py) without waiting for review
+
+log = logging.getLogger('PocketSmith.gui')
 
 #### End Configs & globals ####
 
 # Main function to start gui panel
 def main():
-    if not ps.ReadDevKey():     # Read developer API key from external file. If key file doesn't exist, terminate script
+    global ps
+    MyTelemetry.SetupLogging(sys.stdout)       # Structured log lines go to log file and console
+    timer = MyTelemetry.StartupTimer(STARTUP_START)
+
+    # Read developer API key, then load categories, accounts, approval history and new transactions in background. Cached copies of categories and accounts are used if available,
+    #  and are checked for changes in background once window is up. Window is shown once categories and accounts are loaded. Review grid is filled when transactions arrive
+    loader = MyStartup.StartupLoader(timer).start()
+    with timer.phase('import gui'):
+        import PySimpleGUI as sg
+        import WindowLayout as wl
+    with timer.phase('wait for metadata'):
+        error = loader.waitForMetadata()
+    if error is not None:       # If key file doesn't exist or metadata can't be loaded, terminate script
+        print(f'Startup failed: {type(error).__name__} {error}')
         return
-
-    # Get list of categories and accounts from Pocketsmith
-    ps.LoadCategories()
-    ps.LoadAccounts()
-    approvedTransactionDict = ps.LoadApprovedTransactions()
-    unconfirmedTransactions, allTransactions = ps.GetUserTransactions()
+    import MyPocketSmith as ps
+    from ReviewGrid import ReviewGrid
 
     # Save the sys.stdout object pointer. With the window.read() call below, the stdout pointer will switch to the GUI output panel, because of the added sg.Output() element in the GUI layout. Ref: https://pysimplegui.readthedocs.io/en/latest/#output-element
     #  So any print() calls after that will appear on GUI only. Hence, we save the original stdout object pointer to print to command window for debugging purpose.  Ref: https://stackoverflow.com/a/3263733
     #  For example, to print anything to console after GUI is launched and window.read() is called, use the following, until sys.stdout and sys.stderr are re-instated
     #   cmdPrint.write(testVariable + '\n')     # Debug print to console. write() takes a string input. If testVariable is not string covert to string, like str(testVariable)
+    #  Debug info is logged with LogEvent(), which writes to the console stream saved when logging was set up, and to the log file
     cmdPrint = sys.stdout
     cmdErr = sys.stderr
 
@@ -43,63 +65,142 @@ def main():
     sg.theme('LightGreen1')
     #print(sg.theme_list())     # Debug: Print all available themes in PySimpleGUI. Also check at, https://pysimplegui.readthedocs.io/en/latest/#themes-automatic-coloring-of-your-windows
 
-    # Create the window object
-    panel = wl.WindowLayout(ps.accountList, ps.categoryList, unconfirmedTransactions)
-    #window = sg.Window('Pocketsmith Transaction Entry', window_layout, default_element_size=(80, 1), grab_anywhere=False)
-    window = sg.Window('Pocketsmith Control', panel.layout(), grab_anywhere=False)
+    # Create the window object. Window is created once. Review grid shows a page of transactions at a time, re-using the same rows
+    with timer.phase('build window'):
+        panel = wl.WindowLayout(ps.accountList, ps.categoryList)
+        #window = sg.Window('Pocketsmith Transaction Entry', window_layout, default_element_size=(80, 1), grab_anywhere=False)
+        window = sg.Window('Pocketsmith Control', panel.layout(), grab_anywhere=False, finalize=True)
+    timer.mark('window shown')
     #print(window.AllKeysDict)  # Debug: Print all dict keys. Found attribute using dir() function
     #print(dir(window[0]))      # Debug: Addresing the elements of window via dict keys. Ref: https://pysimplegui.readthedocs.io/en/latest/#windowfindelementkey-shortened-to-windowkey
 
+    # Category lists are filtered as the user types in them. Split rows are bound when they are created (see ReviewGrid)
+    panel.bindTypeAhead(window, [panel.CATEGORY_NAME] + [f'-TransGrid_{slot}_3_0-' for slot in range(panel.pageSize)])
+
+    # sg.Output element has now taken over stdout. Route prints from worker threads through window events, as Tk widgets must only be updated from GUI thread
+    sys.stdout = MyWorker.WorkerStdout(sys.stdout, window)
+
     # Initial state of window elements' values will be panelDefaults
     fieldValuesCurrent = panel.fieldValues
-    initialHideDone = False
-    unconfirmedTransactionApproved = [False for i in range(len(unconfirmedTransactions))]
-    unconfirmedTransactionAmount   = [float(v['amount']) for i, v in enumerate(unconfirmedTransactions)]
-    hiddenSplitRow = [0 for i in range(len(unconfirmedTransactions))]       # List of integer counters initialised to 0. Counters to keep track of inserted split rows for each main transactions
 
-    # If no new transactions to review at program launch, display a message and hide table title row
-    NoReviewCheck(unconfirmedTransactions, window)
+    # Review grid keeps data and unsaved edits of all transactions to review, keyed by transaction id. It's filled when startup loads are done (STARTUP_DONE_EVENT)
+    grid = ReviewGrid(window, panel)
+    grid.updateStatus()
+    window['-ReviewTab_Status-'].Update(' ' * 90 + 'Loading new transactions...', text_color='darkblue', font='Any 12 bold')
+    loader.setWindow(window)
+
+    # Background worker runs API calls off the GUI thread, so the panel keeps taking input. Results come back as WORKER_DONE_EVENT window events
+    worker = MyWorker.ApiWorker(window)
+    worker.schedule('refresh', RefreshData, NEW_DATA_CHECK_INTERVAL)     # Every NEW_DATA_CHECK_INTERVAL seconds, check for new transactions from Pocketsmith
+    worker.schedule('approvalCheck', ps.CheckQueuedApprovals, APPROVAL_CHECK_INTERVAL)     # Results of approvals sent by the outbox in background come back through the worker too
+    worker.submit('metadata', ps.RevalidateMetadata)                     # Check cached categories and accounts are up to date
+
+    apiStatsRows = []           # Rows shown in API Stats table, to look up the selected endpoint
+    payeeTarget = None          # Key of review grid payee field that payee suggestions are shown for
 
     # Main window event handler loop
-    timerCount = NEW_DATA_CHECK_INTERVAL
     while True:
-        if initialHideDone:
-            event, values = window.read(timeout=WIN_READ_TIMEOUT)           # Read event from window. Buttons are event enabled. Events for other elements enabled (using parameter enable_events) as desired. Ref: https://pysimplegui.readthedocs.io/en/latest/#events
-
-        else:  # Keep empty rows for split transaction until they are required
-            event, values = window.read(timeout=50)         # A quicker read() with shorter timeout when window is newly created with new unhidden rows, so we hide them them quickly. Note: read() is a blocking call without a timeout, unless an event occurs
-            for row in range(len(unconfirmedTransactions)):
-                for i in range(1, panel.splitRowsCount):
-                    window[f'-SplitRow_{row}_{i}-'].hide_row()          # Hint from https://github.com/PySimpleGUI/PySimpleGUI/issues/721#issuecomment-438704952
-                window[f'-TransGrid_SpacerRow_{row}-'].hide_row()
-            initialHideDone = True
-
-        if event == '__TIMEOUT__' or event == '-ReviewDataRefresh-':
-            timerCount -= 1
-            # Debug: Print count down time on console
-            cmdPrint.write('%4ds\b\b\b\b\b' % timerCount)     # Moving back the cursor 5 positions using \b, so that the 4 digit (works up to 9999s) count down value is written over the old one
+        event, values = window.read(timeout=WIN_READ_TIMEOUT)           # Read event from window. Buttons are event enabled. Events for other elements enabled (using parameter enable_events) as desired. Ref: https://pysimplegui.readthedocs.io/en/latest/#events
+
+        if event == '__TIMEOUT__':
+            # Debug: Print count down time to next refresh on console
+            cmdPrint.write('%4ds\b\b\b\b\b' % worker.secondsUntil('refresh'))     # Moving back the cursor 5 positions using \b, so that the 4 digit (works up to 9999s) count down value is written over the old one
             cmdPrint.flush()
+            if values['-TabGroup-'] == 'API Stats':
+                apiStatsRows = UpdateApiStats(window, values['-ApiStatsTable-'], apiStatsRows)
 
-            if timerCount == 0 or event == '-ReviewDataRefresh-':       # Every NEW_DATA_CHECK_INTERVAL seconds, check for new transactions from Pocketsmith. Or when Refresh button is clicked
-                timerCount = NEW_DATA_CHECK_INTERVAL
-                cmdPrint.write('Debug 1: Checking for new data' + '\n')
-                #if False not in unconfirmedTransactionApproved:
-                unconfirmedTransactions, allTransactions = ps.GetUserTransactions()
-                if unconfirmedTransactionApproved.count(False) != len(unconfirmedTransactions):
-                    cmdPrint.write('Debug 2: Downloaded new transactions for review' + '\n')
-                    initialHideDone = False
-                    unconfirmedTransactionApproved = [False for i in range(len(unconfirmedTransactions))]
-                    unconfirmedTransactionAmount = [float(v['amount']) for i, v in enumerate(unconfirmedTransactions)]
-                    hiddenSplitRow = [0 for i in range(len(unconfirmedTransactions))]  # List of integer counters initialised to 0. Counters to keep track of inserted split rows for each main transactions
-                    # Close and re-open window with newly downloaded transaction data
-                    window.close()
-                    panel = wl.WindowLayout(ps.accountList, ps.categoryList, unconfirmedTransactions, fieldValues=fieldValuesCurrent)
-                    window = sg.Window('Pocketsmith Control', panel.layout(), grab_anywhere=False)
-                    event, values = window.read(timeout=50)       # Dummy initial read after window creation. A short timeout given because read() is normally a blocking call, unless an event occurs
-                    NoReviewCheck(unconfirmedTransactions, window)
-                    cmdPrint.write(str(unconfirmedTransactionApproved) + '\n')
+        if event == '-ReviewDataRefresh-':      # Refresh button clicked. Check for new transactions straight away
+            worker.runNow('refresh')
 
+        if event in ('-ReviewPagePrev-', '-ReviewPageNext-'):
+            grid.changePage(-1 if event == '-ReviewPagePrev-' else 1)
+            window['-ReviewPayeeSuggestBlock-'].update(visible=False)      # Slots show other transactions now
+            payeeTarget = None
 
+        ## Startup loads finished. Fill review grid ##
+        if event == MyStartup.STARTUP_DONE_EVENT:
+            try:
+                unconfirmedTransactions, allTransactions = loader.transactions()
+                grid.update(unconfirmedTransactions, ps.ApprovalsInFlight())     # Approvals queued before a restart may still be in the outbox
+                AutoApprove(worker, grid, panel)
+            except Exception as ex:
+                print(f'Loading transactions failed: {type(ex).__name__} {ex}. Click Refresh to try again')
+            grid.updateStatus()         # If no new transactions to review at program launch, display a message and hide table title row
+            timer.mark('review grid filled')
+            timer.log(log)
+            if STARTUP_REPORT:
+                cmdPrint.write('\n'.join(timer.report()) + '\n')
+
+        ## Background worker events ##
+        if event == MyWorker.WORKER_PRINT_EVENT:    # Message printed by a background job
+            print(values[event], end='')
+
+        if event == MyWorker.WORKER_DONE_EVENT:
+            job = values[event]
+            metadataChanged = []
+            if job.name != 'approvalCheck' or job.result or job.error is not None:        # Approval checks with nothing finished are not logged
+                LogEvent(log, 'job_done', job=job.name, ms=round(job.elapsed * 1000, 1), error=repr(job.error) if job.error is not None else None)
+            if job.error is not None:
+                print(f'Background job {job.name} failed: {type(job.error).__name__} {job.error.args}')
+                if job.name in ('report', 'reportDownload'):
+                    window['-ReportStatus-'].update(f'Report failed! {type(job.error).__name__} {job.error}' + (' (numpy package is needed for reports)' if isinstance(job.error, ImportError) else ''), text_color='red')
+                if job.name in ('approve', 'approveAll'):
+                    for transId in (job.tag if job.name == 'approveAll' else [job.tag]):
+                        grid.setInFlight(transId, False)
+                    window['-ReviewTab_Status-'].Update(' ' * 5 + f'Transaction posting failed! {type(job.error).__name__}', text_color='red', font='Any 12')
+
+            elif job.name == 'metadata':
+                metadataChanged = job.result
+
+            elif job.name == 'refresh':
+                metadataChanged, inFlightIds, (unconfirmedTransactions, allTransactions) = job.result
+                LogEvent(log, 'refresh_done', pending=len(unconfirmedTransactions), transactions=len(allTransactions))
+                # Add rows of new transactions and remove rows of transactions that no longer need review. Rows being edited or approved are left untouched
+                added, removed = grid.update(unconfirmedTransactions, inFlightIds)
+                if added or removed:
+                    LogEvent(log, 'grid_updated', added=added, removed=removed)
+                    AutoApprove(worker, grid, panel)
+                    grid.updateStatus()
+
+            elif job.name == 'report':
+                headings, rows, storeCount = job.result
+                window['-ReportOutput-'].update('\n'.join(ReportText(headings, rows)))
+                window['-ReportStatus-'].update(f'{len(rows)} rows from {storeCount} transactions in local store. Took {job.elapsed * 1000:.0f} ms', text_color='darkblue')
+
+            elif job.name == 'reportDownload':
+                window['-ReportStatus-'].update(f'Downloaded {job.result} transactions to local store. Click Run Report to include them', text_color='darkblue')
+
+            elif job.name == 'approve':
+                # Approval API calls of a transaction finished
+                status, approvedMain = job.result
+                ApprovalDone(window, grid, panel, job.tag, status, approvedMain)
+
+            elif job.name == 'approveAll':
+                # Approval API calls of a batch of transactions finished
+                failed = 0
+                for transId, (status, approvedMain) in job.result.items():
+                    ApprovalDone(window, grid, panel, transId, status, approvedMain)
+                    failed += 'FAILED' in status.upper()
+                if failed:
+                    window['-ReviewTab_Status-'].Update(' ' * 5 + f'{failed} of {len(job.result)} transactions failed to post! Failed transactions are left in review list', text_color='red', font='Any 12')
+                else:
+                    window['-ReviewTab_Status-'].Update(' ' * 50 + f'{len(job.result)} transactions approved', text_color='green', font='Any 12')
+                    grid.updateStatus(allCleared=True)
+
+            elif job.name == 'approvalCheck':
+                # Approvals queued in the outbox finished. Done ones are saved to history, failed ones are shown again for review
+                for transId, (status, approvedMain) in job.result.items():
+                    ApprovalDone(window, grid, panel, transId, status, approvedMain)
+
+            ## Categories or accounts changed in Pocketsmith. Update drop down lists with new data ##
+            if metadataChanged:
+                LogEvent(log, 'metadata_changed', names=metadataChanged)
+                panel.accountList = ps.accountList
+                panel.categoryList = ps.categoryList
+                UpdateComboValues(window, [panel.AC_FROM, panel.AC_TO], ps.accountList)
+                UpdateComboValues(window, ['-ReportAccount-'], [wl.ALL_ACCOUNTS] + ps.accountList)
+                UpdateComboValues(window, [panel.CATEGORY_NAME], ps.categoryList)
+                grid.updateComboValues(ps.accountList, ps.categoryList)
 
         ## Exit button or window close (X) event ##
         if event in (sg.WIN_CLOSED, 'Exit'):    # Checking for window X close button or our own Exit button. Checking of X is prioritised over other events. Doing X abruptly stop compiled EXE execution, eg. doing json dump above this line was crashing compiled EXE when X was clicked.
@@ -107,305 +208,134 @@ def main():
 
         ## Button events ##
         if event == 'Post':
-            ps.PostTransaction(values)
-            
+            worker.submit('post', ps.PostTransaction, dict(values))
+
         if event == 'Get Trans':
             pass    # TODO
             #ps.GetAccountTransactions(values)
         if event == 'Delete Tran':
-            ps.DeleteAccountTransaction(values)
+            worker.submit('delete', ps.DeleteAccountTransaction, dict(values))
         if event == 'Clear Msg':
             window.FindElement('-Output-').Update('')   # Clearing the contents of Output element window. Ref: https://github.com/PySimpleGUI/PySimpleGUI/issues/1441#issuecomment-493741474
         if event == 'Clear Reports':
-            pass
+            window['-ReportOutput-'].update('')
+            window['-ReportStatus-'].update('')
+
+        ## Reports tab events ##
+        if event in ('-ReportRun-', '-ReportDownload-'):
+            try:
+                startDate, endDate, account = ReportArgs(values, wl.ALL_ACCOUNTS)
+            except ut.DateFormatError as ex:
+                window['-ReportStatus-'].update(f'Invalid date! {ex}', text_color='red')
+            else:
+                if event == '-ReportRun-':
+                    worker.submit('report', ps.GetReport, values['-ReportName-'], startDate, endDate, account)
+                    window['-ReportStatus-'].update('Working...', text_color='darkblue')
+                else:
+                    worker.submit('reportDownload', ps.DownloadTransactions, startDate, endDate)
+                    window['-ReportStatus-'].update(f'Downloading transactions from {startDate} to {endDate}...', text_color='darkblue')
+
+        ## API Stats tab events ##
+        if event == '-ApiStatsTable-':      # Endpoint selected. Show its latency histogram
+            ShowApiHistogram(window, values['-ApiStatsTable-'], apiStatsRows)
+        if event == '-ApiStatsSave-':
+            SaveApiStats()
+        if event == '-ApiStatsReset-':
+            ps.GetTelemetry().reset()
+            apiStatsRows = UpdateApiStats(window, [], apiStatsRows)
         ## File name input text box change events ##
         if event == '-TabGroup-':
             if values['-TabGroup-'] == 'Review':
-                if False in unconfirmedTransactionApproved:
-                    if len(unconfirmedTransactions) == 0:
-                        window['-ReviewTab_Status-'].Update(' ' * 90 + 'No new transactions to review', text_color='darkblue', font='Any 12 bold')          # Using Update() to update the value of the InputText box.  Ref: https://pysimplegui.readthedocs.io/en/latest/call%20reference/#window/#Update
-                    else:
-                        window['-ReviewTab_Status-'].Update(' ' * 70 + 'Review & confirm new transactions. If Rejected, transaction will be deleted!', text_color='darkblue', font='Any 12 bold')
-                        # Fill in the new transaction data to table
-                        for i, row in enumerate(unconfirmedTransactions):
-                            window[f'-TransGrid_{i}_0_0-'].Update(row['date'])
-                            window[f'-TransGrid_{i}_1_0-'].Update(row['account'])
-                            if float(row['amount']) < 0.0:
-                                # Note: we use SepAmount() to add , separators to display on GUI.
-                                #   This caused problem later when we needed to convert it to float as float() doesn't take , in string input.
-                                #   So we later remove the comma whenever we convert GUI amount strings to float, using .replace(',','')
-                                window[f'-TransGrid_{i}_2_0-'].Update(ut.SepAmount('%.2f' % float(row['amount'])), text_color='brown')     # Show debit amount in brown colour, credit in green
-                            else:
-                                window[f'-TransGrid_{i}_2_0-'].Update(ut.SepAmount('%.2f' % float(row['amount'])), text_color='green')
-                            try:
-                                #cmdPrint.write(row['category'] + '\n')     # Debug print to console
-                                if row['category'] not in ps.categoryList or row['category'] == '<< Uncategorised >>':
-                                    window[f'-TransGrid_{i}_3_0-'].Update(row['category'], font='Any 10 bold')     # If Pocketsmith had assigned a category different to our own or not categorised, then show it in bold face to differentiate from others
-                                else:
-                                    window[f'-TransGrid_{i}_3_0-'].Update(row['category'], font='Any 10')
-                            except Exception as ex:
-                                # Generic exception reporting (to find out where the error occurred). Ref: https://stackoverflow.com/a/9824050/7251433
-                                cmdPrint.write(f'An exception of type {type(ex).__name__} occurred. Arguments:\n{ex.args}')
-                            window[f'-TransGrid_{i}_4_0-'].Update(row['payee'])
-                            window[f'-TransGrid_{i}_6_0-'].Update(row['note'])
-
-        if '-TransGrid_' in event:          # Amount change event. Only for Amount field event change is activated. Event may be like this:  -TransGrid_x_2_n-     where x is row number and n=0..4
-            row = int(event.split('_')[1])  # Get row number
-            # Split's remaining amount rationality check. Sum the amounts in main and split transactions, and show difference in split remaining amount
-            #if f'-TransGrid_{row}_2' in event:   # Amount change event
-            #cmdPrint.write(event + '\n')
-            amtSum = 0.0
-            for i in range(0, panel.splitRowsCount):
-                try:
-                    amt = float(window[f'-TransGrid_{row}_2_{i}-'].get().replace(',',''))       # Removing , separator before float conversion
-                    amtSum += amt
-                    # Colour the entered amount. Note: Code commented out as it prevent arrow keys to move cursor in the Input field. Check for another method to implement colour coding the amount
-                    # if amt > 0.001:
-                    #     window[f'-TransGrid_{row}_2_{i}-'].Update(window[f'-TransGrid_{row}_2_{i}-'].get(), text_color='green')
-                    # elif amt < -0.001:
-                    #     window[f'-TransGrid_{row}_2_{i}-'].Update(window[f'-TransGrid_{row}_2_{i}-'].get(), text_color='brown')
-                    # else:
-                    #     window[f'-TransGrid_{row}_2_{i}-'].Update(window[f'-TransGrid_{row}_2_{i}-'].get(), text_color='black')
-                except:
-                    pass        # Amount on field on split row may be empty an string - ignore them
-            # Update split remaining amount indicator
-            diff = (unconfirmedTransactionAmount[row]-amtSum)
-            if diff < -0.001:
-                window[f'-SplitRowRemAmt_{row}_1-'].Update('%.2f' % diff, text_color='red', font='Any 10 bold')
-            elif diff > 0.001:
-                window[f'-SplitRowRemAmt_{row}_1-'].Update('%.2f' % diff, text_color='green', font='Any 10 bold')
-            elif diff < 0.0:        # Just to remove minus sign from remaining very small negative amounts eg. -0.000000001
-                window[f'-SplitRowRemAmt_{row}_1-'].Update('%.2f' % (diff*-1), text_color='black', font='Any 10 bold')
+                grid.updateStatus()
+            if values['-TabGroup-'] == 'API Stats':
+                apiStatsRows = UpdateApiStats(window, values['-ApiStatsTable-'], apiStatsRows)
+
+        if isinstance(event, str) and event.endswith(wl.TYPE_AHEAD_SUFFIX):      # Key typed in a category drop down list
+            FilterCategoryCombo(window, event[:-len(wl.TYPE_AHEAD_SUFFIX)])
+
+        elif '-TransGrid_' in event:        # Amount or payee change event. Only for these fields event change is activated. Event may be like this:  -TransGrid_x_2_n-     where x is grid slot number and n is split row number
+            slot, col = int(event.split('_')[1]), int(event.split('_')[2])     # Get slot and column number
+            if col == 4:
+                payeeTarget = event
+                ShowPayeeSuggestions(window, '-ReviewPayeeSuggest-', '-ReviewPayeeSuggestBlock-', values[event])
             else:
-                window[f'-SplitRowRemAmt_{row}_1-'].Update('%.2f' % diff, text_color='black', font='Any 10 bold')
-
+                grid.updateRemainingAmount(slot)
+
+        ## Payee autocomplete events ##
+        if event == panel.PAYEE_NAME:
+            ShowPayeeSuggestions(window, '-PayeeSuggest-', '-PayeeSuggest-', values[event])
+        if event == '-PayeeSuggest-' and values[event]:
+            window[panel.PAYEE_NAME].Update(values[event][0])
+            window['-PayeeSuggest-'].update(visible=False)
+        if event == '-ReviewPayeeSuggest-' and values[event] and payeeTarget is not None:
+            window[payeeTarget].Update(values[event][0])
+            window['-ReviewPayeeSuggestBlock-'].update(visible=False)
+            payeeTarget = None
 
         if '-TransGridApprove' in event:
             # Rationality checks:
             #   1. Check split Remaining amount is zero. Don't approve if this condition isn't met
             #   2. For each transaction, check date, account, amount and category are valid, to post that transaction. Other fields are optional
             #   3. If Transfer To account is given and valid, make a double entry with inverse amount. Change Payee to "Transfer : xxx" for both double transactions, where xxx is name of each other's account name
-            #   4. If all posts to server are successful, hide the transaction rows
-            cmdPrint.write('Debug 3' + '\n')
-            row = int(event.split('_')[1])
-            try:
-                remAmt = float(window[f'-SplitRowRemAmt_{row}_1-'].get())
-            except:
-                remAmt = 0.0
-            if ut.IsFloatValueZero(remAmt):
-                cmdPrint.write('Debug 3b' + '\n')
+            #   4. If all posts to server are successful, remove the transaction from review grid
+            transId = grid.slotTransaction(int(event.split('_')[1]))
+            LogEvent(log, 'approve_clicked', logging.DEBUG, transId=transId)
+            grid.saveEdits()        # Review state is used for checks and posting, so bring it up to date with the fields
+            state = grid.rows[transId]
+            if state['inFlight']:
+                pass        # Approval of this transaction is already in progress
+            elif ut.IsFloatValueZero(grid.remainingAmount(transId)):
                 # Check user input data are valid
-                valid = [False for i in range(0, panel.splitRowsCount)]
-                resp = ['' for i in range(0, panel.splitRowsCount)]
-                for i in range(0, panel.splitRowsCount):
-                    valid[i], resp[i] = ValidateFields(window[f'-TransGrid_{row}_0_{i}-'].get(),    # Date
-                                                       window[f'-TransGrid_{row}_1_{i}-'].get(),    # Account name
-                                                       window[f'-TransGrid_{row}_2_{i}-'].get(),    # Amount
-                                                       window[f'-TransGrid_{row}_3_{i}-'].get(),    # Category
-                                                       window[f'-TransGrid_{row}_5_{i}-'].get())    # Transfer account name
-                if False in valid:
-                    # Some input data is invalid. When there's no error, we expect all elements to be True in valid[] list
-                    errorMsgIdx = valid.index(False)
-                    window['-ReviewTab_Status-'].Update(' ' * 70 + resp[errorMsgIdx], text_color='red', font='Any 12 bold')
-                    cmdPrint.write('Debug 3c' + '\n')
+                entries, errorMsg = GetApprovalEntries(panel, state)
+                if entries is None:
+                    window['-ReviewTab_Status-'].Update(' ' * 70 + errorMsg, text_color='red', font='Any 12 bold')
+                    LogEvent(log, 'approve_invalid', transId=transId, error=errorMsg)
                 else:
                     window['-ReviewTab_Status-'].Update('', text_color='black')     # Clear status message
-                    # Input data are valid. Post transactions to Pocketsmith
-                    status = ''
-                    cmdPrint.write('Debug 3d-1' + '\n')
-                    for i in range(0, panel.splitRowsCount):        # For each Approve request, loop through main transaction and splits
-                        transDict = {}
-                        res1 = ''
-                        if resp[i] == 'No transfer':
-                            cmdPrint.write(f"Debug 3d-2: {unconfirmedTransactions[row]['date']}" + '\n')
-                            # Main transaction should be updated, split transactions should be created as new
-                            if i == 0:
-                                # Main transaction
-                                transDict[panel.TRANSACTION_DATE] = unconfirmedTransactions[row]['date']
-                                cmdPrint.write(f"Debug 3d-3: {unconfirmedTransactions[row]['account']}" + '\n')
-                                transDict[panel.AC_FROM] = unconfirmedTransactions[row]['account']
-                                cmdPrint.write('Debug 3e' + '\n')
-                                transDict[panel.AMOUNT]           = window[f'-TransGrid_{row}_2_{i}-'].get()
-                                transDict[panel.CATEGORY_NAME]    = window[f'-TransGrid_{row}_3_{i}-'].get()
-                                transDict[panel.PAYEE_NAME]       = window[f'-TransGrid_{row}_4_{i}-'].get()
-                                transDict[panel.AC_TO]            = window[f'-TransGrid_{row}_5_{i}-'].get()
-                                cmdPrint.write('Debug 3f' + '\n')
-                                transDict[panel.NOTE_TEXT]        = window[f'-TransGrid_{row}_6_{i}-'].get()
-                                #cmdPrint.write('-----------------------------------------------' + '\n')
-                                #cmdPrint.write(str(transDict) + '\n')
-                                cmdPrint.write('Debug 3g' + '\n')
-                                res1, res2, status = ps.UpdateTransaction(unconfirmedTransactions[row]['id'], transDict, Need_Review=False)
-                                # cmdPrint.write('Res1: ' + '\n')
-                                # cmdPrint.write(str(res1) + '\n')
-                                # cmdPrint.write('Res2: ' + '\n')
-                                # cmdPrint.write(str(res2) + '\n')
-                                cmdPrint.write('Debug 3h' + '\n')
-                            else:
-                                cmdPrint.write('Debug 3-2a' + '\n')
-                                transDict[panel.TRANSACTION_DATE] = unconfirmedTransactions[row]['date']
-                                transDict[panel.AC_FROM]          = unconfirmedTransactions[row]['account']
-                                transDict[panel.AMOUNT]           = window[f'-TransGrid_{row}_2_{i}-'].get()
-                                transDict[panel.CATEGORY_NAME]    = window[f'-TransGrid_{row}_3_{i}-'].get()
-                                transDict[panel.PAYEE_NAME]       = unconfirmedTransactions[row]['payee']         # We create new split transaction with 'original_payee' of main trans. This may help with correct clearing of pending transaction. Pocketsmith may use 'original_payee' to group sum to match bank amount. Not sure about this as we haven't verified otherwise
-                                transDict[panel.AC_TO]            = window[f'-TransGrid_{row}_5_{i}-'].get()
-                                transDict[panel.NOTE_TEXT]        = window[f'-TransGrid_{row}_6_{i}-'].get()
-                                cmdPrint.write('Debug 3-2b' + '\n')
-                                res1, res2, status = ps.PostTransaction(transDict, Need_Review=False)
-                                cmdPrint.write('Debug 3-2c' + '\n')
-                                if 'SUCCESS' in status.upper():     # When we create new transaction, we need to run an Update Transaction API to clear the review flag in Pocketsmith. Even with needs_review flag is set to False, a newly created transaction always comes up for review
-                                    transDict[panel.PAYEE_NAME] = window[f'-TransGrid_{row}_4_{i}-'].get()        # Get new payee name from input field
-                                    cmdPrint.write('Debug 3-2d' + '\n')
-                                    res1, res2, status = ps.UpdateTransaction(res1['id'], transDict, Need_Review=False) # Using id of the newly created transaction in the above step, to update it
-                                    cmdPrint.write('Debug 3-2e' + '\n')
-                                    # cmdPrint.write(str(res1) + '\n')
-                                    # cmdPrint.write('-----------------------------------------------' + '\n')
-                                    # cmdPrint.write(status + '\n')
-                                    # cmdPrint.write('-----------------------------------------------' + '\n')
-
-                        elif resp[i] == 'Transfer':
-                            # Main transaction should be updated, split transactions should be created as new
-                            transDict = {}
-                            if i == 0:
-                                # Main transaction
-                                cmdPrint.write('Debug 3-3a' + '\n')
-                                transDict[panel.TRANSACTION_DATE] = unconfirmedTransactions[row]['date']
-                                transDict[panel.AC_FROM]          = unconfirmedTransactions[row]['account']
-                                cmdPrint.write('Debug 3-3b' + '\n')
-                                transDict[panel.AMOUNT]           = window[f'-TransGrid_{row}_2_{i}-'].get()
-                                transDict[panel.CATEGORY_NAME]    = window[f'-TransGrid_{row}_3_{i}-'].get()
-                                transDict[panel.PAYEE_NAME]       = window[f'-TransGrid_{row}_4_{i}-'].get()
-                                transDict[panel.AC_TO]            = window[f'-TransGrid_{row}_5_{i}-'].get()
-                                transDict[panel.NOTE_TEXT]        = window[f'-TransGrid_{row}_6_{i}-'].get()
-                                res1, res2, status = ps.UpdateTransaction(unconfirmedTransactions[row]['id'], transDict, Need_Review=False)
-                                # cmdPrint.write('Res1: ' + '\n')
-                                # cmdPrint.write(str(res1) + '\n')
-                                # cmdPrint.write('Res2: ' + '\n')
-                                # cmdPrint.write(str(res2) + '\n')
-                                cmdPrint.write('Debug 3-3c' + '\n')
-                                res1, status = ps.ConfirmTransaction(unconfirmedTransactions[row]['id'])
-                                cmdPrint.write('Debug 3-3d' + '\n')
-
-                            else:
-                                transDict[panel.TRANSACTION_DATE] = unconfirmedTransactions[row]['date']
-                                transDict[panel.AC_FROM]          = unconfirmedTransactions[row]['account']
-                                cmdPrint.write('Debug 3-4a' + '\n')
-                                transDict[panel.AMOUNT]           = window[f'-TransGrid_{row}_2_{i}-'].get()
-                                transDict[panel.CATEGORY_NAME]    = window[f'-TransGrid_{row}_3_{i}-'].get()
-                                transDict[panel.PAYEE_NAME]       = unconfirmedTransactions[row]['payee']         # We create new split transaction with 'original_payee' name of main trans. This may help with correct clearing of pending transaction. Pocketsmith may use 'original_payee' to group sum to match bank amount. Not sure about this as we haven't verified otherwise
-                                transDict[panel.AC_TO]            = window[f'-TransGrid_{row}_5_{i}-'].get()
-                                transDict[panel.NOTE_TEXT]        = window[f'-TransGrid_{row}_6_{i}-'].get()
-                                cmdPrint.write('Debug 3-4b' + '\n')
-                                res1, res2, status = ps.PostTransaction(transDict, Need_Review=False, ChangePayeeName=False)        # For split transfer transaction, Payee name is not changed in the first creation of transaction as we want to clone payee of original
-                                cmdPrint.write('Debug 3-4c' + '\n')
-                                if 'SUCCESS' in status.upper():     # When we create new transaction, we need to run an Update Transaction API to clear the review flag in Pocketsmith. Even with needs_review flag is set to False, a newly created transaction always comes up for review
-                                    cmdPrint.write('Debug 3-4d' + '\n')
-                                    res1, res2, status = ps.UpdateSplitTranferTransactions(res1['id'], res2['id'], transDict)
-                                    cmdPrint.write('Debug 3-4e' + '\n')
-
-                        else:   # Ignore split rows without any amount input
-                            pass
-
-                        if 'FAILED' in status.upper():
-                            cmdPrint.write('Debug 3i: API error: ' + status + '\n')
-                            window['-ReviewTab_Status-'].Update(' ' * 5 + status, text_color='red', font='Any 12')
-                            break
-                        else:
-                            # Success. Transaction approval process for requested row (either main or split) is successful.
-                            # It was noted that sometimes the main transaction repeatedly appear for confirmation even after it was confirmed before.
-                            #  Usually, happens with bank synced trans while they remain on Pending state. It can also happen when main trans amount is split.
-                            #  To prevent such confirmation repetitions, we can save approved main transactions of the last 10 or 15 days with their IDs and when they come up again, the script can detect and automatically clear them again.
-                            if i == 0:      # We need to save only the main transactions, not splits
-                                cmdPrint.write('\nApproved main transaction details:' + '\n')
-                                if isinstance(res1, dict):
-                                    transDict[panel.PAYEE_NAME] = res1['payee']  # res1 is a response data from API call. We get the payee from res1 in case the payee name was changed to 'Transfer : xxx'
-                                else:
-                                    pass    # Should not get here, since trans update is already successful, so res1 should be valid dictionary
-                                x = f"  --> {unconfirmedTransactions[row]['id']} | {transDict[panel.TRANSACTION_DATE]} | {transDict[panel.AC_FROM]} | {transDict[panel.AMOUNT]} | {transDict[panel.PAYEE_NAME]} | {transDict[panel.NOTE_TEXT]}"
-                                cmdPrint.write(x + '\n\n')
-                                # Save approved main transaction to file using transaction id as key. Using stored data, we can later look up and auto clear it if the transaction comes up again for approval
-                                transDict.pop(panel.AC_TO)      # Discard unwanted AccountTo data from dict. We won't need AccountTo info to reconfirm re-appearing transactions for repeated confirmation
-                                approvedTransactionDict[unconfirmedTransactions[row]['id']] = transDict
-                                ps.SaveApprovedTransaction(approvedTransactionDict)
-                                #cmdPrint.write('\nAPI response details:' + '\n')
-                                #cmdPrint.write('  --> ' + str(res1) + '\n')
-
-                    if 'SUCCESS' in status.upper():
-                        window['-ReviewTab_Status-'].Update(' ' * 50 + status, text_color='green', font='Any 12')
-                        # Hide the cleared transaction and any splits
-                        window[event].hide_row()  # Hide the row where the button was pressed
-                        unconfirmedTransactionApproved[row] = True
-                        for i in range(1, panel.splitRowsCount):  # Hide all of the sub split rows belonging to the main transaction
-                            window[f'-SplitRow_{row}_{i}-'].hide_row()
-                        window[f'-TransGrid_SpacerRow_{row}-'].hide_row()  # Hide spacer row
-                        hiddenSplitRow[row] = 0  # Clear tracking counter for split transaction rows
-                        cmdPrint.write('Debug 3j - Requested approval successfully completed' + '\n')
+                    # Input data are valid. Post main transaction and splits to Pocketsmith in background
+                    grid.setInFlight(transId, True)
+                    worker.submit('approve', ps.ApproveTransaction, state['transaction'], entries, Wait=False, tag=transId)     # Changes are saved to outbox and sent from there in background, so row is removed straight away. Final result comes with the 'approvalCheck' job
+                    LogEvent(log, 'approve_submitted', transId=transId, entries=len(entries))
 
             else:
+                LogEvent(log, 'approve_amount_mismatch', transId=transId, remaining=grid.remainingAmount(transId))
                 window['-ReviewTab_Status-'].Update(' ' * 50 + 'Amount total including any splits, does not match amount Pocketsmith! Adjust amounts and try again.', text_color='red', font='Any 12 bold')
 
-            # If all unconfirmed transactions are approved, clear header and display a message
-            if False not in unconfirmedTransactionApproved:
-                cmdPrint.write('Debug 3k' + '\n')
-                window['-TransGridHeadingRow-'].hide_row()
-                window['-ReviewTab_Status-'].Update(' ' * 95 + 'All cleared. Well done!', text_color='green', font='Any 14 bold')
-                cmdPrint.write('Debug 3L - All approvals complete' + '\n')
 
+        if event == '-ReviewApproveAll-':
+            # Approve all transactions under review (on all pages) that pass the same checks as single row approval. Rows that don't pass are left for the user to fix.
+            #  API calls of all rows are posted together in background, running independent rows and splits in parallel
+            submitted, skipped = SubmitApprovalBatch(worker, grid, panel, grid.pendingIds())
+            LogEvent(log, 'approve_all_submitted', rows=submitted, skipped=skipped)
+            window['-ReviewTab_Status-'].Update(' ' * 50 + f'Approving {submitted} transactions.' + (f' {skipped} transactions have invalid data or split amounts and were skipped.' if skipped else ''),
+                                                text_color='red' if skipped else 'darkblue', font='Any 12 bold')
 
         if '-TransGridSplit' in event:
-            # To insert rows for split transactions, first hide all subsequent rows
-            row = int(event.split('_')[1])
-            if hiddenSplitRow[row] < (panel.splitRowsCount - 1):          # Check if we have already reached maximum number of allowed splits. If panel.splitRowsCount is 5, then split rows are 1,2,3,4
-                window[f'-TransGrid_SpacerRow_{row}-'].hide_row()       # First hide any existing spacer row that may be after last split transaction
-                for r in range(row+1, len(unconfirmedTransactions)):
-                    window[f'-TransGridApprove_{r}_0-'].hide_row()       # Hide all subsequent transaction rows
-                    for i in range(1, panel.splitRowsCount):              # Hide splits of next main transactions too
-                        window[f'-SplitRow_{r}_{i}-'].hide_row()
-                    window[f'-TransGrid_SpacerRow_{r}-'].hide_row()
-
-                # Unhide one split row of the requested main transactions
-                window[f'-SplitRow_{row}_{hiddenSplitRow[row]+1}-'].unhide_row()
-                # Copy required transaction details (date, account name and payee) into split transaction fields
-                window[f'-TransGrid_{row}_0_{hiddenSplitRow[row]+1}-'].Update(window[f'-TransGrid_{row}_0_0-'].get())       # Date
-                window[f'-TransGrid_{row}_1_{hiddenSplitRow[row]+1}-'].Update(window[f'-TransGrid_{row}_1_0-'].get())       # Account name
-                window[f'-TransGrid_{row}_4_{hiddenSplitRow[row]+1}-'].Update(window[f'-TransGrid_{row}_4_0-'].get())       # Payee
-                # Unhide spacer row
-                window[f'-TransGrid_SpacerRow_{row}-'].unhide_row()
-                hiddenSplitRow[row] += 1
-                if hiddenSplitRow[row] > 1:
-                    # We only need remaining amount tracking on first split row. Clear on others
-                    window[f'-SplitRowRemAmtTitle_{row}_{hiddenSplitRow[row]}-'].Update('')
-                    window[f'-SplitRowRemAmt_{row}_{hiddenSplitRow[row]}-'].Update('')
-
-
-                # If main unconfirmed transaction is not already Approved, then bring back original transactions that were temporarily hidden to insert above split row.
-                #   We do it this way because, when we unhide a hidden row, PysimpleGui always add to the bottom of the visible rows
-                for r in range(row+1, len(unconfirmedTransactions)):
-                    if unconfirmedTransactionApproved[r] == False:
-                        window[f'-TransGridApprove_{r}_0-'].unhide_row()
-                        i = 1
-                        while i <= hiddenSplitRow[r]:           # Also re-instate any split transaction rows for each unapproved main transaction
-                            window[f'-SplitRow_{r}_{i}-'].unhide_row()
-                            i += 1
-                        if i > 1:
-                            window[f'-TransGrid_SpacerRow_{r}-'].unhide_row()
+            # Add a split row to the transaction. Split rows are created in the transaction's slot when required, so number of splits is not limited
+            grid.addSplit(grid.slotTransaction(int(event.split('_')[1])))
 
         if '-TransGridReject' in event:
             pass        # Note: Functionality for Reject button is not implemented. Reject button from GUI panel may be removed if not required.
 
+        # Worker event, API Stats, payee suggestion and report values are not panel field values. Drop them so they are not saved to panel defaults json
+        for key in (MyWorker.WORKER_DONE_EVENT, MyWorker.WORKER_PRINT_EVENT, MyStartup.STARTUP_DONE_EVENT, '-ApiStatsTable-', '-ApiStatsHistogram-',
+                    '-PayeeSuggest-', '-ReviewPayeeSuggest-', '-ReportName-', '-ReportStart-', '-ReportEnd-', '-ReportAccount-', '-ReportOutput-'):
+            values.pop(key, None)
+
         # If any window element values changed, backup the values
         if values != fieldValuesCurrent:  # We against saved Master double copy and only update json when there's a difference.  Comparing two dictionaries  Ref: https://stackoverflow.com/a/40921229
             if values['-Payee_Name-'] == '':
-                # Debug print to trap when field values goes missing from json
-                cmdPrint.write('Field values:' + '\n')
-                cmdPrint.write(str(fieldValuesCurrent) + '\n')
-                cmdPrint.write('\nNew values:' + '\n')
-                cmdPrint.write(str(values) + '\n')
+                # Debug log to trap when field values goes missing from json
+                LogEvent(log, 'field_values_missing', logging.WARNING, old=fieldValuesCurrent, new=values)
 
             fieldValuesCurrent = values   # We do this double backup of values, because when clicking the X button to close the window will yield a None in 'values'. Later when writing to json, we use fieldValuesCurrent, which will have valid data
 
 
     # Closing the GUI window after Exit button or window X is clicked
+    worker.stop()
     window.close()
+    if ps.approvalHistory is not None:
+        ps.approvalHistory.close()      # Waits for a running history compaction to finish
 
     # Restore original stdout, stderr object pointer
     sys.stdout = cmdPrint
@@ -415,22 +345,174 @@ def main():
     if fieldValuesCurrent != panel.fieldValues:
         panel.saveFieldValues(fieldValuesCurrent)
 
-
-# Function to display No Review message when there are no outstanding transactions to review
-def NoReviewCheck(UnconfirmedTransactions, WindowObj):
-    if len(UnconfirmedTransactions) == 0:
-        event, values = WindowObj.read(timeout=50)  # Dummy read() to enable Update() work to work
-        WindowObj['-ReviewTab_Status-'].Update(' ' * 90 + 'No new transactions to review', text_color='darkblue', font='Any 12 bold')  # Using Update() to update the value of the InputText box.  Ref: https://pysimplegui.readthedocs.io/en/latest/call%20reference/#window/#Update
-        WindowObj['-TransGridHeadingRow-'].hide_row()
+    if TELEMETRY_SAVE_ON_EXIT:
+        SaveApiStats()
+
+
+# Function run by background worker every NEW_DATA_CHECK_INTERVAL seconds, or when Refresh button is clicked.
+#  Returns names of changed metadata (categories/accounts), ids of approvals in the outbox and downloaded transactions.
+#  Approvals in flight are checked before downloading, so an approval finishing during the download is still counted as in flight
+def RefreshData():
+    try:
+        metadataChanged = ps.RevalidateMetadata()
+    except Exception as ex:
+        print(f'Metadata revalidation failed: {type(ex).__name__} {ex.args}')
+        metadataChanged = []
+    inFlightIds = ps.ApprovalsInFlight()
+    return metadataChanged, inFlightIds, ps.GetUserTransactions()
+
+# Function to handle result of a transaction approval. Transaction is removed from review grid if its API calls succeeded or are queued in outbox to be sent.
+#  Approved main transaction is saved to history only once its calls are done. Queued approvals are reported again by the 'approvalCheck' job when they finish,
+#  and if their calls failed, the transaction is put back in the review grid
+def ApprovalDone(Window, Grid, Panel, TransId, Status, ApprovedMain):
+    if TransId not in Grid.rows:
+        return
+    Grid.setInFlight(TransId, False)
+    if ApprovedMain is not None and 'QUEUED' not in Status.upper():
+        # Save approved main transaction to file using transaction id as key. Using stored data, we can later look up and auto clear it if the transaction comes up again for approval
+        LogEvent(log, 'approved_main', transId=TransId, date=ApprovedMain[Panel.TRANSACTION_DATE], account=ApprovedMain[Panel.AC_FROM], amount=ApprovedMain[Panel.AMOUNT],
+                 payee=ApprovedMain[Panel.PAYEE_NAME], note=ApprovedMain[Panel.NOTE_TEXT])
+        ps.SaveApprovedTransaction(TransId, ApprovedMain)
+
+    if 'FAILED' not in Status.upper():
+        Window['-ReviewTab_Status-'].Update(' ' * 50 + Status, text_color='green', font='Any 12')
+        Grid.hide(TransId)     # Remove the cleared transaction and any splits from review grid
+        LogEvent(log, 'approval_done', transId=TransId, status=Status)
+        # If all unconfirmed transactions are approved, clear header and display a message
+        Grid.updateStatus(allCleared=True)
+    else:
+        LogEvent(log, 'approval_failed', logging.WARNING, transId=TransId, status=Status)
+        if not Grid.rows[TransId]['visible']:
+            Grid.show(TransId)      # Queued approval failed after the row was removed
+            Grid.updateStatus()
+        Window['-ReviewTab_Status-'].Update(' ' * 5 + Status, text_color='red', font='Any 12')
+
+# Function to update API Stats tab with current telemetry. Selected is the list of selected table rows, Rows the table rows shown before.
+#  Selected endpoint is kept selected if its row moved. Returns the new table rows
+def UpdateApiStats(Window, Selected, Rows):
+    endpoint = Rows[Selected[0]][0] if Selected and Selected[0] < len(Rows) else None
+    rows = ps.GetTelemetry().rows()
+    endpoints = [row[0] for row in rows]
+    selected = [endpoints.index(endpoint)] if endpoint in endpoints else []
+    Window['-ApiStatsTable-'].Update(values=rows, select_rows=selected)       # Note: Selecting rows raises a table event, which only updates the histogram
+    Window['-ApiStatsSummary-'].Update(f'{sum(row[1] for row in rows)} API calls to {len(rows)} endpoints. Latency percentiles are estimated from histogram buckets')
+    ShowApiHistogram(Window, selected, rows)
+    return rows
+
+# Function to show latency histogram of the selected endpoint in API Stats tab
+def ShowApiHistogram(Window, Selected, Rows):
+    endpoint = Rows[Selected[0]][0] if Selected and Selected[0] < len(Rows) else None
+    Window['-ApiStatsHistogram-'].Update(ps.GetTelemetry().histogramText(endpoint) if endpoint is not None else '')
+
+# Function to save API call stats to json and csv files
+def SaveApiStats():
+    try:
+        telemetry = ps.GetTelemetry()
+        telemetry.saveJson()
+        telemetry.saveCsv()
+        print(f'API call stats saved to {MyTelemetry.telemetryJsonFile} and {MyTelemetry.telemetryCsvFile}')
+    except OSError as ex:
+        print(f'Error saving API call stats: {ex}')
+
+# Function to approve a batch of review grid transactions in background, as one 'approveAll' job. Transactions already being approved are left out, and
+#  transactions that don't pass the same checks as single row approval are skipped. Returns number of submitted and skipped transactions
+def SubmitApprovalBatch(Worker, Grid, Panel, TransIds):
+    Grid.saveEdits()
+    batch = []
+    skipped = 0
+    for transId in TransIds:
+        state = Grid.rows[transId]
+        if state['inFlight']:
+            continue
+        entries = None
+        if ut.IsFloatValueZero(Grid.remainingAmount(transId)):
+            entries, errorMsg = GetApprovalEntries(Panel, state)
+        if entries is None:
+            skipped += 1
+        else:
+            batch.append((state['transaction'], entries))
+    if batch:
+        for transaction, entries in batch:
+            Grid.setInFlight(transaction['id'], True)
+        Worker.submit('approveAll', ps.ApproveTransactions, batch, Wait=False, tag=[transaction['id'] for transaction, entries in batch])
+    return len(batch), skipped
+
+# Function to approve new transactions matched by an auto approve payee rule. Matched transactions that don't pass approval checks
+#  (eg. rule's category doesn't exist) are left in the review list for the user
+def AutoApprove(Worker, Grid, Panel):
+    transIds = Grid.autoApproveIds()
+    if not AUTO_APPROVE_RULES or not transIds:
+        return
+    for transId in transIds:
+        Grid.rows[transId]['autoApprove'] = False       # Tried once. If skipped, it's up to the user
+    submitted, skipped = SubmitApprovalBatch(Worker, Grid, Panel, transIds)
+    LogEvent(log, 'auto_approve_submitted', rows=submitted, skipped=skipped, rules=sorted({Grid.rows[transId]['rule'] for transId in transIds}))
+    print(f'Auto approving {submitted} transactions matched by payee rules' + (f'. {skipped} failed checks and were left for review' if skipped else ''))
+
+# Function to narrow down values of a category drop down list to categories matching the text typed in it. Typed text is kept, with cursor at the end
+def FilterCategoryCombo(Window, Key):
+    text = Window[Key].get()
+    Window[Key].Update(value=text, values=ps.GetCategoryTree().filter(text))
+    Window[Key].Widget.icursor('end')
+
+# Function to get report date range and account from Reports tab values. Account is None for all accounts. Raises ut.DateFormatError if a date is invalid
+def ReportArgs(Values, AllAccounts):
+    startDate = ut.StrToDate(Values['-ReportStart-'], ut.DATE_SOURCE_GUI).date()
+    endDate = ut.StrToDate(Values['-ReportEnd-'], ut.DATE_SOURCE_GUI).date()
+    account = Values['-ReportAccount-']
+    return startDate, endDate, None if account in ('', AllAccounts) else account
+
+# Function to format report rows as text lines. MyReports (and numpy) is imported on first report, not at startup
+def ReportText(Headings, Rows):
+    import MyReports
+    return MyReports.FormatReport(Headings, Rows)
+
+# Function to show payee suggestions for text typed in a payee field. Block (list box, or column holding it) is hidden when there are no suggestions
+def ShowPayeeSuggestions(Window, ListKey, BlockKey, Text):
+    start = time.perf_counter()
+    suggestions = ps.PayeeSuggestions(Text)
+    Window[ListKey].update(values=suggestions)
+    Window[BlockKey].update(visible=bool(suggestions))
+    LogEvent(log, 'payee_suggestions', logging.DEBUG, text=Text, count=len(suggestions), ms=round((time.perf_counter() - start) * 1000, 2))
+
+# Function to check review grid values of a transaction and collect main transaction and split data to post.
+#  Returns list of (EntryType, GuiPanelValues) tuples for ps.ApproveTransaction() and an empty message, or None and an error message if any data is invalid.
+#  Date and account are always taken from the main transaction
+def GetApprovalEntries(Panel, State):
+    entries = []
+    for values in State['rows']:
+        valid, resp = ValidateFields(values[0],     # Date
+                                     values[1],     # Account name
+                                     values[2],     # Amount
+                                     values[3],     # Category
+                                     values[5])     # Transfer account name
+        if not valid:
+            return None, resp
+        if resp in ['No transfer', 'Transfer']:     # Ignore split rows without any amount input
+            transDict = {}
+            transDict[Panel.TRANSACTION_DATE] = State['transaction']['date']
+            transDict[Panel.AC_FROM]          = State['transaction']['account']
+            transDict[Panel.AMOUNT]           = values[2]
+            transDict[Panel.CATEGORY_NAME]    = values[3]
+            transDict[Panel.PAYEE_NAME]       = values[4]
+            transDict[Panel.AC_TO]            = values[5]
+            transDict[Panel.NOTE_TEXT]        = values[6]
+            entries.append((resp, transDict))
+    return entries, ''
+
+# Function to replace drop down list values of Combo elements, keeping the currently entered text
+def UpdateComboValues(WindowObj, Keys, Values):
+    for key in Keys:
+        WindowObj[key].Update(value=WindowObj[key].get(), values=Values)
 
 # Function to validate required transaction input data. Ref: https://stackoverflow.com/a/16870699
-# Pocksmith accepts any of the 4 different date formats checked here. Todo improve format check using regex
+# Pocksmith accepts any of the 4 different date formats checked here, see MyUtils.DATE_FORMATS
 def ValidateFields(DateStr, AccountName, Amount, Category, AccountToName):
     if Amount == '':          # If there's no amount, then we don't data in other fields
         return True, 'Ignore'
 
     # Check date format
-    if not ut.IsDateFormatValid(DateStr)[0]:
+    if not ut.IsDateFormatValid(DateStr, ut.DATE_SOURCE_GUI)[0]:
         return False, 'Invalid date!'
 
     # Account check
@@ -439,6 +521,9 @@ def ValidateFields(DateStr, AccountName, Amount, Category, AccountToName):
 
     # Category check
     if Category not in ps.categoryList:
+        matches = ps.GetCategoryTree().matches(Category)
+        if len(matches) > 1:        # Category title is used in more than one place in category tree. Full path is needed
+            return False, f"Category '{Category}' is ambiguous! Choose one of {', '.join(m.name for m in matches)}"
         return False, 'Invalid category!'
 
     # Transfer To account check
@@ -454,4 +539,6 @@ if __name__ == "__main__":
     if len(sys.argv) == 1:
         main()                      # If no program parameters (eg. python <this file>), start main GUI panel
     else:
-        ps.GetUserTransactions()    # If called with additional parameter, run in console. Used for testing & debugging
+        import MyPocketSmith as ps
+        if ps.ReadDevKey():
+            ps.GetUserTransactions()    # If called with additional parameter, run in console. Used for testing & debugging
@@ -0,0 +1,217 @@
+# Review grid of transactions waiting for approval
+#  Review grid shows one page of transactions at a time, using a fixed number of row slots created with the window (see WindowLayout.transactionSlots()).
+#  Data and unsaved edits of all transactions under review are kept here, keyed by transaction id. When page changes or transactions are added/removed,
+#  edits shown in the slots are saved back and the slots are re-filled. So GUI work doesn't grow with number of transactions to review.
+#  New transactions are classified with payee rules (see MyPayeeRules.py) when added, and fields set by the matching rule are pre-filled.
+#  Repository link: https://github.com/gandos21/PocketSmith
+import MyPocketSmith as ps
+import MyUtils as ut
+
+#### Configs ####
+GRID_COLUMNS = 7        # Input fields of a grid row: date, account, amount, category, payee, transfer to account, note
+#### End Configs ####
+
+
+# Review grid class
+class ReviewGrid:
+    def __init__(self, window, panel):
+        self.window = window
+        self.panel = panel
+        self.rows = {}                              # Transaction id -> review state. Dict keeps transactions in the order they were added
+        self.slots = [None] * panel.pageSize        # Transaction id shown in each slot, None if slot is not used
+        self.slotSplitRows = [0] * panel.pageSize   # Number of split rows created so far in each slot
+        self.page = 0
+
+    # Review state of a transaction. 'rows' has the field values of main transaction row, followed by any split rows
+    def __newState(self, transaction, match=None):
+        # Note: we use SepAmount() to add , separators to display on GUI.
+        #   This caused problem later when we needed to convert it to float as float() doesn't take , in string input.
+        #   So we later remove the comma whenever we convert GUI amount strings to float, using .replace(',','')
+        amount = ut.SepAmount('%.2f' % float(transaction['amount']))
+        return {
+            'transaction'   : transaction,
+            'amount'        : float(transaction['amount']),
+            'visible'       : True,             # False once approved or no longer needs review
+            'inFlight'      : False,            # True while approval API calls are in progress
+            'rule'          : match.name if match is not None else None,     # Name of payee rule that pre-filled the fields
+            'autoApprove'   : match is not None and match.autoApprove,      # True if matching rule approves without review
+            'rows'          : [[transaction['date'], transaction['account'], amount, match and RuleCategory(match) or transaction['category'], transaction['payee'],
+                                match and match.transferTo or '', match and match.note or transaction['note'] or '']]
+        }
+
+    # Ids of transactions waiting for review, in review order
+    def pendingIds(self):
+        return [transId for transId, state in self.rows.items() if state['visible']]
+
+    def pageCount(self):
+        return max(1, -(-len(self.pendingIds()) // self.panel.pageSize))     # Ceiling division
+
+    # Transaction id shown in a slot. Slot number is the first number in grid element keys, eg. 3 in -TransGridApprove_3_0-
+    def slotTransaction(self, slot):
+        return self.slots[slot]
+
+    # Update grid with newly downloaded unconfirmed transactions. New transactions are added to the end of the review list,
+    #  and transactions that no longer need review are removed, unless their approval is in progress. Transactions still under review keep any unsaved edits.
+    #  InFlightIds are transactions whose approval is still being sent by the outbox (see ps.ApprovalsInFlight()). They are not added back while Pocketsmith still lists them.
+    #  Returns number of added and removed transactions
+    def update(self, unconfirmedTransactions, inFlightIds=()):
+        self.saveEdits()
+        unconfirmedIds = {t['id'] for t in unconfirmedTransactions}
+        removed = [transId for transId, state in self.rows.items() if state['visible'] and not state['inFlight'] and transId not in unconfirmedIds]
+        for transId in removed:
+            self.rows[transId]['visible'] = False
+        new = []
+        for t in unconfirmedTransactions:
+            state = self.rows.get(t['id'])
+            if state is None or not state['visible']:
+                if t['id'] not in inFlightIds:
+                    new.append(t)
+            else:
+                state['transaction'] = t
+        matches = ps.GetPayeeRules().classify(new)      # All new transactions are classified in one call
+        for t in new:
+            self.rows.pop(t['id'], None)        # A transaction that came back for review is moved to the end with fresh data
+            self.rows[t['id']] = self.__newState(t, matches.get(t['id']))
+        added = len(new)
+        if added or removed:
+            self.render()
+        return added, len(removed)
+
+    # Ids of new transactions matched by an auto approve payee rule, that are not approved yet
+    def autoApproveIds(self):
+        return [transId for transId, state in self.rows.items() if state['visible'] and state['autoApprove'] and not state['inFlight']]
+
+    # Remove transaction from review, eg. after it's approved
+    def hide(self, transId):
+        self.saveEdits()
+        self.rows[transId]['visible'] = False
+        self.render()
+
+    # Put a transaction back for review, eg. when its approval failed after it was removed. Its edits are kept, so it can be fixed and approved again
+    def show(self, transId):
+        self.saveEdits()
+        self.rows[transId]['visible'] = True
+        self.render(force={transId})
+
+    # Add a split row to a transaction. Date, account name and payee are copied from main transaction
+    def addSplit(self, transId):
+        self.saveEdits()
+        main = self.rows[transId]['rows'][0]
+        self.rows[transId]['rows'].append([main[0], main[1], '', '', main[4], '', ''])
+        self.render(force={transId})
+
+    def setInFlight(self, transId, inFlight):
+        self.saveEdits()
+        self.rows[transId]['inFlight'] = inFlight
+        self.render(force={transId})
+
+    def changePage(self, step):
+        self.saveEdits()
+        self.page = min(max(0, self.page + step), self.pageCount() - 1)
+        self.render()
+
+    # Save values of fields shown in slots back to review state. Must be called before slots are re-filled with other data
+    def saveEdits(self):
+        for slot, transId in enumerate(self.slots):
+            if transId is None or transId not in self.rows:
+                continue
+            rows = self.rows[transId]['rows']
+            for i in range(len(rows)):
+                rows[i] = [self.window[f'-TransGrid_{slot}_{col}_{i}-'].get() for col in range(GRID_COLUMNS)]
+
+    # Show current page of transactions. Only slots showing a different transaction than before (or transactions in force) are re-filled
+    def render(self, force=()):
+        pending = self.pendingIds()
+        self.page = min(self.page, self.pageCount() - 1)
+        pageIds = pending[self.page * self.panel.pageSize:(self.page + 1) * self.panel.pageSize]
+        for slot in range(self.panel.pageSize):
+            transId = pageIds[slot] if slot < len(pageIds) else None
+            if transId is None:
+                if self.slots[slot] is not None:
+                    self.window[f'-TransGridBlock_{slot}-'].update(visible=False)
+                    self.slots[slot] = None
+            elif transId != self.slots[slot] or transId in force:
+                self.__renderSlot(slot, transId)
+        if len(pending) > self.panel.pageSize:
+            self.window['-ReviewPageInfo-'].Update(f'Page {self.page + 1} of {self.pageCount()}  ({len(pending)} to review)')
+        else:
+            self.window['-ReviewPageInfo-'].Update('')
+
+    # Fill a slot with review state of a transaction. Split rows are created in the slot if it doesn't have enough of them yet
+    def __renderSlot(self, slot, transId):
+        state = self.rows[transId]
+        rows = state['rows']
+        splitCount = len(rows) - 1
+        while self.slotSplitRows[slot] < splitCount:
+            self.slotSplitRows[slot] += 1
+            self.window.extend_layout(self.window[f'-SplitRows_{slot}-'], self.panel.splitRow(slot, self.slotSplitRows[slot]))
+            self.panel.bindTypeAhead(self.window, [f'-TransGrid_{slot}_3_{self.slotSplitRows[slot]}-'])
+        for i in range(1, self.slotSplitRows[slot] + 1):
+            self.window[f'-SplitRowBlock_{slot}_{i}-'].update(visible=i <= splitCount)
+
+        for i, values in enumerate(rows):
+            for col, value in enumerate(values):
+                self.window[f'-TransGrid_{slot}_{col}_{i}-'].Update(value)
+        # Show debit amount in brown colour, credit in green
+        self.window[f'-TransGrid_{slot}_2_0-'].Update(text_color='brown' if state['amount'] < 0.0 else 'green')
+        # If Pocketsmith had assigned a category different to our own or not categorised, then show it in bold face to differentiate from others
+        category = rows[0][3]
+        self.window[f'-TransGrid_{slot}_3_0-'].Update(font='Any 10 bold' if category not in ps.categoryList or category == '<< Uncategorised >>' else 'Any 10')
+        self.window[f'-TransGridApprove_{slot}_0-'].Update('Working' if state['inFlight'] else 'Approve', disabled=state['inFlight'])      # Show row is in progress until worker reports back
+        self.window[f'-TransGrid_SpacerRow_{slot}-'].update(visible=splitCount > 0)
+        self.window[f'-TransGridBlock_{slot}-'].update(visible=True)
+        self.slots[slot] = transId
+        self.updateRemainingAmount(slot)
+
+    # Main transaction amount less sum of amounts in main and split rows, from saved review state
+    def remainingAmount(self, transId):
+        state = self.rows[transId]
+        return state['amount'] - sum(AmountValue(row[2]) for row in state['rows'])
+
+    # Split's remaining amount rationality check. Sum the amounts in main and split transactions shown in a slot, and show difference in split remaining amount
+    def updateRemainingAmount(self, slot):
+        transId = self.slots[slot]
+        splitCount = len(self.rows[transId]['rows']) - 1
+        if splitCount == 0:
+            return
+        diff = self.rows[transId]['amount'] - sum(AmountValue(self.window[f'-TransGrid_{slot}_2_{i}-'].get()) for i in range(splitCount + 1))
+        if diff < -0.001:
+            self.window[f'-SplitRowRemAmt_{slot}_1-'].Update('%.2f' % diff, text_color='red', font='Any 10 bold')
+        elif diff > 0.001:
+            self.window[f'-SplitRowRemAmt_{slot}_1-'].Update('%.2f' % diff, text_color='green', font='Any 10 bold')
+        else:       # Abs value to remove minus sign from remaining very small negative amounts eg. -0.000000001
+            self.window[f'-SplitRowRemAmt_{slot}_1-'].Update('%.2f' % abs(diff), text_color='black', font='Any 10 bold')
+
+    # Replace drop down lists of account and category fields in all slots, eg. after categories or accounts changed in Pocketsmith
+    def updateComboValues(self, accountList, categoryList):
+        for slot in range(self.panel.pageSize):
+            for i in range(self.slotSplitRows[slot] + 1):
+                for col, values in ((1, accountList), (3, categoryList), (5, accountList)):
+                    key = f'-TransGrid_{slot}_{col}_{i}-'
+                    self.window[key].Update(value=self.window[key].get(), values=values)
+
+    # Show review tab status message. Table title row is hidden when there are no outstanding transactions to review.
+    #  AllCleared is True when called after an approval, to show a well done message instead
+    def updateStatus(self, allCleared=False):
+        pendingCount = len(self.pendingIds())
+        self.window['-TransGridHeading-'].update(visible=pendingCount > 0)
+        if pendingCount:
+            self.window['-ReviewTab_Status-'].Update(' ' * 70 + 'Review & confirm new transactions. If Rejected, transaction will be deleted!', text_color='darkblue', font='Any 12 bold')
+        elif allCleared:
+            self.window['-ReviewTab_Status-'].Update(' ' * 95 + 'All cleared. Well done!', text_color='green', font='Any 14 bold')
+        else:
+            self.window['-ReviewTab_Status-'].Update(' ' * 90 + 'No new transactions to review', text_color='darkblue', font='Any 12 bold')  # Using Update() to update the value of the InputText box.  Ref: https://pysimplegui.readthedocs.io/en/latest/call%20reference/#window/#Update
+
+
+# Function to get category of a payee rule match as shown in category lists. Rules may give a category by its title or full path
+def RuleCategory(Match):
+    if Match.category is None:
+        return None
+    return ps.GetCategoryTree().displayName(Match.category) or Match.category
+
+# Function to convert amount text from grid to float. Empty or invalid amount (eg. on a split row not used yet) is 0
+def AmountValue(AmountStr):
+    try:
+        return float(AmountStr.replace(',',''))     # Removing , separator before float conversion
+    except ValueError:
+        return 0.0
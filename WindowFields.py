@@ -0,0 +1,36 @@
+# Window panel field names
+#  Field key names are shared by the GUI and the API functions (eg. approved transaction data saved to history is keyed by field names).
+#  Kept in a module of their own without PySimpleGUI, so the API functions can be used headless (see PsControl_CLI.py).
+#  Repository link: https://github.com/gandos21/PocketSmith
+
+
+# Class of data fields used on window panels
+class WindowFields:
+    # Panel field's key names
+    #  Macros style attributes used for field keys for better readability.
+    #  Prefixing and suffixing with '-' for GUI element keys is a convention followed in PySimpleGUI. Ref: https://pysimplegui.readthedocs.io/en/latest/#keys
+    TRANSACTION_DATE    = '-Transaction_Date-'
+    PAYEE_NAME          = '-Payee_Name-'
+    CATEGORY_NAME       = '-Category_Name-'
+    NOTE_TEXT           = '-Note_Text-'
+    AMOUNT              = '-Amount-'
+    AC_FROM             = '-Account_From-'
+    AC_TO               = '-Account_To-'
+    AC_TRANSFER         = '-Account_Transfer-'
+    TRANSACTION_ID      = '-Transaction_Id-'
+
+    # Panel field value defaults
+    fieldValues = {
+        TRANSACTION_DATE    : '',
+        PAYEE_NAME          : '',
+        CATEGORY_NAME       : '',
+        NOTE_TEXT           : '',
+        AMOUNT              : 0.00,
+        AC_FROM             : '',
+        AC_TO               : '',
+        AC_TRANSFER         : True,
+        TRANSACTION_ID      : ''
+    }
+
+    def __init__(self):
+        pass
@@ -4,53 +4,27 @@
 import PySimpleGUI as sg
 from datetime import date
 import json
+from MyTelemetry import TABLE_HEADINGS as API_STATS_HEADINGS
+from WindowFields import WindowFields       # Field names are in their own module, so API code can use them without loading PySimpleGUI. Also imported from here by older code
 
 # Constants & configs
-NUM_ROWS_FOR_SPLIT      = 5     # Num of rows required to enter split transactions, including a row for main transaction. eg. 5 means, 1 + 4 splits possible
+REPORT_NAMES            = ('Category totals', 'Account totals', 'Monthly totals', 'Account balances by month', 'Top payees')     # Same as MyReports.REPORTS. Kept here, so numpy isn't loaded to build the window
+ALL_ACCOUNTS            = 'All accounts'
+REVIEW_PAGE_SIZE        = 10    # Num of transactions shown on one page of review grid. Only this many rows are created, and they are re-used when page changes
+PAYEE_SUGGESTION_ROWS   = 5     # Height of payee suggestion lists, in rows
+TYPE_AHEAD_SUFFIX       = '+TypeAhead'      # Key release events of category drop down lists have this added to element key, eg. -TransGrid_0_3_0-+TypeAhead
 panelDefaultsFileName   = 'PanelDefaults.json'
 logoFileName            = 'logo.png'
 
 
-# Class of data fields used on window panels
-class WindowFields:
-    # Panel field's key names
-    #  Macros style attributes used for field keys for better readability.
-    #  Prefixing and suffixing with '-' for GUI element keys is a convention followed in PySimpleGUI. Ref: https://pysimplegui.readthedocs.io/en/latest/#keys
-    TRANSACTION_DATE    = '-Transaction_Date-'
-    PAYEE_NAME          = '-Payee_Name-'
-    CATEGORY_NAME       = '-Category_Name-'
-    NOTE_TEXT           = '-Note_Text-'
-    AMOUNT              = '-Amount-'
-    AC_FROM             = '-Account_From-'
-    AC_TO               = '-Account_To-'
-    AC_TRANSFER         = '-Account_Transfer-'
-    TRANSACTION_ID      = '-Transaction_Id-'
-
-    # Panel field value defaults
-    fieldValues = {
-        TRANSACTION_DATE    : '',
-        PAYEE_NAME          : '',
-        CATEGORY_NAME       : '',
-        NOTE_TEXT           : '',
-        AMOUNT              : 0.00,
-        AC_FROM             : '',
-        AC_TO               : '',
-        AC_TRANSFER         : True,
-        TRANSACTION_ID      : ''
-    }
-
-    def __init__(self):
-        pass
-
 # Layout class
 class WindowLayout(WindowFields):       # Inherit Window Field names
-    def __init__(self, accountList, categoryList, unconfirmedTransactions, fieldValues=None):
+    def __init__(self, accountList, categoryList, fieldValues=None):
         super().__init__()
         self.accountList = accountList
         self.categoryList = categoryList
-        self.unconfirmedTransactions = unconfirmedTransactions
         self.logoFileName = logoFileName
-        self.splitRowsCount = NUM_ROWS_FOR_SPLIT
+        self.pageSize = REVIEW_PAGE_SIZE
 
         if fieldValues is None:
             # Load panel field values from json
@@ -65,12 +39,15 @@ class WindowLayout(WindowFields):       # Inherit Window Field names
             # Window may be re-initialised with specific panel field values. If value given, use that instead of loading from json or using defaults
             self.fieldValues = fieldValues
 
-    # Layout of window we want to create has 2 tabs: Review and Manual Transaction Entry
+    # Layout of window we want to create has 4 tabs: Review, Manual Transaction Entry, Reports and API Stats
     def layout(self):
         transactionEntryTab = self.__transactionEntryTab()
         reviewTab           = self.__reviewTab()
+        reportsTab          = self.__reportsTab()
+        apiStatsTab         = self.__apiStatsTab()
 
-        window_layout = [[sg.TabGroup([[sg.Tab('Review', reviewTab), sg.Tab('Transaction Entry', transactionEntryTab)]], enable_events=True, key='-TabGroup-')] ]
+        window_layout = [[sg.TabGroup([[sg.Tab('Review', reviewTab), sg.Tab('Transaction Entry', transactionEntryTab), sg.Tab('Reports', reportsTab), sg.Tab('API Stats', apiStatsTab)]],
+                                      enable_events=True, key='-TabGroup-')] ]
         return window_layout
 
     # Transaction Entry tab setup
@@ -86,6 +63,8 @@ class WindowLayout(WindowFields):       # Inherit Window Field names
             # Payee & category
             [sg.Text('Payee', size=(17,1), auto_size_text=False, justification='right'),
              sg.InputText(self.fieldValues[self.PAYEE_NAME], size=(62, 1), key=self.PAYEE_NAME, enable_events=True)],
+            # Payee suggestions while typing. Hidden when there are none. Clicking a suggestion copies it to the Payee field
+            [sg.pin(sg.Listbox([], size=(60, PAYEE_SUGGESTION_ROWS), pad=((140, 5), (0, 3)), no_scrollbar=True, enable_events=True, visible=False, key='-PayeeSuggest-'))],
             [sg.Text('Category', size=(17,1), auto_size_text=False, justification='right'),
              sg.Combo(self.categoryList, size=(60, 1), default_value=self.fieldValues[self.CATEGORY_NAME], key=self.CATEGORY_NAME, enable_events=True)],
 
@@ -129,10 +108,49 @@ class WindowLayout(WindowFields):       # Inherit Window Field names
         ]
         return transactionEntryTab
 
+    # Reports tab setup. Report of transactions in local store for a date range is shown as text. Older transactions can be downloaded to the store first
+    def __reportsTab(self):
+        startDate = date.today().replace(day=1).replace(year=date.today().year - 1)
+        reportsTab = [
+            [sg.Text('Reports', font='Any 15 bold'),
+             sg.Combo(list(REPORT_NAMES), default_value=REPORT_NAMES[0], size=(26, 1), readonly=True, pad=((20, 0), 0), key='-ReportName-'),
+             sg.Text('From'), sg.Input(startDate.strftime('%d-%m-%Y'), size=(11, 1), key='-ReportStart-'),
+             sg.Text('To'), sg.Input(date.today().strftime('%d-%m-%Y'), size=(11, 1), key='-ReportEnd-'),
+             sg.Combo([ALL_ACCOUNTS] + self.accountList, default_value=ALL_ACCOUNTS, size=(22, 1), readonly=True, key='-ReportAccount-')],
+            [sg.Button('Run Report', size=(12,1), key='-ReportRun-'),
+             sg.Button('Download', size=(12,1), key='-ReportDownload-', tooltip='Download transactions of the date range from Pocketsmith to local store'),
+             sg.Button('Clear Reports', size=(12,1))],
+            [sg.Text('', size=(100, 1), pad=((5, 0), (5, 10)), key='-ReportStatus-')],
+            [sg.Multiline('', size=(110, 30), font='Courier 9', disabled=True, key='-ReportOutput-')]
+        ]
+        return reportsTab
+
+    # API Stats tab setup. Table of per-endpoint API call stats, and latency histogram of the selected endpoint. Updated while tab is shown
+    def __apiStatsTab(self):
+        apiStatsTab = [
+            [sg.Text('API Call Stats', font='Any 15 bold'),
+             sg.Button('Save Stats', pad=((20, 0), 0), size=(12,1), key='-ApiStatsSave-'),
+             sg.Button('Reset Stats', pad=((10, 0), 0), size=(12,1), key='-ApiStatsReset-')],
+            [sg.Text('', size=(100, 1), pad=((5, 0), (5, 10)), key='-ApiStatsSummary-')],
+            [sg.Table(values=[], headings=API_STATS_HEADINGS, num_rows=12, auto_size_columns=False, col_widths=[34, 6, 6, 7, 8, 8, 7, 7, 7, 7, 20],
+                      justification='right', enable_events=True, select_mode=sg.TABLE_SELECT_MODE_BROWSE, key='-ApiStatsTable-')],
+            [sg.Text('Latency histogram of selected endpoint', pad=(5, (10, 3)))],
+            [sg.Multiline('', size=(100, 12), font='Courier 9', disabled=True, key='-ApiStatsHistogram-')]
+        ]
+        return apiStatsTab
+
     # Review tab setup
     def __reviewTab(self):
-        reviewTabTitle = [[sg.Text('New Transaction Review', font='Any 15 bold'), sg.Button('Refresh', pad=((20, 0), 0), size=(12,1), key='-ReviewDataRefresh-')],
-                      [sg.Text('', size=(100, 1), pad=((5, 0), (5, 15)), justification='left', key='-ReviewTab_Status-')]]
+        reviewTabTitle = [[sg.Text('New Transaction Review', font='Any 15 bold'), sg.Button('Refresh', pad=((20, 0), 0), size=(12,1), key='-ReviewDataRefresh-'),
+                           sg.Button('Approve All', pad=((10, 0), 0), size=(12,1), key='-ReviewApproveAll-'),
+                           sg.Button('< Prev', pad=((40, 0), 0), size=(8,1), key='-ReviewPagePrev-'),
+                           sg.Text('', size=(24, 1), justification='center', key='-ReviewPageInfo-'),
+                           sg.Button('Next >', size=(8,1), key='-ReviewPageNext-')],
+                      [sg.Text('', size=(100, 1), pad=((5, 0), (5, 15)), justification='left', key='-ReviewTab_Status-')],
+                      # Suggestions for the payee field being typed in. One list is shared by all payee fields of the grid. Hidden when there are none
+                      [sg.pin(sg.Column([[sg.Text('Payee suggestions', font='Any 10 bold'),
+                                          sg.Listbox([], size=(60, PAYEE_SUGGESTION_ROWS), no_scrollbar=True, enable_events=True, key='-ReviewPayeeSuggest-')]],
+                                        pad=((5, 0), (0, 10)), visible=False, key='-ReviewPayeeSuggestBlock-'))]]
 
         rowHeader = [[sg.Text('Date',        size=(6, 1),  pad=((25, 0), 0),  justification='left', font = 'Any 10 bold', key='-TransGridHeadingRow-'),
                       sg.Text('Account',     size=(8, 1),  pad=((60, 0), 0),  justification='left', font = 'Any 10 bold'),
@@ -142,30 +160,53 @@ class WindowLayout(WindowFields):       # Inherit Window Field names
                       sg.Text('Transfer To', size=(12, 1), pad=((140, 0), 0), justification='left', font = 'Any 10 bold'),
                       sg.Text('Note',        size=(5, 1),  pad=((130, 0), 0), justification='left', font = 'Any 10 bold')]]
 
-        spacerRows = [[sg.Text('', size=(1, 1), pad=(0, 0), font='Any 3', key=f'-TransGrid_SpacerRow_{row}-')]  # An empty row with small font height is used to space out last split row and next main transaction
-                      for row in range(len(self.unconfirmedTransactions)) ]
-
-        inputRows = [
-                     [sg.Input(              size=(10, 1), pad=((6, 3), (0, 0)), key=f'-TransGrid_{row}_0_{i}-'),    # Date
-                      sg.Combo(self.accountList,  size=(22, 1), pad=((3, 3), (0, 0)), key=f'-TransGrid_{row}_1_{i}-'),    # Account
-                      sg.Input(              size=(11, 1), pad=((3, 3), (0, 0)), key=f'-TransGrid_{row}_2_{i}-', enable_events=True, justification='right'),       # Amount
-                      sg.Combo(self.categoryList,size=(30, 1), pad=((3, 3), (0, 0)), key=f'-TransGrid_{row}_3_{i}-'),    # Category
-                      sg.Input(              size=(35, 1), pad=((3, 3), (0, 0)), key=f'-TransGrid_{row}_4_{i}-'),    # Payee
-                      sg.Combo(self.accountList,  size=(22, 1), pad=((3, 3), (0, 0)), key=f'-TransGrid_{row}_5_{i}-'),    # Transfer To Account, if double entry to an offline account is required
-                      sg.Input(              size=(35, 1), pad=((3, 3), (0, 0)), key=f'-TransGrid_{row}_6_{i}-'),    # Note
-                      sg.Button('Approve',   size=(8, 1),  pad=((3, 3), (1, 1)), key=f'-TransGridApprove_{row}_{i}-', button_color=('white', 'green'))   # Approve button
-                        if i % self.splitRowsCount == 0 else sg.Text(f'Split {i}', size=(8, 1), pad=((3, 3), (1, 1)), key=f'-SplitRow_{row}_{i}-'),                                   # Button not required on split rows
-                      sg.Button('Split',     size=(8, 1), pad=((3, 3), (1, 1)), key=f'-TransGridSplit_{row}_{i}-', button_color=('white', 'darkblue'))   # Split button
-                        if i % self.splitRowsCount == 0 else sg.Text('Rem. $', size=(8, 1), pad=((3, 3), (1, 1)), key=f'-SplitRowRemAmtTitle_{row}_{i}-', justification='right', font = 'Any 10 bold'),
-                      sg.Button('Reject',    size=(8, 1), pad=((3, 6), (1, 1)), key=f'-TransGridReject_{row}_{i}-', button_color=('white', 'brown'))     # Reject button
-                        if i % self.splitRowsCount == 0 else sg.Text('0.00', size=(8, 1), pad=((3, 12), (1, 1)), key=f'-SplitRowRemAmt_{row}_{i}-', font = 'Any 10 bold')
-                     ]
-                        for row in range(len(self.unconfirmedTransactions)) for i in range(self.splitRowsCount)
-                    ]
-
-        reviewTab = reviewTabTitle + rowHeader + spacerRows + inputRows
+        # Review grid is a fixed number of row slots, one page of transactions. Slots are re-used to show other transactions when page changes,
+        #  so number of GUI elements doesn't grow with number of transactions to review
+        transactionGrid = [[sg.Column(self.transactionSlots(), pad=(0, 0), key='-TransGridColumn-')]]
+
+        # Heading row is in a pinned column, so it can be hidden when there's nothing to review and shown again in the same place
+        reviewTab = reviewTabTitle + [[sg.pin(sg.Column(rowHeader, pad=(0, 0), key='-TransGridHeading-'))]] + transactionGrid
         return reviewTab
 
+    # Row slots of review grid. Element keys include the slot number, eg. -TransGrid_<slot>_2_0- is the amount of main transaction shown in the slot.
+    #  Each slot has a main transaction row, a column split rows are added to when required (see splitRow()) and a spacer row
+    def transactionSlots(self):
+        return [[sg.pin(sg.Column(self.__transactionSlot(slot), pad=(0, 0), visible=False, key=f'-TransGridBlock_{slot}-'))] for slot in range(self.pageSize)]
+
+    def __transactionSlot(self, slot):
+        mainRow = self.__gridInputs(slot, 0) + [
+            sg.Button('Approve', size=(8, 1), pad=((3, 3), (1, 1)), key=f'-TransGridApprove_{slot}_0-', button_color=('white', 'green')),      # Approve button
+            sg.Button('Split',   size=(8, 1), pad=((3, 3), (1, 1)), key=f'-TransGridSplit_{slot}_0-',   button_color=('white', 'darkblue')),   # Split button
+            sg.Button('Reject',  size=(8, 1), pad=((3, 6), (1, 1)), key=f'-TransGridReject_{slot}_0-',  button_color=('white', 'brown'))       # Reject button
+        ]
+        splitRows = [sg.Column([[]], pad=(0, 0), key=f'-SplitRows_{slot}-')]      # Split rows are only created when Split button is clicked
+        spacerRow = [sg.pin(sg.Text('', size=(1, 1), pad=(0, 0), font='Any 3', visible=False, key=f'-TransGrid_SpacerRow_{slot}-'))]   # An empty row with small font height is used to space out last split row and next main transaction
+        return [mainRow, splitRows, spacerRow]
+
+    # A split row of a review grid slot. Added to the slot with window.extend_layout() when a transaction shown in the slot needs more split rows than already created.
+    #  Remaining amount (main transaction amount less sum of split amounts) is shown on first split row only
+    def splitRow(self, slot, split):
+        return [[sg.pin(sg.Column([self.__gridInputs(slot, split) + [
+                    sg.Text(f'Split {split}', size=(8, 1), pad=((3, 3), (1, 1)), key=f'-SplitRow_{slot}_{split}-'),                    # Buttons not required on split rows
+                    sg.Text('Rem. $' if split == 1 else '', size=(8, 1), pad=((3, 3), (1, 1)), key=f'-SplitRowRemAmtTitle_{slot}_{split}-', justification='right', font = 'Any 10 bold'),
+                    sg.Text('0.00' if split == 1 else '',   size=(8, 1), pad=((3, 12), (1, 1)), key=f'-SplitRowRemAmt_{slot}_{split}-', font = 'Any 10 bold')
+                ]], pad=(0, 0), key=f'-SplitRowBlock_{slot}_{split}-'))]]
+
+    # Input fields of a review grid row. Split is 0 for main transaction row
+    def __gridInputs(self, slot, split):
+        return [sg.Input(                   size=(10, 1), pad=((6, 3), (0, 0)), key=f'-TransGrid_{slot}_0_{split}-'),    # Date
+                sg.Combo(self.accountList,  size=(22, 1), pad=((3, 3), (0, 0)), key=f'-TransGrid_{slot}_1_{split}-'),    # Account
+                sg.Input(                   size=(11, 1), pad=((3, 3), (0, 0)), key=f'-TransGrid_{slot}_2_{split}-', enable_events=True, justification='right'),       # Amount
+                sg.Combo(self.categoryList, size=(30, 1), pad=((3, 3), (0, 0)), key=f'-TransGrid_{slot}_3_{split}-'),    # Category
+                sg.Input(                   size=(35, 1), pad=((3, 3), (0, 0)), key=f'-TransGrid_{slot}_4_{split}-', enable_events=True),     # Payee. Events show payee suggestions while typing
+                sg.Combo(self.accountList,  size=(22, 1), pad=((3, 3), (0, 0)), key=f'-TransGrid_{slot}_5_{split}-'),    # Transfer To Account, if double entry to an offline account is required
+                sg.Input(                   size=(35, 1), pad=((3, 3), (0, 0)), key=f'-TransGrid_{slot}_6_{split}-')]    # Note
+
+    # Send a window event on each key release in drop down lists, for type-ahead filtering of their values. Elements must already be created (window finalized)
+    def bindTypeAhead(self, window, keys):
+        for key in keys:
+            window[key].bind('<KeyRelease>', TYPE_AHEAD_SUFFIX)
+
     # Function to save current field values to json
     def saveFieldValues(self, fieldValues):
         with open(panelDefaultsFileName, 'w') as fp:
@@ -0,0 +1,53 @@
+# Shared fixtures of the tests. Run with: python -m pytest tests
+#  Each test runs in its own temporary folder, as script files (key, caches, stores, outbox) are relative to the current folder.
+#  API tests run against a local fake Pocketsmith server (see MyFakeServer.py), so no account or network is needed.
+#  Repository link: https://github.com/gandos21/PocketSmith
+import os
+import sys
+import json
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import MyFakeServer
+import MyPocketSmith
+
+# Module globals of MyPocketSmith holding state of one API key and folder. Reset for each test
+PS_STATE = {
+    'transactionStore': None, 'approvalHistory': None, 'outbox': None, 'payeeRules': None, 'payeeRulesMtime': None, 'payeeIndex': None,
+    'categoryTree': None, 'categoryList': [], 'categoryIdLookup': {}, 'accountList': [], 'accountIdLookup': {},
+    'userContext': {}, 'apiKeyHash': '', 'keyFileMtime': None,
+}
+
+
+@pytest.fixture
+def workDir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+# Fake server with no latency and no errors. Payee and amount changes are never flagged for review again, so API call counts are exact
+@pytest.fixture
+def server():
+    fake = MyFakeServer.FakeServer(reflagRate=0).start()
+    yield fake
+    fake.stop()
+
+# MyPocketSmith module with a fresh state, pointed to the fake server with categories and accounts loaded
+@pytest.fixture
+def ps(workDir, server, monkeypatch):
+    for name, value in PS_STATE.items():
+        monkeypatch.setattr(MyPocketSmith, name, value)
+    monkeypatch.setattr(MyPocketSmith.client, 'baseUrl', server.url)
+    monkeypatch.setattr(MyPocketSmith, 'queuedApprovals', {})
+    monkeypatch.setattr(MyPocketSmith, 'USER_CONTEXT_DISK_CACHE', False)
+    with open(MyPocketSmith.keyFile, 'w') as fp:
+        json.dump({'ApiKey': 't' * 128}, fp)
+    assert MyPocketSmith.ReadDevKey()
+    MyPocketSmith.LoadCategories(UseCache=False)
+    MyPocketSmith.LoadAccounts(UseCache=False)
+    yield MyPocketSmith
+    if MyPocketSmith.outbox is not None:
+        MyPocketSmith.outbox.close()
+    if MyPocketSmith.approvalHistory is not None:
+        MyPocketSmith.approvalHistory.close()
+    if MyPocketSmith.transactionStore is not None:
+        MyPocketSmith.transactionStore.conn.close()
@@ -0,0 +1,111 @@
+# Tests of the asyncio client against the fake server: downloads, changes through the outbox, and auto clearing with the sync version's limits
+import time
+import asyncio
+import pytest
+pytest.importorskip('aiohttp')
+import MyOutbox
+import MyFakeServer
+import MyAsyncPocketSmith as aps
+from test_auto_clear import SaveApproved, PendingList
+
+
+@pytest.fixture
+def client(ps, server, monkeypatch):
+    monkeypatch.setattr(aps.client, 'baseUrl', server.url)
+    monkeypatch.setattr(aps.client, 'retries', 0)       # Every failure reaches the outbox
+    return aps.client
+
+# Run a coroutine on a new event loop. Client session belongs to the loop, so it is closed before the loop is
+def Run(Coroutine):
+    async def Main():
+        try:
+            return await Coroutine
+        finally:
+            await aps.client.close()
+    return asyncio.run(Main())
+
+
+def test_fetch_all_pages(ps, server, client, monkeypatch):
+    monkeypatch.setattr(ps, 'TRANSACTIONS_PER_PAGE', 100)
+    added = MyFakeServer.AddPendingTransactions(server.account, 250)
+    server.resetStats()
+    transactions = Run(aps.FetchUserTransactions(needs_review='true'))
+    assert sorted(t['id'] for t in transactions) == sorted(t['id'] for t in added)
+    assert server.requestCounts[('GET', 'list_transactions')] == 3
+
+def test_sync_fills_shared_store(ps, server, client):
+    MyFakeServer.AddPendingTransactions(server.account, 10)
+    assert Run(aps.SyncTransactions()) == 10
+    assert len(ps.GetTransactionStore().getPendingIds()) == 10
+
+def test_change_is_saved_to_outbox(ps, server, client):
+    t = server.account.addTransaction(101, -10.0, 'Shop', '2024-01-10')
+    res, msg = Run(aps.ConfirmTransactionWithPayee(t['id'], 'New Shop'))
+    assert msg == 'Transaction posting success'
+    assert (res['payee'], res['needs_review']) == ('New Shop', False)
+    ops = ps.GetOutbox().list()
+    assert [(op['method'], op['status'], op['attempts']) for op in ops] == [('PUT', MyOutbox.DONE, 1)]
+
+def test_failed_change_is_reported_not_replayed(ps, server, client):
+    t = server.account.addTransaction(101, -10.0, 'Shop', '2024-01-10')
+    server.errorRate = 1.0
+    res, msg = Run(aps.ConfirmTransaction(t['id']))
+    assert msg.startswith('Transaction confirmation failed!')
+    server.errorRate = 0.0
+    assert ps.GetOutbox().list()[0]['status'] == MyOutbox.FAILED
+    assert ps.GetOutbox().dispatch() == 0
+    assert server.account.transactions[t['id']]['needs_review']
+
+def test_interrupted_create_is_uncertain(ps, server, client, monkeypatch):
+    monkeypatch.setattr(client, 'timeout', aps.aiohttp.ClientTimeout(sock_connect=5, sock_read=0.3))
+    server.latency = 1.0
+    with pytest.raises(asyncio.TimeoutError):
+        Run(aps.OutboxCall('POST', '/transaction_accounts/101/transactions', {'payee': 'New', 'amount': '-5.00', 'date': '2024-01-11'}))
+    assert ps.GetOutbox().list()[0]['status'] == MyOutbox.UNCERTAIN
+
+def test_auto_clear(ps, server, client):
+    pending = PendingList(ps, server, 4)
+    for t in pending[:3]:
+        SaveApproved(ps, t)
+    cleared, stillPending = Run(aps.CheckNewTransactionsForReapproval(pending))
+    assert [t['id'] for t in cleared] == [t['id'] for t in pending[:3]]
+    assert [t['id'] for t in stillPending] == [pending[3]['id']]
+    assert not any(server.account.transactions[t['id']]['needs_review'] for t in pending[:3])
+    assert pending[0]['id'] not in ps.GetTransactionStore().getPendingIds()
+
+def test_auto_clear_keeps_sync_limits(ps, server, client, monkeypatch):
+    pending = PendingList(ps, server, 8)
+    for t in pending:
+        SaveApproved(ps, t)
+    confirm = aps.ConfirmTransactionWithPayee
+    running = [0]
+    track = {'maxRunning': 0, 'starts': []}
+
+    async def Confirm(*args):
+        running[0] += 1
+        track['maxRunning'] = max(track['maxRunning'], running[0])
+        track['starts'].append(time.monotonic())
+        try:
+            return await confirm(*args)
+        finally:
+            running[0] -= 1
+    monkeypatch.setattr(aps, 'ConfirmTransactionWithPayee', Confirm)
+    monkeypatch.setattr(ps, 'AUTO_CLEAR_RATE_LIMIT', 20)
+    server.latency = 0.2
+    assert len(Run(aps.AutoClearTransactions(ps.MatchReapprovalCandidates(pending), MaxConcurrent=3))) == 8
+    assert track['maxRunning'] == 3
+    starts = track['starts']
+    assert all(b - a >= 0.04 for a, b in zip(starts, starts[1:]))       # 1/20 s apart, with a little timer slack
+
+def test_update_with_transfer_is_planned(ps, server, client):
+    from test_planner import PanelValues
+    t = server.account.addTransaction(101, -100.0, 'Rent', '2024-03-05')
+    server.resetStats()
+    res1, res2, msg = Run(aps.UpdateTransaction(t['id'], PanelValues(t, 'Transfer', 'Savings'), Need_Review=False))
+    assert msg == 'Transaction posting success'
+    assert (res1['payee'], res1['needs_review']) == ('Transfer : Savings', False)
+    assert (res2['payee'], res2['amount'], res2['needs_review']) == ('Transfer : Everyday', 100.0, False)
+    # Main PUT, POST of the other side with review flag cleared, and conditional PUT as the server sets new transactions for review
+    assert server.requestCounts[('PUT', 'update_transaction')] == 2
+    assert server.requestCounts[('POST', 'create_transaction')] == 1
+    assert {op['status'] for op in ps.GetOutbox().list()} == {MyOutbox.DONE, MyOutbox.SKIPPED}
@@ -0,0 +1,72 @@
+# Tests of auto clearing re-approved transactions: history match, rate limit and concurrency cap, against the fake server
+import time
+import threading
+import MyFakeServer
+from WindowFields import WindowFields as wf
+
+
+# Save a pending transaction to approval history, the same way the review panel saves approved rows
+def SaveApproved(ps, Transaction, **Changes):
+    values = {wf.TRANSACTION_DATE: Transaction['date'], wf.PAYEE_NAME: 'Approved ' + Transaction['payee'], wf.CATEGORY_NAME: Transaction['category'],
+              wf.NOTE_TEXT: 'Approved', wf.AMOUNT: '{:,.2f}'.format(Transaction['amount']), wf.AC_FROM: Transaction['account']}
+    values.update(Changes)
+    ps.SaveApprovedTransaction(Transaction['id'], values)
+
+def PendingList(ps, Server, Count):
+    MyFakeServer.AddPendingTransactions(Server.account, Count)
+    ps.SyncTransactions()
+    return ps.GetPendingReviewList(ps.GetTransactionStore())
+
+# Wrap a confirmation function to record the number of calls running at the same time, and the start time of each call
+def TrackCalls(Function):
+    lock = threading.Lock()
+    running = [0]
+    track = {'maxRunning': 0, 'starts': []}
+
+    def Tracked(*args, **kwargs):
+        with lock:
+            running[0] += 1
+            track['maxRunning'] = max(track['maxRunning'], running[0])
+            track['starts'].append(time.monotonic())
+        try:
+            return Function(*args, **kwargs)
+        finally:
+            with lock:
+                running[0] -= 1
+    return Tracked, track
+
+
+def test_only_unchanged_approved_transactions_are_cleared(ps, server):
+    pending = PendingList(ps, server, 4)
+    SaveApproved(ps, pending[0])
+    SaveApproved(ps, pending[1], **{wf.AMOUNT: '1.00'})           # Amount changed since approval
+    SaveApproved(ps, pending[2], **{wf.AC_FROM: 'Wallet'})        # Account changed
+    cleared, stillPending = ps.CheckNewTransactionsForReapproval(pending)
+    assert [t['id'] for t in cleared] == [pending[0]['id']]
+    assert [t['id'] for t in stillPending] == [t['id'] for t in pending[1:]]
+    t = server.account.transactions[pending[0]['id']]
+    assert (t['needs_review'], t['payee'], t['note']) == (False, 'Approved ' + pending[0]['payee'], 'Approved')
+    assert pending[0]['id'] not in ps.GetTransactionStore().getPendingIds()      # Store updated without waiting for next sync
+
+def test_rate_limit_and_concurrency_cap(ps, server, monkeypatch):
+    pending = PendingList(ps, server, 8)
+    for t in pending:
+        SaveApproved(ps, t)
+    tracked, track = TrackCalls(ps.ConfirmTransactionWithPayee)
+    monkeypatch.setattr(ps, 'ConfirmTransactionWithPayee', tracked)
+    monkeypatch.setattr(ps, 'AUTO_CLEAR_RATE_LIMIT', 20)
+    server.latency = 0.2
+    assert len(ps.AutoClearTransactions(ps.MatchReapprovalCandidates(pending), MaxConcurrent=3)) == 8
+    assert track['maxRunning'] == 3
+    starts = sorted(track['starts'])
+    assert all(b - a >= 0.04 for a, b in zip(starts, starts[1:]))       # 1/20 s apart, with a little timer slack
+
+def test_failed_confirmation_stays_pending(ps, server):
+    pending = PendingList(ps, server, 2)
+    for t in pending:
+        SaveApproved(ps, t)
+    with server.account.lock:
+        del server.account.transactions[pending[1]['id']]
+    cleared, stillPending = ps.CheckNewTransactionsForReapproval(pending)
+    assert [t['id'] for t in cleared] == [pending[0]['id']]
+    assert [t['id'] for t in stillPending] == [pending[1]['id']]
@@ -0,0 +1,64 @@
+# Tests of category tree updates, lookups and type-ahead filtering
+from MyCategoryTree import CategoryTree
+
+
+def Category(Id, Title, *Children):
+    return {'id': Id, 'title': Title, 'children': list(Children)}
+
+def Categories():
+    return [Category(1, 'Food', Category(11, 'Groceries'), Category(12, 'Eating Out')),
+            Category(2, 'Transport', Category(21, 'Fuel'), Category(22, 'Parking')),
+            Category(3, 'Home', Category(31, 'Parking')),
+            Category(9, 'Hidden', Category(91, 'Old Category'))]
+
+
+def test_names_and_lookups():
+    tree = CategoryTree(Categories())
+    assert tree.names == ['Groceries', 'Eating Out', 'Fuel', 'Transport > Parking', 'Home > Parking']      # Parents and hidden categories left out
+    assert tree.find('fuel') == 21
+    assert tree.find('Transport > Fuel') == 21
+    assert tree.find('Parking') is None                 # Shared leaf title
+    assert [n.id for n in tree.matches('parking')] == [22, 31]
+    assert tree.find('Old Category') == 91
+    assert tree.displayName(22) == 'Transport > Parking'
+    assert sorted(tree.subtreeIds(2)) == [2, 21, 22]
+    assert tree.subtreeIds(99) == []
+
+def test_update_returns_changes():
+    tree = CategoryTree(Categories())
+    version = tree.version
+    assert tree.update(Categories()) == set()
+    assert tree.version == version
+    categories = Categories()
+    categories[1]['title'] = 'Travel'
+    assert tree.update(categories) == {2}
+    assert tree.version == version + 1
+    assert tree.nodes[21].path == 'Travel > Fuel'       # Children get new paths
+    assert tree.find('Transport > Fuel') is None
+    assert tree.displayName(22) == 'Travel > Parking'
+
+def test_removed_category_makes_name_unique():
+    tree = CategoryTree(Categories())
+    categories = Categories()
+    del categories[2]
+    assert tree.update(categories) == {3, 31}
+    assert tree.displayName(22) == 'Parking'
+    assert tree.find('Parking') == 22
+    assert tree.find('Home') is None
+
+def test_moved_category():
+    tree = CategoryTree(Categories())
+    categories = Categories()
+    categories[0]['children'].append(categories[1]['children'].pop(0))
+    assert tree.update(categories) == {21}
+    assert tree.nodes[21].path == 'Food > Fuel'
+    assert tree.nodes[1].childIds == [11, 12, 21]
+    assert tree.nodes[2].childIds == [22]
+
+def test_filter():
+    tree = CategoryTree(Categories())
+    assert tree.filter('tr pa') == ['Transport > Parking']
+    assert tree.filter('p') == ['Transport > Parking', 'Home > Parking']
+    assert tree.filter('pa') == ['Transport > Parking', 'Home > Parking']
+    assert tree.filter('g') == ['Groceries']
+    assert tree.filter('') == tree.names
@@ -0,0 +1,61 @@
+# Tests of transaction export formats and of batched reading from the local store
+import io
+import csv
+import json
+import pytest
+import MyExport
+from MyTransactionStore import TransactionStore
+
+
+def Transaction(Id, Date, Account='Everyday', Category=None, Payee='Shop'):
+    return {'id': Id, 'date': Date, 'payee': Payee, 'amount': -1.5 * Id, 'note': None, 'needs_review': True, 'status': 'posted', 'upload_source': 'feed',
+            'transaction_account': {'id': 101, 'name': Account}, 'category': Category}
+
+TRANSACTIONS = [Transaction(1, '2024-03-05', Category={'id': 11, 'title': 'Groceries'}, Payee='Coles, "Town"'), Transaction(2, '2024-03-04', 'Savings')]
+
+
+def test_flat_transaction():
+    row = MyExport.FlatTransaction(TRANSACTIONS[0], {11: 'Food > Groceries'}.get)
+    assert row['account'] == 'Everyday'
+    assert row['category'] == 'Food > Groceries'
+    assert list(row) == MyExport.EXPORT_FIELDS
+    assert MyExport.FlatTransaction(TRANSACTIONS[1])['category'] is None
+
+def test_export_csv():
+    fp = io.StringIO()
+    assert MyExport.ExportTransactions(iter(TRANSACTIONS), fp, 'csv') == 2
+    rows = list(csv.DictReader(io.StringIO(fp.getvalue())))
+    assert [(r['id'], r['payee'], r['category'], r['account']) for r in rows] == [('1', 'Coles, "Town"', 'Groceries', 'Everyday'), ('2', 'Shop', '', 'Savings')]
+
+def test_export_jsonl():
+    fp = io.StringIO()
+    assert MyExport.ExportTransactions(iter(TRANSACTIONS), fp, 'jsonl') == 2
+    assert [json.loads(line) for line in fp.getvalue().splitlines()] == [MyExport.FlatTransaction(t) for t in TRANSACTIONS]
+
+@pytest.mark.parametrize('transactions', [TRANSACTIONS, []])
+def test_export_json(transactions):
+    fp = io.StringIO()
+    assert MyExport.ExportTransactions(iter(transactions), fp, 'json') == len(transactions)
+    assert json.loads(fp.getvalue()) == [MyExport.FlatTransaction(t) for t in transactions]
+
+def test_export_format():
+    assert MyExport.ExportFormat('out.JSONL') == 'jsonl'
+    assert MyExport.ExportFormat('out.txt') == 'csv'
+    with pytest.raises(ValueError):
+        MyExport.ExportTransactions([], io.StringIO(), 'xml')
+
+def test_filter_transactions():
+    assert [t['id'] for t in MyExport.FilterTransactions(TRANSACTIONS, Account='Savings')] == [2]
+    assert [t['id'] for t in MyExport.FilterTransactions(TRANSACTIONS, CategoryIds={11, 12})] == [1]
+
+
+def test_store_batches_match_full_read(workDir):
+    store = TransactionStore()
+    store.upsert(Transaction(i, f'2024-03-{1 + i % 5:02d}', Category={'id': 11 + i % 2, 'title': 'x'}) for i in range(1, 24))
+    try:
+        assert list(store.iterTransactions(batchSize=4)) == store.getTransactions()
+        assert list(store.iterTransactions('2024-03-02', '2024-03-04', batchSize=3)) == store.getTransactions('2024-03-02', '2024-03-04')
+        assert [t['id'] for t in store.iterTransactions(categoryIds=[12], batchSize=2)] == [t['id'] for t in store.getTransactions(categoryIds=[12])]
+        assert len(store.getTransactions(categoryIds=[12])) == 12
+    finally:
+        store.conn.close()
@@ -0,0 +1,28 @@
+# Tests of paginated transaction download, against the fake server
+import MyFakeServer
+
+
+def ListCalls(Server):
+    return Server.requestCounts[('GET', 'list_transactions')]
+
+
+def test_fetch_all_pages(ps, server, monkeypatch):
+    monkeypatch.setattr(ps, 'TRANSACTIONS_PER_PAGE', 100)
+    added = MyFakeServer.AddPendingTransactions(server.account, 250)
+    server.resetStats()
+    transactions = ps.FetchUserTransactions(needs_review='true')
+    assert sorted(t['id'] for t in transactions) == sorted(t['id'] for t in added)
+    assert ListCalls(server) == 3
+
+def test_iterate_pages_in_order(ps, server, monkeypatch):
+    monkeypatch.setattr(ps, 'TRANSACTIONS_PER_PAGE', 30)
+    MyFakeServer.AddPendingTransactions(server.account, 95)
+    listed = ps.FetchUserTransactions(needs_review='true')
+    server.resetStats()
+    assert [t['id'] for t in ps.IterUserTransactions(needs_review='true')] == [t['id'] for t in listed]
+    assert ListCalls(server) == 4
+
+def test_empty_list_is_one_call(ps, server):
+    server.resetStats()
+    assert ps.FetchUserTransactions(needs_review='true') == []
+    assert ListCalls(server) == 1
@@ -0,0 +1,77 @@
+# Tests of the append-only approved transaction history
+import json
+from datetime import datetime, timedelta
+import MyHistoryStore
+from MyHistoryStore import ApprovalHistory
+
+
+def History(Duration=30):
+    return ApprovalHistory('History.jsonl', Duration, 'date')
+
+def DaysAgo(Days):
+    return (datetime.now() - timedelta(days=Days)).strftime('%Y-%m-%d')
+
+def FileLines():
+    with open('History.jsonl') as fp:
+        return fp.read().splitlines()
+
+
+def test_append_and_reload(workDir):
+    history = History()
+    history.append(5, {'date': DaysAgo(1), 'payee': 'Shop'})
+    history.append('6', {'date': DaysAgo(1), 'payee': 'Cafe'})
+    history.append(5, {'date': DaysAgo(1), 'payee': 'Shop 2'})
+    assert len(FileLines()) == 3                    # Appended, not re-written
+    assert History().get('5')['payee'] == 'Shop 2'  # Later line replaces earlier one
+    assert History().fieldValues('payee') == {'5': 'Shop 2', '6': 'Cafe'}
+
+def test_refresh_after_write_by_another_instance(workDir):
+    first, second = History(), History()
+    assert first.load() == 0
+    second.append(7, {'date': DaysAgo(1)})
+    assert first.get(7) == {'date': DaysAgo(1)}
+    first.append(8, {'date': DaysAgo(2)})
+    assert sorted(second.all()) == ['7', '8']
+
+def test_partly_written_line_is_ignored(workDir):
+    history = History()
+    history.append(1, {'date': DaysAgo(1)})
+    with open('History.jsonl', 'a') as fp:
+        fp.write('{"id": "2", "da')             # Script stopped while saving
+    history = History()
+    assert sorted(history.all()) == ['1']
+    history.append(3, {'date': DaysAgo(1)})
+    assert sorted(History().all()) == ['1', '3']
+
+def test_compaction_drops_replaced_and_expired_entries(workDir, monkeypatch):
+    monkeypatch.setattr(MyHistoryStore, 'COMPACT_MIN_LINES', 4)
+    history = History(Duration=30)
+    history.append(1, {'date': DaysAgo(60)})
+    history.append(2, {'date': 'not a date'})
+    for _ in range(5):
+        history.append(3, {'date': DaysAgo(1)})
+    assert history.needsCompaction()
+    history.compact()
+    assert not history.needsCompaction()
+    assert sorted(json.loads(line)['id'] for line in FileLines()) == ['2', '3']   # Entries without a valid date are kept
+    assert sorted(History().all()) == ['2', '3']
+
+def test_import_legacy_file(workDir):
+    with open('Legacy.json', 'w') as fp:
+        json.dump({'1': {'date': DaysAgo(1)}, '2': {'date': DaysAgo(90)}}, fp)
+    history = History()
+    assert history.importLegacyFile('Legacy.json') == 1
+    assert history.importLegacyFile('Legacy.json') == 0       # New file exists already
+    assert sorted(History().all()) == ['1']
+
+def test_compactor_stops_on_close(workDir, monkeypatch):
+    monkeypatch.setattr(MyHistoryStore, 'COMPACT_MIN_LINES', 1)
+    history = History()
+    for _ in range(3):
+        history.append(1, {'date': DaysAgo(1)})
+    thread = history.startCompactor(interval=0.05)
+    thread.join(0.5)
+    assert thread.is_alive()
+    assert len(FileLines()) == 1        # Compacted in background
+    history.close()
+    assert not thread.is_alive()
@@ -0,0 +1,84 @@
+# Tests of statement file reading, and of import with duplicate check against the fake server
+import io
+import pytest
+import MyImport
+
+CSV_FILE = '''Date,Description,Debit,Credit,Memo
+05/03/2024,Coles,"1,234.50",,weekly shop
+06/03/2024,Salary,,2000.00,
+07/03/2024,Refund,(15.00),,
+31/02/2024,Bad date,1.00,,
+
+08/03/2024,No amount,,,
+'''
+
+OFX_FILE = '''OFXHEADER:100
+<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKACCTFROM><ACCTID>Everyday</BANKACCTFROM><BANKTRANLIST>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20240305120000[+10:AEST]<TRNAMT>-12.50<NAME>Cafe &amp; Co<MEMO>Coffee</STMTTRN>
+<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20240306<TRNAMT>100.00<MEMO>Transfer in</STMTTRN>
+</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+'''
+
+
+def test_read_csv_with_debit_and_credit_columns():
+    rows = list(MyImport.ReadCsv(io.StringIO(CSV_FILE), Defaults={'account': 'Everyday'}))
+    assert [(r.date, r.amount, r.payee, r.note) for r in rows[:3]] == [
+        ('2024-03-05', -1234.5, 'Coles', 'weekly shop'), ('2024-03-06', 2000.0, 'Salary', None), ('2024-03-07', -15.0, 'Refund', None)]
+    assert all(r.account == 'Everyday' for r in rows)
+    assert [r.line for r in rows if r.error] == [5, 7]       # Blank line is skipped
+
+def test_read_csv_with_mapping():
+    rows = list(MyImport.ReadCsv(io.StringIO('When,Who,Value,Acct\n2024-03-05,Shell,-60,Credit Card\n'), {'date': 'When', 'payee': 2, 'amount': 'value', 'account': 'Acct'}))
+    assert [(r.date, r.payee, r.amount, r.account) for r in rows] == [('2024-03-05', 'Shell', -60.0, 'Credit Card')]
+
+def test_missing_columns():
+    with pytest.raises(MyImport.StatementError):
+        list(MyImport.ReadCsv(io.StringIO('Date,Memo\n2024-03-05,x\n')))
+    with pytest.raises(MyImport.StatementError):
+        MyImport.ColumnMapping(['Date', 'Payee', 'Amount'], {'payee': 'Narrative'})
+
+@pytest.mark.parametrize('blockSize', [7, 64, 64 * 1024])
+def test_read_ofx_in_blocks(monkeypatch, blockSize):
+    monkeypatch.setattr(MyImport, 'OFX_READ_SIZE', blockSize)
+    rows = list(MyImport.ReadStatement(io.StringIO(OFX_FILE), 'ofx'))
+    assert [(r.date, r.amount, r.payee, r.note, r.account) for r in rows] == [
+        ('2024-03-05', -12.5, 'Cafe & Co', 'Coffee', 'Everyday'), ('2024-03-06', 100.0, 'Transfer in', None, 'Everyday')]
+
+def test_import_format():
+    assert MyImport.ImportFormat('Statement.QFX') == 'ofx'
+    assert MyImport.ImportFormat('Statement.csv') == 'csv'
+
+def test_each_existing_transaction_skips_one_row():
+    rows = [MyImport.StatementRow(i, '2024-03-05', -4.5, 'Cafe', 'Everyday') for i in range(3)]
+    new, skipped = MyImport.SkipExisting(rows, [MyImport.DuplicateKey('Everyday', '2024-03-05', '-4.50')] * 2)
+    assert [r.line for r in skipped] == [0, 1]
+    assert [r.line for r in new] == [2]
+
+
+def ReadRows(ps, Text, Defaults=None):
+    rows = ps.CheckImportRows(list(MyImport.ReadCsv(io.StringIO(Text), Defaults=Defaults)))
+    return MyImport.SkipExisting(rows, ps.ExistingImportKeys(rows))
+
+def test_import_skips_rows_already_imported(ps, server):
+    text = 'Date,Payee,Amount,Account,Category\n2024-03-05,Coles,-20.00,Everyday,Groceries\n2024-03-05,Coles,-20.00,Everyday,Groceries\n2024-03-06,Shell,-60,Credit Card,Fuel\n'
+    new, skipped = ReadRows(ps, text)
+    assert (len(new), len(skipped)) == (3, 0)
+    results = ps.ImportTransactions(new)
+    assert all('SUCCESS' in status.upper() for status in results.values())
+    assert sorted((t['payee'], t['amount'], (t['category'] or {}).get('title')) for t in server.account.transactions.values()) == [
+        ('Coles', -20.0, 'Groceries'), ('Coles', -20.0, 'Groceries'), ('Shell', -60.0, 'Fuel')]
+    new, skipped = ReadRows(ps, text + '2024-03-05,Coles,-20.00,Everyday,Groceries\n')
+    assert [r.line for r in new] == [5]         # Third purchase of the same amount on the day is new
+
+def test_import_transfer_and_approve(ps, server):
+    new, skipped = ReadRows(ps, 'Date,Payee,Amount\n2024-03-05,To savings,-100\n', {'account': 'Everyday', 'transferTo': 'Savings'})
+    ps.ImportTransactions(new, NeedsReview=False)
+    legs = sorted((t['transaction_account']['name'], t['amount'], t['payee'], t['needs_review']) for t in server.account.transactions.values())
+    assert legs == [('Everyday', -100.0, 'Transfer : Savings', False), ('Savings', 100.0, 'Transfer : Everyday', False)]
+
+def test_rows_with_unknown_account_or_category(ps):
+    rows = [MyImport.StatementRow(1, '2024-03-05', -1.0, 'x', 'Nowhere'), MyImport.StatementRow(2, '2024-03-05', -1.0, 'x', 'Everyday', 'No such category'),
+            MyImport.StatementRow(3, '2024-03-05', -1.0, 'x', 'Everyday', 'Fuel')]
+    assert [r.line for r in ps.CheckImportRows(rows)] == [3]
+    assert rows[0].error == 'Unknown account Nowhere'
+    assert rows[1].error == 'Category No such category not found'
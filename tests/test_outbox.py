@@ -0,0 +1,131 @@
+# Tests of outbox replay of changes that failed with temporary errors, uncertain creates, recovery of operations of stopped processes and results of queued approvals,
+#  against the fake server
+import time
+import pytest
+import MyOutbox
+import MyFakeServer
+from MyApiClient import ApiClient
+from WindowFields import WindowFields as wf
+
+
+@pytest.fixture
+def client(server):
+    client = ApiClient(server.url, retries=0, timeout=(5, 0.3))        # No client retries, so every failure reaches the outbox
+    client.setApiKey('t' * 128)
+    return client
+
+@pytest.fixture
+def outbox(workDir, client, monkeypatch):
+    monkeypatch.setattr(MyOutbox, 'OUTBOX_BACKOFF', 0)      # Retries are due straight away
+    outbox = MyOutbox.Outbox(client)
+    yield outbox
+    if not outbox.closed.is_set():
+        outbox.close()
+
+def AddTransaction(Server):
+    return Server.account.addTransaction(101, -10.0, 'Shop', '2024-01-10')
+
+
+def test_replay_after_server_error(server, outbox):
+    t = AddTransaction(server)
+    outbox.enqueue([{'key': 'create', 'method': 'POST', 'path': '/transaction_accounts/101/transactions', 'expected': [201],
+                     'payload': {'payee': 'New', 'amount': '-5.00', 'date': '2024-01-11'}},
+                    {'key': 'update', 'method': 'PUT', 'path': f"/transactions/{t['id']}", 'payload': {'needs_review': False}, 'expected': [200]},
+                    {'key': 'confirm', 'method': 'PUT', 'path': '/transactions/{id}', 'payload': {'needs_review': False}, 'expected': [200],
+                     'deps': ['create'], 'idFrom': 'create'}], 'g')
+    server.errorRate = 1.0
+    outbox.dispatch()
+    assert outbox.get('create')['status'] == MyOutbox.PENDING       # Server error before the create was done, so it's safe to send again
+    assert outbox.get('update')['status'] == MyOutbox.PENDING
+    assert outbox.get('update')['lastError'] == 'Response 500'
+    assert outbox.get('confirm')['attempts'] == 0                   # Waits for the create
+    server.errorRate = 0.0
+    assert outbox.dispatch() == 3
+    assert {op['status'] for op in outbox.list(group='g')} == {MyOutbox.DONE}
+    created = outbox.get('create')['result']
+    assert not server.account.transactions[created['id']]['needs_review']
+    assert not server.account.transactions[t['id']]['needs_review']
+    assert outbox.get('update')['attempts'] == 2
+
+def test_rejected_change_fails_with_dependents(server, outbox):
+    outbox.enqueue([{'key': 'update', 'method': 'PUT', 'path': '/transactions/999999', 'payload': {'needs_review': False}, 'expected': [200]},
+                    {'key': 'after', 'method': 'PUT', 'path': '/transactions/{id}', 'payload': {}, 'deps': ['update'], 'idFrom': 'update'}])
+    outbox.dispatch()
+    assert outbox.get('update')['status'] == MyOutbox.FAILED
+    assert outbox.get('after')['status'] == MyOutbox.FAILED
+    assert outbox.dispatch() == 0
+
+def test_interrupted_create_is_uncertain(server, outbox):
+    server.latency = 1.0        # Longer than the client read timeout
+    outbox.enqueue([{'key': 'create', 'method': 'POST', 'path': '/transaction_accounts/101/transactions', 'expected': [201],
+                     'payload': {'payee': 'New', 'amount': '-5.00', 'date': '2024-01-11'}}])
+    outbox.dispatch()
+    assert outbox.get('create')['status'] == MyOutbox.UNCERTAIN
+    assert outbox.dispatch() == 0       # Not replayed, it may have been created
+    server.latency = 0.0
+    outbox.retry('create')
+    assert outbox.dispatch() == 1
+    assert outbox.get('create')['status'] == MyOutbox.DONE
+
+def test_failed_call_is_not_replayed(server, outbox):
+    t = AddTransaction(server)
+    server.errorRate = 1.0
+    response = outbox.call('PUT', f"/transactions/{t['id']}", {'needs_review': False})
+    assert response.status_code == 500
+    server.errorRate = 0.0
+    assert outbox.list()[0]['status'] == MyOutbox.FAILED
+    assert outbox.dispatch() == 0
+    assert server.account.transactions[t['id']]['needs_review']
+
+def test_claimed_group_is_left_to_caller(server, outbox):
+    t = AddTransaction(server)
+    outbox.enqueue([{'key': 'update', 'method': 'PUT', 'path': f"/transactions/{t['id']}", 'payload': {'needs_review': False}}], 'mine', claim=True)
+    assert outbox.dispatch() == 0           # Background replay leaves it alone
+    sent = []
+    assert outbox.dispatch('mine', progress=sent.append) == 1
+    assert sent == ['update']
+    assert 'mine' not in outbox.claimedGroups
+
+def test_recover_only_stopped_processes(server, client, outbox):
+    outbox.enqueue([{'key': 'put', 'method': 'PUT', 'path': '/transactions/1', 'payload': {}},
+                    {'key': 'post', 'method': 'POST', 'path': '/transaction_accounts/101/transactions', 'payload': {}}], status=MyOutbox.SENDING)
+    other = MyOutbox.Outbox(client)
+    try:
+        assert other.recoverStale() == 0        # First process is still running
+        assert outbox.get('put')['status'] == MyOutbox.SENDING
+        outbox.close()
+        assert other.recoverStale() == 2
+        assert other.get('put')['status'] == MyOutbox.PENDING
+        assert other.get('post')['status'] == MyOutbox.UNCERTAIN
+    finally:
+        other.close()
+
+
+# Wait for approvals queued with Wait=False to be sent by the outbox replayer
+def WaitForQueuedApprovals(ps, Count, Timeout=10):
+    finished = {}
+    deadline = time.monotonic() + Timeout
+    while len(finished) < Count and time.monotonic() < deadline:
+        finished.update(ps.CheckQueuedApprovals())
+        time.sleep(0.05)
+    return finished
+
+def test_queued_approvals_are_reported_when_done(ps, server):
+    from test_planner import PanelValues
+    added = MyFakeServer.AddPendingTransactions(server.account, 2)
+    ps.SyncTransactions()
+    transactions = {t['id']: t for t in ps.GetTransactionStore().getPending()}
+    with server.account.lock:
+        del server.account.transactions[added[1]['id']]        # Deleted in Pocketsmith, so its approval is rejected
+    batch = [(transactions[t['id']], [('No transfer', PanelValues(transactions[t['id']]))]) for t in added]
+    results = ps.ApproveTransactions(batch, Wait=False)
+    assert all('QUEUED' in status.upper() for status, approved in results.values())
+    finished = WaitForQueuedApprovals(ps, 2)
+    status, approvedMain = finished[added[0]['id']]
+    assert status == 'Transaction posting success'
+    assert approvedMain[wf.PAYEE_NAME] == added[0]['payee']
+    status, approvedMain = finished[added[1]['id']]
+    assert status.startswith('Transaction posting failed!')
+    assert approvedMain is None
+    assert ps.CheckQueuedApprovals() == {}          # Each approval is reported once
+    assert ps.GetApprovalHistory().all() == {}      # Saving to history is up to the caller, once the approval is done
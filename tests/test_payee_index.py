@@ -0,0 +1,50 @@
+# Tests of the payee autocomplete index
+from MyPayeeIndex import PayeeIndex, Trigrams
+
+
+def test_trigrams():
+    assert Trigrams('uber') == {' ub', 'ube', 'ber', 'er '}
+
+def test_prefix_suggestions_most_used_first():
+    index = PayeeIndex()
+    index.addTransactions([{'id': 1, 'payee': 'Coles'}, {'id': 2, 'payee': 'Costco'}, {'id': 3, 'payee': 'Costco'}, {'id': 4, 'payee': 'Aldi'}])
+    assert len(index) == 3
+    assert index.suggest('co') == ['Costco', 'Coles']
+    assert index.suggest('CO', limit=1) == ['Costco']
+    assert index.suggest(' ') == []
+
+def test_transaction_counted_once():
+    index = PayeeIndex()
+    index.addTransactions([{'id': 1, 'payee': 'Coles'}, {'id': 2, 'payee': 'Costco'}])
+    index.addTransactions([{'id': 1, 'payee': 'Coles'}] * 3)       # Downloaded again
+    index.add('Costco', 2)
+    index.add('Costco', 3)
+    assert index.suggest('co') == ['Costco', 'Coles']
+
+def test_new_payee_clears_cached_suggestions():
+    index = PayeeIndex()
+    index.add('Coles')
+    assert index.suggest('c') == ['Coles']
+    index.add('Cafe')
+    index.add('Cafe')
+    assert index.suggest('c') == ['Cafe', 'Coles']
+
+def test_typo_finds_similar_payee():
+    index = PayeeIndex()
+    index.addTransactions([{'id': 1, 'payee': 'Woolworths'}, {'id': 2, 'payee': 'Bunnings'}])
+    assert index.suggest('woolwroths') == ['Woolworths']
+    assert index.suggest('wo') == ['Woolworths']
+    assert index.suggest('xq') == []                # Too short for fuzzy matches
+
+def test_payee_typed_in_full_is_not_suggested():
+    index = PayeeIndex()
+    index.add('Coles')
+    index.add('Coles Express')
+    assert index.suggest('coles') == ['Coles Express']
+
+def test_history_payees_counted_apart_from_transactions():
+    index = PayeeIndex()
+    index.addTransactions([{'id': 1, 'payee': 'Uber'}, {'id': 2, 'payee': 'Uber Eats'}, {'id': 3, 'payee': 'Uber Eats'}])
+    index.addHistory({1: 'uber', 4: 'Uber', 5: 'Uber'})
+    assert index.suggest('ub') == ['Uber', 'Uber Eats']
+    assert index.suggest('ub', limit=1) == ['Uber']          # Shown as in the most recent transaction
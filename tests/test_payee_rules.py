@@ -0,0 +1,83 @@
+# Tests of payee rule matching
+import json
+import pytest
+import MyPayeeRules
+from MyPayeeRules import PayeeRules, RuleError
+
+
+def Transaction(Payee, Amount=-10.0, Note='', Account='Everyday', Id=1):
+    return {'id': Id, 'payee': Payee, 'amount': Amount, 'note': Note, 'account': Account}
+
+def MatchIndex(Rules, Transaction):
+    match = Rules.match(Transaction)
+    return match.index if match is not None else None
+
+
+def test_each_condition():
+    rules = PayeeRules([{'payee_exact': 'ATM Withdrawal', 'transfer_to': 'Wallet', 'auto_approve': True},
+                        {'payee': 'woolworths', 'category': 'Groceries'},
+                        {'note': 'rent', 'category': 'Rent'},
+                        {'payee_regex': r'^opal\b', 'category': 'Public Transport'},
+                        {'payee_regex': r'\d{4} fuel', 'category': 'Fuel'},
+                        {'account': 'Credit Card', 'amount_min': -5, 'amount_max': 0, 'category': 'Fees'}])
+    assert MatchIndex(rules, Transaction('atm withdrawal')) == 0
+    assert MatchIndex(rules, Transaction('ATM Withdrawal Fee')) is None
+    assert MatchIndex(rules, Transaction('WOOLWORTHS 1234 SYDNEY')) == 1
+    assert MatchIndex(rules, Transaction('Transfer', Note='March RENT')) == 2
+    assert MatchIndex(rules, Transaction('OPAL Top up')) == 3
+    assert MatchIndex(rules, Transaction('Top up Opal')) is None
+    assert MatchIndex(rules, Transaction('Station 1234 Fuel')) == 4
+    assert MatchIndex(rules, Transaction('Fee', -2.0, Account='Credit Card')) == 5
+    assert MatchIndex(rules, Transaction('Fee', -20.0, Account='Credit Card')) is None
+    assert MatchIndex(rules, Transaction('Fee', -2.0)) is None
+
+def test_first_matching_rule_wins():
+    rules = PayeeRules([{'payee': 'shell', 'amount_max': -100, 'category': 'Car Service'}, {'payee': 'shell', 'category': 'Fuel'}])
+    assert rules.match(Transaction('Shell Coles Express', -150.0)).category == 'Car Service'
+    assert rules.match(Transaction('Shell Coles Express', -50.0)).category == 'Fuel'
+
+def test_auto_approve_only_for_exact_payee():
+    rules = PayeeRules([{'payee': 'atm', 'category': 'Cash', 'auto_approve': True}, {'payee_exact': 'Salary', 'category': 'Income', 'auto_approve': True}])
+    assert not rules.match(Transaction('ATM 123')).autoApprove
+    assert rules.match(Transaction('salary')).autoApprove
+
+def test_regex_sees_text_as_it_is():
+    # Case folding turns 'ß' into 'ss', which a regex written for the original text wouldn't match
+    rules = PayeeRules([{'payee_regex': r'straße \d+', 'category': 'Parking'}, {'payee_regex': r'^[a-zäöüß]+ gmbh$', 'category': 'Shops'}])
+    assert MatchIndex(rules, Transaction('Parkhaus STRAßE 12')) == 0
+    assert MatchIndex(rules, Transaction('Müller GmbH')) == 1
+
+def test_combined_regexes_with_back_reference():
+    rules = PayeeRules([{'payee_regex': r'(\w)\1x', 'category': 'A'}, {'payee_regex': r'[0-9]+$', 'category': 'B'}])
+    assert MatchIndex(rules, Transaction('aax')) == 0
+    assert MatchIndex(rules, Transaction('abx 42')) == 1
+
+def test_classify():
+    rules = PayeeRules([{'payee': 'cafe', 'category': 'Eating Out'}])
+    matches = rules.classify([Transaction('Cafe', Id=1), Transaction('Bank', Id=2)])
+    assert list(matches) == [1]
+
+def test_required_literal():
+    assert MyPayeeRules.RequiredLiteral(r'^woolworths\s+\d+') == 'woolworths'
+    assert MyPayeeRules.RequiredLiteral(r'a|b') is None
+    assert MyPayeeRules.RequiredLiteral(r'\d{4} Fuel') == ' fuel'
+    assert MyPayeeRules.RequiredLiteral(r'coles{2,3}xx') == 'cole'          # Repeated character is left out
+    assert MyPayeeRules.RequiredLiteral(r'\.co\.uk$') == '.co.uk'
+    assert MyPayeeRules.RequiredLiteral(r'x[\]a](yz)+ab') == 'ab'           # Class and group contents are not literals
+    assert MyPayeeRules.RequiredLiteral(r'ab*c') is None
+    assert MyPayeeRules.RequiredLiteral(r'(?x) a b c') is None
+
+@pytest.mark.parametrize('rule', [{'category': 'x', 'colour': 'red'}, {'payee': 'x'}, {'payee_regex': '(', 'category': 'x'}, {'amount_min': '5', 'category': 'x'}, 'x'])
+def test_invalid_rules(rule):
+    with pytest.raises(RuleError):
+        PayeeRules([rule])
+
+def test_load_rules_file(workDir):
+    assert len(MyPayeeRules.LoadPayeeRules('Missing.json')) == 0
+    with open('Rules.json', 'w') as fp:
+        json.dump([{'payee': 'cafe', 'category': 'Eating Out'}], fp)
+    assert len(MyPayeeRules.LoadPayeeRules('Rules.json')) == 1
+    with open('Rules.json', 'w') as fp:
+        fp.write('{')
+    with pytest.raises(RuleError):
+        MyPayeeRules.LoadPayeeRules('Rules.json')
@@ -0,0 +1,82 @@
+# Tests of the request planner, and of API calls of planned approvals against the fake server
+import MyFakeServer
+from WindowFields import WindowFields as wf
+
+
+# Review panel values of a transaction, the same way the review grid fills them
+def PanelValues(Transaction, Category='Groceries', AccountTo=''):
+    return {
+        wf.TRANSACTION_DATE : Transaction['date'],
+        wf.PAYEE_NAME       : Transaction['payee'],
+        wf.CATEGORY_NAME    : Category,
+        wf.NOTE_TEXT        : 'Test',
+        wf.AMOUNT           : '{:,.2f}'.format(Transaction['amount']),
+        wf.AC_FROM          : Transaction['transaction_account']['name'],
+        wf.AC_TO            : AccountTo,
+        wf.AC_TRANSFER      : not AccountTo,
+    }
+
+
+def test_planner_merges_updates_of_a_transaction():
+    import MyPocketSmith as ps
+    planner = ps.OperationPlanner()
+    key = planner.update(('t', 0, 'main'), 5, payee='Shop', amount='-1.00')
+    planner.set(key, payee='Shop 2')
+    planner.confirm(key)
+    ops = planner.operations('g')
+    assert [op['method'] for op in ops] == ['PUT', 'PUT']
+    assert ops[0]['payload'] == {'payee': 'Shop 2', 'amount': '-1.00', 'needs_review': False}
+    assert ops[1]['condition'] == 'needs_review'        # Second PUT only if still flagged for review
+
+def test_planner_sends_only_fields_changed_since_creation():
+    import MyPocketSmith as ps
+    planner = ps.OperationPlanner()
+    key = planner.create(('t', 1, 'split'), 101, payee='Shop', amount='-1.00')
+    planner.set(key, payee='Shop', note='Split')
+    ops = planner.operations('g')
+    assert [op['method'] for op in ops] == ['POST', 'PUT']
+    assert ops[1]['payload'] == {'note': 'Split'}
+    assert ops[1]['idFrom'] == ops[0]['key']
+
+def test_planner_posts_confirmed_transaction_without_review():
+    import MyPocketSmith as ps
+    planner = ps.OperationPlanner()
+    key = planner.create(('t', 1, 'transferTo'), 104, payee='Transfer : Everyday', amount='1.00')
+    planner.confirm(key)
+    ops = planner.operations('g')
+    assert [op['method'] for op in ops] == ['POST', 'PUT']
+    assert ops[0]['payload']['needs_review'] is False
+    assert ops[1]['condition'] == 'needs_review'        # Only sent if the server set it for review anyway
+
+def test_approval_calls(ps, server):
+    added = MyFakeServer.AddPendingTransactions(server.account, 3)
+    ps.SyncTransactions()
+    transactions = {t['id']: t for t in ps.GetTransactionStore().getPending()}
+    batch = [(transactions[added[0]['id']], [('No transfer', PanelValues(transactions[added[0]['id']]))]),
+             (transactions[added[1]['id']], [('Transfer', PanelValues(transactions[added[1]['id']], 'Transfer', 'Savings'))])]
+    server.resetStats()
+    results = ps.ApproveTransactions(batch)
+    assert all('SUCCESS' in status.upper() for status, approved in results.values())
+    # Plain row: one PUT. Transfer: PUT of main, POST of the other side and conditional PUT to clear its review flag, as the server sets new transactions for review.
+    #  Conditional confirmations of updated transactions are not needed
+    assert server.requestCounts[('PUT', 'update_transaction')] == 3
+    assert server.requestCounts[('POST', 'create_transaction')] == 1
+    assert not server.account.transactions[added[0]['id']]['needs_review']
+    assert server.account.transactions[added[1]['id']]['payee'] == 'Transfer : Savings'
+
+def PostingValues(AccountFrom='Everyday', AccountTo='Savings'):
+    return PanelValues({'date': '2024-03-05', 'payee': 'Rent', 'amount': -100.0, 'transaction_account': {'name': AccountFrom}}, 'Transfer', AccountTo)
+
+def test_post_transfer(ps, server):
+    res1, res2, msg = ps.PostTransaction(PostingValues(), Need_Review=False)
+    assert msg == 'Transaction posting success'
+    legs = sorted((t['transaction_account']['name'], t['amount'], t['payee'], t['needs_review']) for t in server.account.transactions.values())
+    assert legs == [('Everyday', -100.0, 'Transfer : Savings', False), ('Savings', 100.0, 'Transfer : Everyday', False)]
+    assert (res1['payee'], res2['payee']) == ('Transfer : Savings', 'Transfer : Everyday')
+
+def test_failed_post_does_not_create_transfer(ps, server, monkeypatch):
+    monkeypatch.setitem(ps.accountIdLookup, 'Everyday', 999)        # Account not found
+    res1, res2, msg = ps.PostTransaction(PostingValues())
+    assert msg.startswith('Transaction posting failed!')
+    assert (res1, res2) == ('', '')
+    assert server.account.transactions == {}
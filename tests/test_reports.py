@@ -0,0 +1,41 @@
+# Tests of reports on the local store, and of reloading the report table when transactions or categories change
+import pytest
+pytest.importorskip('numpy')
+import MyReports
+from MyCategoryTree import CategoryTree
+from MyTransactionStore import TransactionStore
+
+
+@pytest.fixture
+def store(workDir, monkeypatch):
+    monkeypatch.setattr(MyReports, 'tableCache', None)
+    store = TransactionStore()
+    yield store
+    store.conn.close()
+
+def Transaction(Id, Amount, CategoryId, Date='2024-03-05', Account='Everyday'):
+    return {'id': Id, 'date': Date, 'payee': 'Shop', 'amount': Amount, 'needs_review': False, 'closing_balance': None,
+            'transaction_account': {'name': Account}, 'category': {'id': CategoryId, 'title': 'Title'}}
+
+def Totals(Table):
+    headings, rows = MyReports.RunReport(Table, 'Category totals')
+    return {row[0]: row[3] for row in rows}
+
+
+def test_category_totals(store):
+    store.upsert([Transaction(1, -10.0, 11), Transaction(2, -5.0, 11), Transaction(3, 100.0, 21, Account='Savings')])
+    table = MyReports.LoadTable(store)
+    assert Totals(table) == {'Title': 85.0, 'Total': 85.0}
+    headings, rows = MyReports.RunReport(table, 'Category totals', Account='Everyday')
+    assert rows[-1][3] == -15.0
+
+def test_table_reloaded_on_changes(store):
+    tree = CategoryTree([{'id': 11, 'title': 'Food', 'children': []}])
+    store.upsert([Transaction(1, -10.0, 11)])
+    table = MyReports.LoadTable(store, tree.displayName, tree.version)
+    assert MyReports.LoadTable(store, tree.displayName, tree.version) is table
+    tree.update([{'id': 11, 'title': 'Groceries', 'children': []}])
+    table = MyReports.LoadTable(store, tree.displayName, tree.version)
+    assert 'Groceries' in Totals(table)
+    store.upsert([Transaction(2, -5.0, 11)])
+    assert MyReports.LoadTable(store, tree.displayName, tree.version).count == 2
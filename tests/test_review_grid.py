@@ -0,0 +1,140 @@
+# Tests of the paged review grid, with a fake window holding element values the way PySimpleGUI elements do
+import json
+import pytest
+import ReviewGrid
+
+
+# Element stand-in. Update() sets the value if given, update() the visibility
+class FakeElement:
+    def __init__(self):
+        self.value = ''
+        self.visible = True
+        self.options = {}
+
+    def get(self):
+        return self.value
+
+    def Update(self, value=None, **kwargs):
+        if value is not None:
+            self.value = value
+        self.options.update(kwargs)
+
+    def update(self, visible=None):
+        if visible is not None:
+            self.visible = visible
+
+
+class FakeWindow:
+    def __init__(self):
+        self.elements = {}
+        self.extended = []          # Container keys layout was added to
+
+    def __getitem__(self, key):
+        return self.elements.setdefault(key, FakeElement())
+
+    def extend_layout(self, container, rows):
+        self.extended.append(next(key for key, element in self.elements.items() if element is container))
+
+
+class FakePanel:
+    def __init__(self, pageSize):
+        self.pageSize = pageSize
+
+    def splitRow(self, slot, split):
+        return [[]]
+
+    def bindTypeAhead(self, window, keys):
+        pass
+
+
+def Transaction(TransId, Payee='Shop', Amount=-10.0):
+    return {'id': TransId, 'date': '2024-03-05', 'account': 'Everyday', 'amount': Amount, 'category': 'Groceries', 'payee': Payee, 'note': None}
+
+def Shown(Window, Grid):
+    # Payees shown in used slots, in slot order
+    return [Window[f'-TransGrid_{slot}_4_0-'].get() for slot, transId in enumerate(Grid.slots) if transId is not None]
+
+
+@pytest.fixture
+def window():
+    return FakeWindow()
+
+@pytest.fixture
+def grid(ps, window):
+    return ReviewGrid.ReviewGrid(window, FakePanel(2))
+
+
+def test_update_adds_and_removes_transactions(grid, window):
+    assert grid.update([Transaction(1, 'A'), Transaction(2, 'B')]) == (2, 0)
+    assert Shown(window, grid) == ['A', 'B']
+    assert window['-TransGrid_0_2_0-'].get() == '-10.00'
+    assert window['-TransGrid_0_2_0-'].options['text_color'] == 'brown'
+    assert grid.update([Transaction(2, 'B'), Transaction(3, 'C')]) == (1, 1)
+    assert Shown(window, grid) == ['B', 'C']
+    assert grid.update([Transaction(2, 'B'), Transaction(3, 'C')]) == (0, 0)
+
+def test_only_changed_slots_are_filled_again(grid, window):
+    grid.update([Transaction(1, 'A'), Transaction(2, 'B')])
+    window['-TransGrid_1_4_0-'].value = 'B edited'
+    grid.update([Transaction(1, 'A'), Transaction(2, 'B'), Transaction(3, 'C')])
+    grid.hide(1)
+    assert Shown(window, grid) == ['B edited', 'C']         # Unsaved edit moved with its transaction
+    assert grid.rows[2]['rows'][0][4] == 'B edited'
+
+def test_pages(grid, window):
+    grid.update([Transaction(i, f'P{i}') for i in range(1, 6)])
+    assert grid.pageCount() == 3
+    assert window['-ReviewPageInfo-'].get() == 'Page 1 of 3  (5 to review)'
+    window['-TransGrid_0_6_0-'].value = 'Note of P1'
+    grid.changePage(1)
+    grid.changePage(1)
+    grid.changePage(1)
+    assert Shown(window, grid) == ['P5'] and not window['-TransGridBlock_1-'].visible
+    grid.changePage(-2)
+    assert Shown(window, grid) == ['P1', 'P2'] and window['-TransGrid_0_6_0-'].get() == 'Note of P1'
+    grid.update([Transaction(1, 'P1')])
+    assert grid.pageCount() == 1 and window['-ReviewPageInfo-'].get() == ''
+
+def test_in_flight_approvals_stay_until_done(grid, window):
+    grid.update([Transaction(1, 'A'), Transaction(2, 'B')])
+    grid.setInFlight(1, True)
+    assert window['-TransGridApprove_0_0-'].get() == 'Working'
+    assert grid.update([]) == (0, 1)                        # Approval of 1 is still being sent
+    assert grid.pendingIds() == [1]
+    grid.hide(1)
+    assert grid.update([Transaction(1, 'A')], inFlightIds={1}) == (0, 0)       # Pocketsmith still lists it until outbox is done
+    assert grid.update([Transaction(1, 'A')]) == (1, 0)    # Came back for review
+
+def test_failed_approval_shown_again_with_edits(grid, window):
+    grid.update([Transaction(1, 'A'), Transaction(2, 'B'), Transaction(3, 'C')])
+    window['-TransGrid_0_4_0-'].value = 'A edited'
+    grid.hide(1)
+    assert Shown(window, grid) == ['B', 'C']
+    grid.show(1)
+    assert grid.pendingIds() == [1, 2, 3] and Shown(window, grid) == ['A edited', 'B']
+
+def test_split_rows_are_created_once_per_slot(grid, window):
+    grid.update([Transaction(1, 'A', -30.0), Transaction(2, 'B')])
+    grid.addSplit(1)
+    assert window.extended == ['-SplitRows_0-'] and window['-SplitRowBlock_0_1-'].visible
+    window['-TransGrid_0_2_0-'].value = '-20.00'
+    window['-TransGrid_0_2_1-'].value = '-5.00'
+    grid.updateRemainingAmount(0)
+    assert window['-SplitRowRemAmt_0_1-'].get() == '-5.00'
+    grid.saveEdits()
+    assert grid.remainingAmount(1) == pytest.approx(-5.0)
+    grid.hide(1)                                            # Slot 0 now shows B, which has no splits
+    assert not window['-SplitRowBlock_0_1-'].visible
+    grid.update([Transaction(2, 'B'), Transaction(3, 'C')])
+    grid.addSplit(2)
+    assert window.extended == ['-SplitRows_0-']             # Split row of slot 0 re-used
+
+def test_payee_rules_prefill_new_transactions(ps, window):
+    with open('PayeeRules.json', 'w') as fp:
+        json.dump([{'payee_exact': 'ATM Withdrawal', 'category': 'Transfer', 'transfer_to': 'Wallet', 'set_note': 'Cash', 'auto_approve': True}], fp)
+    grid = ReviewGrid.ReviewGrid(window, FakePanel(2))
+    grid.update([Transaction(1, 'ATM Withdrawal'), Transaction(2, 'Shop')])
+    assert grid.rows[1]['rows'][0][3:] == ['Transfer', 'ATM Withdrawal', 'Wallet', 'Cash']
+    assert grid.autoApproveIds() == [1]
+    grid.setInFlight(1, True)
+    assert grid.autoApproveIds() == []
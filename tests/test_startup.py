@@ -0,0 +1,45 @@
+# Tests of the parallel startup loader, against the fake server
+import json
+import pytest
+import MyFakeServer
+from MyStartup import StartupLoader, STARTUP_DONE_EVENT
+from MyTaskGraph import TaskFailed
+from MyTelemetry import StartupTimer
+from test_worker import FakeWindow
+
+
+def test_startup_loads(ps, server):
+    added = MyFakeServer.AddPendingTransactions(server.account, 2)
+    timer = StartupTimer()
+    loader = StartupLoader(timer).start()
+    assert loader.waitForMetadata() is None
+    assert ps.categoryList and ps.accountList
+    window = FakeWindow()
+    loader.setWindow(window)
+    assert window.read() == (STARTUP_DONE_EVENT, loader)       # Loads may already be done, so event is sent when window is set
+    assert window.events.empty()
+    pending, transactions = loader.transactions()
+    assert {t['id'] for t in added} <= {t['id'] for t in pending}
+    assert {p[0] for p in timer.phases} >= {'import api modules', 'read key', 'load categories', 'load accounts', 'sync transactions', 'review list', 'payee index'}
+
+def test_startup_without_key(ps, server):
+    with open(ps.keyFile, 'w') as fp:
+        json.dump({'ApiKey': 'short'}, fp)
+    loader = StartupLoader(StartupTimer()).start()
+    assert isinstance(loader.waitForMetadata(), TaskFailed)
+    loader.done.wait(5)
+    assert loader.error('history') is None          # Approval history doesn't need the key
+    with pytest.raises(TaskFailed):
+        loader.transactions()
+
+def test_failed_metadata_stops_review_list(ps, server, monkeypatch):
+    def Fail(*args, **kwargs):
+        raise ConnectionError('no network')
+    monkeypatch.setattr(ps, 'LoadCategories', Fail)
+    window = FakeWindow()
+    loader = StartupLoader(StartupTimer())
+    loader.setWindow(window)                # Window set before loads finish
+    loader.start()
+    assert window.read()[0] == STARTUP_DONE_EVENT
+    assert isinstance(loader.waitForMetadata(), ConnectionError)
+    assert loader.error('sync') is None and loader.results['transactions'].skipped
@@ -0,0 +1,40 @@
+# Tests of delta and full sync of the local transaction store, against the fake server
+import time
+import MyFakeServer
+from test_fetch import ListCalls
+
+
+def test_delta_sync_keeps_review_flags(ps, server):
+    added = MyFakeServer.AddPendingTransactions(server.account, 10)
+    store = ps.GetTransactionStore()
+    assert ps.SyncTransactions() == 10
+    assert len(store.getPendingIds()) == 10
+    with server.account.lock:
+        t = server.account.transactions[added[0]['id']]
+        t['needs_review'] = False
+        t['updated_at'] = '2999-01-01T00:00:00Z'
+    server.resetStats()
+    ps.SyncTransactions()
+    assert ListCalls(server) == 1       # Changes only, no separate download of the review list
+    assert added[0]['id'] not in store.getPendingIds()
+    assert len(store.getPendingIds()) == 9
+
+def test_full_sync_drops_deleted_transactions(ps, server):
+    added = MyFakeServer.AddPendingTransactions(server.account, 10)
+    store = ps.GetTransactionStore()
+    ps.SyncTransactions()
+    with server.account.lock:
+        del server.account.transactions[added[0]['id']]
+    ps.SyncTransactions()
+    assert store.count() == 10          # Delta sync doesn't see deletions
+    time.sleep(1.1)                     # Transactions updated in the second the download starts are kept
+    ps.SyncTransactions(FullSync=True)
+    assert store.count() == 9
+    assert added[0]['id'] not in store.getIds()
+
+def test_full_sync_is_due_after_interval(ps, server, monkeypatch):
+    store = ps.GetTransactionStore()
+    ps.SyncTransactions()
+    assert not ps.IsFullSyncDue(store)
+    monkeypatch.setattr(ps, 'FULL_SYNC_INTERVAL', 0)
+    assert ps.IsFullSyncDue(store)
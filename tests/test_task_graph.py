@@ -0,0 +1,91 @@
+# Tests of the API call dependency graph, and of batch approvals run with it
+import threading
+import time
+import pytest
+import MyFakeServer
+from MyTaskGraph import TaskGraph, TaskFailed
+from test_planner import PanelValues
+
+
+def test_tasks_run_after_their_dependencies():
+    graph = TaskGraph()
+    order = []
+    lock = threading.Lock()
+
+    def Task(name, result):
+        def Run(*depResults):
+            time.sleep(0.01)
+            with lock:
+                order.append(name)
+            return result + sum(depResults)
+        return Run
+    graph.add('a', Task('a', 1))
+    graph.add('b', Task('b', 10))
+    graph.add('c', Task('c', 100), deps=['a', 'b'])
+    graph.add('d', Task('d', 1000), deps=['c'])
+    results = graph.run(4)
+    assert set(order[:2]) == {'a', 'b'} and order[2:] == ['c', 'd']
+    assert results['c'].result == 111 and results['d'].result == 1111
+
+def test_independent_tasks_run_at_the_same_time():
+    graph = TaskGraph()
+    barrier = threading.Barrier(3, timeout=5)       # Broken if the tasks were run one by one
+    for key in 'abc':
+        graph.add(key, barrier.wait)
+    results = graph.run(3)
+    assert all(result.ok() for result in results.values())
+
+def test_failed_task_skips_dependents():
+    graph = TaskGraph()
+    ran = []
+
+    def Fail():
+        raise TaskFailed('rejected')
+    graph.add('main', Fail)
+    graph.add('split', lambda *r: ran.append('split'), deps=['main'])
+    graph.add('confirm', lambda *r: ran.append('confirm'), deps=['split'])
+    graph.add('other', lambda: ran.append('other'))
+    results = graph.run()
+    assert ran == ['other']
+    assert not results['main'].skipped and str(results['main'].error) == 'rejected'
+    assert results['split'].skipped and results['confirm'].skipped
+    assert results['confirm'].error is results['main'].error
+    assert results['other'].ok()
+
+def test_unknown_dependency_is_rejected():
+    graph = TaskGraph()
+    with pytest.raises(KeyError):
+        graph.add('a', lambda: None, deps=['b'])
+
+
+def test_approve_batch_with_split(ps, server):
+    added = MyFakeServer.AddPendingTransactions(server.account, 3)
+    ps.SyncTransactions()
+    transactions = {t['id']: t for t in ps.GetTransactionStore().getPending()}
+    split = transactions[added[0]['id']]
+    splitValues = dict(PanelValues(split), **{ps.wf.PAYEE_NAME: 'Split payee', ps.wf.AMOUNT: '1.00'})
+    batch = [(split, [('No transfer', PanelValues(split)), ('No transfer', splitValues)])] + \
+            [(transactions[t['id']], [('No transfer', PanelValues(transactions[t['id']]))]) for t in added[1:]]
+    server.resetStats()
+    results = ps.ApproveTransactions(batch, MaxConcurrent=2)
+    assert all('SUCCESS' in status.upper() for status, approved in results.values())
+    # One PUT per main transaction. Split is created with payee of main transaction and no review flag, then one PUT sets its own payee.
+    #  Conditional confirmation of the split is skipped, as the server did not flag it for review
+    assert server.requestCounts[('POST', 'create_transaction')] == 1
+    assert server.requestCounts[('PUT', 'update_transaction')] == 4
+    created = [t for t in server.account.transactions.values() if t['payee'] == 'Split payee']
+    assert len(created) == 1 and not created[0]['needs_review']
+
+def test_failed_main_update_skips_its_splits(ps, server):
+    added = MyFakeServer.AddPendingTransactions(server.account, 2)
+    ps.SyncTransactions()
+    transactions = {t['id']: t for t in ps.GetTransactionStore().getPending()}
+    missing = dict(transactions[added[0]['id']], id=999999)         # Deleted on the server since download
+    other = transactions[added[1]['id']]
+    batch = [(missing, [('No transfer', PanelValues(missing)), ('No transfer', PanelValues(missing))]),
+             (other, [('No transfer', PanelValues(other))])]
+    server.resetStats()
+    results = ps.ApproveTransactions(batch)
+    assert 'FAILED' in results[999999][0].upper() and results[999999][1] is None
+    assert 'SUCCESS' in results[other['id']][0].upper()
+    assert server.requestCounts[('POST', 'create_transaction')] == 0        # Split not created for a failed main transaction
@@ -0,0 +1,105 @@
+# Tests of API call telemetry and structured logging
+import csv
+import json
+import logging
+import pytest
+from MyApiClient import ApiClient
+from MyTelemetry import EndpointName, EndpointStats, Telemetry, StartupTimer, SetupLogging, LogEvent
+
+
+def test_endpoint_name():
+    assert EndpointName('get', 'https://api.pocketsmith.com/v2/users/123/transactions?page=2') == 'GET /users/{id}/transactions'
+    assert EndpointName('PUT', '/transactions/77') == 'PUT /transactions/{id}'
+    assert EndpointName('GET', '/me') == 'GET /me'
+
+def test_percentiles_from_histogram():
+    stats = EndpointStats()
+    for ms in [5] * 90 + [300] * 9 + [7000]:
+        stats.record(200, ms / 1000, 0, 0, 0)
+    assert stats.percentile(50) == 10               # Upper bound of bucket
+    assert stats.percentile(95) == 500
+    assert stats.percentile(100) == pytest.approx(7000)
+    assert EndpointStats().percentile(50) is None
+    assert stats.toDict()['histogram'] == {'<=10ms': 90, '<=25ms': 0, '<=50ms': 0, '<=100ms': 0, '<=250ms': 0, '<=500ms': 9,
+                                           '<=1000ms': 0, '<=2500ms': 0, '<=5000ms': 0, '<=10000ms': 1, '>10000ms': 0}
+
+def test_slowest_bucket_capped_at_max_time():
+    stats = EndpointStats()
+    stats.record(200, 0.03, 0, 0, 0)
+    assert stats.percentile(50) == pytest.approx(30)
+
+def test_record_groups_by_endpoint():
+    telemetry = Telemetry()
+    telemetry.record('GET', '/transactions/1', 200, 0.02, 0, 1024)
+    telemetry.record('GET', '/transactions/2', 404, 0.04, 0, 512, retries=2)
+    telemetry.record('GET', '/transactions/3', None, 0.2)
+    telemetry.record('PUT', '/transactions/1', 200, 0.05, 2048, 100)
+    snapshot = telemetry.snapshot()
+    assert list(snapshot) == ['GET /transactions/{id}', 'PUT /transactions/{id}']
+    get = snapshot['GET /transactions/{id}']
+    assert (get['calls'], get['errors'], get['retries'], get['bytes_received']) == (3, 1, 2, 1536)
+    assert get['statuses'] == {'200': 1, '404': 1}
+    assert telemetry.rows()[1] == ['PUT /transactions/{id}', 1, 0, 0, 2.0, 0.1, 50.0, 50, 50, 50.0, '200:1']
+    telemetry.reset()
+    assert telemetry.snapshot() == {}
+
+def test_histogram_text():
+    telemetry = Telemetry()
+    telemetry.record('GET', '/me', 200, 0.005)
+    telemetry.record('GET', '/me', 200, 0.005)
+    telemetry.record('GET', '/me', 200, 0.2)
+    lines = telemetry.histogramText('GET /me', width=10).splitlines()
+    assert lines[0] == '    <= 10 ms | ########## 2'
+    assert lines[4] == '   <= 250 ms | #####      1'
+    assert telemetry.histogramText('GET /other') == ''
+
+def test_save_json_and_csv(workDir):
+    telemetry = Telemetry()
+    telemetry.record('GET', '/me', 200, 0.01, 0, 100)
+    telemetry.saveJson('stats.json')
+    telemetry.saveCsv('stats.csv')
+    with open('stats.json') as fp:
+        assert json.load(fp)['endpoints']['GET /me']['calls'] == 1
+    with open('stats.csv', newline='') as fp:
+        rows = list(csv.reader(fp))
+    assert rows[0][0] == 'Endpoint' and rows[1][:2] == ['GET /me', '1']
+
+def test_client_records_calls(server):
+    telemetry = Telemetry()
+    client = ApiClient(server.url, retries=0, telemetry=telemetry)
+    client.setApiKey('t' * 128)
+    try:
+        assert client.request('GET', '/me').status_code == 200
+        client.request('GET', '/me')
+    finally:
+        client.close()
+    stats = telemetry.snapshot()['GET /me']
+    assert stats['calls'] == 2 and stats['statuses'] == {'200': 2} and stats['bytes_received'] > 0
+
+def test_startup_timer_records_phases():
+    timer = StartupTimer()
+    with timer.phase('load'):
+        pass
+    with pytest.raises(ValueError):
+        with timer.phase('broken'):
+            raise ValueError('bad file')
+    timer.mark('window shown')
+    assert [p[0] for p in timer.phases] == ['load', 'broken']
+    assert timer.phases[1][4] == 'ValueError bad file'
+    lines = timer.report()
+    assert len(lines) == 4 and lines[2].endswith('FAILED: ValueError bad file') and lines[3].startswith('window shown')
+
+def test_log_events_are_json_lines(workDir):
+    logger = SetupLogging(FileName='test.log')
+    try:
+        LogEvent(logging.getLogger('PocketSmith.grid'), 'grid_updated', added=2, removed=1)
+        LogEvent(logging.getLogger('PocketSmith.api'), 'api_call', logging.DEBUG, endpoint='GET /me')    # Below log level
+    finally:
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+            handler.close()
+    with open('test.log') as fp:
+        records = [json.loads(line) for line in fp]
+    assert len(records) == 1
+    assert {k: records[0][k] for k in ('level', 'logger', 'event', 'added', 'removed')} == \
+           {'level': 'INFO', 'logger': 'PocketSmith.grid', 'event': 'grid_updated', 'added': 2, 'removed': 1}
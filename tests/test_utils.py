@@ -0,0 +1,43 @@
+# Tests of date parsing
+from datetime import datetime
+import pytest
+import MyUtils as ut
+
+
+@pytest.fixture(autouse=True)
+def formatCache(monkeypatch):
+    monkeypatch.setattr(ut, 'dateFormatCache', {})
+
+
+@pytest.mark.parametrize('text', ['2024-03-05', '05-03-2024', '05/03/2024', '2024/03/05', '5/3/2024', '2024-3-5', ' 2024-03-05 '])
+def test_parse_date_formats(text):
+    assert ut.ParseDate(text) == datetime(2024, 3, 5)
+
+@pytest.mark.parametrize('text', ['31/02/2024', '2024-13-01', '03/05/24', '2024.03.05', '', 'today'])
+def test_parse_date_invalid(text):
+    with pytest.raises(ut.DateFormatError):
+        ut.ParseDate(text)
+
+def test_parse_date_not_text():
+    with pytest.raises(ut.DateFormatError):
+        ut.ParseDate(None)
+
+def test_format_is_remembered_per_source():
+    ut.ParseDate('05/03/2024', ut.DATE_SOURCE_GUI)
+    ut.ParseDate('2024-03-05', ut.DATE_SOURCE_API)
+    assert ut.dateFormatCache == {ut.DATE_SOURCE_GUI: '%d/%m/%Y', ut.DATE_SOURCE_API: '%Y-%m-%d'}
+    assert ut.ParseDate('2024-03-06', ut.DATE_SOURCE_GUI) == datetime(2024, 3, 6)      # Format changed. Detected again
+    assert ut.dateFormatCache[ut.DATE_SOURCE_GUI] == '%Y-%m-%d'
+
+def test_parse_dates_in_order():
+    dates = ut.ParseDates(['2024-03-05', '2024-03-04', '2024-03-05', '04/03/2024'])
+    assert dates == [datetime(2024, 3, 5), datetime(2024, 3, 4), datetime(2024, 3, 5), datetime(2024, 3, 4)]
+
+def test_parse_dates_errors():
+    with pytest.raises(ut.DateFormatError):
+        ut.ParseDates(['2024-03-05', 'bad'])
+    assert ut.ParseDates(['2024-03-05', 'bad', None, ['not', 'hashable']], Errors='none') == [datetime(2024, 3, 5), None, None, None]
+
+def test_is_date_format_valid():
+    assert ut.IsDateFormatValid('05/03/2024') == (True, datetime(2024, 3, 5))
+    assert ut.IsDateFormatValid('31/02/2024') == (False, None)
@@ -0,0 +1,85 @@
+# Tests of the background API worker, with a fake window collecting the events a PySimpleGUI window would get
+import io
+import queue
+import threading
+import time
+import pytest
+from MyWorker import ApiWorker, WorkerStdout, WORKER_DONE_EVENT, WORKER_PRINT_EVENT
+
+
+# Window stand-in. write_event_value() is the only window method the worker calls, from worker threads
+class FakeWindow:
+    def __init__(self):
+        self.events = queue.Queue()
+
+    def write_event_value(self, key, value):
+        self.events.put((key, value))
+
+    def read(self, timeout=5):
+        return self.events.get(timeout=timeout)
+
+
+@pytest.fixture
+def window():
+    return FakeWindow()
+
+@pytest.fixture
+def worker(window):
+    apiWorker = ApiWorker(window, threads=2)
+    yield apiWorker
+    apiWorker.stop()
+
+
+def test_result_sent_to_window(worker, window):
+    jobId = worker.submit('add', lambda a, b=0: a + b, 2, b=3, tag=7)
+    event, result = window.read()
+    assert event == WORKER_DONE_EVENT
+    assert (result.jobId, result.name, result.tag, result.result, result.error) == (jobId, 'add', 7, 5, None)
+
+def test_error_sent_to_window(worker, window):
+    def Fail():
+        raise ValueError('bad response')
+    worker.submit('refresh', Fail)
+    event, result = window.read()
+    assert result.result is None and isinstance(result.error, ValueError)
+
+def test_busy_until_job_is_done(worker, window):
+    release = threading.Event()
+    worker.submit('approve', release.wait, 5)
+    assert worker.busy('approve') and worker.busy() and not worker.busy('refresh')
+    release.set()
+    window.read()
+    assert not worker.busy()
+
+def test_scheduled_job_runs_again(worker, window):
+    worker.schedule('refresh', lambda: 'new data', 0.1)
+    assert [window.read()[1].name for i in range(2)] == ['refresh', 'refresh']
+
+def test_run_now_and_no_overlapping_runs(worker, window):
+    release = threading.Event()
+    calls = []
+
+    def Refresh():
+        calls.append(1)
+        release.wait(5)
+    worker.schedule('refresh', Refresh, 60)
+    assert worker.secondsUntil('refresh') > 50
+    worker.runNow('refresh')
+    time.sleep(0.2)
+    worker.runNow('refresh')        # Previous run still going, so it's run once that one is done
+    time.sleep(0.2)
+    assert len(calls) == 1
+    release.set()
+    window.read()
+    window.read()
+    assert len(calls) == 2 and worker.secondsUntil('refresh') > 50
+
+def test_print_from_worker_thread_sent_to_window(window):
+    stream = io.StringIO()
+    stdout = WorkerStdout(stream, window)
+    stdout.write('gui\n')
+    thread = threading.Thread(target=stdout.write, args=('worker\n',))
+    thread.start()
+    thread.join()
+    assert stream.getvalue() == 'gui\n'
+    assert window.read() == (WORKER_PRINT_EVENT, 'worker\n')